@@ -0,0 +1,170 @@
+"""Cold start benchmark for the pipeline's Lambda functions
+
+For each function, runs a fresh interpreter (like a new Lambda container) from the function's folder with
+the common util layer on the path, and measures:
+
+- `import_ms`: Importing the function's `main` module (the Lambda "init" phase)
+- `first_client_ms`: Creating each AWS client the function uses for the first time (the first invocation)
+- `cached_client_ms`: Getting the same clients again (every later, warm, invocation)
+
+Client creation doesn't call AWS, so no credentials are needed: Placeholder environment variables and region
+are set for the functions that read them at import time. Functions may also list modules that they must not
+import eagerly (e.g. boto3, which util.clients only imports on first use). E.g:
+
+    python benchmark_cold_start.py --repeats 10 --output cold-start.json
+    python benchmark_cold_start.py register-model evaluate-model --check
+"""
+
+# Python Built-Ins:
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+FUNCTIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYER_DIR = os.path.join(FUNCTIONS_DIR, "common-util-layer", "python")
+
+PLACEHOLDER_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "MONITORING_BUCKET": "example-monitoring-bucket",
+    "PROJECT_BUCKET": "example-project-bucket",
+    "PROJECT_ID": "example-project",
+    "PROJECT_MODEL_ROLE_ARN": "arn:aws:iam::111122223333:role/example-model-role",
+}
+
+# Which AWS clients each function creates, and what it must *not* pull in at import time:
+DEFAULT_TARGETS = {
+    "check-performance": { "clients": ["s3", "sagemaker"], "forbidden": ["boto3"] },
+    "collect-garbage": { "clients": ["s3", "sagemaker"], "forbidden": ["boto3"] },
+    "configure-autoscaling": {
+        "clients": ["application-autoscaling", "cloudwatch", "sagemaker"], "forbidden": ["boto3"]
+    },
+    "evaluate-model": { "clients": ["s3"], "forbidden": ["boto3"] },
+    "is-endpoint-updated": { "clients": ["sagemaker"], "forbidden": ["boto3"] },
+    "plan-test-scoring": { "clients": ["s3"], "forbidden": ["boto3"] },
+    "prepare-deployment-configs": { "clients": ["cloudwatch", "s3", "sagemaker"], "forbidden": ["boto3"] },
+    # (Needs boto3's TransferConfig at import time, and uses a larger-pooled S3 resource)
+    "register-model": { "clients": ["sagemaker"], "resources": ["s3"], "forbidden": [] },
+    "request-approval": { "clients": ["ses", "sns"], "forbidden": ["boto3"] },
+    "shift-traffic": { "clients": ["cloudwatch", "sagemaker"], "forbidden": ["boto3"] },
+    "sweep-endpoint-configs": { "clients": ["sagemaker"], "forbidden": ["boto3"] },
+    "test-results-cache": { "clients": ["s3"], "forbidden": ["boto3"] },
+    "tune-data-capture": {
+        "clients": ["application-autoscaling", "cloudwatch", "sagemaker"], "forbidden": ["boto3"]
+    },
+}
+
+# Run in the fresh interpreter: Prints one JSON object of timings
+DRIVER = """
+import json, sys, time
+t0 = time.perf_counter()
+import main
+import_ms = (time.perf_counter() - t0) * 1000
+imported = sorted(sys.modules)
+import util
+first, cached = {}, {}
+for kind, name in json.loads(sys.argv[1]):
+    factory = getattr(util, kind)
+    for timings in (first, cached):
+        t0 = time.perf_counter()
+        factory(name)
+        timings[f"{kind}:{name}"] = (time.perf_counter() - t0) * 1000
+print(json.dumps({
+    "import_ms": import_ms, "first_client_ms": first, "cached_client_ms": cached, "modules": imported,
+}))
+"""
+
+
+def measure_once(function_name: str, spec: dict) -> dict:
+    """Cold-start one function in a fresh interpreter, and return its timings"""
+    env = dict(os.environ)
+    for name, value in PLACEHOLDER_ENV.items():
+        env.setdefault(name, value)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [LAYER_DIR, env.get("PYTHONPATH")]))
+    factories = [["client", name] for name in spec.get("clients", [])] + [
+        ["resource", name] for name in spec.get("resources", [])
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", DRIVER, json.dumps(factories)],
+        cwd=os.path.join(FUNCTIONS_DIR, function_name),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode:
+        return { "ok": False, "error": proc.stderr.strip().splitlines()[-1] }
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["ok"] = True
+    result["wall_ms"] = wall_ms
+    return result
+
+
+def measure_target(function_name: str, spec: dict, repeats: int=5) -> dict:
+    """Measure a function over several fresh-interpreter runs, and check it against its spec"""
+    runs = [measure_once(function_name, spec) for _ in range(repeats)]
+    failed = [r for r in runs if not r["ok"]]
+    result = { "violations": [] }
+    if failed:
+        result["violations"].append(f"Cold start failed: {failed[0]['error']}")
+        return result
+
+    result["import_ms_median"] = statistics.median(r["import_ms"] for r in runs)
+    result["wall_ms_median"] = statistics.median(r["wall_ms"] for r in runs)
+    for key in ("first_client_ms", "cached_client_ms"):
+        result[f"{key}_median"] = {
+            name: statistics.median(r[key][name] for r in runs) for name in runs[0][key]
+        }
+    # Total time to the point a first invocation could make its first AWS call:
+    result["cold_start_ms_median"] = result["import_ms_median"] + sum(
+        result["first_client_ms_median"].values()
+    )
+
+    imported = set(runs[0]["modules"])
+    for forbidden in spec.get("forbidden", []):
+        if any(m == forbidden or m.startswith(f"{forbidden}.") for m in imported):
+            result["violations"].append(f"Eagerly imports forbidden module '{forbidden}'")
+    return result
+
+
+def parse_args(cmd_args=None):
+    parser = argparse.ArgumentParser(description="Measure Lambda function import and first-client latency")
+    parser.add_argument(
+        "targets", nargs="*", default=list(DEFAULT_TARGETS),
+        help=f"Functions to measure (default: {', '.join(DEFAULT_TARGETS)})"
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh-interpreter runs per function")
+    parser.add_argument(
+        "--check", action="store_true", help="Exit non-zero if any function imports a forbidden module"
+    )
+    parser.add_argument("--output", "-o", type=str, default=None, help="Output file (default stdout)")
+    args = parser.parse_args(args=cmd_args)
+
+    unknown = [t for t in args.targets if t not in DEFAULT_TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets {unknown}: Expected some of {list(DEFAULT_TARGETS)}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = {}
+    for target in args.targets:
+        results[target] = measure_target(target, DEFAULT_TARGETS[target], repeats=args.repeats)
+        for violation in results[target]["violations"]:
+            print(f"COLD START VIOLATION [{target}] {violation}", file=sys.stderr)
+
+    results_str = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(results_str)
+    else:
+        print(results_str)
+    if args.check and any(r["violations"] for r in results.values()):
+        sys.exit(1)
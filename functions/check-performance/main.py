@@ -0,0 +1,202 @@
+"""Lambda function to plan and check the pre-approval performance gate
+
+The gate benchmarks the candidate model's inference path offline, with `benchmark.py gate` in a Processing
+job. It compares the results to the stored benchmark of the model that's currently live on the endpoint.
+Each model's results are kept at `{BenchmarkRootUri}{ModelName}/benchmark.json`, so today's candidate is the
+baseline for the next one.
+
+- Action "Plan" finds the live model and its stored benchmark (if any). It returns the Processing job's
+  inputs and arguments.
+- Action "Check" reads the job's comparison.json, and says whether the candidate Passed.
+
+Options come from the execution input's optional `PerformanceGate` object:
+
+    {
+        "MaxLatencyRegression": 0.1,     # Fractional p99 latency increase allowed (per batch size)
+        "MaxThroughputRegression": 0.1,  # Fractional rows/sec decrease allowed (per batch size)
+        "OnRegression": "flag",          # "flag" (show in approval email) or "fail" (stop the pipeline)
+        "InstanceType": "ml.m5.xlarge"
+    }
+"""
+
+# Python Built-Ins:
+import json
+import logging
+
+# External Dependencies:
+from botocore import exceptions as botoexceptions
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+DEFAULT_OPTIONS = {
+    "MaxLatencyRegression": 0.1,
+    "MaxThroughputRegression": 0.1,
+    "OnRegression": "flag",
+    # (Should match the instance type the stored baselines were measured on, for a fair comparison)
+    "InstanceType": "ml.m5.xlarge",
+}
+ON_REGRESSION_ACTIONS = ("flag", "fail")
+
+
+def bucket_and_key_from_s3_uri(s3uri):
+    assert isinstance(s3uri, str) and s3uri.lower().startswith("s3://"), (
+        f"s3uri must be a string beginning with 's3://': Got {s3uri}"
+    )
+    bucket, _, key = s3uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def resolve_options(execution_input):
+    options = dict(DEFAULT_OPTIONS)
+    options.update(execution_input.get("PerformanceGate") or {})
+    if options["OnRegression"] not in ON_REGRESSION_ACTIONS:
+        raise ValueError("PerformanceGate.OnRegression must be one of {}: Got {}".format(
+            ON_REGRESSION_ACTIONS, options["OnRegression"]
+        ))
+    for name in ("MaxLatencyRegression", "MaxThroughputRegression"):
+        options[name] = float(options[name])
+    return options
+
+
+def live_model_name(endpoint_name):
+    """Name of the model taking the most traffic on an endpoint (or None if no endpoint)"""
+    smclient = util.client("sagemaker")
+    try:
+        endpoint_desc = smclient.describe_endpoint(EndpointName=endpoint_name)
+    except botoexceptions.ClientError as err:
+        if err.response.get("Error", {}).get("Message", "").lower().startswith("could not find endpoint"):
+            return None
+        raise err
+    main_variant = max(endpoint_desc["ProductionVariants"], key=lambda v: v.get("CurrentWeight", 0))
+    config_desc = smclient.describe_endpoint_config(EndpointConfigName=endpoint_desc["EndpointConfigName"])
+    return next(
+        (v["ModelName"] for v in config_desc["ProductionVariants"]
+            if v["VariantName"] == main_variant["VariantName"]),
+        None,
+    )
+
+
+def object_exists(s3uri):
+    bucket, key = bucket_and_key_from_s3_uri(s3uri)
+    s3 = util.client("s3")
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except botoexceptions.ClientError as err:
+        if err.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise err
+
+
+def processing_input(name, s3uri):
+    return {
+        "InputName": name,
+        "S3Input": {
+            "LocalPath": f"/opt/ml/processing/{name}",
+            "S3DataType": "S3Prefix",
+            "S3InputMode": "File",
+            "S3Uri": s3uri,
+        },
+    }
+
+
+def plan(event):
+    options = resolve_options(event.get("ExecutionInput") or {})
+    root_uri = event["BenchmarkRootUri"]
+    if not root_uri.endswith("/"):
+        root_uri += "/"
+    model_name = event["ModelName"]
+
+    baseline_model_name = live_model_name(event["EndpointName"])
+    baseline_uri = None
+    if baseline_model_name and baseline_model_name != model_name:
+        stored_uri = f"{root_uri}{baseline_model_name}/benchmark.json"
+        if object_exists(stored_uri):
+            baseline_uri = stored_uri
+        else:
+            logger.warning(f"Live model {baseline_model_name} has no stored benchmark at {stored_uri}")
+
+    inputs = [
+        processing_input("model", event["ModelDataUrl"]),
+        processing_input("code", event["SourceDirUrl"]),
+    ]
+    if baseline_uri:
+        inputs.append(processing_input("baseline", baseline_uri))
+    logger.info(f"Benchmarking {model_name} against {baseline_uri or 'no baseline'}")
+    return dict(
+        options,
+        JobName=util.append_timestamp(f"benchmark-{model_name}")[:63],
+        ResultsUri=f"{root_uri}{model_name}/",
+        BaselineModelName=baseline_model_name if baseline_uri else None,
+        BaselineUri=baseline_uri,
+        ProcessingInputs=inputs,
+        # (The first argument is $0 for the job's `bash -c` entrypoint)
+        ContainerArguments=[
+            "benchmark",
+            "--max-latency-regression",
+            str(options["MaxLatencyRegression"]),
+            "--max-throughput-regression",
+            str(options["MaxThroughputRegression"]),
+        ],
+    )
+
+
+def check(event):
+    benchmark = dict(event["Benchmark"])
+    bucket, key = bucket_and_key_from_s3_uri(f"{benchmark['ResultsUri']}comparison.json")
+    comparison = json.loads(util.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read())
+    comparison["BaselineModelName"] = benchmark["BaselineModelName"]
+    comparison["OnRegression"] = benchmark["OnRegression"]
+    # Whether to stop the pipeline here:
+    comparison["Blocked"] = not comparison["Passed"] and benchmark["OnRegression"] == "fail"
+    if comparison["Regressions"]:
+        logger.warning(
+            f"Performance regressions vs {benchmark['BaselineModelName']}: {comparison['Regressions']}"
+        )
+    return comparison
+
+
+def handler(event, context):
+    """Lambda handler to plan or check the performance gate
+
+    Parameters
+    ----------
+    event.Action : str
+        "Plan" (before the benchmark job) or "Check" (after it)
+    event.ExecutionInput : dict
+        (Plan) The state machine execution input, read for optional PerformanceGate options
+    event.EndpointName : str
+        (Plan) Endpoint whose live model is the baseline
+    event.ModelName, event.ModelDataUrl, event.SourceDirUrl : str
+        (Plan) The candidate model, as registered
+    event.BenchmarkRootUri : str
+        (Plan) s3:// URI prefix under which each model's benchmark results are stored
+    event.Benchmark : dict
+        (Check) The output of the previous Plan
+
+    Returns
+    -------
+    (Plan) Options plus JobName, ResultsUri, BaselineModelName, BaselineUri, ProcessingInputs and
+    ContainerArguments for the benchmark job.
+    (Check) The job's comparison (Passed, HasBaseline, Regressions, BatchSizes...) plus Blocked: Whether
+    the regressions should stop the pipeline.
+    """
+    logger.info(f"Got event {event}")
+    action = event.get("Action", "Plan")
+    if action == "Plan":
+        return plan(event)
+    elif action == "Check":
+        return check(event)
+    else:
+        raise ValueError(f"Unknown Action '{action}': Expected 'Plan' or 'Check'")
@@ -0,0 +1,160 @@
+"""Lambda function to find (and optionally delete) unreferenced blobs in the project artifact store
+
+A blob under `blobs/sha256/` is referenced if either:
+
+- any registration manifest under `models/` lists it, or
+- any SageMaker model still points at it, through ModelDataUrl or SAGEMAKER_SUBMIT_DIRECTORY.
+
+Registration copies blobs before it writes its manifest, so a blob is never collected until it is older
+than a grace period. Registration refreshes the LastModified of any blob it re-uses, and each blob is
+checked again just before deleting, so a blob listed before a registration re-used it is kept too. ETag
+index entries (see util.blobs) for collected blobs are removed as well.
+"""
+
+# Python Built-Ins:
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import os
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+bucket_name = os.environ["PROJECT_BUCKET"]
+
+DEFAULT_GRACE_PERIOD_HOURS = 24
+MANIFESTS_ROOT = "models/"
+
+
+def list_keys(prefix):
+    """List (key, last modified) for all objects under prefix in the project bucket"""
+    paginator = util.client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            yield obj["Key"], obj["LastModified"]
+
+
+def referenced_from_manifests():
+    """Set of blob keys listed by any registration manifest"""
+    referenced = set()
+    n_manifests = 0
+    manifest_segment = f"/{util.blobs.MANIFESTS_DIR}/"
+    for key, _ in list_keys(MANIFESTS_ROOT):
+        if manifest_segment not in key or not key.endswith(".json"):
+            continue
+        manifest = json.loads(util.client("s3").get_object(Bucket=bucket_name, Key=key)["Body"].read())
+        n_manifests += 1
+        for artifact in manifest.get("Artifacts", {}).values():
+            referenced.add(artifact["Uri"][len(f"s3://{bucket_name}/"):])
+    logger.info(f"Found {len(referenced)} blobs referenced by {n_manifests} manifests")
+    return referenced
+
+
+def referenced_from_models():
+    """Set of blob keys used by any SageMaker model in this account & region"""
+    referenced = set()
+    prefix = f"s3://{bucket_name}/{util.blobs.BLOB_PREFIX}"
+    smclient = util.client("sagemaker")
+    paginator = smclient.get_paginator("list_models")
+    for page in paginator.paginate():
+        for model in page["Models"]:
+            desc = smclient.describe_model(ModelName=model["ModelName"])
+            containers = desc.get("Containers", []) + (
+                [desc["PrimaryContainer"]] if "PrimaryContainer" in desc else []
+            )
+            for container in containers:
+                uris = [
+                    container.get("ModelDataUrl"),
+                    container.get("Environment", {}).get("SAGEMAKER_SUBMIT_DIRECTORY"),
+                ]
+                referenced.update(
+                    uri[len(f"s3://{bucket_name}/"):] for uri in uris
+                    if isinstance(uri, str) and uri.startswith(prefix)
+                )
+    logger.info(f"Found {len(referenced)} blobs referenced by SageMaker models")
+    return referenced
+
+
+def find_garbage(cutoff, check_models=True):
+    """List unreferenced blob keys last modified before cutoff (a datetime)"""
+    referenced = referenced_from_manifests()
+    if check_models:
+        referenced |= referenced_from_models()
+    garbage = []
+    n_blobs = 0
+    for key, last_modified in list_keys(util.blobs.BLOB_PREFIX):
+        n_blobs += 1
+        if key not in referenced and last_modified < cutoff:
+            garbage.append(key)
+    logger.info(f"Found {len(garbage)} unreferenced of {n_blobs} blobs")
+    return garbage
+
+
+def still_unmodified(keys, cutoff):
+    """Those of keys which still exist and were last modified before cutoff, checked one by one
+
+    A registration can re-use (and so refresh) a blob after find_garbage listed it and its manifests.
+    """
+    s3client = util.client("s3")
+    result = []
+    for key in keys:
+        try:
+            head = s3client.head_object(Bucket=bucket_name, Key=key)
+        except s3client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                continue
+            raise
+        if head["LastModified"] < cutoff:
+            result.append(key)
+    return result
+
+
+def delete_keys(keys):
+    for ix in range(0, len(keys), 1000):
+        util.client("s3").delete_objects(
+            Bucket=bucket_name,
+            Delete={ "Objects": [{ "Key": key } for key in keys[ix:ix + 1000]], "Quiet": True },
+        )
+
+
+def handler(event, context):
+    """Lambda handler to garbage collect the blob store
+
+    Parameters
+    ----------
+    event.DryRun : bool (Optional)
+        Only report unreferenced blobs, without deleting (default true)
+    event.GracePeriodHours : float (Optional)
+        Minimum age of blobs to collect (default 24)
+    event.CheckModels : bool (Optional)
+        Whether to also treat blobs used by existing SageMaker models as referenced (default true)
+    """
+    logger.info(f"Got event {event}")
+    dry_run = event.get("DryRun", True)
+    grace_period = timedelta(hours=float(event.get("GracePeriodHours", DEFAULT_GRACE_PERIOD_HOURS)))
+    cutoff = datetime.now(timezone.utc) - grace_period
+    garbage = find_garbage(cutoff, check_models=event.get("CheckModels", True))
+    if not dry_run:
+        garbage = still_unmodified(garbage, cutoff)
+    collected = { util.blobs.sha256_from_blob_key(key) for key in garbage }
+    stale_index = [
+        key for key, _ in list_keys(util.blobs.INDEX_PREFIX) if key.rpartition("/")[2] in collected
+    ]
+    if not dry_run:
+        delete_keys(garbage + stale_index)
+        logger.info(f"Deleted {len(garbage)} blobs and {len(stale_index)} index entries")
+    return {
+        "DryRun": dry_run,
+        "UnreferencedBlobs": garbage,
+        "StaleIndexEntries": len(stale_index),
+    }
@@ -1,3 +1,10 @@
 """util package added as a layer to all Lambdas in the stack"""
 
+from . import autoscaling
+from . import blobs
+from . import endpoint_configs
+from . import metrics
+from . import sampling
+from . import sizing
+from .clients import client, resource
 from .uid import append_timestamp
@@ -0,0 +1,149 @@
+"""Save, suspend and re-apply Application Auto Scaling settings of SageMaker endpoint variants
+
+SageMaker won't update an endpoint while a variant it would replace is registered with Application Auto
+Scaling. So anything updating an endpoint (the deployment pipeline's configure-autoscaling, or
+tune-data-capture changing capture sampling) suspends scaling first, and re-applies the saved settings after.
+
+Saved settings are plain dicts of MinCapacity, MaxCapacity and Policies (as PutScalingPolicy arguments), so
+they can be passed through Step Functions state. Helpers take their clients as arguments, so they can be
+tested against stubs.
+"""
+
+# Python Built-Ins:
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAMESPACE = "sagemaker"
+SCALABLE_DIMENSION = "sagemaker:variant:DesiredInstanceCount"
+ASYNC_NO_CAPACITY_METRIC = "HasBacklogWithoutCapacity"
+# Step scaling policies with this name suffix are triggered by the endpoint's no-capacity alarm:
+SCALE_FROM_ZERO_SUFFIX = "-scale-from-zero"
+
+
+def resource_id(endpoint_name, variant_name):
+    return f"endpoint/{endpoint_name}/variant/{variant_name}"
+
+
+def save_variant_scaling(aasclient, endpoint_name, variant_name):
+    """Read a variant's scalable target and scaling policies (None if it's not registered)"""
+    rid = resource_id(endpoint_name, variant_name)
+    targets = aasclient.describe_scalable_targets(
+        ServiceNamespace=SERVICE_NAMESPACE,
+        ResourceIds=[rid],
+        ScalableDimension=SCALABLE_DIMENSION,
+    )["ScalableTargets"]
+    if not targets:
+        return None
+    policies = aasclient.describe_scaling_policies(
+        ServiceNamespace=SERVICE_NAMESPACE,
+        ResourceId=rid,
+        ScalableDimension=SCALABLE_DIMENSION,
+    )["ScalingPolicies"]
+    return {
+        "MinCapacity": targets[0]["MinCapacity"],
+        "MaxCapacity": targets[0]["MaxCapacity"],
+        "Policies": [
+            {
+                key: policy[key]
+                for key in (
+                    "PolicyName",
+                    "PolicyType",
+                    "TargetTrackingScalingPolicyConfiguration",
+                    "StepScalingPolicyConfiguration",
+                )
+                if key in policy
+            }
+            for policy in policies
+        ],
+    }
+
+
+def suspend(aasclient, endpoint_name, variant_names):
+    """Save then deregister the scaling settings of each variant, so the endpoint can be updated
+
+    Returns
+    -------
+    saved : dict
+        Settings by variant name, for variants that were registered
+    """
+    saved = {}
+    for variant_name in variant_names:
+        settings = save_variant_scaling(aasclient, endpoint_name, variant_name)
+        if settings is None:
+            continue
+        # (Deregistering the target deletes its policies too)
+        aasclient.deregister_scalable_target(
+            ServiceNamespace=SERVICE_NAMESPACE,
+            ResourceId=resource_id(endpoint_name, variant_name),
+            ScalableDimension=SCALABLE_DIMENSION,
+        )
+        logger.info(f"Suspended autoscaling on variant {variant_name}: {settings}")
+        saved[variant_name] = settings
+    return saved
+
+
+def apply_settings(aasclient, endpoint_name, variant_name, settings):
+    """Register a variant as a scalable target and put its scaling policies
+
+    Returns
+    -------
+    policy_arns : dict
+        ARN of each policy put, by name
+    """
+    rid = resource_id(endpoint_name, variant_name)
+    aasclient.register_scalable_target(
+        ServiceNamespace=SERVICE_NAMESPACE,
+        ResourceId=rid,
+        ScalableDimension=SCALABLE_DIMENSION,
+        MinCapacity=settings["MinCapacity"],
+        MaxCapacity=settings["MaxCapacity"],
+    )
+    policy_arns = {}
+    for policy in settings["Policies"]:
+        policy_arns[policy["PolicyName"]] = aasclient.put_scaling_policy(
+            ServiceNamespace=SERVICE_NAMESPACE,
+            ResourceId=rid,
+            ScalableDimension=SCALABLE_DIMENSION,
+            **policy,
+        )["PolicyARN"]
+    logger.info(f"Applied autoscaling to variant {variant_name}: {settings}")
+    return policy_arns
+
+
+def put_no_capacity_alarm(cwclient, endpoint_name, policy_arn):
+    """(Re-)point the endpoint's HasBacklogWithoutCapacity alarm at a scale-from-zero policy"""
+    cwclient.put_metric_alarm(
+        AlarmName=f"{endpoint_name}-{ASYNC_NO_CAPACITY_METRIC}",
+        MetricName=ASYNC_NO_CAPACITY_METRIC,
+        Namespace="AWS/SageMaker",
+        Dimensions=[{ "Name": "EndpointName", "Value": endpoint_name }],
+        Statistic="Average",
+        Period=60,
+        EvaluationPeriods=2,
+        DatapointsToAlarm=2,
+        Threshold=1,
+        ComparisonOperator="GreaterThanOrEqualToThreshold",
+        TreatMissingData="missing",
+        AlarmActions=[policy_arn],
+    )
+    logger.info(f"Pointed {ASYNC_NO_CAPACITY_METRIC} alarm for {endpoint_name} at {policy_arn}")
+
+
+def point_alarms(get_cwclient, endpoint_name, policy_arns):
+    """Re-point alarms at any scale-from-zero policies just put (their ARNs change each time they're put)
+
+    get_cwclient is only called if there are any, so functions without them never create a CloudWatch client.
+    """
+    for name, arn in policy_arns.items():
+        if name.endswith(SCALE_FROM_ZERO_SUFFIX):
+            put_no_capacity_alarm(get_cwclient(), endpoint_name, arn)
+
+
+def restore(aasclient, get_cwclient, endpoint_name, saved):
+    """Re-apply settings saved by suspend() to the same variants, once the endpoint has finished updating"""
+    for variant_name, settings in saved.items():
+        point_alarms(
+            get_cwclient, endpoint_name, apply_settings(aasclient, endpoint_name, variant_name, settings)
+        )
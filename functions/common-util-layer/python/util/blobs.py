@@ -0,0 +1,77 @@
+"""Content-addressed artifact ("blob") store layout for the project bucket
+
+Artifacts are stored once per distinct content at `blobs/sha256/{hex digest}{suffix}`. The suffix, e.g.
+".tar.gz", is kept only so that tools which look at extensions still work.
+
+Hashing a large object means reading all of it. So each blob is also indexed by the ETag and size of the
+sources it was copied from, as empty marker objects at `blobs/index/etag/{etag}-{size}/{hex digest}`. This
+lets a source that has been seen before be resolved to its blob with one LIST call. Blobs (and any other
+object whose producer already knows its digest) carry it as `sha256` user metadata, which saves hashing too.
+
+Each registration's manifest.json maps artifact names to blob URIs. Blobs that no manifest (or live model)
+refers to can be garbage collected: See the collect-garbage Lambda.
+"""
+
+# Python Built-Ins:
+import hashlib
+import re
+
+
+BLOB_PREFIX = "blobs/sha256/"
+INDEX_PREFIX = "blobs/index/etag/"
+# Registration manifests are stored at {registration folder}/{MANIFESTS_DIR}/{model name}.json
+MANIFESTS_DIR = "manifests"
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+_BLOB_KEY_PATTERN = re.compile(r"^" + re.escape(BLOB_PREFIX) + r"([0-9a-f]{64})")
+
+
+def blob_key(sha256: str, suffix: str="") -> str:
+    """Object key for a blob with the given hex digest"""
+    return f"{BLOB_PREFIX}{sha256}{suffix}"
+
+
+def sha256_from_blob_key(key: str):
+    """Hex digest of a blob key (or None if key is not in the blob store)"""
+    match = _BLOB_KEY_PATTERN.match(key)
+    return match.group(1) if match else None
+
+
+def artifact_suffix(filename: str) -> str:
+    """Extension(s) to preserve from an artifact filename e.g. '.tar.gz'"""
+    for suffix in (".tar.gz", ".tar.zst", ".tar", ".zip", ".json"):
+        if filename.endswith(suffix):
+            return suffix
+    return ""
+
+
+def index_prefix(etag: str, size: int) -> str:
+    """Index key prefix for a source object with the given ETag and size"""
+    return f"{INDEX_PREFIX}{etag.strip(chr(34))}-{size}/"
+
+
+def lookup_index(s3client, bucket: str, etag: str, size: int):
+    """Find the hex digest previously recorded for a source ETag and size (or None)"""
+    response = s3client.list_objects_v2(Bucket=bucket, Prefix=index_prefix(etag, size), MaxKeys=1)
+    for obj in response.get("Contents", []):
+        return obj["Key"].rpartition("/")[2]
+    return None
+
+
+def record_index(s3client, bucket: str, etag: str, size: int, sha256: str):
+    s3client.put_object(Bucket=bucket, Key=index_prefix(etag, size) + sha256, Body=b"")
+
+
+def recorded_sha256(head: dict):
+    """Hex digest recorded in an object's `sha256` user metadata, from its HeadObject response (or None)"""
+    sha256 = head.get("Metadata", {}).get("sha256", "").lower()
+    return sha256 if re.fullmatch(r"[0-9a-f]{64}", sha256) else None
+
+
+def hash_object(s3client, bucket: str, key: str) -> str:
+    """Stream an S3 object to compute its SHA-256 hex digest"""
+    digest = hashlib.sha256()
+    body = s3client.get_object(Bucket=bucket, Key=key)["Body"]
+    for chunk in body.iter_chunks(chunk_size=HASH_CHUNK_BYTES):
+        digest.update(chunk)
+    return digest.hexdigest()
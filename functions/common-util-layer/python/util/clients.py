@@ -0,0 +1,108 @@
+"""Lazy, cached boto3 clients with shared connection and retry settings for the pipeline's Lambdas
+
+Creating a client is the most expensive part of a cold start that hits the network, so clients are only
+created on first use. After that they are cached for the life of the (warm) Lambda container. Every client
+shares one session and one botocore Config, which sets:
+
+- Adaptive retries, so throttled SageMaker/S3 calls back off instead of failing the state machine
+- A larger connection pool, for functions that make concurrent calls
+- Explicit connect and read timeouts, to fail fast rather than consume the Lambda's own timeout
+
+For local testing, a client's endpoint can be overridden by setting e.g. S3_ENDPOINT_URL (for "s3") or
+SAGEMAKER_ENDPOINT_URL, so that it points at a local stand-in such as moto server. Or to run handlers
+in-process without boto3 at all, use_stand_in() registers an object to return in place of a service's client
+or resource (as state-machines/localrun.py does).
+"""
+
+# Python Built-Ins:
+import os
+import threading
+
+
+MAX_ATTEMPTS = 8
+MAX_POOL_CONNECTIONS = 32
+CONNECT_TIMEOUT_SECS = 5
+READ_TIMEOUT_SECS = 60
+
+# boto3 sessions aren't thread-safe, and some functions create clients from worker threads:
+_lock = threading.RLock()
+_cache = {}
+# Objects to return instead of boto3 clients/resources, by (kind, service_name):
+_stand_ins = {}
+
+
+def _cached(key, factory):
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    with _lock:
+        if key not in _cache:
+            _cache[key] = factory()
+        return _cache[key]
+
+
+def session():
+    """Shared boto3 Session (importing boto3 itself is deferred until first needed)"""
+    def create():
+        import boto3
+        return boto3.session.Session()
+    return _cached("session", create)
+
+
+def config(max_pool_connections=None):
+    """Shared botocore Config, optionally with a larger connection pool"""
+    from botocore.config import Config
+    return Config(
+        retries={ "mode": "adaptive", "max_attempts": MAX_ATTEMPTS },
+        max_pool_connections=max(max_pool_connections or 0, MAX_POOL_CONNECTIONS),
+        connect_timeout=CONNECT_TIMEOUT_SECS,
+        read_timeout=READ_TIMEOUT_SECS,
+    )
+
+
+def endpoint_url(service_name):
+    """Endpoint override for service_name from the environment e.g. S3_ENDPOINT_URL (or None)"""
+    return os.environ.get(f"{service_name.upper().replace('-', '_')}_ENDPOINT_URL") or None
+
+
+def use_stand_in(service_name, stand_in, kind="client"):
+    """Make client(service_name) (or resource(), with kind="resource") return stand_in, until set to None"""
+    with _lock:
+        if stand_in is None:
+            _stand_ins.pop((kind, service_name), None)
+        else:
+            _stand_ins[(kind, service_name)] = stand_in
+
+
+def client(service_name, max_pool_connections=None):
+    """Get the (cached) boto3 client for service_name"""
+    if _stand_ins and ("client", service_name) in _stand_ins:
+        return _stand_ins[("client", service_name)]
+    return _cached(
+        ("client", service_name, max_pool_connections),
+        lambda: session().client(
+            service_name,
+            config=config(max_pool_connections),
+            endpoint_url=endpoint_url(service_name),
+        ),
+    )
+
+
+def resource(service_name, max_pool_connections=None):
+    """Get the (cached) boto3 resource for service_name"""
+    if _stand_ins and ("resource", service_name) in _stand_ins:
+        return _stand_ins[("resource", service_name)]
+    return _cached(
+        ("resource", service_name, max_pool_connections),
+        lambda: session().resource(
+            service_name,
+            config=config(max_pool_connections),
+            endpoint_url=endpoint_url(service_name),
+        ),
+    )
+
+
+def region_name():
+    # (Lambda always sets AWS_REGION, so this doesn't need to import boto3 there)
+    return os.environ.get("AWS_REGION") or session().region_name
@@ -0,0 +1,113 @@
+"""Content-addressed SageMaker endpoint configs
+
+Endpoint configs are named from a hash of their content (production variants, data capture and async
+inference settings), as `{EndpointName}-{type}-{hash}`. If a config with that name already exists, e.g. from
+a retry or a resubmitted model, it's re-used instead of creating another. Configs no endpoint uses any more
+are cleaned up by the sweep-endpoint-configs function.
+
+A re-used config keeps its original CreationTime, so each config is also tagged with when the pipeline last
+created or re-used it (LAST_USED_TAG). The sweeper goes by that, not by age, to avoid deleting a config that
+a deployment in progress is about to roll out.
+"""
+
+# Python Built-Ins:
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+
+# External Dependencies:
+from botocore import exceptions as botoexceptions
+
+
+logger = logging.getLogger(__name__)
+
+MAX_CONFIG_NAME_LENGTH = 63
+CONFIG_HASH_LENGTH = 16
+LAST_USED_TAG = "PipelineLastUsed"
+LAST_USED_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def endpoint_config_name(
+    endpoint_name, config_type, production_variants, data_capture_config, async_inference_config=None
+):
+    """Deterministic endpoint config name from a hash of its content"""
+    content = { "ProductionVariants": production_variants, "DataCaptureConfig": data_capture_config }
+    if async_inference_config:
+        # (Only hashed when present, so existing real-time config names are unchanged)
+        content["AsyncInferenceConfig"] = async_inference_config
+    digest = hashlib.sha256(
+        json.dumps(content, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:CONFIG_HASH_LENGTH]
+    suffix = f"-{config_type}-{digest}"
+    return endpoint_name[:MAX_CONFIG_NAME_LENGTH - len(suffix)] + suffix
+
+
+def last_used_tag():
+    return { "Key": LAST_USED_TAG, "Value": datetime.now(timezone.utc).strftime(LAST_USED_FORMAT) }
+
+
+def last_used(smclient, config_arn):
+    """When the pipeline last created or re-used an endpoint config (UTC), or None if it isn't tagged"""
+    tags = smclient.list_tags(ResourceArn=config_arn)["Tags"]
+    value = next((t["Value"] for t in tags if t["Key"] == LAST_USED_TAG), None)
+    if value is None:
+        return None
+    return datetime.strptime(value, LAST_USED_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def mark_used(smclient, config_arn):
+    """Re-tag an existing endpoint config as last used now (AddTags overwrites the previous value)"""
+    smclient.add_tags(ResourceArn=config_arn, Tags=[last_used_tag()])
+
+
+def ensure_endpoint_config(
+    smclient,
+    endpoint_name,
+    config_type,
+    production_variants,
+    data_capture_config,
+    async_inference_config=None,
+):
+    """Get the endpoint config with this content, creating it only if it doesn't already exist
+
+    Returns
+    -------
+    config : dict
+        Arn and Name of the endpoint config, and whether it already Existed
+    """
+    name = endpoint_config_name(
+        endpoint_name, config_type, production_variants, data_capture_config, async_inference_config
+    )
+    try:
+        arn = smclient.describe_endpoint_config(EndpointConfigName=name)["EndpointConfigArn"]
+        logger.info(f"Re-using existing endpoint config {name}")
+        mark_used(smclient, arn)
+        return { "Arn": arn, "Name": name, "Existed": True }
+    except botoexceptions.ClientError as err:
+        if not err.response.get("Error", {}).get("Message", "").lower().startswith("could not find"):
+            raise err
+    optional_args = {}
+    if data_capture_config:
+        optional_args["DataCaptureConfig"] = data_capture_config
+    if async_inference_config:
+        optional_args["AsyncInferenceConfig"] = async_inference_config
+    try:
+        arn = smclient.create_endpoint_config(
+            EndpointConfigName=name,
+            ProductionVariants=production_variants,
+            Tags=[
+                { "Key": "PipelineConfigType", "Value": config_type.capitalize() },
+                last_used_tag(),
+            ],
+            **optional_args,
+        )["EndpointConfigArn"]
+        logger.info(f"Created endpoint config {name}")
+        return { "Arn": arn, "Name": name, "Existed": False }
+    except botoexceptions.ClientError as err:
+        # A concurrent retry may have created the same config since we checked, which is fine:
+        if "already existing" not in err.response.get("Error", {}).get("Message", "").lower():
+            raise err
+    arn = smclient.describe_endpoint_config(EndpointConfigName=name)["EndpointConfigArn"]
+    mark_used(smclient, arn)
+    return { "Arn": arn, "Name": name, "Existed": True }
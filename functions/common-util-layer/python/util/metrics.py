@@ -0,0 +1,131 @@
+"""Read per-variant endpoint metrics (invocations, errors and latency) for deployment guardrails
+
+Guardrail and capture sampling logic only depends on the VariantMetrics interface, so it can be run and
+tested locally against StaticVariantMetrics instead of CloudWatch.
+"""
+
+# Python Built-Ins:
+from datetime import timedelta
+import math
+
+# Local Dependencies:
+from .clients import client
+
+
+class VariantMetrics:
+    """Interface for reading an endpoint variant's metrics over a time window"""
+    def read(self, endpoint_name: str, variant_name: str, start, end) -> dict:
+        """Totals for the window [start, end) (datetimes)
+
+        Returns
+        -------
+        metrics : dict
+            Invocations (int), Errors (int, server-side 5XX) and P99LatencyMs (float, or None if no data)
+        """
+        raise NotImplementedError()
+
+    def hourly_invocations(self, endpoint_name: str, variant_name: str, start, end) -> list:
+        """Invocations in each whole hour of [start, end) from the first with any data, oldest first
+
+        Hours with no data after that are 0. Hours before it are left out rather than counted as no traffic,
+        as the variant might not have existed yet.
+        """
+        raise NotImplementedError()
+
+
+class StaticVariantMetrics(VariantMetrics):
+    """Fixed metrics per variant name, e.g. `{ "green": { "Invocations": 500, ... } }`, for local testing
+
+    Hourly invocation series are given as e.g. `{ "blue": { "HourlyInvocations": [1200, 900, ...] } }`.
+    """
+    def __init__(self, metrics_by_variant: dict):
+        self.metrics_by_variant = metrics_by_variant
+
+    def read(self, endpoint_name, variant_name, start, end):
+        metrics = { "Invocations": 0, "Errors": 0, "P99LatencyMs": None }
+        metrics.update(self.metrics_by_variant.get(variant_name, {}))
+        metrics.pop("HourlyInvocations", None)
+        return metrics
+
+    def hourly_invocations(self, endpoint_name, variant_name, start, end):
+        return list(self.metrics_by_variant.get(variant_name, {}).get("HourlyInvocations", []))
+
+
+class CloudWatchVariantMetrics(VariantMetrics):
+    """Variant metrics from the AWS/SageMaker CloudWatch namespace"""
+    NAMESPACE = "AWS/SageMaker"
+
+    @classmethod
+    def dimensions(cls, endpoint_name, variant_name):
+        return [
+            { "Name": "EndpointName", "Value": endpoint_name },
+            { "Name": "VariantName", "Value": variant_name },
+        ]
+
+    def read(self, endpoint_name, variant_name, start, end):
+        dimensions = self.dimensions(endpoint_name, variant_name)
+        # One period covering the whole window (CloudWatch periods are multiples of 60s):
+        period = max(60, math.ceil((end - start).total_seconds() / 60) * 60)
+        queries = [
+            ("invocations", "Invocations", "Sum"),
+            ("errors", "Invocation5XXErrors", "Sum"),
+            ("latency", "ModelLatency", "p99"),
+        ]
+        response = client("cloudwatch").get_metric_data(
+            MetricDataQueries=[
+                {
+                    "Id": query_id,
+                    "MetricStat": {
+                        "Metric": {
+                            "Namespace": self.NAMESPACE,
+                            "MetricName": name,
+                            "Dimensions": dimensions,
+                        },
+                        "Period": period,
+                        "Stat": stat,
+                    },
+                }
+                for query_id, name, stat in queries
+            ],
+            StartTime=start,
+            EndTime=end,
+        )
+        values = { r["Id"]: r["Values"] for r in response["MetricDataResults"] }
+        latencies = values.get("latency", [])
+        return {
+            "Invocations": int(sum(values.get("invocations", []))),
+            "Errors": int(sum(values.get("errors", []))),
+            # (ModelLatency is in microseconds. If the window spans periods, take the worst)
+            "P99LatencyMs": max(latencies) / 1000 if latencies else None,
+        }
+
+    def hourly_invocations(self, endpoint_name, variant_name, start, end):
+        n_hours = int((end - start).total_seconds() // 3600)
+        if n_hours < 1:
+            return []
+        start = end - timedelta(hours=n_hours)
+        response = client("cloudwatch").get_metric_data(
+            MetricDataQueries=[{
+                "Id": "invocations",
+                "MetricStat": {
+                    "Metric": {
+                        "Namespace": self.NAMESPACE,
+                        "MetricName": "Invocations",
+                        "Dimensions": self.dimensions(endpoint_name, variant_name),
+                    },
+                    "Period": 3600,
+                    "Stat": "Sum",
+                },
+            }],
+            StartTime=start,
+            EndTime=end,
+            ScanBy="TimestampAscending",
+        )
+        by_hour = {}
+        for result in response["MetricDataResults"]:
+            for timestamp, value in zip(result["Timestamps"], result["Values"]):
+                by_hour[int((timestamp - start).total_seconds() // 3600)] = value
+        if not by_hour:
+            return []
+        # (CloudWatch omits periods with no data points, which after the first means no traffic)
+        return [by_hour.get(ix, 0.) for ix in range(min(by_hour), n_hours)]
@@ -0,0 +1,137 @@
+"""Choose endpoint data capture sampling percentages from observed request volume
+
+Capturing a fixed percentage of requests means capture volume (S3 PUTs, and the data monitoring jobs must
+read) grows with traffic. Instead, we aim for a target number of captured records per hour: The sampling
+percentage is the target divided by a high percentile of recent hourly invocations, so busy hours don't
+overshoot by much.
+
+Changing the percentage means updating the endpoint, so it's only changed when the volume captured at the
+current percentage has drifted outside a tolerance band around the target. Everything here is pure logic on
+hourly invocation counts, so it can be tested with synthetic traffic series.
+"""
+
+# Python Built-Ins:
+import math
+
+
+DEFAULT_SAMPLING_OPTIONS = {
+    "TargetRecordsPerHour": 10000,
+    # SageMaker accepts whole percentages from 0 (which would capture nothing) to 100:
+    "MinSamplingPercentage": 1,
+    "MaxSamplingPercentage": 100,
+    # Used when there's no traffic history, e.g. for a new endpoint:
+    "InitialSamplingPercentage": 50,
+    # Percentile of hourly invocations to size for:
+    "VolumePercentile": 90,
+    # Only change if records/hour at the current percentage is outside [target / T, target * T]:
+    "Tolerance": 2.0,
+    # Hours of history needed before changing anything:
+    "MinHours": 24,
+    "LookbackHours": 7 * 24,
+}
+
+
+def resolve_options(options: dict=None) -> dict:
+    resolved = dict(DEFAULT_SAMPLING_OPTIONS)
+    resolved.update(options or {})
+    if not 0 < resolved["MinSamplingPercentage"] <= resolved["MaxSamplingPercentage"] <= 100:
+        raise ValueError(
+            "Need 0 < MinSamplingPercentage <= MaxSamplingPercentage <= 100: Got {} and {}".format(
+                resolved["MinSamplingPercentage"], resolved["MaxSamplingPercentage"]
+            )
+        )
+    if resolved["Tolerance"] < 1:
+        raise ValueError(f"Tolerance must be >= 1: Got {resolved['Tolerance']}")
+    return resolved
+
+
+def percentile(values, p: float) -> float:
+    """Nearest-rank percentile (p in 0-100) of a non-empty sequence"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def traffic_history(hourly_invocations) -> list:
+    """Hourly invocations from the first hour with any traffic (earlier hours predate the variant)"""
+    for ix, value in enumerate(hourly_invocations):
+        if value:
+            return list(hourly_invocations[ix:])
+    return []
+
+
+def recommend_percentage(hourly_volume: float, options: dict) -> int:
+    """Whole sampling percentage to capture about TargetRecordsPerHour at hourly_volume invocations/hour"""
+    if not hourly_volume:
+        return int(options["MaxSamplingPercentage"])
+    pct = math.ceil(100 * options["TargetRecordsPerHour"] / hourly_volume)
+    return int(min(options["MaxSamplingPercentage"], max(options["MinSamplingPercentage"], pct)))
+
+
+def decide_sampling(hourly_invocations, current_percentage: int=None, options: dict=None) -> dict:
+    """Decide the capture sampling percentage given recent hourly invocation counts
+
+    Parameters
+    ----------
+    hourly_invocations : List[float]
+        Invocations in each recent hour, oldest first (hours with no traffic as 0). Hours before the first
+        with any traffic don't count as history: A recently deployed variant has none to size from.
+    current_percentage : int | None
+        The endpoint's current InitialSamplingPercentage (None if there's no current setting)
+
+    Returns
+    -------
+    decision : dict
+        SamplingPercentage (what to use), whether that's a Change, the Reason, and the figures behind it
+    """
+    options = resolve_options(options)
+    target = options["TargetRecordsPerHour"]
+    hourly_invocations = traffic_history(hourly_invocations)
+    hours = len(hourly_invocations)
+    decision = {
+        "CurrentPercentage": current_percentage,
+        "Hours": hours,
+        "HourlyVolume": None,
+        "RecommendedPercentage": None,
+        "ExpectedRecordsPerHour": None,
+        "TargetRecordsPerHour": target,
+    }
+
+    if hours < options["MinHours"]:
+        keep = options["InitialSamplingPercentage"] if current_percentage is None else current_percentage
+        decision.update({
+            "SamplingPercentage": int(keep),
+            "Change": current_percentage is None,
+            "Reason": f"Only {hours} hours of traffic (< {options['MinHours']}): Keeping {keep}%",
+        })
+        return decision
+
+    volume = percentile(hourly_invocations, options["VolumePercentile"])
+    recommended = recommend_percentage(volume, options)
+    decision.update({ "HourlyVolume": volume, "RecommendedPercentage": recommended })
+    if current_percentage is None:
+        decision.update({
+            "SamplingPercentage": recommended,
+            "Change": True,
+            "Reason": f"No current setting: Using {recommended}%",
+        })
+        return decision
+
+    expected = volume * current_percentage / 100
+    low, high = target / options["Tolerance"], target * options["Tolerance"]
+    decision["ExpectedRecordsPerHour"] = expected
+    if recommended == current_percentage:
+        change, reason = False, f"Already at the recommended {recommended}%"
+    elif low <= expected <= high:
+        change, reason = False, f"{expected:.0f} records/hr at {current_percentage}% is within tolerance"
+    else:
+        change = True
+        reason = "{:.0f} records/hr at {}% is outside [{:.0f}, {:.0f}]: Changing to {}%".format(
+            expected, current_percentage, low, high, recommended
+        )
+    decision.update({
+        "SamplingPercentage": recommended if change else current_percentage,
+        "Change": change,
+        "Reason": reason,
+    })
+    return decision
@@ -0,0 +1,187 @@
+"""Choose endpoint instance type and count from measured load test profiles
+
+A profile is a report from notebooks/src/loadtest.py, run against one instance type (and count). It gives
+latency percentiles and achieved throughput at each offered request rate. An instance type's capacity is the
+highest achieved rate per instance at which p99 latency still meets the target (with acceptable errors). The
+count needed is then the peak rate divided by that capacity, scaled down by a target utilization to leave
+headroom. The cheapest (type, count) that meets the target wins.
+
+Prices are approximate on-demand USD/hour for real-time inference in us-east-1. Pass `prices` to use your
+own region's prices, or to add instance types missing here.
+
+Cold-start-sensitive settings are sized from the model's measured load time and memory footprint (as
+reported by notebooks/src/benchmark.py): Serverless memory sizes, and container startup health check
+timeouts for instance-backed variants.
+"""
+
+# Python Built-Ins:
+import math
+
+
+DEFAULT_INSTANCE_PRICES = {
+    "ml.t2.medium": 0.056,
+    "ml.t2.large": 0.111,
+    "ml.m5.large": 0.115,
+    "ml.m5.xlarge": 0.23,
+    "ml.m5.2xlarge": 0.461,
+    "ml.m5.4xlarge": 0.922,
+    "ml.c5.large": 0.102,
+    "ml.c5.xlarge": 0.204,
+    "ml.c5.2xlarge": 0.408,
+    "ml.c5.4xlarge": 0.816,
+    "ml.g4dn.xlarge": 0.736,
+    "ml.g4dn.2xlarge": 1.053,
+    "ml.p3.2xlarge": 3.825,
+}
+DEFAULT_TARGET_UTILIZATION = 0.7
+DEFAULT_MAX_ERROR_RATE = 0.01
+# (As in loadtest.find_saturation: A step that couldn't achieve most of its offered rate was saturated)
+MIN_ACHIEVED_RATIO = 0.9
+# Memory sizes SageMaker Serverless Inference allows:
+SERVERLESS_MEMORY_SIZES_MB = (1024, 2048, 3072, 4096, 5120, 6144)
+# Memory used by Python, the framework and the serving stack before the model itself is loaded:
+SERVERLESS_RUNTIME_OVERHEAD_MB = 768
+# SageMaker's ContainerStartupHealthCheckTimeoutInSeconds when it isn't set, and the most it allows:
+DEFAULT_STARTUP_TIMEOUT_SECS = 600
+MAX_STARTUP_TIMEOUT_SECS = 3600
+
+
+def profile_capacity(profile: dict, target_p99_ms: float, max_error_rate: float=DEFAULT_MAX_ERROR_RATE):
+    """Highest per-instance request rate in a load test report at which objectives were met
+
+    Returns
+    -------
+    capacity_rps : float
+        Per-instance achieved requests/sec at the best passing step (0 if none passed)
+    p99_ms : float | None
+        p99 latency at that step
+    """
+    instance_count = profile.get("meta", {}).get("instance_count") or 1
+    best = None
+    for step in profile.get("steps", []):
+        if step.get("p99_ms", math.inf) > target_p99_ms or step["error_rate"] > max_error_rate:
+            continue
+        if step["achieved_rps"] < MIN_ACHIEVED_RATIO * step["offered_rps"]:
+            continue
+        if best is None or step["achieved_rps"] > best["achieved_rps"]:
+            best = step
+    if best is None:
+        return 0., None
+    return best["achieved_rps"] / instance_count, best.get("p99_ms")
+
+
+def latest_profiles(profiles):
+    """Keep only the most recent profile for each instance type"""
+    result = {}
+    for profile in profiles:
+        meta = profile.get("meta", {})
+        instance_type = meta.get("instance_type")
+        if not instance_type:
+            continue
+        current = result.get(instance_type)
+        if current is None or meta.get("timestamp", "") >= current["meta"].get("timestamp", ""):
+            result[instance_type] = profile
+    return result
+
+
+def choose_instances(
+    profiles,
+    target_p99_ms: float,
+    peak_rps: float,
+    target_utilization: float=DEFAULT_TARGET_UTILIZATION,
+    min_instance_count: int=1,
+    max_instance_count: int=None,
+    instance_types=None,
+    prices: dict=None,
+    max_error_rate: float=DEFAULT_MAX_ERROR_RATE,
+):
+    """Choose the cheapest instance type & count able to serve peak_rps within target_p99_ms
+
+    Returns
+    -------
+    decision : dict
+        Chosen InstanceType, InstanceCount and HourlyCost (None if no profile meets the target), plus the
+        objectives and every Candidate considered with its measured capacity, or the reason it was rejected
+    """
+    all_prices = dict(DEFAULT_INSTANCE_PRICES)
+    all_prices.update(prices or {})
+    candidates = []
+    for instance_type, profile in sorted(latest_profiles(profiles).items()):
+        capacity_rps, p99_ms = profile_capacity(profile, target_p99_ms, max_error_rate)
+        candidate = {
+            "InstanceType": instance_type,
+            "ProfileTimestamp": profile["meta"].get("timestamp"),
+            "CapacityRpsPerInstance": capacity_rps,
+            "P99MsAtCapacity": p99_ms,
+            "InstanceCount": None,
+            "HourlyCost": None,
+            "Rejected": None,
+        }
+        candidates.append(candidate)
+        if instance_types is not None and instance_type not in instance_types:
+            candidate["Rejected"] = "Not in allowed instance types"
+            continue
+        if instance_type not in all_prices:
+            candidate["Rejected"] = "No price known"
+            continue
+        if capacity_rps <= 0:
+            candidate["Rejected"] = f"No load test step met p99 <= {target_p99_ms}ms"
+            continue
+        count = max(min_instance_count, math.ceil(peak_rps / (capacity_rps * target_utilization)))
+        candidate["InstanceCount"] = count
+        candidate["HourlyCost"] = round(count * all_prices[instance_type], 4)
+        if max_instance_count is not None and count > max_instance_count:
+            candidate["Rejected"] = f"Needs {count} instances (max {max_instance_count})"
+
+    feasible = [c for c in candidates if not c["Rejected"]]
+    # Cheapest first, then fewest instances, then lowest measured latency:
+    feasible.sort(key=lambda c: (c["HourlyCost"], c["InstanceCount"], c["P99MsAtCapacity"] or 0))
+    chosen = feasible[0] if feasible else {}
+    return {
+        "InstanceType": chosen.get("InstanceType"),
+        "InstanceCount": chosen.get("InstanceCount"),
+        "HourlyCost": chosen.get("HourlyCost"),
+        # (Used to derive autoscaling targets, see configure-autoscaling)
+        "CapacityRpsPerInstance": chosen.get("CapacityRpsPerInstance"),
+        "TargetP99Ms": target_p99_ms,
+        "PeakRps": peak_rps,
+        "TargetUtilization": target_utilization,
+        "Candidates": candidates,
+    }
+
+
+def serverless_memory_size(
+    model_rss_bytes: int=None,
+    headroom: float=1.5,
+    overhead_mb: float=SERVERLESS_RUNTIME_OVERHEAD_MB,
+    min_memory_mb: int=None,
+):
+    """Smallest Serverless Inference memory size that fits the measured model footprint with headroom
+
+    Serverless vCPUs scale with memory too, so `min_memory_mb` can force a larger size for faster loading.
+    """
+    needed_mb = overhead_mb + headroom * (model_rss_bytes or 0) / 2**20
+    needed_mb = max(needed_mb, min_memory_mb or 0)
+    for size_mb in SERVERLESS_MEMORY_SIZES_MB:
+        if size_mb >= needed_mb:
+            return size_mb
+    raise ValueError(
+        f"Model needs ~{needed_mb:.0f}MB: More than the largest Serverless memory size "
+        f"{SERVERLESS_MEMORY_SIZES_MB[-1]}MB"
+    )
+
+
+def startup_timeout_seconds(model_load_ms: float=None, safety_factor: float=3.0):
+    """Container startup health check timeout for a slow-loading model, or None to keep SageMaker's default
+
+    This never lowers the default: It only returns a timeout when the estimate is above it. model_load_ms is
+    just model_fn on a warm benchmark host, and leaves out container boot, downloading and extracting model
+    data, and any requirements.txt the framework container installs at startup. So it can tell us a model
+    needs *longer* than the default, but never that a shorter timeout is safe.
+    """
+    if not model_load_ms:
+        return None
+    secs = math.ceil(safety_factor * model_load_ms / 1000)
+    if secs <= DEFAULT_STARTUP_TIMEOUT_SECS:
+        return None
+    return min(MAX_STARTUP_TIMEOUT_SECS, secs)
@@ -0,0 +1,45 @@
+"""In-memory AWS client stand-ins shared by several test modules (see util.clients.use_stand_in)"""
+
+
+class StubAutoScaling:
+    """Keeps scalable targets and policies in memory like Application Auto Scaling, for SageMaker variants"""
+    def __init__(self):
+        self.targets = {}
+        self.policies = {}
+
+    def describe_scalable_targets(self, ServiceNamespace, ResourceIds, ScalableDimension):
+        return {
+            "ScalableTargets": [
+                { "ResourceId": rid, **self.targets[rid] } for rid in ResourceIds if rid in self.targets
+            ],
+        }
+
+    def describe_scaling_policies(self, ServiceNamespace, ResourceId, ScalableDimension):
+        return {
+            "ScalingPolicies": [
+                { "PolicyARN": f"arn:{ResourceId}:{name}", "ResourceId": ResourceId, **policy }
+                for name, policy in self.policies.get(ResourceId, {}).items()
+            ],
+        }
+
+    def register_scalable_target(
+        self, ServiceNamespace, ResourceId, ScalableDimension, MinCapacity, MaxCapacity
+    ):
+        self.targets[ResourceId] = { "MinCapacity": MinCapacity, "MaxCapacity": MaxCapacity }
+
+    def deregister_scalable_target(self, ServiceNamespace, ResourceId, ScalableDimension):
+        del self.targets[ResourceId]
+        self.policies.pop(ResourceId, None)
+
+    def put_scaling_policy(self, ServiceNamespace, ResourceId, ScalableDimension, PolicyName, **policy):
+        assert ResourceId in self.targets, "Policies need a registered scalable target"
+        self.policies.setdefault(ResourceId, {})[PolicyName] = { "PolicyName": PolicyName, **policy }
+        return { "PolicyARN": f"arn:{ResourceId}:{PolicyName}" }
+
+
+class StubCloudWatch:
+    def __init__(self):
+        self.alarms = {}
+
+    def put_metric_alarm(self, AlarmName, **kwargs):
+        self.alarms[AlarmName] = kwargs
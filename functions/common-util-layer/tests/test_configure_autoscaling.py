@@ -0,0 +1,186 @@
+"""Tests for configure-autoscaling's Suspend/Apply/Restore actions, against stubbed AWS clients
+
+Run from functions/common-util-layer with `python -m pytest tests` (needs botocore, as in the Lambda runtime).
+"""
+
+# Python Built-Ins:
+import copy
+import importlib.util
+import os
+import sys
+
+# External Dependencies:
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "python"))
+
+# Local Dependencies:
+from util import autoscaling, clients
+from stubs import StubAutoScaling, StubCloudWatch
+
+# (Every function's module is called main, so load this one under its own name)
+_spec = importlib.util.spec_from_file_location(
+    "configure_autoscaling", os.path.join(TESTS_DIR, "..", "..", "configure-autoscaling", "main.py")
+)
+configure_autoscaling = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(configure_autoscaling)
+
+
+ENDPOINT = "demo"
+
+
+class StubSageMaker:
+    def __init__(self, variant_names):
+        self.variant_names = variant_names
+
+    def describe_endpoint(self, EndpointName):
+        return {
+            "EndpointName": EndpointName,
+            "ProductionVariants": [{ "VariantName": name } for name in self.variant_names],
+        }
+
+
+@pytest.fixture
+def aws():
+    """Stub application-autoscaling, cloudwatch and sagemaker clients, with variant 'blue' autoscaled"""
+    aasclient = StubAutoScaling()
+    blue = autoscaling.resource_id(ENDPOINT, "blue")
+    aasclient.targets[blue] = { "MinCapacity": 2, "MaxCapacity": 6 }
+    aasclient.policies[blue] = {
+        f"{ENDPOINT}-blue-invocations-per-instance": {
+            "PolicyName": f"{ENDPOINT}-blue-invocations-per-instance",
+            "PolicyType": "TargetTrackingScaling",
+            "TargetTrackingScalingPolicyConfiguration": {
+                "TargetValue": 500.,
+                "PredefinedMetricSpecification": {
+                    "PredefinedMetricType": configure_autoscaling.PREDEFINED_METRIC,
+                },
+                "ScaleInCooldown": 600,
+                "ScaleOutCooldown": 30,
+            },
+        },
+        "business-hours": {
+            "PolicyName": "business-hours",
+            "PolicyType": "StepScaling",
+            "StepScalingPolicyConfiguration": { "AdjustmentType": "ChangeInCapacity" },
+        },
+    }
+    stubs = {
+        "application-autoscaling": aasclient,
+        "cloudwatch": StubCloudWatch(),
+        "sagemaker": StubSageMaker(["blue"]),
+    }
+    for service_name, stub in stubs.items():
+        clients.use_stand_in(service_name, stub)
+    yield stubs
+    for service_name in stubs:
+        clients.use_stand_in(service_name, None)
+
+
+def suspend(aws):
+    return configure_autoscaling.handler({ "Action": "Suspend", "EndpointName": ENDPOINT }, None)
+
+
+def test_suspend_then_restore(aws):
+    aasclient = aws["application-autoscaling"]
+    before = copy.deepcopy((aasclient.targets, aasclient.policies))
+    saved = suspend(aws)
+    assert list(saved) == ["blue"]
+    assert aasclient.targets == {} and aasclient.policies == {}
+
+    result = configure_autoscaling.handler(
+        {
+            "Action": "Restore",
+            "EndpointName": ENDPOINT,
+            "EndpointStatus": { "Rollout": { "BaselineVariant": "blue" }, "SavedAutoscaling": saved },
+        },
+        None,
+    )
+    assert result["Configured"] and result["VariantName"] == "blue"
+    assert (aasclient.targets, aasclient.policies) == before
+
+
+def test_policies_carry_over_to_new_variant(aws):
+    saved = suspend(aws)
+    carried = configure_autoscaling.carried_settings(saved, { "Rollout": { "BaselineVariant": "blue" } })
+    settings, source = configure_autoscaling.plan_settings(
+        ENDPOINT, "green", configure_autoscaling.resolve_options({}), carried=carried
+    )
+    assert source == "CarriedOver"
+    assert (settings["MinCapacity"], settings["MaxCapacity"]) == (2, 6)
+    policies = { p["PolicyName"]: p for p in settings["Policies"] }
+    assert set(policies) == { "business-hours", f"{ENDPOINT}-green-invocations-per-instance" }
+    tracking = policies[f"{ENDPOINT}-green-invocations-per-instance"]
+    config = tracking["TargetTrackingScalingPolicyConfiguration"]
+    assert (config["TargetValue"], config["ScaleInCooldown"], config["ScaleOutCooldown"]) == (500., 600, 30)
+
+
+def test_apply_targets_measured_throughput(aws):
+    saved = suspend(aws)
+    result = configure_autoscaling.handler(
+        {
+            "Action": "Apply",
+            "EndpointName": ENDPOINT,
+            "EndpointStatus": {
+                "TargetVariantName": "green",
+                "Rollout": { "BaselineVariant": "blue" },
+                "Sizing": { "CapacityRpsPerInstance": 10., "TargetUtilization": 0.5, "InstanceCount": 3 },
+                "SavedAutoscaling": saved,
+            },
+        },
+        None,
+    )
+    assert result["Configured"] and result["Source"] == "Throughput"
+    green = autoscaling.resource_id(ENDPOINT, "green")
+    # (Capacity still carried over from blue, rather than from the sized instance count)
+    assert aws["application-autoscaling"].targets == { green: { "MinCapacity": 2, "MaxCapacity": 6 } }
+    policy = aws["application-autoscaling"].policies[green][f"{ENDPOINT}-green-invocations-per-instance"]
+    assert policy["TargetTrackingScalingPolicyConfiguration"]["TargetValue"] == 300.
+
+
+def test_serverless_registers_nothing(aws):
+    saved = suspend(aws)
+    result = configure_autoscaling.handler(
+        {
+            "Action": "Apply",
+            "EndpointName": ENDPOINT,
+            "EndpointStatus": {
+                "TargetVariantName": "green",
+                "Mode": { "Mode": "Serverless" },
+                "SavedAutoscaling": saved,
+            },
+        },
+        None,
+    )
+    assert not result["Configured"] and result["Source"] == "Serverless"
+    assert aws["application-autoscaling"].targets == {}
+
+
+def test_async_scale_to_zero(aws):
+    mode = {
+        "Mode": "Async",
+        "ScaleToZero": True,
+        "AsyncInferenceConfig": { "ClientConfig": { "MaxConcurrentInvocationsPerInstance": 4 } },
+    }
+    result = configure_autoscaling.handler(
+        {
+            "Action": "Apply",
+            "EndpointName": ENDPOINT,
+            "EndpointStatus": { "TargetVariantName": "green", "Mode": mode },
+            "ExecutionInput": { "Autoscaling": { "MaxInstanceCount": 3 } },
+        },
+        None,
+    )
+    assert result["Configured"] and result["Source"] == "Concurrency"
+    assert (result["Settings"]["MinCapacity"], result["Settings"]["MaxCapacity"]) == (0, 3)
+    policies = { p["PolicyName"]: p for p in result["Settings"]["Policies"] }
+    tracking = policies[f"{ENDPOINT}-green-backlog-per-instance"]["TargetTrackingScalingPolicyConfiguration"]
+    assert tracking["TargetValue"] == 4.
+    metric_name = tracking["CustomizedMetricSpecification"]["MetricName"]
+    assert metric_name == configure_autoscaling.ASYNC_BACKLOG_METRIC
+    scale_from_zero = f"{ENDPOINT}-green{autoscaling.SCALE_FROM_ZERO_SUFFIX}"
+    assert policies[scale_from_zero]["PolicyType"] == "StepScaling"
+    alarm = aws["cloudwatch"].alarms[f"{ENDPOINT}-{autoscaling.ASYNC_NO_CAPACITY_METRIC}"]
+    green = autoscaling.resource_id(ENDPOINT, "green")
+    assert alarm["AlarmActions"] == [f"arn:{green}:{scale_from_zero}"]
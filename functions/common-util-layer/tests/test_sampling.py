@@ -0,0 +1,111 @@
+"""Tests for util.sampling capture sampling decisions, on synthetic CloudWatch-shaped traffic series
+
+Run from functions/common-util-layer with `python -m pytest tests` (needs botocore, as in the Lambda runtime).
+"""
+
+# Python Built-Ins:
+from datetime import datetime, timedelta, timezone
+import os
+import sys
+
+# External Dependencies:
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+
+# Local Dependencies:
+from util import clients, metrics, sampling
+
+
+END = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+LOOKBACK = timedelta(hours=sampling.DEFAULT_SAMPLING_OPTIONS["LookbackHours"])
+
+
+class StubCloudWatch:
+    """Answers GetMetricData like CloudWatch: Hourly Sums, omitting hours with no data points"""
+    def __init__(self, values_by_hours_ago: dict):
+        self.values_by_hours_ago = values_by_hours_ago
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy):
+        points = sorted(
+            (EndTime - timedelta(hours=hours_ago), value)
+            for hours_ago, value in self.values_by_hours_ago.items()
+            if StartTime <= EndTime - timedelta(hours=hours_ago) < EndTime
+        )
+        return {
+            "MetricDataResults": [{
+                "Id": MetricDataQueries[0]["Id"],
+                "Timestamps": [timestamp for timestamp, _ in points],
+                "Values": [value for _, value in points],
+            }],
+        }
+
+
+@pytest.fixture
+def cloudwatch_hours():
+    """Hourly invocations read through CloudWatchVariantMetrics from {hours_ago: invocations} data points"""
+    def read(values_by_hours_ago):
+        clients.use_stand_in("cloudwatch", StubCloudWatch(values_by_hours_ago))
+        return metrics.CloudWatchVariantMetrics().hourly_invocations("demo", "blue", END - LOOKBACK, END)
+    yield read
+    clients.use_stand_in("cloudwatch", None)
+
+
+def test_new_variant_keeps_current_percentage(cloudwatch_hours):
+    # Deployed 3 hours ago, with busy traffic since: Not enough history to size from yet
+    hourly = cloudwatch_hours({ 3: 20000., 2: 20000., 1: 20000. })
+    assert hourly == [20000.] * 3
+    decision = sampling.decide_sampling(hourly, 50)
+    assert decision["Hours"] == 3
+    assert decision["SamplingPercentage"] == 50
+    assert not decision["Change"]
+
+
+def test_leading_zero_hours_are_not_history():
+    decision = sampling.decide_sampling([0.] * 165 + [20000.] * 3, 50)
+    assert decision["Hours"] == 3
+    assert decision["SamplingPercentage"] == 50
+    assert not decision["Change"]
+
+
+def test_new_endpoint_uses_initial_percentage(cloudwatch_hours):
+    decision = sampling.decide_sampling(cloudwatch_hours({}), None)
+    assert decision["Hours"] == 0
+    assert decision["SamplingPercentage"] == sampling.DEFAULT_SAMPLING_OPTIONS["InitialSamplingPercentage"]
+    assert decision["Change"]
+
+
+def test_busy_endpoint_samples_down(cloudwatch_hours):
+    # 2 days at 100k/hr, with quiet nights that CloudWatch leaves out entirely:
+    hourly = cloudwatch_hours({ h: 100000. for h in range(1, 49) if h % 24 < 18 })
+    assert len(hourly) == 48 and hourly.count(0.) == 12
+    decision = sampling.decide_sampling(hourly, 50)
+    assert decision["HourlyVolume"] == 100000.
+    assert decision["SamplingPercentage"] == 10
+    assert decision["Change"]
+
+
+def test_quiet_endpoint_samples_up(cloudwatch_hours):
+    hourly = cloudwatch_hours({ h: 2000. for h in range(1, 169) })
+    decision = sampling.decide_sampling(hourly, 50)
+    assert decision["SamplingPercentage"] == 100
+    assert decision["Change"]
+
+
+def test_within_tolerance_is_unchanged(cloudwatch_hours):
+    # 30% of 40k/hr captures 12k records/hr: Within a factor 2 of the 10k target, though 25% would be closer
+    hourly = cloudwatch_hours({ h: 40000. for h in range(1, 73) })
+    decision = sampling.decide_sampling(hourly, 30)
+    assert decision["RecommendedPercentage"] == 25
+    assert decision["SamplingPercentage"] == 30
+    assert not decision["Change"]
+
+
+def test_idle_hours_after_first_traffic_count():
+    # An endpoint that was busy a week ago then went quiet should sample up to capture what little there is
+    hourly = [50000.] * 12 + [0.] * 156
+    decision = sampling.decide_sampling(hourly, 20)
+    assert decision["Hours"] == 168
+    assert decision["HourlyVolume"] == 0.
+    assert decision["SamplingPercentage"] == 100
+    assert decision["Change"]
@@ -0,0 +1,174 @@
+"""Tests for tune-data-capture updating autoscaled endpoints, against stubbed AWS clients
+
+Run from functions/common-util-layer with `python -m pytest tests` (needs botocore, as in the Lambda runtime).
+"""
+
+# Python Built-Ins:
+import copy
+import importlib.util
+import os
+import sys
+
+# External Dependencies:
+from botocore import exceptions as botoexceptions
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "python"))
+
+# Local Dependencies:
+from util import autoscaling, clients, metrics, sampling
+from stubs import StubAutoScaling, StubCloudWatch
+
+# (Every function's module is called main, so load this one under its own name)
+_spec = importlib.util.spec_from_file_location(
+    "tune_data_capture", os.path.join(TESTS_DIR, "..", "..", "tune-data-capture", "main.py")
+)
+tune_data_capture = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(tune_data_capture)
+
+
+ENDPOINT = "demo"
+CONFIG_NAME = f"{ENDPOINT}-target-0123456789abcdef"
+# Two days at 100k invocations/hr, which should sample down from 50%:
+BUSY = metrics.StaticVariantMetrics({ "blue": { "HourlyInvocations": [100000.] * 48 } })
+
+
+class StubSageMaker:
+    """One single-variant endpoint, which stays Updating for `update_polls` DescribeEndpoint calls"""
+    def __init__(self, aasclient, update_polls=2):
+        self.aasclient = aasclient
+        self.update_polls = update_polls
+        self.status = "InService"
+        self.busy_polls = 0
+        self.endpoint_config_name = CONFIG_NAME
+        self.configs = {
+            CONFIG_NAME: {
+                "EndpointConfigName": CONFIG_NAME,
+                "EndpointConfigArn": f"arn:{CONFIG_NAME}",
+                "ProductionVariants": [{
+                    "VariantName": "blue",
+                    "ModelName": "model",
+                    "InstanceType": "ml.m5.large",
+                    "InitialInstanceCount": 1,
+                }],
+                "DataCaptureConfig": { "EnableCapture": True, "InitialSamplingPercentage": 50 },
+            },
+        }
+
+    def describe_endpoint(self, EndpointName):
+        if self.status == "Updating":
+            self.busy_polls += 1
+            if self.busy_polls > self.update_polls:
+                self.status = "InService"
+        return {
+            "EndpointName": EndpointName,
+            "EndpointConfigName": self.endpoint_config_name,
+            "EndpointStatus": self.status,
+            "ProductionVariants": [{ "VariantName": "blue", "CurrentInstanceCount": 3 }],
+        }
+
+    def describe_endpoint_config(self, EndpointConfigName):
+        if EndpointConfigName not in self.configs:
+            raise botoexceptions.ClientError(
+                { "Error": { "Code": "ValidationException", "Message": "Could not find endpoint config" } },
+                "DescribeEndpointConfig",
+            )
+        return self.configs[EndpointConfigName]
+
+    def create_endpoint_config(self, EndpointConfigName, Tags, **config):
+        self.configs[EndpointConfigName] = dict(
+            config, EndpointConfigName=EndpointConfigName, EndpointConfigArn=f"arn:{EndpointConfigName}"
+        )
+        return { "EndpointConfigArn": f"arn:{EndpointConfigName}" }
+
+    def update_endpoint(self, EndpointName, EndpointConfigName):
+        if self.aasclient.targets:
+            raise botoexceptions.ClientError(
+                { "Error": { "Code": "ValidationException", "Message": "Variant is a scalable target" } },
+                "UpdateEndpoint",
+            )
+        self.endpoint_config_name = EndpointConfigName
+        self.status = "Updating"
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    """Stub clients, with the endpoint's variant autoscaled and no real sleeping between polls"""
+    aasclient = StubAutoScaling()
+    blue = autoscaling.resource_id(ENDPOINT, "blue")
+    aasclient.targets[blue] = { "MinCapacity": 2, "MaxCapacity": 6 }
+    aasclient.policies[blue] = {
+        "scale-out": {
+            "PolicyName": "scale-out",
+            "PolicyType": "StepScaling",
+            "StepScalingPolicyConfiguration": { "AdjustmentType": "ChangeInCapacity" },
+        },
+    }
+    stubs = {
+        "application-autoscaling": aasclient,
+        "cloudwatch": StubCloudWatch(),
+        "sagemaker": StubSageMaker(aasclient),
+    }
+    for service_name, stub in stubs.items():
+        clients.use_stand_in(service_name, stub)
+    monkeypatch.setattr(tune_data_capture, "UPDATE_POLL_SECS", 0)
+    yield stubs
+    for service_name in stubs:
+        clients.use_stand_in(service_name, None)
+
+
+def tune(get_remaining_ms):
+    return tune_data_capture.tune_endpoint(
+        ENDPOINT, sampling.resolve_options(None), BUSY, get_remaining_ms=get_remaining_ms
+    )
+
+
+def test_autoscaled_endpoint_is_updated_and_scaling_restored(aws):
+    aasclient, smclient = aws["application-autoscaling"], aws["sagemaker"]
+    before = copy.deepcopy((aasclient.targets, aasclient.policies))
+    result = tune(lambda: 900000)
+
+    assert result["Action"] == "Updated" and result["AutoscalingRestored"]
+    assert result["SamplingPercentage"] == 10
+    new_config = smclient.configs[result["NewEndpointConfigName"]]
+    assert new_config["DataCaptureConfig"]["InitialSamplingPercentage"] == 10
+    assert new_config["ProductionVariants"][0]["InitialInstanceCount"] == 3
+    # Restored only once the endpoint was back InService:
+    assert smclient.busy_polls == 3 and smclient.status == "InService"
+    assert (aasclient.targets, aasclient.policies) == before
+
+
+def test_autoscaled_endpoint_deferred_without_enough_time(aws):
+    aasclient, smclient = aws["application-autoscaling"], aws["sagemaker"]
+    before = copy.deepcopy((aasclient.targets, aasclient.policies))
+    result = tune(lambda: 60000)
+
+    assert result["Action"] == "Deferred"
+    assert smclient.endpoint_config_name == CONFIG_NAME
+    assert (aasclient.targets, aasclient.policies) == before
+
+
+def test_scaling_restored_if_update_fails(aws):
+    aasclient, smclient = aws["application-autoscaling"], aws["sagemaker"]
+    before = copy.deepcopy((aasclient.targets, aasclient.policies))
+
+    def reject(EndpointName, EndpointConfigName):
+        raise botoexceptions.ClientError(
+            { "Error": { "Code": "ValidationException", "Message": "Rejected" } }, "UpdateEndpoint"
+        )
+    smclient.update_endpoint = reject
+    with pytest.raises(botoexceptions.ClientError):
+        tune(lambda: 900000)
+    assert (aasclient.targets, aasclient.policies) == before
+
+
+def test_unscaled_endpoint_is_updated_without_waiting(aws):
+    aasclient, smclient = aws["application-autoscaling"], aws["sagemaker"]
+    aasclient.targets.clear()
+    aasclient.policies.clear()
+    result = tune(lambda: 0)
+
+    assert result["Action"] == "Updated" and not result["AutoscalingRestored"]
+    assert smclient.busy_polls == 0 and smclient.status == "Updating"
+    assert aasclient.targets == {}
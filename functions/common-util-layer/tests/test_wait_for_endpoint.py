@@ -0,0 +1,118 @@
+"""Tests for is-endpoint-updated's wait_for_endpoint polling, against a stubbed DescribeEndpoint and clock
+
+Run from functions/common-util-layer with `python -m pytest tests` (needs botocore, as in the Lambda runtime).
+"""
+
+# Python Built-Ins:
+import importlib.util
+import os
+import sys
+
+# External Dependencies:
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "python"))
+
+# Local Dependencies:
+# (Every function's module is called main, so load this one under its own name)
+_spec = importlib.util.spec_from_file_location(
+    "is_endpoint_updated", os.path.join(TESTS_DIR, "..", "..", "is-endpoint-updated", "main.py")
+)
+is_endpoint_updated = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(is_endpoint_updated)
+
+
+class StubSageMaker:
+    """Answers DescribeEndpoint with each of `statuses` in turn, then the last one forever"""
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def describe_endpoint(self, EndpointName):
+        status = self.statuses[min(self.calls, len(self.statuses) - 1)]
+        self.calls += 1
+        return { "EndpointName": EndpointName, "EndpointStatus": status }
+
+
+class StubClock:
+    """A Lambda invocation's remaining time, which only passes when wait_for_endpoint sleeps"""
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+        self.sleeps = []
+
+    def get_remaining_ms(self):
+        return self.remaining_ms
+
+    def sleep(self, secs):
+        self.sleeps.append(secs)
+        self.remaining_ms -= secs * 1000
+
+
+def wait(smclient, clock, **kwargs):
+    return is_endpoint_updated.wait_for_endpoint(
+        smclient,
+        "demo",
+        is_endpoint_updated.DEFAULT_BUSY_STATES,
+        is_endpoint_updated.DEFAULT_FAIL_STATES,
+        get_remaining_ms=clock.get_remaining_ms,
+        sleep=clock.sleep,
+        **kwargs,
+    )
+
+
+def test_updating_then_in_service():
+    smclient = StubSageMaker(["Updating"] * 4 + ["InService"])
+    clock = StubClock(900000)
+    endpoint_desc, polls = wait(smclient, clock)
+    assert endpoint_desc["EndpointStatus"] == "InService"
+    assert polls == smclient.calls == 5
+    # Backing off from MinPollSeconds at BackoffRate:
+    assert clock.sleeps == pytest.approx([2, 3, 4.5, 6.75])
+
+
+def test_backoff_is_capped():
+    clock = StubClock(900000)
+    wait(StubSageMaker(["Updating"] * 9 + ["InService"]), clock, max_poll_secs=10)
+    assert clock.sleeps == pytest.approx([2, 3, 4.5, 6.75, 10, 10, 10, 10, 10])
+
+
+def test_out_of_time_raises_endpoint_updating():
+    smclient = StubSageMaker(["Updating"])
+    clock = StubClock(60000)
+    with pytest.raises(is_endpoint_updated.EndpointUpdating):
+        wait(smclient, clock, max_poll_secs=10)
+    # Never sleeps into the safety margin, and the last sleep is cut short to poll once more just before it:
+    margin_ms = is_endpoint_updated.DEFAULT_SAFETY_MARGIN_MS
+    assert clock.remaining_ms >= margin_ms
+    assert clock.sleeps == pytest.approx([2, 3, 4.5, 6.75, 10, 10, 10, 8.75])
+    assert smclient.calls == len(clock.sleeps) + 1
+
+
+def test_no_remaining_time_polls_once():
+    # (The default get_remaining_ms, i.e. a plain check)
+    smclient = StubSageMaker(["Updating"])
+    with pytest.raises(is_endpoint_updated.EndpointUpdating):
+        is_endpoint_updated.wait_for_endpoint(
+            smclient,
+            "demo",
+            is_endpoint_updated.DEFAULT_BUSY_STATES,
+            is_endpoint_updated.DEFAULT_FAIL_STATES,
+            sleep=pytest.fail,
+        )
+    assert smclient.calls == 1
+
+
+def test_failed_raises_update_failed():
+    smclient = StubSageMaker(["Updating", "Updating", "Failed"])
+    clock = StubClock(900000)
+    with pytest.raises(is_endpoint_updated.UpdateFailed):
+        wait(smclient, clock)
+    assert smclient.calls == 3
+    assert clock.sleeps == pytest.approx([2, 3])
+
+
+def test_unexpected_status_with_target_states_raises():
+    smclient = StubSageMaker(["Updating", "OutOfService"])
+    with pytest.raises(is_endpoint_updated.UpdateFailed):
+        wait(smclient, StubClock(900000), target_states=["InService"])
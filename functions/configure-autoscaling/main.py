@@ -0,0 +1,296 @@
+"""Lambda function to carry endpoint autoscaling over blue/green swaps, and target it from measured throughput
+
+SageMaker won't update an endpoint while one of its variants is registered with Application Auto Scaling,
+and a policy on the old variant name wouldn't apply to the new one anyway. So:
+
+- Action "Suspend" (before the endpoint is updated) saves each variant's scalable target and scaling
+  policies, then deregisters them.
+- Action "Apply" (once the deployment is complete) registers the target variant with a target tracking
+  policy on SageMakerVariantInvocationsPerInstance. Settings carry over from the variant it replaced (as
+  saved by Suspend), except that the target invocations per instance is derived from measured throughput
+  when prepare-deployment-configs sized the instances from load test profiles.
+- Action "Restore" (after a rollback) re-applies the saved settings to the baseline variant unchanged.
+
+The deployment `Mode` from prepare-deployment-configs changes what's applied:
+
+- Serverless endpoints scale by themselves, so nothing is registered.
+- Async endpoints track ApproximateBacklogSizePerInstance instead (targeting one batch of
+  MaxConcurrentInvocationsPerInstance queued per instance by default). With ScaleToZero, MinCapacity is 0,
+  and a step scaling policy triggered by a HasBacklogWithoutCapacity alarm starts the first instance
+  (target tracking alone can't scale out from zero instances).
+
+Options come from the execution input's optional `Autoscaling` object (anything unset is carried over, then
+falls back to the defaults below):
+
+    {
+        "Enabled": true,
+        "MinInstanceCount": 1,
+        "MaxInstanceCount": 4,
+        "TargetInvocationsPerInstance": null,  # Per minute. Overrides the throughput-derived target
+        "TargetBacklogPerInstance": null,      # (Async) Overrides the concurrency-derived target
+        "TargetUtilization": 0.7,              # Fraction of measured per-instance capacity to target
+        "ScaleInCooldown": 300,
+        "ScaleOutCooldown": 60
+    }
+
+Saving, suspending and re-applying settings are shared with tune-data-capture, in util.autoscaling.
+"""
+
+# Python Built-Ins:
+import logging
+import math
+
+# External Dependencies:
+from botocore import exceptions as botoexceptions
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+PREDEFINED_METRIC = "SageMakerVariantInvocationsPerInstance"
+ASYNC_BACKLOG_METRIC = "ApproximateBacklogSizePerInstance"
+DEFAULT_OPTIONS = {
+    "Enabled": True,
+    "MinInstanceCount": None,
+    "MaxInstanceCount": None,
+    "TargetInvocationsPerInstance": None,
+    "TargetBacklogPerInstance": None,
+    "TargetUtilization": None,
+    "ScaleInCooldown": None,
+    "ScaleOutCooldown": None,
+}
+# Used when neither options nor carried-over settings give a cooldown (seconds):
+DEFAULT_COOLDOWNS = { "ScaleInCooldown": 300, "ScaleOutCooldown": 60 }
+
+
+def policy_name(endpoint_name, variant_name, async_mode=False):
+    metric = "backlog" if async_mode else "invocations"
+    return f"{endpoint_name}-{variant_name}-{metric}-per-instance"
+
+
+def tracking_metric(endpoint_name, async_mode=False):
+    """(key, spec) of the metric to target track in a TargetTrackingScalingPolicyConfiguration"""
+    if not async_mode:
+        return "PredefinedMetricSpecification", { "PredefinedMetricType": PREDEFINED_METRIC }
+    return "CustomizedMetricSpecification", {
+        "MetricName": ASYNC_BACKLOG_METRIC,
+        "Namespace": "AWS/SageMaker",
+        "Dimensions": [{ "Name": "EndpointName", "Value": endpoint_name }],
+        "Statistic": "Average",
+    }
+
+
+def is_tracking_policy(policy):
+    """Whether a policy is one this function manages (invocations or backlog target tracking)"""
+    if policy["PolicyType"] != "TargetTrackingScaling":
+        return False
+    config = policy["TargetTrackingScalingPolicyConfiguration"]
+    return (
+        config.get("PredefinedMetricSpecification", {}).get("PredefinedMetricType") == PREDEFINED_METRIC
+        or config.get("CustomizedMetricSpecification", {}).get("MetricName") == ASYNC_BACKLOG_METRIC
+    )
+
+
+def resolve_options(execution_input):
+    options = dict(DEFAULT_OPTIONS)
+    options.update(execution_input.get("Autoscaling") or {})
+    return options
+
+
+def target_from_throughput(capacity_rps, target_utilization):
+    """Invocations per instance per minute to target, given measured requests/sec per instance"""
+    if not capacity_rps:
+        return None
+    # (The metric is per minute: Round down, to err towards scaling out early)
+    return float(max(1, math.floor(capacity_rps * 60 * target_utilization)))
+
+
+def plan_settings(endpoint_name, variant_name, options, sizing=None, carried=None, mode=None):
+    """Work out the target variant's scaling settings from options, measured throughput and carried settings
+
+    Returns
+    -------
+    settings : dict | None
+        MinCapacity, MaxCapacity and Policies, or None if there's nothing to target scaling on
+    source : str
+        Where the tracking target came from: "Options", "Throughput", "Concurrency", "CarriedOver" or "None"
+    """
+    sizing = sizing or {}
+    carried = carried or { "Policies": [] }
+    mode = mode or { "Mode": "RealTime" }
+    async_mode = mode["Mode"] == "Async"
+    carried_tracking = next((p for p in carried["Policies"] if is_tracking_policy(p)), None)
+    # (Scale-from-zero policies are re-created below if still needed, since their alarm is re-pointed)
+    other_policies = [
+        p for p in carried["Policies"]
+        if p is not carried_tracking and not p["PolicyName"].endswith(util.autoscaling.SCALE_FROM_ZERO_SUFFIX)
+    ]
+
+    target_option = "TargetBacklogPerInstance" if async_mode else "TargetInvocationsPerInstance"
+    if options.get(target_option):
+        target_value, source = float(options[target_option]), "Options"
+    elif async_mode:
+        target_value = float(
+            mode["AsyncInferenceConfig"]["ClientConfig"]["MaxConcurrentInvocationsPerInstance"]
+        )
+        source = "Concurrency"
+    elif sizing.get("CapacityRpsPerInstance"):
+        target_value = target_from_throughput(
+            sizing["CapacityRpsPerInstance"],
+            (
+                options.get("TargetUtilization")
+                or sizing.get("TargetUtilization")
+                or util.sizing.DEFAULT_TARGET_UTILIZATION
+            ),
+        )
+        source = "Throughput"
+    elif carried_tracking:
+        target_value = carried_tracking["TargetTrackingScalingPolicyConfiguration"]["TargetValue"]
+        source = "CarriedOver"
+    else:
+        target_value, source = None, "None"
+    if target_value is None and not other_policies:
+        return None, source
+
+    # (Min capacity can be 0, so check for None rather than falsiness)
+    if options.get("MinInstanceCount") is not None:
+        min_capacity = options["MinInstanceCount"]
+    elif async_mode and mode.get("ScaleToZero"):
+        min_capacity = 0
+    elif carried.get("MinCapacity") is not None:
+        min_capacity = carried["MinCapacity"]
+    else:
+        min_capacity = sizing.get("InstanceCount") or 1
+    max_capacity = (
+        options.get("MaxInstanceCount")
+        or carried.get("MaxCapacity")
+        or 2 * (min_capacity or sizing.get("InstanceCount") or 1)
+    )
+    if max_capacity < min_capacity:
+        raise ValueError(f"Autoscaling max instance count {max_capacity} < min {min_capacity}")
+
+    # (Policy names are per scalable target, so other carried policies can keep theirs)
+    policies = list(other_policies)
+    carried_config = (carried_tracking or {}).get("TargetTrackingScalingPolicyConfiguration", {})
+    cooldowns = {
+        key: options.get(key) or carried_config.get(key) or default
+        for key, default in DEFAULT_COOLDOWNS.items()
+    }
+    if target_value is not None:
+        metric_key, metric_spec = tracking_metric(endpoint_name, async_mode)
+        policies.append({
+            "PolicyName": policy_name(endpoint_name, variant_name, async_mode),
+            "PolicyType": "TargetTrackingScaling",
+            "TargetTrackingScalingPolicyConfiguration": {
+                "TargetValue": target_value,
+                metric_key: metric_spec,
+                **cooldowns,
+            },
+        })
+    if async_mode and min_capacity == 0:
+        policies.append({
+            "PolicyName": f"{endpoint_name}-{variant_name}{util.autoscaling.SCALE_FROM_ZERO_SUFFIX}",
+            "PolicyType": "StepScaling",
+            "StepScalingPolicyConfiguration": {
+                "AdjustmentType": "ChangeInCapacity",
+                "MetricAggregationType": "Average",
+                "Cooldown": cooldowns["ScaleOutCooldown"],
+                "StepAdjustments": [{ "MetricIntervalLowerBound": 0, "ScalingAdjustment": 1 }],
+            },
+        })
+    return {
+        "MinCapacity": int(min_capacity),
+        "MaxCapacity": int(max_capacity),
+        "Policies": policies,
+    }, source
+
+
+def carried_settings(saved, endpoint_status):
+    """Saved settings of the variant being replaced (the rollout baseline, else any that was registered)"""
+    baseline = (endpoint_status.get("Rollout") or {}).get("BaselineVariant")
+    if baseline in saved:
+        return saved[baseline]
+    return next(iter(saved.values()), None)
+
+
+def current_variant_names(endpoint_name):
+    smclient = util.client("sagemaker")
+    try:
+        endpoint_desc = smclient.describe_endpoint(EndpointName=endpoint_name)
+    except botoexceptions.ClientError as err:
+        if err.response.get("Error", {}).get("Message", "").lower().startswith("could not find endpoint"):
+            return []
+        raise err
+    return [v["VariantName"] for v in endpoint_desc["ProductionVariants"]]
+
+
+def handler(event, context):
+    """Lambda handler to suspend, apply or restore endpoint variant autoscaling
+
+    Parameters
+    ----------
+    event.Action : str
+        "Suspend" (before updating the endpoint), "Apply" (after deployment) or "Restore" (after rollback)
+    event.EndpointName : str
+        Name of the endpoint
+    event.EndpointStatus : dict
+        Output of prepare-deployment-configs: Read for TargetVariantName, Mode, Sizing and Rollout, plus
+        SavedAutoscaling (the output of Suspend) if it ran
+    event.ExecutionInput : dict
+        The state machine execution input, read for optional Autoscaling options
+
+    Returns
+    -------
+    (Suspend) Saved settings by variant name.
+    (Apply/Restore) Configured (bool), VariantName, Source of the invocations target, and the Settings
+    applied.
+    """
+    logger.info(f"Got event {event}")
+    action = event.get("Action", "Apply")
+    endpoint_name = event["EndpointName"]
+    endpoint_status = event.get("EndpointStatus") or {}
+    aasclient = util.client("application-autoscaling")
+
+    if action == "Suspend":
+        return util.autoscaling.suspend(aasclient, endpoint_name, current_variant_names(endpoint_name))
+    elif action not in ("Apply", "Restore"):
+        raise ValueError(f"Unknown Action '{action}': Expected 'Suspend', 'Apply' or 'Restore'")
+
+    saved = endpoint_status.get("SavedAutoscaling") or {}
+    if action == "Restore":
+        variant_name = endpoint_status["Rollout"]["BaselineVariant"]
+        settings, source = saved.get(variant_name), "CarriedOver"
+    else:
+        variant_name = endpoint_status["TargetVariantName"]
+        options = resolve_options(event.get("ExecutionInput") or {})
+        mode = endpoint_status.get("Mode") or { "Mode": "RealTime" }
+        if not options["Enabled"]:
+            logger.info("Autoscaling disabled by execution input")
+            return { "Configured": False, "VariantName": variant_name, "Source": "Disabled" }
+        elif mode["Mode"] == "Serverless":
+            logger.info("Serverless endpoints scale by themselves: No autoscaling to register")
+            return { "Configured": False, "VariantName": variant_name, "Source": "Serverless" }
+        settings, source = plan_settings(
+            endpoint_name,
+            variant_name,
+            options,
+            sizing=endpoint_status.get("Sizing"),
+            carried=carried_settings(saved, endpoint_status),
+            mode=mode,
+        )
+
+    if settings is None:
+        logger.info(f"No autoscaling target for variant {variant_name} (no measured throughput or options)")
+        return { "Configured": False, "VariantName": variant_name, "Source": source }
+    policy_arns = util.autoscaling.apply_settings(aasclient, endpoint_name, variant_name, settings)
+    util.autoscaling.point_alarms(lambda: util.client("cloudwatch"), endpoint_name, policy_arns)
+    return { "Configured": True, "VariantName": variant_name, "Source": source, "Settings": settings }
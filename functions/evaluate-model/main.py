@@ -0,0 +1,320 @@
+"""Lambda function to evaluate a model's test set results (as joined by the Test Transform/Batch Score step)
+
+Each result line is the full input record (features, then the true label) followed by one predicted
+probability per class. The .out objects under the results prefix are streamed line by line and only small
+running totals are kept in memory. Those totals are the confusion matrix and the calibration bins.
+
+Multi-GB results may not fit in one Lambda invocation's time limit. When time runs short, the function
+returns `Complete: false` with a `Checkpoint` object. The state machine passes that straight back in to
+carry on from the same byte offset.
+
+For local testing against an S3 stand-in (e.g. moto server or MinIO), set S3_ENDPOINT_URL (see util.clients).
+"""
+
+# Python Built-Ins:
+import json
+import logging
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+DEFAULT_NUM_CLASSES = 7
+DEFAULT_CALIBRATION_BINS = 10
+# Stop consuming results once fewer than this remain of the Lambda's time, to leave room to checkpoint:
+DEFAULT_SAFETY_MARGIN_MS = 20000
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+def bucket_and_key_from_s3_uri(s3uri):
+    assert isinstance(s3uri, str) and s3uri.lower().startswith("s3://"), (
+        f"s3uri must be a string beginning with 's3://': Got {s3uri}"
+    )
+    bucket, _, key = s3uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def list_result_keys(bucket, prefix, s3client=None):
+    """List the result (.out) object keys under prefix in sorted order, with their sizes"""
+    s3client = s3client or util.client("s3")
+    result = []
+    paginator = s3client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith(".out"):
+                result.append({ "Key": obj["Key"], "Size": obj["Size"] })
+    return sorted(result, key=lambda o: o["Key"])
+
+
+def iter_lines_from(bucket, key, offset=0, s3client=None):
+    """Stream the lines of an S3 object from byte `offset`, yielding (line, offset_after_line)"""
+    s3client = s3client or util.client("s3")
+    response = s3client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-")
+    pending = b""
+    for chunk in response["Body"].iter_chunks(chunk_size=READ_CHUNK_BYTES):
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            offset += len(line) + 1
+            yield line, offset
+    if pending:
+        offset += len(pending)
+        yield pending, offset
+
+
+class EvaluationState:
+    """Mergeable running totals for classification metrics: Confusion counts and calibration bins
+
+    Probability columns are identified by index, and true labels by their raw string value. The two are
+    matched up in finalize(), so this never needs to see the whole dataset at once.
+    """
+    def __init__(self, num_classes, n_bins=DEFAULT_CALIBRATION_BINS, confusion=None, bins=None,
+            n_records=0, n_invalid=0):
+        self.num_classes = num_classes
+        self.n_bins = n_bins
+        # { true_label: [count predicted as class index 0, 1, ...] }
+        self.confusion = confusion or {}
+        # [n_records, sum(confidence)] per top-class confidence bin:
+        self.bins = bins or [[0, 0.0] for _ in range(n_bins)]
+        self.n_records = n_records
+        self.n_invalid = n_invalid
+        # { true_label: { "bin:predicted_index": count } }, to resolve per-bin accuracy in finalize() once
+        # labels can be matched to probability columns:
+        self._bin_hits = {}
+
+    def update(self, line):
+        """Add one joined result line (bytes or str) to the totals"""
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            return
+        fields = line.split(",")
+        try:
+            label = fields[-self.num_classes - 1].strip()
+            probs = [float(p) for p in fields[-self.num_classes:]]
+        except (IndexError, ValueError):
+            self.n_invalid += 1
+            return
+        if label.endswith(".0"):  # Labels may have round-tripped through float formatting
+            label = label[:-2]
+        pred_ix = max(range(self.num_classes), key=probs.__getitem__)
+        confidence = probs[pred_ix]
+        bin_ix = min(int(confidence * self.n_bins), self.n_bins - 1)
+
+        row = self.confusion.setdefault(label, [0] * self.num_classes)
+        row[pred_ix] += 1
+        self.bins[bin_ix][0] += 1
+        self.bins[bin_ix][1] += confidence
+        hits = self._bin_hits.setdefault(label, {})
+        key = f"{bin_ix}:{pred_ix}"
+        hits[key] = hits.get(key, 0) + 1
+        self.n_records += 1
+
+    def to_dict(self):
+        return {
+            "NumClasses": self.num_classes,
+            "Bins": self.n_bins,
+            "Confusion": self.confusion,
+            "CalibrationBins": self.bins,
+            "BinHits": self._bin_hits,
+            "Records": self.n_records,
+            "Invalid": self.n_invalid,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls(
+            d["NumClasses"],
+            n_bins=d["Bins"],
+            confusion=d["Confusion"],
+            bins=d["CalibrationBins"],
+            n_records=d["Records"],
+            n_invalid=d["Invalid"],
+        )
+        state._bin_hits = d["BinHits"]
+        return state
+
+    def finalize(self, class_labels=None):
+        """Compute the final metrics, mapping probability column i to class_labels[i]
+
+        If class_labels is not given, the sorted distinct true labels are used - matching a classifier
+        whose classes_ were taken from the same label set (as TabNetClassifier does).
+        """
+        if class_labels is None:
+            observed = list(self.confusion.keys())
+            try:
+                class_labels = sorted(observed, key=float)
+            except ValueError:
+                class_labels = sorted(observed)
+            if len(class_labels) != self.num_classes:
+                raise ValueError(
+                    f"Saw {len(class_labels)} distinct labels in results but {self.num_classes} probability "
+                    "columns: Please provide ClassLabels explicitly"
+                )
+        class_labels = [str(c) for c in class_labels]
+        label_ix = { label: ix for ix, label in enumerate(class_labels) }
+
+        matrix = [[0] * self.num_classes for _ in range(self.num_classes)]
+        for label, row in self.confusion.items():
+            if label not in label_ix:
+                raise ValueError(f"Result label '{label}' not in ClassLabels {class_labels}")
+            matrix[label_ix[label]] = [a + b for a, b in zip(matrix[label_ix[label]], row)]
+
+        total = sum(sum(row) for row in matrix)
+        correct = sum(matrix[i][i] for i in range(self.num_classes))
+        per_class = {}
+        for i, label in enumerate(class_labels):
+            tp = matrix[i][i]
+            support = sum(matrix[i])
+            n_predicted = sum(row[i] for row in matrix)
+            per_class[label] = {
+                "Precision": tp / n_predicted if n_predicted else None,
+                "Recall": tp / support if support else None,
+                "Support": support,
+            }
+
+        bin_correct = [0] * self.n_bins
+        for label, hits in self._bin_hits.items():
+            for key, count in hits.items():
+                bin_ix, pred_ix = (int(x) for x in key.split(":"))
+                if label_ix[label] == pred_ix:
+                    bin_correct[bin_ix] += count
+        calibration = []
+        ece = 0.0
+        for bin_ix, (count, sum_confidence) in enumerate(self.bins):
+            calibration.append({
+                "Lower": bin_ix / self.n_bins,
+                "Upper": (bin_ix + 1) / self.n_bins,
+                "Count": count,
+                "MeanConfidence": sum_confidence / count if count else None,
+                "Accuracy": bin_correct[bin_ix] / count if count else None,
+            })
+            if count:
+                ece += abs(sum_confidence - bin_correct[bin_ix]) / total
+
+        return {
+            "Records": total,
+            "InvalidRecords": self.n_invalid,
+            "Accuracy": correct / total if total else None,
+            "ClassLabels": class_labels,
+            "PerClass": per_class,
+            "ConfusionMatrix": matrix,
+            "Calibration": calibration,
+            "ExpectedCalibrationError": ece if total else None,
+        }
+
+
+def evaluate(bucket, prefix, state, checkpoint=None, should_stop=lambda: False, s3client=None):
+    """Stream results under s3://bucket/prefix into state, returning the checkpoint to resume from or None
+
+    checkpoint is {"Key", "Offset"}: Objects sorting before Key have been consumed, and so have the first
+    Offset bytes of Key itself.
+    """
+    objects = list_result_keys(bucket, prefix, s3client=s3client)
+    if not objects:
+        raise ValueError(f"No .out result objects found under s3://{bucket}/{prefix}")
+    start_key = checkpoint["Key"] if checkpoint else None
+    for obj in objects:
+        key = obj["Key"]
+        if start_key is not None and key < start_key:
+            continue
+        offset = checkpoint["Offset"] if checkpoint and key == start_key else 0
+        if offset >= obj["Size"]:
+            continue
+        logger.info(f"Evaluating s3://{bucket}/{key} from byte {offset} of {obj['Size']}")
+        for line, offset in iter_lines_from(bucket, key, offset, s3client=s3client):
+            state.update(line)
+            # Checking the clock every line would dominate the runtime, so only check every so often:
+            if state.n_records % 10000 == 0 and should_stop():
+                return { "Key": key, "Offset": offset }
+    return None
+
+
+def handler(event, context):
+    """Lambda handler to (continue to) evaluate test results
+
+    Parameters
+    ----------
+    event.ResultsUri : str
+        s3:// URI prefix under which the .out result files are stored
+    event.NumClasses : int (Optional)
+        Number of probability columns at the end of each line (default 7)
+    event.ClassLabels : List (Optional)
+        Class label for each probability column (default: sorted distinct labels in the results)
+    event.Checkpoint : dict (Optional)
+        Checkpoint returned by a previous incomplete invocation, to resume from
+    event.Recompute : bool (Optional)
+        Set true to ignore any metrics previously saved for these results
+
+    Returns
+    -------
+    Complete : bool
+        Whether all results have been consumed (if false, pass Checkpoint back in to continue)
+    Checkpoint : dict | None
+        Progress & running totals for continuation
+    Metrics : dict | None
+        Accuracy, per-class precision/recall, confusion matrix and calibration (when Complete)
+    MetricsUri : str | None
+        Where the metrics JSON was also saved to S3 (when Complete)
+    """
+    logger.info(f"Got event {event}")
+    bucket, prefix = bucket_and_key_from_s3_uri(event["ResultsUri"])
+    checkpoint = event.get("Checkpoint")
+    s3 = util.client("s3")
+    metrics_key = prefix.rstrip("/") + "/_evaluation.json"
+    if not checkpoint and not event.get("Recompute"):
+        # Results under a prefix never change once written (see test-results-cache), so nor do metrics:
+        try:
+            metrics = json.loads(s3.get_object(Bucket=bucket, Key=metrics_key)["Body"].read())
+            logger.info(f"Re-using existing metrics s3://{bucket}/{metrics_key}")
+            return {
+                "Complete": True,
+                "Checkpoint": None,
+                "Metrics": metrics,
+                "MetricsUri": f"s3://{bucket}/{metrics_key}",
+            }
+        except s3.exceptions.NoSuchKey:
+            pass
+
+    if checkpoint:
+        state = EvaluationState.from_dict(checkpoint["State"])
+    else:
+        state = EvaluationState(int(event.get("NumClasses", DEFAULT_NUM_CLASSES)))
+
+    safety_margin_ms = int(event.get("SafetyMarginMs", DEFAULT_SAFETY_MARGIN_MS))
+    next_position = evaluate(
+        bucket,
+        prefix,
+        state,
+        checkpoint=checkpoint and checkpoint["Position"],
+        should_stop=lambda: context.get_remaining_time_in_millis() < safety_margin_ms,
+    )
+    if next_position is not None:
+        logger.info(f"Checkpointing after {state.n_records} records at {next_position}")
+        return {
+            "Complete": False,
+            "Checkpoint": { "Position": next_position, "State": state.to_dict() },
+            "Metrics": None,
+            "MetricsUri": None,
+        }
+
+    metrics = state.finalize(event.get("ClassLabels"))
+    logger.info(f"Evaluated {metrics['Records']} records: Accuracy {metrics['Accuracy']}")
+    s3.put_object(Bucket=bucket, Key=metrics_key, Body=json.dumps(metrics).encode("utf-8"))
+    return {
+        "Complete": True,
+        "Checkpoint": None,
+        "Metrics": metrics,
+        "MetricsUri": f"s3://{bucket}/{metrics_key}",
+    }
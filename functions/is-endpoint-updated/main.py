@@ -3,20 +3,30 @@
 At the time of writing there's no createEndpoint.sync or updateEndpoint.sync actions in Step Functions
 itself, so instead we can have Step Functions poll this Lambda, which checks whether the endpoint is
 finished creating/updating/deleting/whatever yet and throws the specific EndpointUpdating error if not.
+
+Each of those polls is a Lambda invocation and a state transition, and a fixed retry interval means the
+pipeline can sit idle for up to a whole interval after the endpoint is ready. So with `Wait: true`, the
+function instead polls DescribeEndpoint itself: Quickly at first, then backing off up to MaxPollSeconds.
+It only raises EndpointUpdating once the invocation's remaining time runs out, so the state machine's
+Retry becomes the (rare) fallback for very long deployments rather than the main polling loop.
 """
 
 # Python Built-Ins:
 from datetime import date, datetime
 import json
+import time
 
-# External Dependencies:
-import boto3
-
+# Local Dependencies:
+import util
 
-smclient = boto3.client("sagemaker")
 
 DEFAULT_BUSY_STATES = set(["Creating", "Updating", "SystemUpdating", "RollingBack", "Deleting"])
 DEFAULT_FAIL_STATES = set(["Failed"])
+DEFAULT_MIN_POLL_SECS = 2
+DEFAULT_MAX_POLL_SECS = 30
+DEFAULT_BACKOFF_RATE = 1.5
+# Stop waiting once fewer than this remain of the Lambda's time, to leave room to return/raise cleanly:
+DEFAULT_SAFETY_MARGIN_MS = 5000
 
 class EndpointUpdating(ValueError):
     """Error thrown if endpoint update still in progress (catch & retry this in your SFn)"""
@@ -35,6 +45,58 @@ def default_json_serializer(obj):
     raise TypeError (f"Type {type(obj)} not serializable")
 
 
+def check_endpoint(smclient, endpoint_name, busy_states, fail_states, target_states=None):
+    """Describe the endpoint, raising EndpointUpdating or UpdateFailed unless it's finished updating"""
+    endpoint_desc = smclient.describe_endpoint(EndpointName=endpoint_name)
+
+    endpoint_status = endpoint_desc["EndpointStatus"]
+    if endpoint_status in busy_states:
+        raise EndpointUpdating(f"Endpoint {endpoint_name} is in status {endpoint_status}")
+    elif target_states is not None and endpoint_status not in target_states:
+        raise UpdateFailed(f"Endpoint {endpoint_name} is in status {endpoint_status}")
+    elif endpoint_status in fail_states:
+        raise UpdateFailed(f"Endpoint {endpoint_name} is in status {endpoint_status}")
+    return endpoint_desc
+
+
+def wait_for_endpoint(
+    smclient,
+    endpoint_name,
+    busy_states,
+    fail_states,
+    target_states=None,
+    get_remaining_ms=lambda: 0,
+    min_poll_secs=DEFAULT_MIN_POLL_SECS,
+    max_poll_secs=DEFAULT_MAX_POLL_SECS,
+    backoff_rate=DEFAULT_BACKOFF_RATE,
+    safety_margin_ms=DEFAULT_SAFETY_MARGIN_MS,
+    sleep=time.sleep,
+):
+    """Poll check_endpoint with backoff until it's finished, or raise EndpointUpdating when time runs out
+
+    Returns
+    -------
+    endpoint_desc : dict
+        The DescribeEndpoint response once the endpoint has finished updating
+    polls : int
+        Number of DescribeEndpoint calls made
+    """
+    interval = min_poll_secs
+    polls = 0
+    while True:
+        polls += 1
+        try:
+            return check_endpoint(smclient, endpoint_name, busy_states, fail_states, target_states), polls
+        except EndpointUpdating:
+            budget_secs = (get_remaining_ms() - safety_margin_ms) / 1000
+            if budget_secs < min_poll_secs:
+                print(f"Endpoint {endpoint_name} still updating after {polls} polls: Out of time")
+                raise
+        # (Never sleep past the budget, so the final poll happens just before time runs out)
+        sleep(min(interval, budget_secs))
+        interval = min(interval * backoff_rate, max_poll_secs)
+
+
 def handler(event, context):
     """Lambda handler to check if endpoint is updated after deployment/change
 
@@ -49,6 +111,11 @@ def handler(event, context):
         not supplied, entering any state not listed in BusyStates or FailStates will be marked as completion.
     event.FailStates : List[str] (Optional)
         Optional override for set of specific fail states raising UpdateFailed
+    event.Wait : bool (Optional)
+        Set true to keep polling within this invocation (with backoff) until the endpoint is finished
+        updating or the invocation is nearly out of time, instead of raising EndpointUpdating right away
+    event.MinPollSeconds, event.MaxPollSeconds, event.BackoffRate : float (Optional)
+        Override the first and longest intervals between polls in Wait mode, and the growth in between
     """
     print(event)
 
@@ -57,17 +124,24 @@ def handler(event, context):
     fail_states = event.get("FailStates", DEFAULT_FAIL_STATES)
     busy_states = event.get("BusyStates", DEFAULT_BUSY_STATES)
 
-    endpoint_desc = smclient.describe_endpoint(EndpointName=endpoint_name)
-
-    endpoint_status = endpoint_desc["EndpointStatus"]
-    if endpoint_status in busy_states:
-        raise EndpointUpdating(f"Endpoint {endpoint_name} is in status {endpoint_status}")
-    elif target_states is not None and endpoint_status not in target_states:
-        raise UpdateFailed(f"Endpoint {endpoint_name} is in status {endpoint_status}")
-    elif endpoint_status in fail_states:
-        raise UpdateFailed(f"Endpoint {endpoint_name} is in status {endpoint_status}")
-
-    # Otherwise, success! The update is complete
+    smclient = util.client("sagemaker")
+    if event.get("Wait"):
+        endpoint_desc, polls = wait_for_endpoint(
+            smclient,
+            endpoint_name,
+            busy_states,
+            fail_states,
+            target_states,
+            get_remaining_ms=context.get_remaining_time_in_millis,
+            min_poll_secs=float(event.get("MinPollSeconds", DEFAULT_MIN_POLL_SECS)),
+            max_poll_secs=float(event.get("MaxPollSeconds", DEFAULT_MAX_POLL_SECS)),
+            backoff_rate=float(event.get("BackoffRate", DEFAULT_BACKOFF_RATE)),
+        )
+        print(f"Endpoint {endpoint_name} finished updating after {polls} polls")
+    else:
+        endpoint_desc = check_endpoint(smclient, endpoint_name, busy_states, fail_states, target_states)
+
+    # Success! The update is complete
     # We want to return a dict (so SFn treats it as an object rather than string), but one that's safe for
     # JSON serialization (datetime raises error by default):
     return json.loads(json.dumps(endpoint_desc, default=default_json_serializer))
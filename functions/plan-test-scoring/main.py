@@ -0,0 +1,230 @@
+"""Lambda function to plan the test set scoring step: Resolve options and split the test data into shards
+
+The state machine scores each planned shard in parallel, through a Map state. That is either a Batch
+Transform job or a batch_transform.py Processing job per shard. Options come from the execution input's
+optional `TestScoring` object:
+
+    {
+        "Engine": "processing",         # or "transform"
+        "ShardCount": 4,
+        "InstanceType": "ml.m5.xlarge", # (default depends on engine)
+        "MaxPayloadInMB": 3,            # (transform only)
+        "MaxConcurrency": 4
+    }
+
+With more than one shard, the test data prefix is cut into ShardCount roughly equal, line-aligned byte
+ranges. Each range is materialized as its own object by server-side UploadPartCopy, so no data passes
+through this function. Each shard's results go under `{ResultsUri}shard-NNNNN/`, so that listing ResultsUri
+returns the merged output in the original record order.
+"""
+
+# Python Built-Ins:
+import logging
+import os
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+ENGINES = ("processing", "transform")
+DEFAULT_INSTANCE_TYPES = {
+    "processing": "ml.m5.xlarge",
+    "transform": "ml.p3.2xlarge",
+}
+DEFAULT_OPTIONS = {
+    "Engine": "processing",
+    "ShardCount": 1,
+    "MaxPayloadInMB": 3,
+    "MaxConcurrency": 4,
+}
+MAX_SHARDS = 100
+MAX_COPY_PART_BYTES = 5 * 1024 ** 3  # S3 UploadPartCopy limit
+BOUNDARY_SEARCH_BYTES = 256 * 1024
+
+
+def bucket_and_key_from_s3_uri(s3uri):
+    assert isinstance(s3uri, str) and s3uri.lower().startswith("s3://"), (
+        f"s3uri must be a string beginning with 's3://': Got {s3uri}"
+    )
+    bucket, _, key = s3uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def resolve_options(execution_input, source_dir_url):
+    """Merge TestScoring execution input over defaults, and validate"""
+    options = dict(DEFAULT_OPTIONS)
+    if execution_input.get("ScoringEngine"):
+        # (Top-level ScoringEngine input is also accepted, for backward compatibility)
+        options["Engine"] = execution_input["ScoringEngine"]
+    options.update(execution_input.get("TestScoring") or {})
+
+    if options["Engine"] not in ENGINES:
+        raise ValueError(f"TestScoring.Engine must be one of {ENGINES}: Got {options['Engine']}")
+    if options["Engine"] == "processing" and not source_dir_url:
+        logger.warning("Model has no source bundle to run batch_transform.py from: Using 'transform' engine")
+        options["Engine"] = "transform"
+    options.setdefault("InstanceType", DEFAULT_INSTANCE_TYPES[options["Engine"]])
+    for name in ("ShardCount", "MaxPayloadInMB", "MaxConcurrency"):
+        options[name] = int(options[name])
+    if not 1 <= options["ShardCount"] <= MAX_SHARDS:
+        raise ValueError(f"TestScoring.ShardCount must be between 1 and {MAX_SHARDS}")
+    return options
+
+
+def list_objects(data_uri):
+    bucket, prefix = bucket_and_key_from_s3_uri(data_uri)
+    result = []
+    paginator = util.client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        result.extend(
+            { "Bucket": bucket, "Key": obj["Key"], "Size": obj["Size"] }
+            for obj in page.get("Contents", []) if obj["Size"] > 0 and not obj["Key"].endswith("/")
+        )
+    return result
+
+
+def next_line_start(obj, offset):
+    """Find the offset just after the first newline at or after `offset` in obj (or the object's size)"""
+    while offset < obj["Size"]:
+        end = min(offset + BOUNDARY_SEARCH_BYTES, obj["Size"]) - 1
+        response = util.client("s3").get_object(
+            Bucket=obj["Bucket"], Key=obj["Key"], Range=f"bytes={offset}-{end}",
+        )
+        data = response["Body"].read()
+        ix = data.find(b"\n")
+        if ix >= 0:
+            return offset + ix + 1
+        offset = end + 1
+    return obj["Size"]
+
+
+def plan_segments(objects, n_shards):
+    """Split a list of objects into n_shards lists of line-aligned (object, start, end) byte segments"""
+    total = sum(obj["Size"] for obj in objects)
+    # Global byte offsets at which to cut, each then moved forward to the start of the next line:
+    cuts = []
+    base = 0
+    targets = [total * i // n_shards for i in range(1, n_shards)]
+    for obj in objects:
+        while targets and targets[0] < base + obj["Size"]:
+            local = next_line_start(obj, targets.pop(0) - base)
+            cuts.append((obj["Key"], local))
+            # Skip any further targets that fell inside the line we just moved past:
+            while targets and targets[0] < base + local:
+                targets.pop(0)
+        base += obj["Size"]
+
+    shards = [[]]
+    for obj in objects:
+        start = 0
+        for key, cut in cuts:
+            if key == obj["Key"] and start < cut:
+                shards[-1].append((obj, start, cut))
+                shards.append([])
+                start = cut
+        if start < obj["Size"]:
+            shards[-1].append((obj, start, obj["Size"]))
+    return [shard for shard in shards if shard]
+
+
+def copy_segment(obj, start, end, dest_bucket, dest_key):
+    """Materialize bytes [start, end) of obj as a new object, server-side"""
+    s3 = util.client("s3")
+    upload = s3.create_multipart_upload(Bucket=dest_bucket, Key=dest_key)
+    try:
+        parts = []
+        for part_start in range(start, end, MAX_COPY_PART_BYTES):
+            part_end = min(part_start + MAX_COPY_PART_BYTES, end) - 1
+            response = s3.upload_part_copy(
+                Bucket=dest_bucket,
+                Key=dest_key,
+                UploadId=upload["UploadId"],
+                PartNumber=len(parts) + 1,
+                CopySource={ "Bucket": obj["Bucket"], "Key": obj["Key"] },
+                CopySourceRange=f"bytes={part_start}-{part_end}",
+            )
+            parts.append({ "PartNumber": len(parts) + 1, "ETag": response["CopyPartResult"]["ETag"] })
+        s3.complete_multipart_upload(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload["UploadId"],
+            MultipartUpload={ "Parts": parts },
+        )
+    except Exception:
+        s3.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload["UploadId"])
+        raise
+
+
+def handler(event, context):
+    """Lambda handler to plan (and shard the data for) test set scoring
+
+    Parameters
+    ----------
+    event.ExecutionInput : dict
+        The state machine execution input, read for optional TestScoring options
+    event.ModelName : str
+        Registered model name (used to name the scoring jobs)
+    event.SourceDirUrl : str | None
+        Model source bundle from register-model (the processing engine needs this)
+    event.DataUri : str
+        s3:// URI prefix of the test data
+    event.ResultsUri : str
+        s3:// URI prefix to write results to
+    event.ShardRootUri : str
+        s3:// URI prefix under which to write sharded test data (if ShardCount > 1)
+
+    Returns
+    -------
+    Engine, InstanceType, MaxPayloadInMB, MaxConcurrency, ShardCount :
+        Resolved scoring options (ShardCount may be lower than requested for very small data)
+    Shards : List[dict]
+        Index, JobName, DataUri and ResultsUri for each shard
+    """
+    logger.info(f"Got event {event}")
+    options = resolve_options(event.get("ExecutionInput") or {}, event.get("SourceDirUrl"))
+    model_name = event["ModelName"]
+    results_uri = event["ResultsUri"]
+    if not results_uri.endswith("/"):
+        results_uri += "/"
+
+    if options["ShardCount"] == 1:
+        shards = [{
+            "Index": 0,
+            "JobName": model_name,
+            "DataUri": event["DataUri"],
+            "ResultsUri": results_uri,
+        }]
+    else:
+        objects = list_objects(event["DataUri"])
+        if not objects:
+            raise ValueError(f"No test data found under {event['DataUri']}")
+        shard_root_uri = event["ShardRootUri"]
+        if not shard_root_uri.endswith("/"):
+            shard_root_uri += "/"
+        dest_bucket, dest_prefix = bucket_and_key_from_s3_uri(shard_root_uri)
+        shards = []
+        for ix, segments in enumerate(plan_segments(objects, options["ShardCount"])):
+            shard_prefix = f"{dest_prefix}shard-{ix:05d}/"
+            for segment_ix, (obj, start, end) in enumerate(segments):
+                dest_key = f"{shard_prefix}{segment_ix:05d}-{os.path.basename(obj['Key'])}"
+                copy_segment(obj, start, end, dest_bucket, dest_key)
+            shards.append({
+                "Index": ix,
+                "JobName": f"{model_name}-{ix}",
+                "DataUri": f"s3://{dest_bucket}/{shard_prefix}",
+                "ResultsUri": f"{results_uri}shard-{ix:05d}/",
+            })
+        logger.info(f"Split {len(objects)} test data objects into {len(shards)} shards")
+
+    options["ShardCount"] = len(shards)
+    options["Shards"] = shards
+    return options
@@ -1,12 +1,58 @@
-"""Lambda function to check current endpoint status and prepare for a (canary) deployment"""
+"""Lambda function to check current endpoint status and prepare for a (canary) deployment
+
+Endpoint configs are named from a hash of their content, as `{EndpointName}-{target|canary}-{hash}`, and
+re-used if they already exist (see util.endpoint_configs).
+
+The new model's instance type and count can be right-sized from load test profiles (see util.sizing), given
+in the execution input's optional `Deployment` object:
+
+    {
+        "ProfilesUri": "s3://.../loadtests/",  # loadtest.py reports (.json), and/or inline "Profiles": [...]
+        "TargetP99Ms": 100,
+        "PeakRps": 50,
+        "TargetUtilization": 0.7,
+        "MinInstanceCount": 1,
+        "MaxInstanceCount": 4,
+        "InstanceTypes": ["ml.c5.large", "ml.m5.large"],  # (Optional allow-list)
+        "InstancePrices": { "ml.c5.large": 0.119 }        # (Optional USD/hour overrides)
+    }
+
+Without profiles and objectives, `Deployment.InstanceType` and `InstanceCount` are used, or the defaults.
+The decision, with every candidate considered, is returned as `Sizing`.
+
+`Deployment.Mode` selects how the model is hosted, for both the target and canary configs:
+
+- "RealTime" (default): Instance-backed variants, sized as above.
+- "Serverless": Pay-per-request Serverless Inference, with options `MemorySizeInMB`, `MaxConcurrency`,
+  `ProvisionedConcurrency` and `MaxColdStartMs`. No instance sizing or data capture.
+- "Async": Asynchronous Inference on instances sized as above, with options `S3OutputPath`,
+  `S3FailurePath`, `MaxConcurrentInvocationsPerInstance` and `ScaleToZero` (applied by
+  configure-autoscaling).
+
+Cold-start-sensitive settings come from the candidate's measured load time and memory footprint, in the
+performance gate's benchmark.json (override with `Deployment.ModelLoadMs` and `ModelMemoryMB`): Serverless
+memory size, provisioned concurrency when a cold start would exceed MaxColdStartMs, and otherwise a longer
+container startup health check timeout if the model loads too slowly for SageMaker's default (which is never
+lowered). An existing endpoint can't change mode in place, so that fails early. The
+resolved settings are returned as `Mode`.
+
+Data capture samples a percentage of requests chosen by util.sampling, aiming for a target number of captured
+records per hour given the existing endpoint's recent traffic (if any). Its options come from the execution
+input's optional `DataCapture` object (see util.sampling.DEFAULT_SAMPLING_OPTIONS), and the decision is
+returned as `CaptureSampling`. The tune-data-capture function keeps adjusting it between deployments.
+
+When replacing an existing model, the canary config starts the new variant at the first step of the rollout
+schedule. The shift-traffic function then moves through the rest of the schedule. Its options come from the
+execution input's optional `Rollout` object (see DEFAULT_ROLLOUT), and are returned as `Rollout`.
+"""
 
 # Python Built-Ins:
+from datetime import datetime, timedelta, timezone
 import json
 import logging
 import os
 
 # External Dependencies:
-import boto3
 from botocore import exceptions as botoexceptions
 
 # Fix logging in Lambda functions (before any local imports)
@@ -22,15 +68,232 @@ import util
 
 logger = logging.getLogger()
 
-smclient = boto3.client("sagemaker")
 monitoring_bucket = os.environ["MONITORING_BUCKET"]
 
+DEFAULT_INSTANCE_TYPE = "ml.g4dn.xlarge"
+DEFAULT_INSTANCE_COUNT = 1
+DEPLOYMENT_MODES = ("RealTime", "Serverless", "Async")
+DEFAULT_SERVERLESS_MAX_CONCURRENCY = 5
+DEFAULT_ASYNC_MAX_CONCURRENT_INVOCATIONS = 4
+DEFAULT_ROLLOUT = {
+    # Percentage of traffic to the new variant at each step:
+    "Schedule": [5, 25, 50, 100],
+    # How long to watch metrics at each step before moving on:
+    "BakeSeconds": 300,
+    "Guardrails": {
+        # New variant's p99 ModelLatency may be at most this multiple of the existing variant's:
+        "MaxLatencyRatio": 1.25,
+        # Optional absolute p99 ModelLatency limit for the new variant:
+        "MaxP99Ms": None,
+        # New variant's 5XX error rate may be at most this much higher than the existing variant's:
+        "MaxErrorRateIncrease": 0.01,
+        # Fewer invocations than this in a step is too little data to judge (so the step passes):
+        "MinInvocations": 100,
+    },
+}
+
+
+def bucket_and_key_from_s3_uri(s3uri):
+    assert isinstance(s3uri, str) and s3uri.lower().startswith("s3://"), (
+        f"s3uri must be a string beginning with 's3://': Got {s3uri}"
+    )
+    bucket, _, key = s3uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def load_profiles(profiles_uri):
+    """Load all load test report (.json) objects under an S3 prefix"""
+    bucket, prefix = bucket_and_key_from_s3_uri(profiles_uri)
+    s3 = util.client("s3")
+    profiles = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith(".json"):
+                profiles.append(json.loads(s3.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read()))
+    logger.info(f"Loaded {len(profiles)} load test profiles from {profiles_uri}")
+    return profiles
+
+
+def size_instances(options):
+    """Choose the new variant's instance type and count from the `Deployment` execution input options"""
+    profiles = list(options.get("Profiles") or [])
+    if options.get("ProfilesUri"):
+        profiles += load_profiles(options["ProfilesUri"])
+    if not (profiles and options.get("TargetP99Ms") and options.get("PeakRps")):
+        return {
+            "InstanceType": options.get("InstanceType", DEFAULT_INSTANCE_TYPE),
+            "InstanceCount": int(options.get("InstanceCount", DEFAULT_INSTANCE_COUNT)),
+            "Source": "Fixed",
+        }
+
+    decision = util.sizing.choose_instances(
+        profiles,
+        target_p99_ms=float(options["TargetP99Ms"]),
+        peak_rps=float(options["PeakRps"]),
+        target_utilization=float(
+            options.get("TargetUtilization", util.sizing.DEFAULT_TARGET_UTILIZATION)
+        ),
+        min_instance_count=int(options.get("MinInstanceCount", 1)),
+        max_instance_count=options.get("MaxInstanceCount"),
+        instance_types=options.get("InstanceTypes"),
+        prices=options.get("InstancePrices"),
+    )
+    if decision["InstanceType"] is None:
+        raise ValueError("".join([
+            f"No profiled instance type can serve {options['PeakRps']} req/s within p99 ",
+            f"{options['TargetP99Ms']}ms: ",
+            "; ".join(f"{c['InstanceType']}: {c['Rejected']}" for c in decision["Candidates"]),
+        ]))
+    decision["Source"] = "Profiles"
+    logger.info(
+        f"Sized to {decision['InstanceCount']}x {decision['InstanceType']} (${decision['HourlyCost']}/hr)"
+    )
+    return decision
+
+
+def load_footprint(event, options):
+    """Measured model load time & memory, from the candidate's benchmark.json and/or Deployment overrides"""
+    benchmark = {}
+    results_uri = (event.get("Benchmark") or {}).get("ResultsUri")
+    if results_uri:
+        bucket, key = bucket_and_key_from_s3_uri(f"{results_uri}benchmark.json")
+        try:
+            benchmark = json.loads(util.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read())
+        except botoexceptions.ClientError as err:
+            if err.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+                raise err
+            logger.warning(f"No benchmark results at {results_uri}: Model footprint unknown")
+    footprint = {
+        "ModelLoadMs": benchmark.get("model_load_ms"),
+        "ModelRssBytes": benchmark.get("model_rss_bytes"),
+        "ColdFirstRequestMs": benchmark.get("cold_first_request_ms"),
+    }
+    if options.get("ModelLoadMs") is not None:
+        footprint["ModelLoadMs"] = float(options["ModelLoadMs"])
+    if options.get("ModelMemoryMB") is not None:
+        footprint["ModelRssBytes"] = int(float(options["ModelMemoryMB"]) * 2**20)
+    return footprint
+
+
+def resolve_mode(endpoint_name, options, footprint):
+    """Hosting settings for the `Deployment.Mode`, with cold-start-sensitive ones sized from the footprint"""
+    mode = {
+        "Mode": options.get("Mode", "RealTime"),
+        "Footprint": footprint,
+        "ServerlessConfig": None,
+        "AsyncInferenceConfig": None,
+        "ContainerStartupHealthCheckTimeoutInSeconds": None,
+        "ScaleToZero": False,
+    }
+    if mode["Mode"] not in DEPLOYMENT_MODES:
+        raise ValueError(f"Deployment.Mode must be one of {DEPLOYMENT_MODES}: Got {mode['Mode']}")
+
+    if mode["Mode"] == "Serverless":
+        serverless_config = {
+            "MemorySizeInMB": int(options.get("MemorySizeInMB") or util.sizing.serverless_memory_size(
+                footprint["ModelRssBytes"], min_memory_mb=options.get("MinMemorySizeInMB")
+            )),
+            "MaxConcurrency": int(options.get("MaxConcurrency", DEFAULT_SERVERLESS_MAX_CONCURRENCY)),
+        }
+        cold_start_ms = (footprint["ModelLoadMs"] or 0) + (footprint["ColdFirstRequestMs"] or 0)
+        provisioned = options.get("ProvisionedConcurrency")
+        max_cold_start_ms = options.get("MaxColdStartMs")
+        if provisioned is None and max_cold_start_ms and cold_start_ms > max_cold_start_ms:
+            logger.info(f"Measured cold start {cold_start_ms:.0f}ms > MaxColdStartMs: Provisioning 1")
+            provisioned = 1
+        if provisioned:
+            serverless_config["ProvisionedConcurrency"] = min(
+                int(provisioned), serverless_config["MaxConcurrency"]
+            )
+        mode["ServerlessConfig"] = serverless_config
+        return mode
+
+    mode["ContainerStartupHealthCheckTimeoutInSeconds"] = util.sizing.startup_timeout_seconds(
+        footprint["ModelLoadMs"]
+    )
+    if mode["Mode"] == "Async":
+        output_path = options.get("S3OutputPath") or f"s3://{monitoring_bucket}/async/{endpoint_name}/output"
+        mode["AsyncInferenceConfig"] = {
+            "OutputConfig": {
+                "S3OutputPath": output_path,
+                "S3FailurePath": options.get("S3FailurePath") or f"{output_path.rstrip('/')}-failures",
+            },
+            "ClientConfig": {
+                "MaxConcurrentInvocationsPerInstance": int(options.get(
+                    "MaxConcurrentInvocationsPerInstance", DEFAULT_ASYNC_MAX_CONCURRENT_INVOCATIONS
+                )),
+            },
+        }
+        mode["ScaleToZero"] = bool(options.get("ScaleToZero", True))
+    return mode
+
+
+def existing_mode(endpoint_config_desc):
+    if endpoint_config_desc.get("AsyncInferenceConfig"):
+        return "Async"
+    elif any(v.get("ServerlessConfig") for v in endpoint_config_desc["ProductionVariants"]):
+        return "Serverless"
+    else:
+        return "RealTime"
+
+
+def apply_mode(variant_config, mode):
+    """Adapt an (instance-backed) production variant config to the deployment mode, in place"""
+    if mode["ServerlessConfig"]:
+        variant_config.pop("InstanceType", None)
+        variant_config.pop("InitialInstanceCount", None)
+        variant_config["ServerlessConfig"] = dict(mode["ServerlessConfig"])
+    elif mode["ContainerStartupHealthCheckTimeoutInSeconds"]:
+        variant_config["ContainerStartupHealthCheckTimeoutInSeconds"] = (
+            mode["ContainerStartupHealthCheckTimeoutInSeconds"]
+        )
+    return variant_config
+
+
+def capture_sampling(endpoint_name, endpoint_desc, endpoint_config_desc, options):
+    """Decide the data capture sampling percentage from the existing endpoint's recent traffic (if any)"""
+    options = util.sampling.resolve_options(options)
+    current = None
+    hourly_invocations = []
+    if endpoint_desc is not None:
+        capture = endpoint_config_desc.get("DataCaptureConfig") or {}
+        if capture.get("EnableCapture"):
+            current = capture["InitialSamplingPercentage"]
+        end = datetime.now(timezone.utc)
+        hourly_invocations = util.metrics.CloudWatchVariantMetrics().hourly_invocations(
+            endpoint_name,
+            endpoint_desc["ProductionVariants"][0]["VariantName"],
+            end - timedelta(hours=options["LookbackHours"]),
+            end,
+        )
+    decision = util.sampling.decide_sampling(hourly_invocations, current, options)
+    logger.info(f"Capture sampling decision: {json.dumps(decision)}")
+    return decision
+
+
+def resolve_rollout(options):
+    """Merge Rollout execution input over defaults, and validate"""
+    rollout = json.loads(json.dumps(DEFAULT_ROLLOUT))
+    rollout["Guardrails"].update(options.get("Guardrails") or {})
+    rollout.update({ k: v for k, v in options.items() if k != "Guardrails" })
+    schedule = [float(pct) for pct in rollout["Schedule"]]
+    if not schedule or schedule[-1] != 100 or any(
+        not 0 < pct <= 100 or (ix and pct <= schedule[ix - 1]) for ix, pct in enumerate(schedule)
+    ):
+        raise ValueError(f"Rollout.Schedule must be increasing percentages ending at 100: Got {schedule}")
+    rollout["Schedule"] = schedule
+    rollout["BakeSeconds"] = int(rollout["BakeSeconds"])
+    return rollout
+
+
 def handler(event, context):
     """Lambda handler to check current endpoint status and prepare configs for a (canary) deployment"""
     logger.info(event)
 
     endpoint_name = event["EndpointName"]
     target_model_name = event["ModelRegistration"]["ModelName"]
+    smclient = util.client("sagemaker")
     result = {}
 
     # Check if the endpoint exists at all:
@@ -59,12 +322,28 @@ def handler(event, context):
         return { "Status": "Testing" }
     else:
         result["Status"] = "Ready"
+    existing_endpoint_config = None if endpoint_desc is None else smclient.describe_endpoint_config(
+        EndpointConfigName=endpoint_desc["EndpointConfigName"]
+    )
+
+    # Resolve the hosting mode, and size the new variant (so an impossible target fails here, before any
+    # config is created):
+    deployment_options = event.get("Deployment") or {}
+    mode = resolve_mode(endpoint_name, deployment_options, load_footprint(event, deployment_options))
+    result["Mode"] = mode
+    if mode["Mode"] == "Serverless":
+        sizing = { "InstanceType": None, "InstanceCount": None, "Source": "Serverless" }
+    else:
+        sizing = size_instances(deployment_options)
+    result["Sizing"] = sizing
 
     # OK Now we're ready to start creating our target (and maybe canary) configurations:
-    # TODO: Add some parameter controls on data capture?
+    result["CaptureSampling"] = capture_sampling(
+        endpoint_name, endpoint_desc, existing_endpoint_config, event.get("DataCapture") or {}
+    )
     data_capture_config = {
         "EnableCapture": True,
-        "InitialSamplingPercentage": 50, # TODO: Parameterize & evolve?
+        "InitialSamplingPercentage": result["CaptureSampling"]["SamplingPercentage"],
         # A subfolder for endpoint name will automatically get created:
         "DestinationS3Uri": f"s3://{monitoring_bucket}/capture",
         "CaptureContentTypeHeader": {
@@ -78,30 +357,19 @@ def handler(event, context):
             { "CaptureMode": "Output" },
         ],
     }
+    if mode["Mode"] == "Serverless":
+        # (Serverless endpoints don't support data capture)
+        data_capture_config = None
 
     # Target end-state variant for our new model, at 100% of traffic:
     target_variant_config = {
-        "InitialInstanceCount": 1,  # TODO: Parameterize
+        "InitialInstanceCount": sizing["InstanceCount"],
         "InitialVariantWeight": 1.0,
-        "InstanceType": "ml.g4dn.xlarge",  # TODO: Parameterize
+        "InstanceType": sizing["InstanceType"],
         "ModelName": target_model_name,
         "VariantName": "blue",  # A starting assumption - we'll override below if needed
     }
-
-    # End-state endpoint configuration:
-    target_endpoint_config_name = util.append_timestamp(f"{endpoint_name}-target")
-    target_config_create_response = smclient.create_endpoint_config(
-        EndpointConfigName=target_endpoint_config_name,
-        ProductionVariants=[target_variant_config],
-        DataCaptureConfig=data_capture_config,
-        Tags=[
-            { "Key": "PipelineConfigType", "Value": "Target" },
-        ],
-    )
-    result["TargetEndpointConfig"] = {
-        "Arn": target_config_create_response["EndpointConfigArn"],
-        "Name": target_endpoint_config_name,
-    }
+    apply_mode(target_variant_config, mode)
 
     # If an existing model is deployed, we'll also need to create an interim (canary monitoring) config:
     if endpoint_desc is not None:
@@ -111,9 +379,11 @@ def handler(event, context):
         existing_variant_name = existing_variant_summary["VariantName"]
         if existing_variant_name == "blue":
             target_variant_config["VariantName"] = "green"
-        existing_endpoint_config = smclient.describe_endpoint_config(
-            EndpointConfigName=endpoint_desc["EndpointConfigName"]
-        )
+        if existing_mode(existing_endpoint_config) != mode["Mode"]:
+            raise ValueError(
+                f"Endpoint '{endpoint_name}' is {existing_mode(existing_endpoint_config)}, and can't be "
+                f"updated in place to {mode['Mode']}: Deploy to a new EndpointName instead"
+            )
         try:
             # Variant names should be unique, so we'll cross-reference from the DescribeEndpoint:
             existing_variant_config = next(
@@ -132,24 +402,43 @@ def handler(event, context):
         # Now we've fetched the extra information, we can construct the new canary-period Variant configs for
         # the existing and new models:
         existing_variant_interim = json.loads(json.dumps(existing_variant_config))
-        existing_variant_interim["InitialInstanceCount"] = existing_variant_summary["CurrentInstanceCount"]
-        existing_variant_interim["InitialVariantWeight"] = 0.9  # TODO: Make canary pct configurable?
+        if "InstanceType" in existing_variant_interim:
+            # (Async endpoints scaled to zero still need an instance to start the canary config)
+            existing_variant_interim["InitialInstanceCount"] = max(
+                1, existing_variant_summary.get("CurrentInstanceCount", 1)
+            )
+        rollout = resolve_rollout(event.get("Rollout") or {})
         new_variant_interim = json.loads(json.dumps(target_variant_config))
-        new_variant_interim["InitialVariantWeight"] = 1. - existing_variant_interim["InitialVariantWeight"]
-
-        interim_endpoint_config_name = util.append_timestamp(f"{endpoint_name}-canary")
-        interim_config_create_response = smclient.create_endpoint_config(
-            EndpointConfigName=interim_endpoint_config_name,
-            ProductionVariants=[existing_variant_interim, new_variant_interim],
-            DataCaptureConfig=data_capture_config,
-            Tags=[
-                { "Key": "PipelineConfigType", "Value": "Target" },
-            ],
+        new_variant_interim["InitialVariantWeight"] = rollout["Schedule"][0] / 100
+        existing_variant_interim["InitialVariantWeight"] = 1. - new_variant_interim["InitialVariantWeight"]
+
+        result["CanaryEndpointConfig"] = util.endpoint_configs.ensure_endpoint_config(
+            smclient,
+            endpoint_name,
+            "canary",
+            [existing_variant_interim, new_variant_interim],
+            data_capture_config,
+            mode["AsyncInferenceConfig"],
         )
-        result["CanaryEndpointConfig"] = {
-            "Arn": interim_config_create_response["EndpointConfigArn"],
-            "Name": interim_endpoint_config_name,
-        }
+        rollout.update({
+            "StepIndex": 0,
+            "NewVariant": new_variant_interim["VariantName"],
+            "BaselineVariant": existing_variant_name,
+            # (To restore if the rollout is rolled back)
+            "PreviousEndpointConfig": endpoint_desc["EndpointConfigName"],
+        })
+        result["Rollout"] = rollout
+
+    # End-state endpoint configuration (now the variant name is settled):
+    result["TargetEndpointConfig"] = util.endpoint_configs.ensure_endpoint_config(
+        smclient,
+        endpoint_name,
+        "target",
+        [target_variant_config],
+        data_capture_config,
+        mode["AsyncInferenceConfig"],
+    )
+    result["TargetVariantName"] = target_variant_config["VariantName"]
 
     # We've now prepped an endpoint config for target state, and for interim canary state if appropriate:
     logger.info(result)
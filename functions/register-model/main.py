@@ -1,20 +1,35 @@
 """Lambda function to register a model from sandbox to project"""
 
 # Python Built-Ins:
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import hashlib
 import io
 import json
 import os
 
 # External Dependencies:
-import boto3
+from boto3.s3.transfer import TransferConfig
 
 # Local Dependencies:
 import util
 
 bucket_name = os.environ["PROJECT_BUCKET"]
-bucket = boto3.resource("s3").Bucket(bucket_name)
-smclient = boto3.client("sagemaker")
+# Enough connections for every part of every artifact copy to run at once:
+MAX_PARALLEL_ARTIFACTS = 4
+transfer_config = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=16,
+)
+
+
+def project_bucket():
+    """The project Bucket (resource), with enough pooled connections for concurrent artifact copies"""
+    return util.resource(
+        "s3",
+        max_pool_connections=MAX_PARALLEL_ARTIFACTS * transfer_config.max_request_concurrency,
+    ).Bucket(bucket_name)
 
 
 def bucket_and_key_from_s3_uri(s3uri):
@@ -26,7 +41,7 @@ def bucket_and_key_from_s3_uri(s3uri):
 
 
 def promote_model_container(container_def, new_data_uri, new_submit_uri=None):
-    """Copy a container definition into a new environment"""
+    """Copy a container definition into a new environment (e.g. pointing at artifacts in the blob store)"""
     result = json.loads(json.dumps(container_def))
     # TODO: Any changes to "Image"?
     result["ModelDataUrl"] = new_data_uri
@@ -48,12 +63,144 @@ def promote_model_container(container_def, new_data_uri, new_submit_uri=None):
     return result
     
 
+def describe_source(s3uri):
+    """Get the bucket, key, ETag, size and any already-recorded SHA-256 of a source artifact"""
+    source_bucket, source_key = bucket_and_key_from_s3_uri(s3uri)
+    head = project_bucket().meta.client.head_object(Bucket=source_bucket, Key=source_key)
+    return {
+        "Uri": s3uri,
+        "Bucket": source_bucket,
+        "Key": source_key,
+        "ETag": head["ETag"],
+        "Size": head["ContentLength"],
+        "Sha256": util.blobs.recorded_sha256(head),
+    }
+
+
+def blob_exists(key):
+    s3client = project_bucket().meta.client
+    try:
+        s3client.head_object(Bucket=bucket_name, Key=key)
+        return True
+    except s3client.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def store_artifact(name, source):
+    """Store a source artifact in the content-addressed blob store, copying it only if not already present
+
+    The digest comes from the ETag index, or else from the source's own `sha256` metadata, and the source is
+    only streamed to hash it when neither has it. Re-using a stored blob refreshes its LastModified, so that
+    collect-garbage's grace period runs from this registration rather than from the original copy.
+
+    Returns
+    -------
+    sha256 : str
+        Hex digest of the artifact content
+    key : str
+        Blob object key in the project bucket
+    copied : bool
+        False if the content was already stored
+    """
+    bucket = project_bucket()
+    s3client = bucket.meta.client
+    sha256 = util.blobs.lookup_index(s3client, bucket_name, source["ETag"], source["Size"])
+    indexed = sha256 is not None
+    if not indexed:
+        sha256 = source["Sha256"] or util.blobs.hash_object(s3client, source["Bucket"], source["Key"])
+    key = util.blobs.blob_key(sha256, util.blobs.artifact_suffix(name))
+
+    copied = not blob_exists(key)
+    if copied:
+        bucket.copy(
+            { "Bucket": source["Bucket"], "Key": source["Key"] },
+            key,
+            ExtraArgs={
+                # (Fail rather than store content not matching the key, if the source changed since hashing)
+                "CopySourceIfMatch": source["ETag"],
+                "Metadata": { "sha256": sha256 },
+                "MetadataDirective": "REPLACE",
+            },
+            Config=transfer_config,
+        )
+    else:
+        print(f"Skipping copy of {source['Uri']}: Already stored as {key}")
+        bucket.copy(
+            { "Bucket": bucket_name, "Key": key },
+            key,
+            ExtraArgs={ "Metadata": { "sha256": sha256 }, "MetadataDirective": "REPLACE" },
+            Config=transfer_config,
+        )
+    if not indexed:
+        util.blobs.record_index(s3client, bucket_name, source["ETag"], source["Size"], sha256)
+    return sha256, key, copied
+
+
+def promote_artifacts(sources):
+    """Store artifacts {filename: source s3 URI or None} in the blob store concurrently, de-duplicating
+
+    Sources with identical ETag and size are only hashed/copied once, and any content already in the blob
+    store is not copied again.
+
+    Returns
+    -------
+    artifacts : dict
+        {filename: {Uri, Sha256, Source, ETag, Size, Copied}} for each non-None source, where Uri is the blob
+    """
+    names = [name for name, uri in sources.items() if uri is not None]
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_ARTIFACTS) as executor:
+        described = dict(zip(names, executor.map(lambda n: describe_source(sources[n]), names)))
+
+        first_by_content = {}
+        for name in names:
+            first_by_content.setdefault((described[name]["ETag"], described[name]["Size"]), name)
+        unique_names = list(first_by_content.values())
+        stored = dict(zip(
+            unique_names,
+            executor.map(lambda n: store_artifact(n, described[n]), unique_names),
+        ))
+
+    artifacts = {}
+    for name in names:
+        source = described[name]
+        original = first_by_content[(source["ETag"], source["Size"])]
+        sha256, key, copied = stored[original]
+        artifacts[name] = {
+            "Uri": f"s3://{bucket_name}/{key}",
+            "Sha256": sha256,
+            "Source": source["Uri"],
+            "ETag": source["ETag"],
+            "Size": source["Size"],
+            "Copied": copied and original == name,
+        }
+    n_copied = sum(a["Copied"] for a in artifacts.values())
+    print(f"Copied {n_copied} of {len(names)} artifacts to the blob store ({len(names) - n_copied} re-used)")
+    return artifacts
+
+
+def model_fingerprint(container_def, digests):
+    """Content fingerprint of a model: Its image, non-S3 environment, and the SHA-256 of its S3 artifacts
+
+    Registering the same trained model twice gives the same fingerprint, so downstream steps can re-use
+    results keyed on it (see test-results-cache).
+    """
+    env = {
+        k: v for k, v in container_def.get("Environment", {}).items()
+        if k != "SAGEMAKER_SUBMIT_DIRECTORY"
+    }
+    spec = { "Image": container_def["Image"], "Environment": env, "Sha256": digests }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 def handler(event, context):
     print(event)
 
     training_job_name = event["TrainingJob"]["TrainingJobName"]
     trial_name = event["TrainingJob"]["ExperimentConfig"]["TrialName"]
 
+    smclient = util.client("sagemaker")
     trial_desc = smclient.describe_trial(TrialName=trial_name)
     experiment_name = trial_desc["ExperimentName"]
 
@@ -62,50 +209,29 @@ def handler(event, context):
 
     folder = f"models/{experiment_name}/{trial_name}"
 
+    bucket = project_bucket()
     bucket.upload_fileobj(io.BytesIO(json.dumps(event).encode("utf-8")), f"{folder}/request.json")
 
     # Copy the artifacts from sandbox to project
     # (Note training job output model.tar.gz might differ from registered model object model.tar.gz because
     # of additional code/ folder... We'll store both but use the latter for our model.)
-    trainmodeltar_bucket_name, trainmodeltar_key = bucket_and_key_from_s3_uri(
-        event["TrainingJob"]["ModelArtifacts"]["S3ModelArtifacts"]
-    )
-    bucket.copy(
-        { "Bucket": trainmodeltar_bucket_name, "Key": trainmodeltar_key },
-        f"{folder}/model-train.tar.gz"
-    )
-    modeltar_bucket_name, modeltar_key = bucket_and_key_from_s3_uri(
-        event["Model"]["PrimaryContainer"]["ModelDataUrl"]
-    )
-    bucket.copy(
-        { "Bucket": modeltar_bucket_name, "Key": modeltar_key },
-        f"{folder}/model.tar.gz"
-    )
-    target_modeltar_uri = f"s3://{bucket_name}/{folder}/model.tar.gz"
-    if "sagemaker_submit_directory" in event["TrainingJob"]["HyperParameters"]:
-        traintar_bucket_name, traintar_key = bucket_and_key_from_s3_uri(
-            # Hyperparams are JSON encoded to support non-string types (i.e. with "" wrapper)
-            json.loads(event["TrainingJob"]["HyperParameters"]["sagemaker_submit_directory"])
-        )
-        bucket.copy(
-            { "Bucket": traintar_bucket_name, "Key": traintar_key },
-            f"{folder}/train-sourcedir.tar.gz"
-        )
-        target_traintar_uri = f"s3://{bucket_name}/{folder}/train-sourcedir.tar.gz"
-    else:
-        target_traintar_uri = None
+    hyperparams = event["TrainingJob"]["HyperParameters"]
     # TODO: Multi-container support
-    if "SAGEMAKER_SUBMIT_DIRECTORY" in event["Model"]["PrimaryContainer"]["Environment"]:
-        inftar_bucket_name, inftar_key = bucket_and_key_from_s3_uri(
-            event["Model"]["PrimaryContainer"]["Environment"]["SAGEMAKER_SUBMIT_DIRECTORY"]
-        )
-        bucket.copy(
-            { "Bucket": inftar_bucket_name, "Key": inftar_key },
-            f"{folder}/inference.tar.gz"
-        )
-        target_inftar_uri = f"s3://{bucket_name}/{folder}/inference.tar.gz"
-    else:
-        target_inftar_uri = None
+    container_env = event["Model"]["PrimaryContainer"].get("Environment", {})
+    artifacts = promote_artifacts(
+        {
+            "model-train.tar.gz": event["TrainingJob"]["ModelArtifacts"]["S3ModelArtifacts"],
+            "model.tar.gz": event["Model"]["PrimaryContainer"]["ModelDataUrl"],
+            # Hyperparams are JSON encoded to support non-string types (i.e. with "" wrapper)
+            "train-sourcedir.tar.gz": json.loads(hyperparams["sagemaker_submit_directory"])
+                if "sagemaker_submit_directory" in hyperparams else None,
+            "inference.tar.gz": container_env.get("SAGEMAKER_SUBMIT_DIRECTORY"),
+        },
+    )
+    # The model will point directly at the (shared, content-addressed) blobs:
+    target_modeltar_uri = artifacts["model.tar.gz"]["Uri"]
+    target_traintar_uri = artifacts.get("train-sourcedir.tar.gz", {}).get("Uri")
+    target_inftar_uri = artifacts.get("inference.tar.gz", {}).get("Uri")
 
     # TODO: Check training job and model use same model.tar.gz, and maybe S3 modification datetime?
 
@@ -143,7 +269,33 @@ def handler(event, context):
         #  "Subnets": [ "string" ]
         #}
     )
+    fingerprint = model_fingerprint(
+        event["Model"]["PrimaryContainer"],
+        [artifacts["model.tar.gz"]["Sha256"], artifacts.get("inference.tar.gz", {}).get("Sha256")],
+    )
+
+    # The per-registration manifest is what keeps its blobs from garbage collection (see collect-garbage):
+    manifest_key = f"{folder}/{util.blobs.MANIFESTS_DIR}/{target_model_name}.json"
+    bucket.upload_fileobj(
+        io.BytesIO(json.dumps({
+            "ModelName": target_model_name,
+            "ModelArn": create_model_response["ModelArn"],
+            "TrainingJobName": training_job_name,
+            "ModelFingerprint": fingerprint,
+            "CreatedAt": datetime.utcnow().isoformat() + "Z",
+            "Artifacts": artifacts,
+        }).encode("utf-8")),
+        manifest_key,
+    )
+
     return {
         "ModelArn": create_model_response["ModelArn"],
         "ModelName": target_model_name,
+        # Enough to run the model's own code in other jobs (e.g. offline batch scoring in the pipeline):
+        "Image": event["Model"]["PrimaryContainer"]["Image"],
+        "ModelDataUrl": target_modeltar_uri,
+        "SourceDirUrl": target_inftar_uri or target_traintar_uri,
+        "ModelFingerprint": fingerprint,
+        "ManifestUri": f"s3://{bucket_name}/{manifest_key}",
+        "AlreadyStored": not any(a["Copied"] for a in artifacts.values()),
     }
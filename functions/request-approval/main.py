@@ -7,9 +7,6 @@ import os
 from string import Template
 import urllib
 
-# External Dependencies:
-import boto3
-
 # Fix logging in Lambda functions (before any local imports)
 rootlogger = logging.getLogger()
 if rootlogger.handlers:
@@ -23,16 +20,70 @@ import util
 
 logger = logging.getLogger()
 
-botosess = boto3.session.Session()
-region_name = botosess.region_name
-ses = botosess.client("ses")
-sfn = botosess.client("stepfunctions")
-sns = botosess.client("sns")
-
 with open("email.tpl.html", "r") as f:
     email_template = Template(f.read())
 
 
+def format_score(evaluation):
+    """Format the headline score from an evaluate-model Metrics object (if provided) for display"""
+    if not evaluation or evaluation.get("Accuracy") is None:
+        return "Not available"
+    return "{:.2%} (on {} records)".format(evaluation["Accuracy"], evaluation["Records"])
+
+
+def format_details_html(evaluation):
+    """Format per-class precision/recall and calibration from an evaluate-model Metrics object as HTML"""
+    if not evaluation:
+        return ""
+    fmt = lambda v: "-" if v is None else "{:.2%}".format(v)
+    rows = "".join(
+        f"<tr><td>{label}</td><td>{fmt(c['Precision'])}</td><td>{fmt(c['Recall'])}</td>"
+        f"<td>{c['Support']}</td></tr>"
+        for label, c in evaluation["PerClass"].items()
+    )
+    return "".join([
+        "<table cellspacing=\"0\" cellpadding=\"4\" border=\"1\">",
+        "<tr><th>Class</th><th>Precision</th><th>Recall</th><th>Support</th></tr>",
+        rows,
+        "</table>",
+        "<p><b>Expected Calibration Error:</b> {}</p>".format(
+            fmt(evaluation.get("ExpectedCalibrationError"))
+        ),
+    ])
+
+
+def format_performance(performance):
+    """Format the headline result of a check-performance comparison (if provided) for display"""
+    if not performance:
+        return "Not available"
+    if not performance.get("HasBaseline"):
+        return "No baseline to compare with (first benchmarked model)"
+    if performance["Passed"]:
+        return f"No regressions vs {performance['BaselineModelName']}"
+    return "REGRESSED vs {}: {}".format(
+        performance["BaselineModelName"], "; ".join(performance["Regressions"])
+    )
+
+
+def format_performance_html(performance):
+    """Format per-batch-size latency/throughput from a check-performance comparison as HTML"""
+    if not performance or not performance.get("BatchSizes"):
+        return ""
+    fmt = lambda v: "-" if v is None else "{:,.1f}".format(v)
+    rows = "".join(
+        f"<tr><td>{batch_size}</td><td>{fmt(b['CandidateP99Ms'])}</td><td>{fmt(b['BaselineP99Ms'])}</td>"
+        f"<td>{fmt(b['CandidateRowsPerSec'])}</td><td>{fmt(b['BaselineRowsPerSec'])}</td></tr>"
+        for batch_size, b in sorted(performance["BatchSizes"].items(), key=lambda item: int(item[0]))
+    )
+    return "".join([
+        "<table cellspacing=\"0\" cellpadding=\"4\" border=\"1\">",
+        "<tr><th>Batch Size</th><th>p99 ms (new)</th><th>p99 ms (live)</th>",
+        "<th>Rows/sec (new)</th><th>Rows/sec (live)</th></tr>",
+        rows,
+        "</table>",
+    ])
+
+
 def handler(event, context):
     """Lambda to send approval emails from Step Functions events"""
     logger.info(f"Got event {event}")
@@ -40,6 +91,7 @@ def handler(event, context):
     execution_context = event["ExecutionContext"]
 
     # (This part is only really for generating a nice AWS Console URL)
+    region_name = util.clients.region_name()
     execution_name = execution_context["Execution"]["Name"]
     lambda_arn_tokens = context.invoked_function_arn.split(":")
     partition = lambda_arn_tokens[1]
@@ -78,13 +130,18 @@ def handler(event, context):
     manager_email = event.get("ManagerEmailAddress")
     sns_topic = event.get("EmailTopic")
     timeout_description = event["TimeoutDescription"]
+    model_name = event.get("ModelName", "Unknown")
+    evaluation = event.get("Evaluation")
+    model_score = format_score(evaluation)
+    performance = event.get("Performance")
+    performance_summary = format_performance(performance)
 
     if manager_email:
         # If an email address is provided, try it first because we can send richer (HTML) content:
         try:
             no_reply_email = "no-reply@" + manager_email.partition("@")[2]  # At same domain
             logger.info("Sending email...")
-            ses.send_email(
+            util.client("ses").send_email(
                 Source=manager_email,  # Tag as from self
                 ReplyToAddresses=[no_reply_email],
                 Destination={ "ToAddresses": [manager_email] },
@@ -99,8 +156,11 @@ def handler(event, context):
                             "Data": email_template.safe_substitute({
                                 "ApproveLink": approval_uri,
                                 "RejectLink": rejection_uri,
-                                "ModelName": "TODO",
-                                "ModelScore": "TODO",
+                                "ModelName": model_name,
+                                "ModelScore": model_score,
+                                "EvaluationDetails": format_details_html(evaluation),
+                                "Performance": performance_summary,
+                                "PerformanceDetails": format_performance_html(performance),
                                 "Timeout": timeout_description,
                                 "DetailsUrl": details_url,
                             }),
@@ -119,13 +179,15 @@ def handler(event, context):
                 raise e
 
     # Fallback option: SNS notification
-    sns_response = sns.publish(
+    sns_response = util.client("sns").publish(
         TopicArn=sns_topic,
         Subject="Your approval needed for model deployment",
         Message="".join([
             "Hello,\n\n",
             "A new model has been tested and is ready for deployment.\n\n",
-            # TODO: Model name and score
+            f"Model Name: {model_name}\n",
+            f"Test Set Accuracy: {model_score}\n",
+            f"Inference Performance: {performance_summary}\n\n",
             "Please *approve* to trigger phased deployment, or *reject* the change within ",
             f"{timeout_description}, or the model will be auto-rejected.\n\n\n",
             f"Approve -> {approval_uri}\n\n",
@@ -0,0 +1,143 @@
+"""Lambda function to check rollout guardrails and move an endpoint to the next traffic step (or roll back)
+
+Each invocation handles one step of the rollout schedule from prepare-deployment-configs. First it compares
+the new variant's metrics over the last BakeSeconds with the existing (baseline) variant's. Then it either:
+
+- Shifts traffic to the next percentage in the schedule, with UpdateEndpointWeightsAndCapacities. This only
+  changes variant weights, so no instances are replaced (Status "Shifting").
+- Reports the schedule is finished, with the new variant taking 100% of traffic (Status "Complete").
+- Sends all traffic back to the baseline variant if any guardrail is breached (Status "RolledBack").
+
+Metrics are read through util.metrics. For local runs, pass `StubMetrics` (a dict of metrics by variant
+name) in the event to use StaticVariantMetrics instead of CloudWatch.
+"""
+
+# Python Built-Ins:
+from datetime import datetime, timedelta, timezone
+import logging
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+
+def error_rate(metrics):
+    return metrics["Errors"] / metrics["Invocations"] if metrics["Invocations"] else 0.
+
+
+def check_guardrails(new_metrics, baseline_metrics, guardrails):
+    """Compare new variant metrics with baseline variant metrics
+
+    Returns
+    -------
+    breaches : List[str]
+        Description of each guardrail breached (empty if none were)
+    notes : List[str]
+        Other observations, e.g. too little traffic to judge
+    """
+    breaches = []
+    notes = []
+    if new_metrics["Invocations"] < guardrails["MinInvocations"]:
+        notes.append(
+            f"Only {new_metrics['Invocations']} invocations (< {guardrails['MinInvocations']}): Not judged"
+        )
+        return breaches, notes
+
+    new_error_rate = error_rate(new_metrics)
+    max_error_rate = error_rate(baseline_metrics) + guardrails["MaxErrorRateIncrease"]
+    if new_error_rate > max_error_rate:
+        breaches.append(f"Error rate {new_error_rate:.2%} > {max_error_rate:.2%}")
+
+    new_p99 = new_metrics["P99LatencyMs"]
+    if new_p99 is not None:
+        if guardrails.get("MaxP99Ms") is not None and new_p99 > guardrails["MaxP99Ms"]:
+            breaches.append(f"p99 latency {new_p99:.1f}ms > {guardrails['MaxP99Ms']}ms")
+        baseline_p99 = baseline_metrics["P99LatencyMs"]
+        if baseline_p99:
+            max_p99 = baseline_p99 * guardrails["MaxLatencyRatio"]
+            if new_p99 > max_p99:
+                breaches.append("p99 latency {:.1f}ms > {}x baseline {:.1f}ms".format(
+                    new_p99, guardrails["MaxLatencyRatio"], baseline_p99
+                ))
+        else:
+            notes.append("No baseline latency data: Latency ratio not checked")
+    return breaches, notes
+
+
+def set_weights(endpoint_name, rollout, new_pct):
+    util.client("sagemaker").update_endpoint_weights_and_capacities(
+        EndpointName=endpoint_name,
+        DesiredWeightsAndCapacities=[
+            { "VariantName": rollout["NewVariant"], "DesiredWeight": new_pct / 100 },
+            { "VariantName": rollout["BaselineVariant"], "DesiredWeight": 1 - new_pct / 100 },
+        ],
+    )
+
+
+def run_step(endpoint_name, rollout, metrics_reader):
+    """Check guardrails for the current step of rollout, then shift, finish or roll back accordingly"""
+    rollout = dict(rollout)
+    step_ix = rollout["StepIndex"]
+    current_pct = rollout["Schedule"][step_ix]
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(seconds=rollout["BakeSeconds"])
+    new_metrics = metrics_reader.read(endpoint_name, rollout["NewVariant"], start, end)
+    baseline_metrics = metrics_reader.read(endpoint_name, rollout["BaselineVariant"], start, end)
+    breaches, notes = check_guardrails(new_metrics, baseline_metrics, rollout["Guardrails"])
+    rollout["Checks"] = rollout.get("Checks", []) + [{
+        "TrafficPercent": current_pct,
+        "NewVariant": new_metrics,
+        "BaselineVariant": baseline_metrics,
+        "Breaches": breaches,
+        "Notes": notes,
+    }]
+
+    if breaches:
+        logger.warning(f"Guardrails breached at {current_pct}% traffic: {breaches}: Rolling back")
+        set_weights(endpoint_name, rollout, 0)
+        rollout.update({ "Status": "RolledBack", "TrafficPercent": 0 })
+    elif step_ix + 1 >= len(rollout["Schedule"]):
+        logger.info(f"Rollout complete: New variant passed all checks at {current_pct}% traffic")
+        rollout.update({ "Status": "Complete", "TrafficPercent": current_pct })
+    else:
+        next_pct = rollout["Schedule"][step_ix + 1]
+        logger.info(f"Passed checks at {current_pct}% traffic: Shifting to {next_pct}%")
+        set_weights(endpoint_name, rollout, next_pct)
+        rollout.update({ "Status": "Shifting", "StepIndex": step_ix + 1, "TrafficPercent": next_pct })
+    return rollout
+
+
+def handler(event, context):
+    """Lambda handler to run one step of a progressive rollout
+
+    Parameters
+    ----------
+    event.EndpointName : str
+        Name of the endpoint being rolled out to
+    event.Rollout : dict
+        Rollout state from prepare-deployment-configs (or the previous invocation of this function):
+        Schedule, BakeSeconds, Guardrails, StepIndex, NewVariant, BaselineVariant, ...
+    event.StubMetrics : dict (Optional)
+        Fixed metrics by variant name to use instead of CloudWatch (for local testing)
+
+    Returns
+    -------
+    rollout : dict
+        The input Rollout with updated StepIndex, plus Status ("Shifting", "Complete" or "RolledBack"),
+        TrafficPercent (to the new variant) and the Checks made at each step so far
+    """
+    logger.info(f"Got event {event}")
+    if event.get("StubMetrics"):
+        metrics_reader = util.metrics.StaticVariantMetrics(event["StubMetrics"])
+    else:
+        metrics_reader = util.metrics.CloudWatchVariantMetrics()
+    return run_step(event["EndpointName"], event["Rollout"], metrics_reader)
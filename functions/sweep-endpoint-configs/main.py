@@ -0,0 +1,103 @@
+"""Lambda function to find (and optionally delete) pipeline endpoint configs that no endpoint uses
+
+Only configs named by util.endpoint_configs are considered: `{EndpointName}-{target|canary}-{hash}`,
+or the older timestamped `{EndpointName}-{target|canary}-YYYY-MM-DD-HH-MM-SS`. A config is in use if any
+endpoint is running it or is part-way through updating to it.
+
+Prepare Deployment Configs creates (or re-uses) a deployment's configs after approval, but no endpoint
+references the target config until the rollout's final Scale step, which can be hours of canary baking
+later. And a re-used config keeps its original CreationTime. So configs are only swept once the pipeline
+hasn't created or re-used them for a grace period longer than any rollout: Going by their last-used tag
+(see util.endpoint_configs), or CreationTime for older configs without one.
+"""
+
+# Python Built-Ins:
+from datetime import datetime, timedelta, timezone
+import logging
+import re
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+DEFAULT_GRACE_PERIOD_HOURS = 8 * 24
+PIPELINE_CONFIG_PATTERN = re.compile(r"-(target|canary)-([0-9a-f]{16}|\d{4}(-\d{2}){5})$")
+
+
+def referenced_configs():
+    """Set of endpoint config names in use by any endpoint in this account & region"""
+    smclient = util.client("sagemaker")
+    referenced = set()
+    paginator = smclient.get_paginator("list_endpoints")
+    for page in paginator.paginate():
+        for endpoint in page["Endpoints"]:
+            desc = smclient.describe_endpoint(EndpointName=endpoint["EndpointName"])
+            referenced.add(desc["EndpointConfigName"])
+            # (While an update is in progress, the config being rolled out is only listed here)
+            referenced.add((desc.get("PendingDeploymentSummary") or {}).get("EndpointConfigName"))
+    referenced.discard(None)
+    logger.info(f"Found {len(referenced)} endpoint configs in use")
+    return referenced
+
+
+def find_unused_configs(grace_period, endpoint_names=None):
+    """List pipeline endpoint config names not in use or created/re-used within grace_period (a timedelta)"""
+    referenced = referenced_configs()
+    cutoff = datetime.now(timezone.utc) - grace_period
+    smclient = util.client("sagemaker")
+    paginator = smclient.get_paginator("list_endpoint_configs")
+    unused = []
+    # (Configs created since the cutoff are recent enough anyway, so don't need their tags checked)
+    for page in paginator.paginate(CreationTimeBefore=cutoff):
+        for config in page["EndpointConfigs"]:
+            name = config["EndpointConfigName"]
+            match = PIPELINE_CONFIG_PATTERN.search(name)
+            if not match or name in referenced:
+                continue
+            if endpoint_names is not None and name[:match.start()] not in endpoint_names:
+                continue
+            last_used = util.endpoint_configs.last_used(smclient, config["EndpointConfigArn"])
+            if last_used is not None and last_used >= cutoff:
+                logger.info(f"Keeping {name}: Re-used at {last_used.isoformat()}")
+                continue
+            unused.append(name)
+    logger.info(f"Found {len(unused)} unused pipeline endpoint configs")
+    return unused
+
+
+def handler(event, context):
+    """Lambda handler to sweep unused pipeline endpoint configs
+
+    Parameters
+    ----------
+    event.DryRun : bool (Optional)
+        Only report unused configs, without deleting (default true)
+    event.GracePeriodHours : float (Optional)
+        Minimum time since configs were created or last re-used to sweep them (default 192, i.e. 8 days)
+    event.EndpointNames : List[str] (Optional)
+        Only sweep configs for these endpoints (default all pipeline configs)
+    """
+    logger.info(f"Got event {event}")
+    dry_run = event.get("DryRun", True)
+    unused = find_unused_configs(
+        timedelta(hours=float(event.get("GracePeriodHours", DEFAULT_GRACE_PERIOD_HOURS))),
+        endpoint_names=event.get("EndpointNames"),
+    )
+    if not dry_run:
+        smclient = util.client("sagemaker")
+        for name in unused:
+            smclient.delete_endpoint_config(EndpointConfigName=name)
+        logger.info(f"Deleted {len(unused)} endpoint configs")
+    return {
+        "DryRun": dry_run,
+        "UnusedEndpointConfigs": unused,
+    }
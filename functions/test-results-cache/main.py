@@ -0,0 +1,166 @@
+"""Lambda function to look up or record cached test set scoring results
+
+Scoring the test set is the same work for the same model and the same data. This happens whenever a model
+is resubmitted, for example after a rejected approval or a failed deployment. This function keys results
+on a fingerprint of both:
+
+- The model fingerprint (image, environment and SHA-256 digests of its artifacts) from register-model
+- A data fingerprint: The keys, sizes and ETags of every object under the test data prefix
+
+...plus a version for the scoring configuration. Pointers are stored as `{ResultsRootUri}_cache/{key}.json`.
+On a hit, the pipeline skips the scoring step and evaluates the earlier results directly.
+"""
+
+# Python Built-Ins:
+from datetime import datetime
+import hashlib
+import json
+import logging
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+# Bump this whenever the scoring step changes in a way that would change its output:
+SCORING_CONFIG_VERSION = "1"
+
+
+def bucket_and_key_from_s3_uri(s3uri):
+    assert isinstance(s3uri, str) and s3uri.lower().startswith("s3://"), (
+        f"s3uri must be a string beginning with 's3://': Got {s3uri}"
+    )
+    bucket, _, key = s3uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def data_fingerprint(data_uri):
+    """Fingerprint of the objects under an S3 prefix (by key, size and ETag, without reading contents)"""
+    bucket, prefix = bucket_and_key_from_s3_uri(data_uri)
+    digest = hashlib.sha256()
+    n_objects = 0
+    paginator = util.client("s3").get_paginator("list_objects_v2")
+    # (ListObjectsV2 returns keys in sorted order, so this is deterministic)
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            digest.update(f"{obj['Key'][len(prefix):]}\t{obj['Size']}\t{obj['ETag']}\n".encode("utf-8"))
+            n_objects += 1
+    if not n_objects:
+        raise ValueError(f"No test data objects found under {data_uri}")
+    return digest.hexdigest()
+
+
+def cache_key(model_fingerprint, data_fingerprint):
+    return hashlib.sha256(
+        f"{model_fingerprint}:{data_fingerprint}:{SCORING_CONFIG_VERSION}".encode("utf-8")
+    ).hexdigest()
+
+
+def has_results(results_uri):
+    """Check results (.out objects) still exist under results_uri, e.g. not removed by a lifecycle rule"""
+    bucket, prefix = bucket_and_key_from_s3_uri(results_uri)
+    paginator = util.client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        if any(obj["Key"].endswith(".out") for obj in page.get("Contents", [])):
+            return True
+    return False
+
+
+def lookup(event):
+    root_uri = event["ResultsRootUri"]
+    if not root_uri.endswith("/"):
+        root_uri += "/"
+    key = cache_key(event["ModelFingerprint"], data_fingerprint(event["DataUri"]))
+    pointer_uri = f"{root_uri}_cache/{key}.json"
+    # Where fresh results will go if this is a miss:
+    results_uri = f"{root_uri}{event['ModelName']}/"
+
+    pointer_bucket, pointer_key = bucket_and_key_from_s3_uri(pointer_uri)
+    s3 = util.client("s3")
+    try:
+        pointer = json.loads(s3.get_object(Bucket=pointer_bucket, Key=pointer_key)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        pointer = None
+    if pointer and has_results(pointer["ResultsUri"]):
+        logger.info(f"Cache hit {key}: Re-using results {pointer['ResultsUri']} from {pointer['ModelName']}")
+        return {
+            "Hit": True,
+            "CacheKey": key,
+            "ResultsUri": pointer["ResultsUri"],
+            "CachedFrom": pointer["ModelName"],
+        }
+    elif pointer:
+        logger.warning(f"Cache entry {pointer_uri} points to missing results {pointer['ResultsUri']}")
+    logger.info(f"Cache miss {key}: Results will be written to {results_uri}")
+    return {
+        "Hit": False,
+        "CacheKey": key,
+        "ResultsUri": results_uri,
+        "CachedFrom": None,
+    }
+
+
+def record(event):
+    root_uri = event["ResultsRootUri"]
+    if not root_uri.endswith("/"):
+        root_uri += "/"
+    results = event["TestResults"]
+    pointer_bucket, pointer_key = bucket_and_key_from_s3_uri(f"{root_uri}_cache/{results['CacheKey']}.json")
+    util.client("s3").put_object(
+        Bucket=pointer_bucket,
+        Key=pointer_key,
+        Body=json.dumps({
+            "ResultsUri": results["ResultsUri"],
+            "ModelName": event["ModelName"],
+            "CreatedAt": datetime.utcnow().isoformat() + "Z",
+        }).encode("utf-8"),
+    )
+    logger.info(f"Recorded cache entry {results['CacheKey']} -> {results['ResultsUri']}")
+    return results
+
+
+def handler(event, context):
+    """Lambda handler to look up or record cached test results
+
+    Parameters
+    ----------
+    event.Action : str
+        "Lookup" (before scoring) or "Record" (after scoring succeeds)
+    event.ResultsRootUri : str
+        s3:// URI prefix under which all models' test results are stored
+    event.ModelName : str
+        Name of the model being tested
+    event.ModelFingerprint : str
+        (Lookup) Model fingerprint from register-model
+    event.DataUri : str
+        (Lookup) s3:// URI prefix of the test data
+    event.TestResults : dict
+        (Record) The output of the previous Lookup
+
+    Returns
+    -------
+    Hit : bool
+        Whether existing results were found (so scoring can be skipped)
+    CacheKey : str
+        Cache key for this model & data combination
+    ResultsUri : str
+        s3:// URI prefix of the results: Existing ones on a hit, or where to write new ones on a miss
+    CachedFrom : str | None
+        Name of the model whose scoring run produced the cached results (on a hit)
+    """
+    logger.info(f"Got event {event}")
+    action = event.get("Action", "Lookup")
+    if action == "Lookup":
+        return lookup(event)
+    elif action == "Record":
+        return record(event)
+    else:
+        raise ValueError(f"Unknown Action '{action}': Expected 'Lookup' or 'Record'")
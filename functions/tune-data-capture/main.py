@@ -0,0 +1,216 @@
+"""Lambda function to keep endpoint data capture sampling near a target number of records per hour
+
+Run on a schedule. For each pipeline endpoint with data capture enabled, it reads recent hourly invocations
+and asks util.sampling for a decision. When the volume captured at the current percentage has drifted far
+enough from the target, it updates the endpoint to a copy of its config with the new percentage.
+
+Updating an endpoint is only safe when no deployment is in progress, so endpoints mid-deployment are left
+alone ("Deferred"): The next run, or the next deployment (in prepare-deployment-configs), picks up the same
+decision. SageMaker also refuses updates while a variant is registered for autoscaling. So for autoscaled
+variants, scaling is suspended (see util.autoscaling), the endpoint updated, and the saved settings restored
+once it's back InService, all within one invocation. Those updates are deferred to a later run if there
+isn't enough of this invocation left to see one through. Every decision is logged as JSON.
+"""
+
+# Python Built-Ins:
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import re
+import time
+
+# Fix logging in Lambda functions (before any local imports)
+rootlogger = logging.getLogger()
+if rootlogger.handlers:
+    for handler in rootlogger.handlers:
+        rootlogger.removeHandler(handler)
+logging.basicConfig(level=logging.INFO)
+
+# Local Dependencies:
+import util
+
+
+logger = logging.getLogger()
+
+# (As in sweep-endpoint-configs: Only endpoints running configs this pipeline created are tuned)
+PIPELINE_CONFIG_PATTERN = re.compile(r"-(target|canary)-([0-9a-f]{16}|\d{4}(-\d{2}){5})$")
+BUSY_STATES = ("Creating", "Updating", "SystemUpdating", "RollingBack")
+UPDATE_POLL_SECS = 20
+# Only update an autoscaled endpoint with at least this long left, to see it back InService and restore:
+MIN_AUTOSCALED_UPDATE_MS = 600000
+# Stop waiting with this long left, to restore scaling (or log what to restore) before the Lambda times out:
+RESTORE_MARGIN_MS = 30000
+
+
+def in_service_endpoint_names():
+    smclient = util.client("sagemaker")
+    names = []
+    paginator = smclient.get_paginator("list_endpoints")
+    for page in paginator.paginate(StatusEquals="InService"):
+        names += [e["EndpointName"] for e in page["Endpoints"]]
+    return names
+
+
+def is_autoscaled(endpoint_name, variant_name):
+    aasclient = util.client("application-autoscaling")
+    return util.autoscaling.save_variant_scaling(aasclient, endpoint_name, variant_name) is not None
+
+
+def wait_while_updating(smclient, endpoint_name, get_remaining_ms):
+    """Poll until the endpoint leaves its busy states, or this invocation is nearly out of time
+
+    Returns
+    -------
+    status : str
+        The last EndpointStatus seen
+    """
+    while True:
+        status = smclient.describe_endpoint(EndpointName=endpoint_name)["EndpointStatus"]
+        if status not in BUSY_STATES or get_remaining_ms() - RESTORE_MARGIN_MS < UPDATE_POLL_SECS * 1000:
+            return status
+        time.sleep(UPDATE_POLL_SECS)
+
+
+def update_endpoint(smclient, endpoint_name, variant_name, config_name, get_remaining_ms):
+    """Update the endpoint to config_name, suspending and then restoring the variant's autoscaling if any
+
+    Returns
+    -------
+    restored : bool
+        Whether autoscaling was suspended (and has been restored)
+    """
+    aasclient = util.client("application-autoscaling")
+    saved = util.autoscaling.suspend(aasclient, endpoint_name, [variant_name])
+    try:
+        smclient.update_endpoint(EndpointName=endpoint_name, EndpointConfigName=config_name)
+        if saved:
+            status = wait_while_updating(smclient, endpoint_name, get_remaining_ms)
+            logger.info(f"Endpoint {endpoint_name} is {status}: Restoring autoscaling")
+    finally:
+        if saved:
+            try:
+                util.autoscaling.restore(aasclient, lambda: util.client("cloudwatch"), endpoint_name, saved)
+            except Exception:
+                # (If the update took too long, scaling must be re-applied by hand once it's InService)
+                logger.exception(
+                    f"Failed to restore autoscaling on endpoint {endpoint_name}. Saved settings by variant: "
+                    + json.dumps(saved)
+                )
+                raise
+    return bool(saved)
+
+
+def resampled_config(endpoint_desc, config_desc, percentage):
+    """Arguments to re-create an endpoint's current config, with a new capture sampling percentage"""
+    variants = []
+    for variant in config_desc["ProductionVariants"]:
+        variant = dict(variant)
+        if "InstanceType" in variant:
+            # (Keep the current, possibly autoscaled, instance count)
+            summary = next(
+                v for v in endpoint_desc["ProductionVariants"] if v["VariantName"] == variant["VariantName"]
+            )
+            variant["InitialInstanceCount"] = max(1, summary.get("CurrentInstanceCount", 1))
+        variants.append(variant)
+    capture = dict(config_desc["DataCaptureConfig"], InitialSamplingPercentage=percentage)
+    return variants, capture, config_desc.get("AsyncInferenceConfig")
+
+
+def tune_endpoint(endpoint_name, options, metrics_reader, dry_run=False, get_remaining_ms=lambda: 0):
+    """Decide (and apply, if possible and justified) an endpoint's capture sampling percentage
+
+    get_remaining_ms gives the time left in this invocation: Autoscaled endpoints are only updated with at
+    least MIN_AUTOSCALED_UPDATE_MS left.
+
+    Returns
+    -------
+    decision : dict
+        util.sampling decision plus the EndpointName and the Action taken: "Updated", "Unchanged",
+        "Deferred", "DryRun" or "Skipped"
+    """
+    smclient = util.client("sagemaker")
+    endpoint_desc = smclient.describe_endpoint(EndpointName=endpoint_name)
+    config_name = endpoint_desc["EndpointConfigName"]
+    result = { "EndpointName": endpoint_name, "EndpointConfigName": config_name }
+    if not PIPELINE_CONFIG_PATTERN.search(config_name):
+        return dict(result, Action="Skipped", Reason="Not a pipeline endpoint config")
+    if endpoint_desc["EndpointStatus"] != "InService" or len(endpoint_desc["ProductionVariants"]) > 1:
+        return dict(result, Action="Deferred", Reason="Deployment in progress")
+    config_desc = smclient.describe_endpoint_config(EndpointConfigName=config_name)
+    capture = config_desc.get("DataCaptureConfig") or {}
+    if not capture.get("EnableCapture"):
+        return dict(result, Action="Skipped", Reason="Data capture not enabled")
+
+    variant_name = endpoint_desc["ProductionVariants"][0]["VariantName"]
+    end = datetime.now(timezone.utc)
+    hourly_invocations = metrics_reader.hourly_invocations(
+        endpoint_name, variant_name, end - timedelta(hours=options["LookbackHours"]), end
+    )
+    decision = util.sampling.decide_sampling(
+        hourly_invocations, capture["InitialSamplingPercentage"], options
+    )
+    result.update(decision)
+    if not decision["Change"]:
+        result["Action"] = "Unchanged"
+    elif dry_run:
+        result["Action"] = "DryRun"
+    elif get_remaining_ms() < MIN_AUTOSCALED_UPDATE_MS and is_autoscaled(endpoint_name, variant_name):
+        result.update({
+            "Action": "Deferred",
+            "Reason": decision["Reason"] + " (deferred to next run: No time left to restore autoscaling)",
+        })
+    else:
+        variants, capture, async_config = resampled_config(
+            endpoint_desc, config_desc, decision["SamplingPercentage"]
+        )
+        new_config = util.endpoint_configs.ensure_endpoint_config(
+            smclient, endpoint_name, "target", variants, capture, async_config
+        )
+        restored = update_endpoint(
+            smclient, endpoint_name, variant_name, new_config["Name"], get_remaining_ms
+        )
+        result.update({
+            "Action": "Updated",
+            "NewEndpointConfigName": new_config["Name"],
+            "AutoscalingRestored": restored,
+        })
+    return result
+
+
+def handler(event, context):
+    """Lambda handler to tune data capture sampling on pipeline endpoints
+
+    Parameters
+    ----------
+    event.EndpointNames : List[str] (Optional)
+        Endpoints to tune (default: all InService endpoints running pipeline-created configs)
+    event.DataCapture : dict (Optional)
+        Sampling options (see util.sampling.DEFAULT_SAMPLING_OPTIONS)
+    event.DryRun : bool (Optional)
+        Set true to only log decisions, without updating any endpoint
+    event.StubMetrics : dict (Optional)
+        Fixed metrics by variant name (with HourlyInvocations) to use instead of CloudWatch (for testing)
+
+    Returns
+    -------
+    decisions : List[dict]
+        The decision for each endpoint, with the Action taken
+    """
+    logger.info(f"Got event {event}")
+    options = util.sampling.resolve_options(event.get("DataCapture"))
+    if event.get("StubMetrics"):
+        metrics_reader = util.metrics.StaticVariantMetrics(event["StubMetrics"])
+    else:
+        metrics_reader = util.metrics.CloudWatchVariantMetrics()
+    decisions = []
+    for endpoint_name in event.get("EndpointNames") or in_service_endpoint_names():
+        decision = tune_endpoint(
+            endpoint_name,
+            options,
+            metrics_reader,
+            dry_run=event.get("DryRun", False),
+            get_remaining_ms=context.get_remaining_time_in_millis,
+        )
+        logger.info(f"Capture sampling decision: {json.dumps(decision)}")
+        decisions.append(decision)
+    return decisions
@@ -0,0 +1,221 @@
+"""Fast-loading "flat" model artifact format for PyTorch TabNet
+
+pytorch-tabnet's own save_model() produces tabnet.zip: A deflate-compressed zip of the model params JSON
+and a pickled (torch.save) state dict. SageMaker then wraps that inside model.tar.gz, so every new endpoint
+instance pays to decompress the weights twice before it can serve.
+
+The flat format instead stores, alongside metadata.json in the model folder:
+
+- tabnet.manifest.json: Format version, model type, constructor params, and the dtype/shape/byte offset of
+  every tensor in the network state dict
+- tabnet.weights: All tensors concatenated (64-byte aligned) into a single contiguous, uncompressed file
+
+...which model_fn memory-maps and loads into the network without any decompression or unpickling. (The
+network's load_state_dict() still copies the weights into its own parameters, so the saving is the zip and
+pickle steps, not the copy: Loaded weights aren't shared through the page cache.)
+
+pack() and unpack() bundle a model folder into an uncompressed (or zstd-compressed) tar with the manifest
+first, for cases where the model data is delivered without SageMaker's own gzip step. E.g:
+
+    python artifact.py pack ./model model.tar.zst
+"""
+
+# Python Built-Ins:
+import argparse
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import tarfile
+
+# External Dependencies:
+import numpy as np
+import torch
+
+
+logger = logging.getLogger("artifact")
+
+MANIFEST_FILENAME = "tabnet.manifest.json"
+WEIGHTS_FILENAME = "tabnet.weights"
+FORMAT_NAME = "tabnet-flat"
+FORMAT_VERSION = 1
+ALIGNMENT = 64  # Byte alignment of each tensor in the weights file
+
+
+def has_flat_artifact(model_dir: str) -> bool:
+    """Check whether model_dir contains a flat-format artifact"""
+    return os.path.isfile(os.path.join(model_dir, MANIFEST_FILENAME))
+
+
+def model_init_params(model) -> dict:
+    """Constructor params of a pytorch-tabnet model (as filtered by pytorch-tabnet's own save_model())"""
+    return { k: v for k, v in model.get_params().items() if not isinstance(v, type) }
+
+
+def save_flat(model, model_dir: str, model_type: str) -> str:
+    """Save a fitted pytorch-tabnet model to model_dir in the flat format, returning the manifest path"""
+    tensors = []
+    offset = 0
+    sha256 = hashlib.sha256()
+    with open(os.path.join(model_dir, WEIGHTS_FILENAME), "wb") as f:
+        for name, tensor in model.network.state_dict().items():
+            array = tensor.detach().cpu().contiguous().numpy()
+            padding = b"\0" * ((-offset) % ALIGNMENT)
+            f.write(padding)
+            sha256.update(padding)
+            offset += len(padding)
+            data = array.tobytes()
+            f.write(data)
+            sha256.update(data)
+            tensors.append({
+                "name": name,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+                "nbytes": len(data),
+            })
+            offset += len(data)
+
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "modelType": model_type,
+        "params": model_init_params(model),
+        "weightsFile": WEIGHTS_FILENAME,
+        "weightsBytes": offset,
+        "weightsSha256": sha256.hexdigest(),
+        "tensors": tensors,
+    }
+    # Classifiers' label mappings are set by fit() rather than the constructor, so carry them over too:
+    extras = {}
+    for attr in ("preds_mapper", "classes_"):
+        value = getattr(model, attr, None)
+        if value is not None:
+            extras[attr] = value.tolist() if isinstance(value, np.ndarray) else value
+    if extras:
+        manifest["extras"] = extras
+
+    manifest_path = os.path.join(model_dir, MANIFEST_FILENAME)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, default=lambda o: o.item() if isinstance(o, np.generic) else str(o))
+    logger.info(f"Saved flat artifact with {len(tensors)} tensors ({offset} bytes) to {model_dir}")
+    return manifest_path
+
+
+def load_state_dict(model_dir: str, manifest: dict) -> OrderedDict:
+    """Memory-map the weights file and return a state dict of tensors viewing it
+
+    The tensors are only valid while the mapping is, and are meant to be passed straight to the network's
+    load_state_dict() (which copies them into its own parameters).
+    """
+    weights_path = os.path.join(model_dir, manifest["weightsFile"])
+    # (Copy-on-write rather than read-only, because torch.from_numpy() expects a writable buffer)
+    weights = np.memmap(weights_path, dtype=np.uint8, mode="c")
+    if weights.size != manifest["weightsBytes"]:
+        raise ValueError(
+            f"Weights file {weights_path} is {weights.size} bytes but manifest expects "
+            f"{manifest['weightsBytes']}"
+        )
+    state_dict = OrderedDict()
+    for spec in manifest["tensors"]:
+        raw = weights[spec["offset"]:spec["offset"] + spec["nbytes"]]
+        state_dict[spec["name"]] = torch.from_numpy(raw.view(np.dtype(spec["dtype"])).reshape(spec["shape"]))
+    return state_dict
+
+
+def load_flat(model_dir: str):
+    """Load a pytorch-tabnet model from a flat-format artifact in model_dir"""
+    with open(os.path.join(model_dir, MANIFEST_FILENAME), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_NAME or manifest.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported artifact format {manifest.get('format')} v{manifest.get('version')}: This code "
+            f"reads {FORMAT_NAME} up to v{FORMAT_VERSION}"
+        )
+
+    # Deferred because pytorch-tabnet (with sklearn/scipy) is slow to import:
+    from pytorch_tabnet.tab_model import TabNetClassifier, TabNetRegressor
+    ModelClass = TabNetClassifier if manifest["modelType"] == "classification" else TabNetRegressor
+
+    # Same steps as pytorch-tabnet's load_model(), minus the unzipping and unpickling:
+    model = ModelClass(**manifest["params"])
+    model._set_network()
+    model.network.load_state_dict(load_state_dict(model_dir, manifest))
+    device = getattr(model, "device", None)
+    if device is not None:
+        model.network.to(device)
+    model.network.eval()
+    for attr, value in manifest.get("extras", {}).items():
+        if attr == "preds_mapper":
+            # (JSON stringified the class index keys, but pytorch-tabnet's predict() looks them up by int)
+            value = { int(k): v for k, v in value.items() }
+        setattr(model, attr, np.array(value) if attr == "classes_" else value)
+    return model
+
+
+def _archive_mode(path: str, write: bool) -> str:
+    if path.endswith(".tar"):
+        return "w" if write else "r"
+    elif path.endswith((".tar.gz", ".tgz")):
+        return "w:gz" if write else "r:gz"
+    else:
+        raise ValueError(f"Unrecognised archive extension for {path}: Expected .tar, .tar.zst or .tar.gz")
+
+
+def pack(model_dir: str, output_path: str, zstd_level: int=3):
+    """Bundle model_dir into a tar (manifest & weights first), compressed by extension: .tar/.tar.zst/.tar.gz
+
+    zstd compression requires the `zstandard` package.
+    """
+    names = sorted(os.listdir(model_dir))
+    first = [n for n in (MANIFEST_FILENAME, WEIGHTS_FILENAME) if n in names]
+    ordered = first + [n for n in names if n not in first]
+
+    def add_all(tar):
+        for name in ordered:
+            tar.add(os.path.join(model_dir, name), arcname=name)
+
+    if output_path.endswith(".tar.zst"):
+        import zstandard
+        with open(output_path, "wb") as f:
+            with zstandard.ZstdCompressor(level=zstd_level).stream_writer(f) as zf:
+                with tarfile.open(fileobj=zf, mode="w|") as tar:
+                    add_all(tar)
+    else:
+        with tarfile.open(output_path, _archive_mode(output_path, write=True)) as tar:
+            add_all(tar)
+    return output_path
+
+
+def unpack(archive_path: str, output_dir: str):
+    """Extract an archive created by pack() into output_dir (streaming, single pass)"""
+    os.makedirs(output_dir, exist_ok=True)
+    if archive_path.endswith(".tar.zst"):
+        import zstandard
+        with open(archive_path, "rb") as f:
+            with zstandard.ZstdDecompressor().stream_reader(f) as zf:
+                with tarfile.open(fileobj=zf, mode="r|") as tar:
+                    tar.extractall(output_dir)
+    else:
+        with tarfile.open(archive_path, _archive_mode(archive_path, write=False)) as tar:
+            tar.extractall(output_dir)
+    return output_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack/unpack flat TabNet model artifacts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="Bundle a model folder to .tar, .tar.zst or .tar.gz")
+    pack_parser.add_argument("model_dir", type=str)
+    pack_parser.add_argument("output_path", type=str)
+    pack_parser.add_argument("--zstd-level", type=int, default=3)
+    unpack_parser = subparsers.add_parser("unpack", help="Extract a packed artifact")
+    unpack_parser.add_argument("archive_path", type=str)
+    unpack_parser.add_argument("output_dir", type=str)
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        print(pack(args.model_dir, args.output_path, zstd_level=args.zstd_level))
+    else:
+        print(unpack(args.archive_path, args.output_dir))
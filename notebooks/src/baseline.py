@@ -0,0 +1,156 @@
+"""Compute a Model Monitor data quality baseline (statistics.json and constraints.json) locally
+
+SageMaker Model Monitor's suggest_baseline() launches a processing job to re-read the training data. Instead
+we aggregate the training features a chunk at a time with sketches.FeatureStats (vectorized per column, with
+KLL sketches in Model Monitor's own format), so train.py can save a baseline with every model for about the
+cost of one extra pass over data it already has in memory. The files can be used as-is for a Model Monitor
+monitoring schedule, or by drift.py.
+
+Captured requests are headerless CSV, which Model Monitor names _c0, _c1, ... so features are named by
+position (excluding the target) to match. To baseline a dataset outside of training, e.g:
+
+    python baseline.py --data ../data/train.csv --target Cover_Type --output-dir ../data/baseline \\
+        --s3-uri s3://{bucket}/baselines/{model}
+"""
+
+# Python Built-Ins:
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# External Dependencies:
+import numpy as np
+
+# Local Dependencies:
+import capture
+import data
+from sketches import FeatureStats
+
+
+logger = logging.getLogger("baseline")
+
+DEFAULT_CHUNK_ROWS = 100000
+STATISTICS_FILENAME = "statistics.json"
+CONSTRAINTS_FILENAME = "constraints.json"
+# Model Monitor's defaults for suggested constraints:
+DEFAULT_MONITORING_CONFIG = {
+    "evaluate_constraints": "Enabled",
+    "emit_metrics": "Enabled",
+    "datatype_check_threshold": 1.0,
+    "domain_content_threshold": 1.0,
+    "distribution_constraints": {
+        "perform_comparison": "Enabled",
+        "comparison_threshold": 0.1,
+        "comparison_method": "Robust",
+    },
+}
+
+
+def compute_statistics(chunks) -> FeatureStats:
+    """Aggregate an iterable of 2D feature arrays (e.g. chunks of rows) to FeatureStats"""
+    stats = None
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if stats is None:
+            stats = FeatureStats(capture.column_names(chunk.shape[1]))
+        stats.update(chunk)
+    if stats is None:
+        raise ValueError("Can't compute a baseline from no data")
+    return stats
+
+
+def array_chunks(X, chunk_rows: int=DEFAULT_CHUNK_ROWS):
+    """Chunks of an in-memory feature array (views, not copies)"""
+    for start in range(0, len(X), chunk_rows):
+        yield X[start:start + chunk_rows]
+
+
+def suggest_constraints(stats: FeatureStats, monitoring_config: dict=None) -> dict:
+    """Model Monitor constraints.json content, as suggest_baseline() would for these statistics"""
+    features = []
+    for name, feature in zip(stats.names, stats.features):
+        total = feature.present + feature.missing
+        constraint = {
+            "name": name,
+            "inferred_type": "Integral" if feature.integral else "Fractional",
+            "completeness": feature.present / total if total else 0.,
+        }
+        if feature.present and feature.min >= 0:
+            constraint["num_constraints"] = { "is_non_negative": True }
+        features.append(constraint)
+    return {
+        "version": 0.0,
+        "features": features,
+        "monitoring_config": monitoring_config or DEFAULT_MONITORING_CONFIG,
+    }
+
+
+def save_baseline(stats: FeatureStats, output_dir: str, s3_uri: str=None, store=None):
+    """Write statistics.json and constraints.json to output_dir, and upload to s3_uri if set
+
+    Returns
+    -------
+    paths : List[str]
+        Local paths of the files written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if s3_uri and store is None:
+        store = capture.open_store()
+    paths = []
+    for filename, content in (
+        (STATISTICS_FILENAME, stats.to_model_monitor()),
+        (CONSTRAINTS_FILENAME, suggest_constraints(stats)),
+    ):
+        path = os.path.join(output_dir, filename)
+        with open(path, "w") as f:
+            json.dump(content, f)
+        paths.append(path)
+        if s3_uri:
+            uri = f"{s3_uri.rstrip('/')}/{filename}"
+            with open(path, "rb") as f:
+                store.write(uri, f.read())
+            logger.info(f"Uploaded {uri}")
+    return paths
+
+
+def parse_args(cmd_args=None):
+    parser = argparse.ArgumentParser(description="Compute a Model Monitor baseline from a CSV dataset")
+    parser.add_argument("--data", type=str, required=True, help="CSV file or channel folder (with header)")
+    parser.add_argument("--target", type=str, default="Target", help="Target column name or index")
+    parser.add_argument("--output-dir", type=str, required=True)
+    parser.add_argument("--s3-uri", type=str, default=None, help="Also upload the baseline to this prefix")
+    parser.add_argument("--local-root", type=str, default=None, help="Local stand-in folder for S3")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--log-level", default=logging.INFO)
+    args = parser.parse_args(args=cmd_args)
+
+    try:
+        args.log_level = int(args.log_level)
+    except ValueError:
+        pass
+    try:
+        args.target = int(args.target)
+    except ValueError:
+        pass
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(
+        stream=sys.stdout,
+        level=args.log_level,
+        format="%(asctime)s [%(name)s] %(levelname)s %(message)s",
+    )
+    t_start = time.perf_counter()
+    stats = compute_statistics(
+        X for X, _, _ in data.iter_dataset_chunks(args.data, args, chunk_rows=args.chunk_rows)
+    )
+    store = capture.open_store(args.local_root) if args.s3_uri else None
+    save_baseline(stats, args.output_dir, args.s3_uri, store)
+    logger.info(
+        f"Baselined {stats.rows} rows x {len(stats.names)} features in {time.perf_counter() - t_start:.2f}s"
+    )
@@ -0,0 +1,300 @@
+"""Offline batch scoring engine: A CPU stand-in for SageMaker Batch Transform
+
+Scores large headerless CSV files with the handlers in inference.py, streaming each file in chunks of lines
+through a pool of CPU worker processes. The model is loaded once before the workers are forked, so its
+weights are shared copy-on-write. Output order always matches input order, and the Batch Transform
+`DataProcessing` semantics used by the pipeline are supported:
+
+- `--input-filter` selects the model input columns with SageMaker's JSONPath subset, e.g. "$[:-2]". Note
+  that SageMaker slice end indexes are *inclusive*, so "$[:-2]" keeps everything but the last column.
+- `--join-source Input` writes each input record (in full) followed by the prediction columns.
+
+Output is written as `{input file path}.part-NNNNN.out` shards of at most --shard-rows records each (with
+paths relative to --input, so files in its subfolders keep their own subfolders as in Batch Transform), plus a
+`_report.json` summary including the rows/sec achieved. This runs the same locally or in a cheap CPU
+SageMaker Processing job (the default paths are the Processing job conventions). E.g:
+
+    python batch_transform.py --model-dir ./model --input ../data/test-noheader.csv --output ./results \\
+        --input-filter '$[:-2]' --join-source Input
+"""
+
+# Python Built-Ins:
+import argparse
+from collections import deque
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+import torch
+
+# Local Dependencies:
+import config
+import inference
+
+
+logger = logging.getLogger("batch_transform")
+
+# Worker process state, inherited from the parent through fork():
+_state = {}
+
+
+def parse_input_filter(expr: str):
+    """Compile a SageMaker-style JSONPath CSV column filter to a function of n_columns -> column indexes
+
+    Supports "$" (all columns), and bracketed comma-separated lists of indexes and slices like "$[0,3:5]"
+    or "$[:-2]". As in SageMaker Batch Transform, slice *end* indexes are inclusive.
+    """
+    expr = (expr or "$").replace(" ", "")
+    if expr == "$":
+        return None
+    match = re.fullmatch(r"\$\[(.+)\]", expr)
+    if not match:
+        raise ValueError(f"Unsupported input filter '{expr}': Expected '$' or '$[...]'")
+    parts = match.group(1).split(",")
+
+    def to_index(raw, n_columns):
+        i = int(raw)
+        return i + n_columns if i < 0 else i
+
+    def select(n_columns):
+        indexes = []
+        for part in parts:
+            if ":" in part:
+                start, _, end = part.partition(":")
+                start = to_index(start, n_columns) if start else 0
+                end = to_index(end, n_columns) if end else n_columns - 1
+                indexes.extend(range(start, end + 1))
+            else:
+                indexes.append(to_index(part, n_columns))
+        if any(i < 0 or i >= n_columns for i in indexes):
+            raise ValueError(f"Input filter '{expr}' out of range for {n_columns} columns")
+        return np.array(indexes, dtype=int)
+
+    return select
+
+
+def _init_worker(threads_per_worker: int):
+    torch.set_num_threads(threads_per_worker)
+
+
+def score_chunk(lines):
+    """Score a list of raw CSV lines, returning the list of output lines (in the same order)"""
+    model = _state["model"]
+    X = pd.read_csv(io.StringIO("\n".join(lines)), header=None, dtype=np.float32).to_numpy()
+    column_filter = _state["column_filter"]
+    if column_filter is not None:
+        X = X[:, column_filter(X.shape[1])]
+    prediction = inference.predict_fn(torch.from_numpy(np.ascontiguousarray(X)), model)
+    output_lines = inference.output_fn(prediction, inference.CSV_CONTENT_TYPE).splitlines()
+    if len(output_lines) != len(lines):
+        raise ValueError(f"Got {len(output_lines)} predictions for {len(lines)} input records")
+    if _state["join_input"]:
+        return [f"{line},{out}" for line, out in zip(lines, output_lines)]
+    return output_lines
+
+
+def read_chunks(path: str, chunk_rows: int):
+    """Stream non-blank lines of a text file in lists of up to chunk_rows"""
+    chunk = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            chunk.append(line)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+class ShardedWriter:
+    """Writes lines to numbered output shards of at most shard_rows lines each"""
+    def __init__(self, output_dir: str, name: str, shard_rows: int):
+        self.output_dir = output_dir
+        self.name = name
+        self.shard_rows = shard_rows
+        self.shards = []
+        self._file = None
+        self._rows_in_shard = 0
+
+    def _next_shard(self):
+        if self._file:
+            self._file.close()
+        path = os.path.join(self.output_dir, f"{self.name}.part-{len(self.shards):05d}.out")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.shards.append(path)
+        self._file = open(path, "w")
+        self._rows_in_shard = 0
+
+    def write(self, lines):
+        while lines:
+            if self._file is None or (self.shard_rows and self._rows_in_shard >= self.shard_rows):
+                self._next_shard()
+            n = len(lines) if not self.shard_rows else min(len(lines), self.shard_rows - self._rows_in_shard)
+            self._file.write("\n".join(lines[:n]) + "\n")
+            self._rows_in_shard += n
+            lines = lines[n:]
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def input_files(input_path: str):
+    """List the files to score under input_path (a file or folder, searched recursively)"""
+    if os.path.isfile(input_path):
+        return [input_path]
+    paths = []
+    for root, _, files in os.walk(input_path):
+        paths.extend(os.path.join(root, f) for f in files if not f.startswith("."))
+    return sorted(paths)
+
+
+def output_name(path: str, input_path: str) -> str:
+    """Output shard name for an input file: Its path relative to input_path, so names can't collide"""
+    if os.path.isfile(input_path):
+        return os.path.basename(path)
+    return os.path.relpath(path, input_path)
+
+
+def score_file(path: str, name: str, output_dir: str, pool, args) -> dict:
+    """Score one input file into {name}.part-NNNNN.out shards, keeping a bounded window of chunks in flight"""
+    writer = ShardedWriter(output_dir, name, args.shard_rows)
+    n_rows = 0
+    t0 = time.perf_counter()
+    try:
+        if pool is None:
+            for chunk in read_chunks(path, args.chunk_rows):
+                writer.write(score_chunk(chunk))
+                n_rows += len(chunk)
+        else:
+            # Unlike Pool.imap (which reads its whole input eagerly), this bounds memory use to
+            # max_in_flight chunks while still writing results in input order:
+            max_in_flight = args.workers * args.prefetch
+            pending = deque()
+            for chunk in read_chunks(path, args.chunk_rows):
+                pending.append(pool.apply_async(score_chunk, (chunk,)))
+                if len(pending) >= max_in_flight:
+                    lines = pending.popleft().get()
+                    writer.write(lines)
+                    n_rows += len(lines)
+            while pending:
+                lines = pending.popleft().get()
+                writer.write(lines)
+                n_rows += len(lines)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - t0
+    rows_per_sec = n_rows / max(elapsed, 1e-9)
+    logger.info(f"Scored {n_rows} rows from {path} in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)")
+    return {
+        "input": path,
+        "rows": n_rows,
+        "seconds": elapsed,
+        "rows_per_sec": rows_per_sec,
+        "shards": [os.path.relpath(s, output_dir) for s in writer.shards],
+    }
+
+
+def run(args) -> dict:
+    """Load the model, score every input file, and write/return the summary report"""
+    t0 = time.perf_counter()
+    _state["model"] = inference.model_fn(args.model_dir)
+    _state["column_filter"] = parse_input_filter(args.input_filter)
+    _state["join_input"] = args.join_source.lower() == "input"
+    load_secs = time.perf_counter() - t0
+    os.makedirs(args.output, exist_ok=True)
+
+    paths = input_files(args.input)
+    if not paths:
+        raise ValueError(f"No input files found at {args.input}")
+
+    pool = None
+    if args.workers > 1:
+        # Fork after loading the model (and before running any torch ops) so weights are shared copy-on-write
+        pool = multiprocessing.get_context("fork").Pool(
+            args.workers,
+            initializer=_init_worker,
+            initargs=(args.threads_per_worker,),
+        )
+    else:
+        _init_worker(args.threads_per_worker)
+    try:
+        t_score = time.perf_counter()
+        files = [
+            score_file(path, output_name(path, args.input), args.output, pool, args) for path in paths
+        ]
+        score_secs = time.perf_counter() - t_score
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    n_rows = sum(f["rows"] for f in files)
+    report = {
+        "rows": n_rows,
+        "model_load_secs": load_secs,
+        "scoring_secs": score_secs,
+        "rows_per_sec": n_rows / max(score_secs, 1e-9),
+        "workers": args.workers,
+        "threads_per_worker": args.threads_per_worker,
+        "chunk_rows": args.chunk_rows,
+        "input_filter": args.input_filter,
+        "join_source": args.join_source,
+        "files": files,
+    }
+    with open(os.path.join(args.output, "_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Scored {n_rows} rows in {score_secs:.2f}s: {report['rows_per_sec']:.0f} rows/sec")
+    return report
+
+
+def parse_args(cmd_args=None):
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    parser = argparse.ArgumentParser(description="Batch score CSV files with the TabNet inference handlers")
+    parser.add_argument("--model-dir", type=str, default="/opt/ml/processing/model")
+    parser.add_argument("--input", type=str, default="/opt/ml/processing/input")
+    parser.add_argument("--output", type=str, default="/opt/ml/processing/output")
+    parser.add_argument(
+        "--input-filter", type=str, default="$",
+        help="SageMaker JSONPath column filter for model inputs e.g. '$[:-2]' (slice ends inclusive)"
+    )
+    parser.add_argument(
+        "--join-source", type=str, default="None", choices=("None", "Input"),
+        help="'Input' to prefix each output line with the full input record, as in Batch Transform"
+    )
+    parser.add_argument("--workers", type=int, default=cpu_count, help="Worker processes (1 = in-process)")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--chunk-rows", type=int, default=4096, help="Records per scoring chunk")
+    parser.add_argument("--prefetch", type=int, default=2, help="Chunks in flight per worker")
+    parser.add_argument(
+        "--shard-rows", type=int, default=1000000, help="Max records per output shard (0 = unlimited)"
+    )
+    parser.add_argument("--log-level", default=logging.INFO)
+    args = parser.parse_args(args=cmd_args)
+
+    try:
+        args.log_level = int(args.log_level)
+    except ValueError:
+        pass
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config.configure_logger(logger, args)
+    run(args)
+    sys.exit(0)
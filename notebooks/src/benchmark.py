@@ -0,0 +1,506 @@
+"""Offline micro-benchmarks for the PyTorch TabNet inference hot path
+
+Times the SageMaker handler functions in inference.py (model_fn, input_fn, predict_fn, output_fn) without
+deploying an endpoint: Either against an existing model directory, or against a tiny TabNet trained on the
+spot from synthetic Forest-Cover-shaped data. Results are written as JSON, so runs from different commits
+can be compared with the `compare` sub-command to catch inference regressions early. E.g:
+
+    python benchmark.py run --output bench-old.json
+    # ...change something...
+    python benchmark.py run --output bench-new.json
+    python benchmark.py compare bench-old.json bench-new.json
+
+The pipeline's pre-approval performance gate runs the `gate` sub-command in a Processing job. It benchmarks
+the candidate model and writes benchmark.json, plus a comparison.json against the deployed model's stored
+benchmark.json, when one is provided.
+"""
+
+# Python Built-Ins:
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+import torch
+
+# Local Dependencies:
+import config
+import inference
+import train
+
+
+logger = logging.getLogger("benchmark")
+
+DEFAULT_BATCH_SIZES = (1, 8, 64, 512, 4096)
+PERCENTILES = (50, 95, 99)
+
+# Shape of the UCI Forest CoverType data as prepared in notebook 1:
+N_NUMERIC_FEATURES = 10
+N_WILDERNESS_AREAS = 4
+N_SOIL_TYPES = 40
+N_COVER_TYPES = 7
+TARGET_COLUMN = "Cover_Type"
+
+
+def synthetic_forest_cover(n_rows: int, seed: int=1337) -> pd.DataFrame:
+    """Generate a random DataFrame with the same columns, dtypes and rough ranges as Forest CoverType
+
+    The data is not meant to be learnable - just shaped right, so the model and payloads are realistic.
+    """
+    rng = np.random.default_rng(seed)
+    numeric = rng.normal(loc=1000., scale=500., size=(n_rows, N_NUMERIC_FEATURES)).round()
+    wilderness = np.eye(N_WILDERNESS_AREAS)[rng.integers(0, N_WILDERNESS_AREAS, size=n_rows)]
+    soil = np.eye(N_SOIL_TYPES)[rng.integers(0, N_SOIL_TYPES, size=n_rows)]
+    target = rng.integers(1, N_COVER_TYPES + 1, size=n_rows)
+    columns = (
+        [f"Numeric_{i}" for i in range(N_NUMERIC_FEATURES)]
+        + [f"Area_is_{i}" for i in range(N_WILDERNESS_AREAS)]
+        + [f"Soil_Type_is_{i + 1:02}" for i in range(N_SOIL_TYPES)]
+    )
+    df = pd.DataFrame(np.concatenate([numeric, wilderness, soil], axis=1).astype(int), columns=columns)
+    df[TARGET_COLUMN] = target
+    return df
+
+
+def train_tiny_model(
+    model_dir: str,
+    work_dir: str,
+    n_rows: int=4096,
+    seed: int=1337,
+    save_format: str="both",
+):
+    """Train a deliberately small TabNet with train.py on synthetic data, saving to model_dir"""
+    df = synthetic_forest_cover(n_rows, seed=seed)
+    n_train = int(0.8 * n_rows)
+    train_path = os.path.join(work_dir, "train.csv")
+    val_path = os.path.join(work_dir, "validation.csv")
+    df.iloc[:n_train].to_csv(train_path, index=False)
+    df.iloc[n_train:].to_csv(val_path, index=False)
+    args = config.parse_args([
+        "--target", TARGET_COLUMN,
+        "--n-d", "8",
+        "--n-a", "8",
+        "--n-steps", "3",
+        "--max-epochs", "2",
+        "--batch-size", "1024",
+        "--virtual-batch-size", "128",
+        "--seed", str(seed),
+        "--num-workers", "0",
+        "--num-gpus", "0",
+        "--train", train_path,
+        "--validation", val_path,
+        "--model-dir", model_dir,
+        "--output-data-dir", work_dir,
+        "--save-format", save_format,
+    ])
+    train.set_seed(args.seed, use_gpus=False)
+    return train.train(args)
+
+
+def current_rss_bytes() -> int:
+    """Current resident set size of this process (falls back to peak RSS where /proc is not available)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is KiB on Linux but bytes on MacOS:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def model_parameter_bytes(model) -> int:
+    """Total bytes of parameters and buffers in a (pytorch-tabnet wrapped) torch network"""
+    network = getattr(model, "network", model)
+    return sum(
+        t.numel() * t.element_size() for t in list(network.parameters()) + list(network.buffers())
+    )
+
+
+def summarize_latencies(samples_ms) -> dict:
+    """Percentile/mean summary of a list of latencies in milliseconds"""
+    samples = np.asarray(samples_ms, dtype=float)
+    result = { f"p{p}_ms": float(np.percentile(samples, p)) for p in PERCENTILES }
+    result.update({
+        "mean_ms": float(samples.mean()),
+        "min_ms": float(samples.min()),
+        "max_ms": float(samples.max()),
+        "n": int(samples.size),
+    })
+    return result
+
+
+def make_payload(X: np.ndarray, content_type: str):
+    """Serialize a feature batch as a client would, for the given request content type"""
+    if content_type == inference.CSV_CONTENT_TYPE:
+        return inference.output_fn(X, inference.CSV_CONTENT_TYPE)
+    elif content_type == inference.JSON_CONTENT_TYPE:
+        return json.dumps(X.tolist())
+    elif content_type == inference.NPY_CONTENT_TYPE:
+        return inference.output_fn(X.astype(np.float32), inference.NPY_CONTENT_TYPE)
+    else:
+        raise ValueError(f"Unsupported content type '{content_type}'")
+
+
+def invoke(model, payload, content_type: str, accept: str) -> dict:
+    """Run one request through the full handler chain, returning per-stage timings in ms"""
+    t0 = time.perf_counter()
+    input_data = inference.input_fn(payload, content_type)
+    t1 = time.perf_counter()
+    prediction = inference.predict_fn(input_data, model)
+    t2 = time.perf_counter()
+    inference.output_fn(prediction, accept)
+    t3 = time.perf_counter()
+    return {
+        "total": (t3 - t0) * 1000,
+        "input_fn": (t1 - t0) * 1000,
+        "predict_fn": (t2 - t1) * 1000,
+        "output_fn": (t3 - t2) * 1000,
+    }
+
+
+def benchmark_batch_size(
+    model,
+    X: np.ndarray,
+    batch_size: int,
+    content_type: str,
+    accept: str,
+    warmup_iters: int=3,
+    min_iters: int=20,
+    max_iters: int=1000,
+    min_secs: float=2.,
+) -> dict:
+    """Steady-state latency & throughput at one batch size
+
+    Runs at least min_iters requests and until min_secs has elapsed (capped at max_iters), after discarding
+    warmup_iters requests.
+    """
+    payload = make_payload(X[:batch_size], content_type)
+    for _ in range(warmup_iters):
+        invoke(model, payload, content_type, accept)
+
+    stage_samples = { "total": [], "input_fn": [], "predict_fn": [], "output_fn": [] }
+    t_start = time.perf_counter()
+    n = 0
+    while n < max_iters and (n < min_iters or time.perf_counter() - t_start < min_secs):
+        timings = invoke(model, payload, content_type, accept)
+        for stage, ms in timings.items():
+            stage_samples[stage].append(ms)
+        n += 1
+    elapsed = time.perf_counter() - t_start
+
+    result = summarize_latencies(stage_samples["total"])
+    result["stages_p50_ms"] = {
+        stage: float(np.percentile(samples, 50))
+        for stage, samples in stage_samples.items() if stage != "total"
+    }
+    result["payload_bytes"] = len(payload)
+    result["requests_per_sec"] = n / elapsed
+    result["rows_per_sec"] = n * batch_size / elapsed
+    return result
+
+
+def git_commit():
+    """Best-effort current git commit of this source tree, for labelling results"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    model_dir: str,
+    batch_sizes=DEFAULT_BATCH_SIZES,
+    content_type: str=inference.CSV_CONTENT_TYPE,
+    accept: str=inference.CSV_CONTENT_TYPE,
+    seed: int=1337,
+    **kwargs,
+) -> dict:
+    """Benchmark model load, cold first request and steady-state latency for a saved model
+
+    Parameters
+    ----------
+    model_dir : str
+        Folder containing the artifacts produced by train.py
+    batch_sizes : Iterable[int]
+        Request batch sizes (records per request) to measure
+    content_type : str
+        Request serialization format
+    accept : str
+        Response serialization format
+    **kwargs
+        Passed through to benchmark_batch_size()
+    """
+    gc.collect()
+    rss_before = current_rss_bytes()
+    t0 = time.perf_counter()
+    model = inference.model_fn(model_dir)
+    load_ms = (time.perf_counter() - t0) * 1000
+    rss_after = current_rss_bytes()
+
+    X = synthetic_forest_cover(max(batch_sizes), seed=seed).drop(columns=[TARGET_COLUMN]).to_numpy()
+
+    # The very first request on a freshly loaded model pays for any lazy initialization:
+    cold = invoke(model, make_payload(X[:1], content_type), content_type, accept)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "content_type": content_type,
+            "accept": accept,
+        },
+        "model_load_ms": load_ms,
+        "model_rss_bytes": rss_after - rss_before,
+        "model_parameter_bytes": model_parameter_bytes(model),
+        "cold_first_request_ms": cold["total"],
+        "batch_sizes": {},
+    }
+    for batch_size in batch_sizes:
+        logger.info(f"Benchmarking batch size {batch_size}")
+        results["batch_sizes"][str(batch_size)] = benchmark_batch_size(
+            model, X, batch_size, content_type, accept, **kwargs
+        )
+    results["max_rows_per_sec"] = max(r["rows_per_sec"] for r in results["batch_sizes"].values())
+    return results
+
+
+def compare_results(
+    baseline: dict,
+    candidate: dict,
+    max_latency_regression: float=0.1,
+    max_throughput_regression: float=0.1,
+) -> list:
+    """List regressions of candidate vs baseline benchmark results beyond the given fractional thresholds
+
+    Returns
+    -------
+    regressions : List[str]
+        Human-readable descriptions of each regression found (empty if none)
+    """
+    regressions = []
+
+    def check(name, old, new, higher_is_better, threshold):
+        if old is None or new is None or old <= 0:
+            return
+        change = (new - old) / old
+        if (not higher_is_better and change > threshold) or (higher_is_better and change < -threshold):
+            regressions.append(f"{name}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+
+    check(
+        "model_load_ms",
+        baseline.get("model_load_ms"),
+        candidate.get("model_load_ms"),
+        False,
+        max_latency_regression,
+    )
+    for batch_size, old in baseline.get("batch_sizes", {}).items():
+        new = candidate.get("batch_sizes", {}).get(batch_size)
+        if new is None:
+            continue
+        check(f"batch {batch_size} p99_ms", old["p99_ms"], new["p99_ms"], False, max_latency_regression)
+        check(
+            f"batch {batch_size} rows_per_sec",
+            old["rows_per_sec"],
+            new["rows_per_sec"],
+            True,
+            max_throughput_regression,
+        )
+    return regressions
+
+
+def summarize_comparison(
+    baseline: dict,
+    candidate: dict,
+    max_latency_regression: float=0.1,
+    max_throughput_regression: float=0.1,
+) -> dict:
+    """Side-by-side summary of candidate vs (optional) baseline results, with any regressions"""
+    regressions = compare_results(
+        baseline,
+        candidate,
+        max_latency_regression=max_latency_regression,
+        max_throughput_regression=max_throughput_regression,
+    ) if baseline else []
+    baseline_batches = (baseline or {}).get("batch_sizes", {})
+    return {
+        "Passed": not regressions,
+        "HasBaseline": baseline is not None,
+        "Regressions": regressions,
+        "MaxLatencyRegression": max_latency_regression,
+        "MaxThroughputRegression": max_throughput_regression,
+        "ModelLoadMs": {
+            "Candidate": candidate.get("model_load_ms"),
+            "Baseline": (baseline or {}).get("model_load_ms"),
+        },
+        "BatchSizes": {
+            batch_size: {
+                "CandidateP99Ms": new["p99_ms"],
+                "BaselineP99Ms": baseline_batches.get(batch_size, {}).get("p99_ms"),
+                "CandidateRowsPerSec": new["rows_per_sec"],
+                "BaselineRowsPerSec": baseline_batches.get(batch_size, {}).get("rows_per_sec"),
+            }
+            for batch_size, new in candidate.get("batch_sizes", {}).items()
+        },
+    }
+
+
+def parse_args(cmd_args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TabNet inference hot path offline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks and write results JSON")
+    run_parser.add_argument(
+        "--model-dir", type=str, default=None,
+        help="Existing model folder to benchmark. If omitted, a tiny model is trained on synthetic data."
+    )
+    run_parser.add_argument(
+        "--batch-sizes", type=config.list_hyperparam_withparser(int),
+        default=list(DEFAULT_BATCH_SIZES),
+        help="Comma-separated request batch sizes to measure"
+    )
+    run_parser.add_argument("--content-type", type=str, default=inference.CSV_CONTENT_TYPE)
+    run_parser.add_argument("--accept", type=str, default=inference.CSV_CONTENT_TYPE)
+    run_parser.add_argument("--threads", type=int, default=None, help="torch intra-op thread count")
+    run_parser.add_argument("--min-iters", type=int, default=20)
+    run_parser.add_argument("--max-iters", type=int, default=1000)
+    run_parser.add_argument("--min-secs", type=float, default=2.)
+    run_parser.add_argument("--seed", type=int, default=1337)
+    run_parser.add_argument(
+        "--save-format", type=str, default="flat", choices=config.SAVE_FORMATS,
+        help="Artifact format for the synthetic model (to compare model load times between formats)"
+    )
+    run_parser.add_argument("--output", "-o", type=str, default=None, help="Output file (default stdout)")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare two results files, exiting non-zero on regression"
+    )
+    compare_parser.add_argument("baseline", type=str)
+    compare_parser.add_argument("candidate", type=str)
+    compare_parser.add_argument("--max-latency-regression", type=float, default=0.1)
+    compare_parser.add_argument("--max-throughput-regression", type=float, default=0.1)
+
+    gate_parser = subparsers.add_parser(
+        "gate", help="Benchmark a model and compare with a baseline benchmark.json if present (pipeline job)"
+    )
+    gate_parser.add_argument("--model-dir", type=str, default="/opt/ml/processing/model")
+    gate_parser.add_argument(
+        "--baseline-dir", type=str, default="/opt/ml/processing/baseline",
+        help="Folder that may contain the deployed model's benchmark.json"
+    )
+    gate_parser.add_argument("--output-dir", type=str, default="/opt/ml/processing/output")
+    gate_parser.add_argument(
+        "--batch-sizes", type=config.list_hyperparam_withparser(int),
+        default=list(DEFAULT_BATCH_SIZES),
+        help="Comma-separated request batch sizes to measure"
+    )
+    gate_parser.add_argument("--threads", type=int, default=None, help="torch intra-op thread count")
+    gate_parser.add_argument("--min-secs", type=float, default=2.)
+    gate_parser.add_argument("--max-latency-regression", type=float, default=0.1)
+    gate_parser.add_argument("--max-throughput-regression", type=float, default=0.1)
+
+    parser.add_argument("--log-level", default=logging.INFO)
+    return parser.parse_args(args=cmd_args)
+
+
+def main(args):
+    if args.command == "compare":
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        with open(args.candidate, "r") as f:
+            candidate = json.load(f)
+        regressions = compare_results(
+            baseline,
+            candidate,
+            max_latency_regression=args.max_latency_regression,
+            max_throughput_regression=args.max_throughput_regression,
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if not regressions:
+            print("No regressions found")
+        return 1 if regressions else 0
+
+    if args.command == "gate":
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        candidate = run_benchmarks(args.model_dir, batch_sizes=args.batch_sizes, min_secs=args.min_secs)
+        baseline_path = os.path.join(args.baseline_dir, "benchmark.json")
+        baseline = None
+        if os.path.isfile(baseline_path):
+            with open(baseline_path, "r") as f:
+                baseline = json.load(f)
+        else:
+            logger.info(f"No baseline found at {baseline_path}: Recording results only")
+        comparison = summarize_comparison(
+            baseline,
+            candidate,
+            max_latency_regression=args.max_latency_regression,
+            max_throughput_regression=args.max_throughput_regression,
+        )
+        for regression in comparison["Regressions"]:
+            logger.warning(f"REGRESSION {regression}")
+        os.makedirs(args.output_dir, exist_ok=True)
+        with open(os.path.join(args.output_dir, "benchmark.json"), "w") as f:
+            json.dump(candidate, f, indent=2)
+        with open(os.path.join(args.output_dir, "comparison.json"), "w") as f:
+            json.dump(comparison, f, indent=2)
+        # (The pipeline decides what to do about regressions, so this isn't an error)
+        return 0
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_dir = args.model_dir
+        if model_dir is None:
+            model_dir = os.path.join(work_dir, "model")
+            os.makedirs(model_dir)
+            logger.info("Training tiny model on synthetic data")
+            train_tiny_model(model_dir, work_dir, seed=args.seed, save_format=args.save_format)
+        results = run_benchmarks(
+            model_dir,
+            batch_sizes=args.batch_sizes,
+            content_type=args.content_type,
+            accept=args.accept,
+            seed=args.seed,
+            min_iters=args.min_iters,
+            max_iters=args.max_iters,
+            min_secs=args.min_secs,
+        )
+
+    results_str = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(results_str)
+        logger.info(f"Results written to {args.output}")
+    else:
+        print(results_str)
+    return 0
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        args.log_level = int(args.log_level)
+    except ValueError:
+        pass
+    config.configure_logger(logger, args)
+    sys.exit(main(args))
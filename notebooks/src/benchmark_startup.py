@@ -0,0 +1,183 @@
+"""Import-time (startup) benchmark and budget check for the training/serving entry points
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for each target, and reports the
+cumulative import time of the module plus the slowest individual imports under it. Each target has:
+
+- A list of *forbidden* modules which must not be imported eagerly (e.g. `import config` must not import
+  torch): This check is deterministic and machine-independent, so it's the main guard against regressions.
+- An optional budget in milliseconds for the module's cumulative import time (median over --repeats runs).
+
+With --check, the script exits non-zero if any target breaks its budget, so it can be used as a gate in CI
+or before building a container. E.g:
+
+    python benchmark_startup.py --check --output startup.json
+    python benchmark_startup.py --check --budget config=50 --budget util=80
+"""
+
+# Python Built-Ins:
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+NOTEBOOKS_DIR = os.path.dirname(SRC_DIR)
+
+# Which modules to measure, from where, and what they must *not* pull in at import time:
+DEFAULT_TARGETS = {
+    "config": {
+        "cwd": SRC_DIR,
+        "forbidden": ["torch", "pytorch_tabnet"],
+        "budget_ms": 100,
+    },
+    "data": {
+        "cwd": SRC_DIR,
+        "forbidden": ["torch", "pytorch_tabnet"],
+        "budget_ms": None,  # (pandas is needed and its import time varies a lot by machine)
+    },
+    "inference": {
+        "cwd": SRC_DIR,
+        "forbidden": ["pytorch_tabnet", "sklearn", "scipy"],
+        "budget_ms": None,
+    },
+    "train": {
+        "cwd": SRC_DIR,
+        "forbidden": ["pytorch_tabnet", "sklearn", "scipy"],
+        "budget_ms": None,
+    },
+    "util": {
+        "cwd": NOTEBOOKS_DIR,
+        "forbidden": ["boto3", "botocore", "sagemaker", "smexperiments"],
+        "budget_ms": 100,
+    },
+}
+
+
+def parse_importtime(stderr: str):
+    """Parse `-X importtime` output to a list of (module, self_us, cumulative_us, depth) tuples"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            self_us = int(fields[0])
+            cumulative_us = int(fields[1])
+        except ValueError:
+            continue  # The header line
+        name_field = fields[2].rstrip()
+        name = name_field.strip()
+        entries.append((name, self_us, cumulative_us, len(name_field) - len(name_field.lstrip())))
+    return entries
+
+
+def measure_once(module: str, cwd: str) -> dict:
+    """Import `module` in a fresh interpreter with -X importtime and summarize the results"""
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000
+    entries = parse_importtime(proc.stderr)
+    target_entries = [e for e in entries if e[0] == module]
+    return {
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "wall_ms": wall_ms,
+        # Modules imported by interpreter startup (site, encodings...) aren't re-counted under the target:
+        "import_ms": target_entries[-1][2] / 1000 if target_entries else None,
+        "modules": [e[0] for e in entries],
+        "slowest": [
+            { "module": e[0], "self_ms": e[1] / 1000, "cumulative_ms": e[2] / 1000 }
+            for e in sorted(entries, key=lambda e: -e[1])[:10]
+        ],
+    }
+
+
+def measure_target(module: str, spec: dict, repeats: int=5) -> dict:
+    """Measure a target over several fresh-interpreter runs, and check it against its spec"""
+    runs = [measure_once(module, spec["cwd"]) for _ in range(repeats)]
+    failed = [r for r in runs if not r["ok"]]
+    result = {
+        "budget_ms": spec.get("budget_ms"),
+        "violations": [],
+    }
+    if failed:
+        result["violations"].append(f"Import failed: {failed[0]['error']}")
+        return result
+
+    import_times = [r["import_ms"] for r in runs if r["import_ms"] is not None]
+    result["import_ms_median"] = statistics.median(import_times) if import_times else None
+    result["wall_ms_median"] = statistics.median(r["wall_ms"] for r in runs)
+    result["n_modules"] = len(runs[0]["modules"])
+    result["slowest"] = runs[0]["slowest"]
+
+    imported = set(runs[0]["modules"])
+    for forbidden in spec.get("forbidden", []):
+        offenders = sorted(m for m in imported if m == forbidden or m.startswith(f"{forbidden}."))
+        if offenders:
+            result["violations"].append(f"Eagerly imports forbidden module '{forbidden}'")
+    budget = spec.get("budget_ms")
+    if budget is not None and result["import_ms_median"] is not None and result["import_ms_median"] > budget:
+        result["violations"].append(
+            f"Median import time {result['import_ms_median']:.1f}ms exceeds budget {budget}ms"
+        )
+    return result
+
+
+def parse_args(cmd_args=None):
+    parser = argparse.ArgumentParser(description="Measure and check import-time budgets of entry points")
+    parser.add_argument(
+        "targets", nargs="*", default=list(DEFAULT_TARGETS),
+        help=f"Modules to measure (default: {', '.join(DEFAULT_TARGETS)})"
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh-interpreter runs per target")
+    parser.add_argument(
+        "--budget", action="append", default=[],
+        help="Override a target's import budget as target=milliseconds (repeatable)"
+    )
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if any target is over budget")
+    parser.add_argument("--output", "-o", type=str, default=None, help="Output file (default stdout)")
+    args = parser.parse_args(args=cmd_args)
+
+    unknown = [t for t in args.targets if t not in DEFAULT_TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets {unknown}: Expected some of {list(DEFAULT_TARGETS)}")
+    args.budget_overrides = {}
+    for raw in args.budget:
+        target, _, ms = raw.partition("=")
+        if target not in DEFAULT_TARGETS or not ms:
+            parser.error(f"--budget must be target=milliseconds for a known target: Got '{raw}'")
+        args.budget_overrides[target] = float(ms)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = {}
+    for target in args.targets:
+        spec = dict(DEFAULT_TARGETS[target])
+        if target in args.budget_overrides:
+            spec["budget_ms"] = args.budget_overrides[target]
+        results[target] = measure_target(target, spec, repeats=args.repeats)
+        for violation in results[target]["violations"]:
+            print(f"BUDGET VIOLATION [{target}] {violation}", file=sys.stderr)
+
+    results_str = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(results_str)
+    else:
+        print(results_str)
+    if args.check and any(r["violations"] for r in results.values()):
+        sys.exit(1)
@@ -0,0 +1,322 @@
+"""Stream SageMaker Data Capture files hour partition by hour partition, decoding payloads in bulk
+
+Data Capture writes JSONL files under {capture prefix}/{endpoint}/{variant}/yyyy/mm/dd/hh/, one line per
+request with the (CSV, JSON or NPY; maybe base64-encoded) request and response payloads. Here we:
+
+- List the files of an endpoint grouped into hour partitions, each with a fingerprint of its objects so
+  callers can cache per-partition results and only re-process partitions that changed.
+- Read a partition in batches of bounded size, decoding the payloads of a whole batch at once: CSV payloads
+  are joined into one document for pandas' C parser, and JSON payloads into one array for a single parse.
+  Requests can hold several records, so each batch carries the request index of every row.
+
+Objects are addressed by s3:// URI, through a store: S3Store (boto3, imported only when used) or LocalStore,
+a stand-in mapping s3://bucket/key to {root}/bucket/key on the local filesystem.
+"""
+
+# Python Built-Ins:
+import base64
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger("capture")
+
+CSV_CONTENT_TYPE = "text/csv"
+JSON_CONTENT_TYPE = "application/json"
+NPY_CONTENT_TYPE = "application/x-npy"
+
+HOUR_PARTITION_PATTERN = re.compile(
+    r"/(?P<variant>[^/]+)/(?P<y>\d{4})/(?P<m>\d{2})/(?P<d>\d{2})/(?P<h>\d{2})/[^/]+\.jsonl$"
+)
+
+ObjectInfo = namedtuple("ObjectInfo", ["uri", "size", "version"])
+Partition = namedtuple("Partition", ["uri", "variant", "hour", "objects"])
+CaptureBatch = namedtuple(
+    "CaptureBatch",
+    [
+        # 2D float arrays of request and response records, row-aligned:
+        "inputs",
+        "outputs",
+        # Per row: Index of the request in the batch, and the request's eventId and inferenceTime:
+        "request_index",
+        "event_ids",
+        "event_times",
+        # Number of captured requests read, and how many of them couldn't be decoded/aligned:
+        "n_requests",
+        "n_skipped",
+    ],
+)
+
+
+def column_names(n: int):
+    """Model Monitor's names for the columns of headerless CSV (as captured)"""
+    return [f"_c{ix}" for ix in range(n)]
+
+
+def split_uri(uri: str):
+    """Split s3://bucket/key to (bucket, key)"""
+    if not uri.startswith("s3://"):
+        raise ValueError(f"Expected an s3:// URI: Got {uri}")
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+class LocalStore:
+    """Object store stand-in on the local filesystem: s3://bucket/key is the file {root}/bucket/key"""
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, uri: str) -> str:
+        bucket, key = split_uri(uri)
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def list(self, prefix_uri: str):
+        """Yield ObjectInfo for each object under prefix_uri, in key order"""
+        bucket, prefix = split_uri(prefix_uri)
+        bucket_root = os.path.join(self.root, bucket)
+        # Walk from the deepest whole folder in the prefix, then filter on the full prefix (as S3 does):
+        folder = os.path.join(bucket_root, *prefix.split("/")[:-1])
+        keys = []
+        for dirpath, _, filenames in os.walk(folder):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(dirpath, filename), bucket_root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        for key in sorted(keys):
+            stat = os.stat(os.path.join(bucket_root, key))
+            yield ObjectInfo(f"s3://{bucket}/{key}", stat.st_size, str(stat.st_mtime_ns))
+
+    def read(self, uri: str) -> bytes:
+        with open(self.path(uri), "rb") as f:
+            return f.read()
+
+    def write(self, uri: str, data: bytes):
+        path = self.path(uri)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+class S3Store:
+    """Amazon S3 (needs boto3)"""
+    def __init__(self, s3client=None):
+        if s3client is None:
+            import boto3
+            s3client = boto3.client("s3")
+        self.s3client = s3client
+
+    def list(self, prefix_uri: str):
+        """Yield ObjectInfo for each object under prefix_uri, in key order"""
+        bucket, prefix = split_uri(prefix_uri)
+        paginator = self.s3client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield ObjectInfo(f"s3://{bucket}/{obj['Key']}", obj["Size"], obj["ETag"])
+
+    def read(self, uri: str) -> bytes:
+        bucket, key = split_uri(uri)
+        return self.s3client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    def write(self, uri: str, data: bytes):
+        bucket, key = split_uri(uri)
+        self.s3client.put_object(Bucket=bucket, Key=key, Body=data)
+
+
+def open_store(local_root: str=None):
+    """A LocalStore on local_root if set, else S3"""
+    return LocalStore(local_root) if local_root else S3Store()
+
+
+def fingerprint(objects) -> str:
+    """Hash of a list of ObjectInfo: Changes whenever an object is added, removed or rewritten"""
+    digest = hashlib.sha256()
+    for obj in sorted(objects):
+        digest.update(f"{obj.uri}\t{obj.size}\t{obj.version}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def list_partitions(store, capture_uri: str, endpoint_name: str, variant: str=None, start=None, end=None):
+    """List an endpoint's capture files by (variant, hour) partition, oldest first
+
+    Parameters
+    ----------
+    capture_uri : str
+        The DataCaptureConfig DestinationS3Uri (files are under {capture_uri}/{endpoint_name}/...)
+    variant : str (Optional)
+        Only list this variant's partitions
+    start, end : datetime (Optional)
+        Only list partitions with start <= hour < end (naive datetimes are taken as UTC)
+    """
+    prefix = "/".join((capture_uri.rstrip("/"), endpoint_name, f"{variant}/" if variant else ""))
+    start, end = (
+        t.replace(tzinfo=timezone.utc) if t is not None and t.tzinfo is None else t for t in (start, end)
+    )
+    partitions = {}
+    for obj in store.list(prefix):
+        match = HOUR_PARTITION_PATTERN.search(obj.uri)
+        if not match:
+            continue
+        hour = datetime(
+            *(int(match.group(g)) for g in ("y", "m", "d", "h")), tzinfo=timezone.utc
+        )
+        if (start is not None and hour < start) or (end is not None and hour >= end):
+            continue
+        uri = obj.uri[:match.end("h") + 1]
+        partitions.setdefault((hour, match.group("variant"), uri), []).append(obj)
+    return [
+        Partition(uri, variant_name, hour, tuple(objects))
+        for (hour, variant_name, uri), objects in sorted(partitions.items())
+    ]
+
+
+def _payload_text(capture: dict) -> str:
+    if capture.get("encoding") == "BASE64":
+        return base64.b64decode(capture["data"]).decode("utf-8")
+    return capture["data"]
+
+
+def _as_rows(array) -> np.ndarray:
+    # A flat list/array is a single record:
+    array = np.asarray(array, dtype=np.float64)
+    return array.reshape(1, -1) if array.ndim < 2 else array.reshape(len(array), -1)
+
+
+def decode_payloads(captures):
+    """Decode a list of captureData.endpointInput/endpointOutput dicts to records
+
+    Returns
+    -------
+    rows : List[np.ndarray | None]
+        Per payload, a 2D float array of its records (None if undecodable)
+    """
+    rows = [None] * len(captures)
+    csv_ixs, csv_texts, json_ixs, json_texts = [], [], [], []
+    for ix, capture in enumerate(captures):
+        content_type = capture.get("observedContentType", "").split(";")[0].strip().lower()
+        try:
+            if content_type == CSV_CONTENT_TYPE:
+                text = _payload_text(capture).strip()
+                if text:
+                    csv_ixs.append(ix)
+                    csv_texts.append(text)
+            elif content_type == JSON_CONTENT_TYPE:
+                json_ixs.append(ix)
+                json_texts.append(_payload_text(capture))
+            elif content_type == NPY_CONTENT_TYPE:
+                data = base64.b64decode(capture["data"])
+                rows[ix] = _as_rows(np.load(io.BytesIO(data), allow_pickle=False))
+        except (ValueError, UnicodeDecodeError) as err:
+            logger.debug(f"Couldn't decode {content_type} payload: {err}")
+
+    if csv_texts:
+        # One parse for the whole batch, then split back by each payload's line count:
+        n_lines = np.array([text.count("\n") + 1 for text in csv_texts])
+        try:
+            matrix = pd.read_csv(
+                io.StringIO("\n".join(csv_texts)), header=None, skip_blank_lines=False
+            ).apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        except (ValueError, pd.errors.ParserError) as err:
+            # (e.g. payloads with different numbers of columns): Fall back to parsing one at a time
+            logger.debug(f"Batch CSV parse failed, parsing payloads individually: {err}")
+            matrix = None
+        if matrix is not None and len(matrix) == n_lines.sum():
+            for ix, chunk in zip(csv_ixs, np.split(matrix, np.cumsum(n_lines)[:-1])):
+                rows[ix] = chunk
+        else:
+            for ix, text in zip(csv_ixs, csv_texts):
+                try:
+                    rows[ix] = _as_rows(np.genfromtxt(io.StringIO(text), delimiter=",", ndmin=1))
+                except ValueError:
+                    pass
+
+    if json_texts:
+        try:
+            parsed = json.loads("[" + ",".join(json_texts) + "]")
+        except ValueError:
+            parsed = []
+            for text in json_texts:
+                try:
+                    parsed.append(json.loads(text))
+                except ValueError:
+                    parsed.append(None)
+        for ix, value in zip(json_ixs, parsed):
+            try:
+                rows[ix] = None if value is None else _as_rows(value)
+            except (TypeError, ValueError):
+                pass
+    return rows
+
+
+def _modal_width(arrays) -> int:
+    widths = Counter(a.shape[1] for a in arrays if a is not None)
+    return widths.most_common(1)[0][0] if widths else None
+
+
+def _decode_batch(lines, n_columns: int=None) -> CaptureBatch:
+    records = [json.loads(line) for line in lines]
+    inputs = decode_payloads([r["captureData"]["endpointInput"] for r in records])
+    outputs = decode_payloads([r["captureData"].get("endpointOutput", {}) for r in records])
+    # Rows are stacked across requests, so requests whose input (or output) width differs from the most
+    # common one, or whose output doesn't have one row per input record, are skipped:
+    input_width = n_columns or _modal_width(inputs)
+    keep = [
+        ix for ix, (i, o) in enumerate(zip(inputs, outputs))
+        if i is not None and i.shape[1] == input_width and (o is None or len(o) == len(i))
+    ]
+    output_width = _modal_width([outputs[ix] for ix in keep]) or 0
+    keep = [ix for ix in keep if outputs[ix] is None or outputs[ix].shape[1] == output_width]
+
+    if not keep:
+        empty = np.empty((0, 0))
+        return CaptureBatch(
+            empty, empty, np.empty(0, dtype=np.int64), np.empty(0, dtype=object),
+            np.empty(0, dtype="datetime64[ms]"), len(records), len(records),
+        )
+    n_rows = np.array([len(inputs[ix]) for ix in keep])
+    metadata = [records[ix].get("eventMetadata", {}) for ix in keep]
+    request_index = np.repeat(np.array(keep), n_rows)
+    return CaptureBatch(
+        np.concatenate([inputs[ix] for ix in keep]),
+        np.concatenate([
+            outputs[ix] if outputs[ix] is not None else np.full((len(inputs[ix]), output_width), np.nan)
+            for ix in keep
+        ]),
+        request_index,
+        np.repeat(np.array([m.get("eventId") for m in metadata], dtype=object), n_rows),
+        np.repeat(
+            pd.to_datetime(
+                [m.get("inferenceTime") for m in metadata], utc=True, errors="coerce"
+            ).tz_localize(None).to_numpy(dtype="datetime64[ms]"),
+            n_rows,
+        ),
+        len(records),
+        len(records) - len(keep),
+    )
+
+
+def iter_batches(store, objects, batch_requests: int=10000, n_columns: int=None):
+    """Yield CaptureBatches of at most batch_requests captured requests from a list of ObjectInfo
+
+    Only one object and one batch of request lines are held in memory at a time. Set n_columns to drop
+    requests with a different number of input features (e.g. malformed ones).
+    """
+    lines = []
+    for obj in objects:
+        for line in store.read(obj.uri).decode("utf-8").splitlines():
+            if line.strip():
+                lines.append(line)
+            if len(lines) >= batch_requests:
+                yield _decode_batch(lines, n_columns)
+                lines = []
+    if lines:
+        yield _decode_batch(lines, n_columns)
@@ -0,0 +1,276 @@
+"""Compact SageMaker Data Capture JSONL into one Parquet file per endpoint variant and hour
+
+Data Capture writes many small JSONL objects per hour, so listing and fetching them dominates any analysis.
+This job decodes each (variant, hour) capture partition once (see capture.py) into a single Parquet file,
+sorted by event time, with columns:
+
+- event_time (UTC timestamp), event_id, variant and request (index of the request within the file)
+- _c0, _c1, ... the request's feature records (named as Model Monitor names headerless CSV)
+- output_0, output_1, ... the model's output for each record (e.g. class probabilities)
+
+...under {compacted_uri}/{endpoint}/{variant}/yyyy/mm/dd/hh/captures.parquet, and indexes the files in one
+{compacted_uri}/{endpoint}/_manifest.json with each one's variant, hour, event time range, row count and
+the fingerprint of the capture files it was built from. Runs are incremental: Hours already compacted from
+the same capture files are skipped, and hours still being written (within --settle-minutes of their end)
+are left for the next run. E.g:
+
+    python compact.py --capture-uri s3://{bucket}/capture --compacted-uri s3://{bucket}/compacted \\
+        --endpoint-name forestcover --hours 48
+
+Readers use the manifest to list only the files overlapping a time window: list_partitions() and
+iter_batches() here mirror the capture module's, so drift.py and replay.py can read either source.
+"""
+
+# Python Built-Ins:
+import argparse
+from datetime import datetime, timedelta, timezone
+import io
+import json
+import logging
+import sys
+import time
+
+# External Dependencies:
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Local Dependencies:
+import capture
+
+
+logger = logging.getLogger("compact")
+
+MANIFEST_FILENAME = "_manifest.json"
+PARTITION_FILENAME = "captures.parquet"
+OUTPUT_COLUMN_PREFIX = "output_"
+DEFAULT_SETTLE_MINUTES = 15
+
+
+def manifest_uri(compacted_uri: str, endpoint_name: str) -> str:
+    return f"{compacted_uri.rstrip('/')}/{endpoint_name}/{MANIFEST_FILENAME}"
+
+
+def load_manifest(store, compacted_uri: str, endpoint_name: str) -> dict:
+    """Manifest entries by source capture partition URI (empty if there's no manifest yet)"""
+    uri = manifest_uri(compacted_uri, endpoint_name)
+    if not any(obj.uri == uri for obj in store.list(uri)):
+        return {}
+    content = store.read(uri)
+    return { entry["Partition"]: entry for entry in json.loads(content)["Partitions"] }
+
+
+def save_manifest(store, compacted_uri: str, endpoint_name: str, entries: dict):
+    ordered = sorted(entries.values(), key=lambda e: (e["Hour"], e["Variant"]))
+    store.write(
+        manifest_uri(compacted_uri, endpoint_name),
+        json.dumps({ "EndpointName": endpoint_name, "Partitions": ordered }, indent=1).encode("utf-8"),
+    )
+
+
+def batch_table(batch: capture.CaptureBatch, variant: str, request_offset: int=0) -> pa.Table:
+    columns = {
+        "event_time": pa.array(batch.event_times, type=pa.timestamp("ms", tz="UTC")),
+        "event_id": pa.array(batch.event_ids.tolist(), type=pa.string()),
+        "variant": pa.array([variant] * len(batch.inputs), type=pa.string()).dictionary_encode(),
+        "request": pa.array(batch.request_index + request_offset, type=pa.int64()),
+    }
+    for name, values in zip(capture.column_names(batch.inputs.shape[1]), batch.inputs.T):
+        columns[name] = pa.array(values, type=pa.float64())
+    for ix, values in enumerate(batch.outputs.T):
+        columns[f"{OUTPUT_COLUMN_PREFIX}{ix}"] = pa.array(values, type=pa.float64())
+    return pa.table(columns)
+
+
+def compact_partition(store, partition: capture.Partition, output_uri: str,
+        batch_requests: int=10000) -> dict:
+    """Decode one capture partition to a Parquet file at output_uri, returning its manifest entry"""
+    tables = []
+    n_requests, n_skipped = 0, 0
+    for batch in capture.iter_batches(store, partition.objects, batch_requests):
+        table = batch_table(batch, partition.variant, n_requests) if len(batch.inputs) else None
+        n_requests += batch.n_requests
+        n_skipped += batch.n_skipped
+        if table is None:
+            continue
+        if tables and table.schema != tables[0].schema:
+            # (Different numbers of features or outputs to earlier batches: Can't share a file)
+            n_skipped += len(np.unique(batch.request_index))
+            continue
+        tables.append(table)
+
+    entry = {
+        "Partition": partition.uri,
+        "Uri": output_uri,
+        "Variant": partition.variant,
+        "Hour": partition.hour.isoformat(),
+        "Fingerprint": capture.fingerprint(partition.objects),
+        "SourceObjects": len(partition.objects),
+        "Requests": n_requests,
+        "Skipped": n_skipped,
+        "Rows": 0,
+        "Bytes": 0,
+        "MinEventTime": None,
+        "MaxEventTime": None,
+    }
+    if not tables:
+        entry["Uri"] = None
+        return entry
+    table = pa.concat_tables(tables)
+    table = table.take(pc.sort_indices(table, sort_keys=[("event_time", "ascending")]))
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd")
+    store.write(output_uri, buffer.getvalue())
+    event_times = table.column("event_time")
+    entry.update({
+        "Rows": table.num_rows,
+        "Bytes": buffer.tell(),
+        "MinEventTime": pc.min(event_times).as_py().isoformat(),
+        "MaxEventTime": pc.max(event_times).as_py().isoformat(),
+    })
+    return entry
+
+
+def compact_endpoint(store, capture_uri: str, compacted_uri: str, endpoint_name: str, start=None, end=None,
+        settle_minutes: float=DEFAULT_SETTLE_MINUTES, batch_requests: int=10000, force: bool=False) -> dict:
+    """Compact an endpoint's new or changed capture partitions in [start, end)
+
+    Returns
+    -------
+    summary : dict
+        Counts of Compacted, Skipped (already up to date) and Open (not yet settled) partitions, with the
+        objects read and written
+    """
+    settled_before = datetime.now(timezone.utc) - timedelta(hours=1, minutes=settle_minutes)
+    entries = load_manifest(store, compacted_uri, endpoint_name)
+    partitions = capture.list_partitions(store, capture_uri, endpoint_name, start=start, end=end)
+    summary = { "Compacted": 0, "Skipped": 0, "Open": 0, "ObjectsRead": 0, "RowsWritten": 0 }
+    for partition in partitions:
+        if partition.hour > settled_before:
+            summary["Open"] += 1
+            continue
+        existing = entries.get(partition.uri)
+        if not force and existing and existing["Fingerprint"] == capture.fingerprint(partition.objects):
+            summary["Skipped"] += 1
+            continue
+        output_uri = "/".join((
+            compacted_uri.rstrip("/"),
+            endpoint_name,
+            partition.variant,
+            partition.hour.strftime("%Y/%m/%d/%H"),
+            PARTITION_FILENAME,
+        ))
+        t_start = time.perf_counter()
+        entry = compact_partition(store, partition, output_uri, batch_requests)
+        logger.info(
+            "Compacted {} objects ({} requests) to {} rows in {:.2f}s: {}".format(
+                len(partition.objects), entry["Requests"], entry["Rows"], time.perf_counter() - t_start,
+                entry["Uri"],
+            )
+        )
+        entries[partition.uri] = entry
+        # Save progress as we go, so an interrupted run doesn't redo finished hours:
+        save_manifest(store, compacted_uri, endpoint_name, entries)
+        summary["Compacted"] += 1
+        summary["ObjectsRead"] += len(partition.objects)
+        summary["RowsWritten"] += entry["Rows"]
+    return summary
+
+
+def list_partitions(store, compacted_uri: str, endpoint_name: str, variant: str=None, start=None, end=None):
+    """List compacted files as capture.Partitions (with the file as the only object), oldest first
+
+    Takes the same arguments as capture.list_partitions, but only reads the manifest.
+    """
+    start, end = (
+        t.replace(tzinfo=timezone.utc) if t is not None and t.tzinfo is None else t for t in (start, end)
+    )
+    partitions = []
+    for entry in load_manifest(store, compacted_uri, endpoint_name).values():
+        hour = datetime.fromisoformat(entry["Hour"])
+        if not entry["Uri"] or (variant and entry["Variant"] != variant):
+            continue
+        if (start is not None and hour < start) or (end is not None and hour >= end):
+            continue
+        obj = capture.ObjectInfo(entry["Uri"], entry["Bytes"], entry["Fingerprint"])
+        partitions.append(capture.Partition(entry["Uri"], entry["Variant"], hour, (obj,)))
+    return sorted(partitions, key=lambda p: (p.hour, p.variant))
+
+
+def iter_batches(store, objects, batch_requests: int=10000, n_columns: int=None):
+    """Yield capture.CaptureBatches of compacted files' rows (as capture.iter_batches does for JSONL)
+
+    Batches are of about batch_requests rows, rather than requests.
+    """
+    for obj in objects:
+        parquet = pq.ParquetFile(io.BytesIO(store.read(obj.uri)))
+        names = parquet.schema_arrow.names
+        input_names = [n for n in names if n.startswith("_c")]
+        output_names = [n for n in names if n.startswith(OUTPUT_COLUMN_PREFIX)]
+        if n_columns is not None and len(input_names) != n_columns:
+            logger.warning(f"Skipping {obj.uri}: Has {len(input_names)} features, not {n_columns}")
+            continue
+        last_request = None
+        for record_batch in parquet.iter_batches(batch_size=batch_requests):
+            def matrix(columns):
+                if not columns:
+                    return np.empty((record_batch.num_rows, 0))
+                return np.column_stack([
+                    record_batch.column(names.index(n)).to_numpy(zero_copy_only=False) for n in columns
+                ])
+            requests = record_batch.column(names.index("request")).to_numpy()
+            # (Rows are sorted by time, not request, but a request's rows share a time so stay adjacent)
+            n_requests = len(np.unique(requests)) - int(len(requests) > 0 and requests[0] == last_request)
+            last_request = requests[-1] if len(requests) else last_request
+            yield capture.CaptureBatch(
+                matrix(input_names),
+                matrix(output_names),
+                requests,
+                np.array(record_batch.column(names.index("event_id")).to_pylist(), dtype=object),
+                record_batch.column(names.index("event_time")).to_numpy().astype("datetime64[ms]"),
+                n_requests,
+                0,
+            )
+
+
+def parse_args(cmd_args=None):
+    parser = argparse.ArgumentParser(description="Compact Data Capture JSONL to hourly Parquet files")
+    parser.add_argument("--capture-uri", type=str, required=True, help="Data capture DestinationS3Uri")
+    parser.add_argument("--compacted-uri", type=str, required=True, help="Where to write compacted files")
+    parser.add_argument("--endpoint-name", type=str, required=True)
+    parser.add_argument("--hours", type=float, default=None, help="Only look back N hours (default all)")
+    parser.add_argument("--settle-minutes", type=float, default=DEFAULT_SETTLE_MINUTES,
+        help="Leave hours that ended less than this long ago for the next run"
+    )
+    parser.add_argument("--force", action="store_true", help="Re-compact hours that are already up to date")
+    parser.add_argument("--local-root", type=str, default=None, help="Local stand-in folder for S3")
+    parser.add_argument("--batch-requests", type=int, default=10000)
+    parser.add_argument("--log-level", default=logging.INFO)
+    args = parser.parse_args(args=cmd_args)
+
+    try:
+        args.log_level = int(args.log_level)
+    except ValueError:
+        pass
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(
+        stream=sys.stdout,
+        level=args.log_level,
+        format="%(asctime)s [%(name)s] %(levelname)s %(message)s",
+    )
+    summary = compact_endpoint(
+        capture.open_store(args.local_root),
+        args.capture_uri,
+        args.compacted_uri,
+        args.endpoint_name,
+        start=datetime.now(timezone.utc) - timedelta(hours=args.hours) if args.hours else None,
+        settle_minutes=args.settle_minutes,
+        batch_requests=args.batch_requests,
+        force=args.force,
+    )
+    print(json.dumps(summary, indent=2))
@@ -10,10 +10,8 @@ import logging
 import os
 import sys
 
-# External Dependencies:
-import torch
-
 MODEL_TYPES=("classification", "regression")
+SAVE_FORMATS=("both", "flat", "zip")
 
 def configure_logger(logger, args):
     """Configure a logger's level and handler (since base container already configures top level logging)"""
@@ -199,6 +197,17 @@ def parse_args(cmd_args=None):
     parser.add_argument("--output-data-dir", type=str,
         default=os.environ.get("SM_OUTPUT_DATA_DIR", "/opt/ml/output/data")
     )
+    parser.add_argument("--save-format", type=str, default=hps.get("save-format", "both"),
+        help=f"Model artifact format(s) to save, one of: {', '.join(SAVE_FORMATS)}. 'flat' loads fastest "
+        "(see artifact.py) and 'zip' is pytorch-tabnet's own tabnet.zip, for older inference code."
+    )
+    parser.add_argument("--baseline", type=boolean_hyperparam, default=hps.get("baseline", True),
+        help="Save a Model Monitor baseline (statistics.json, constraints.json) of the training features "
+        "to baseline/ in the model artifact (see baseline.py)"
+    )
+    parser.add_argument("--baseline-s3-uri", type=str, default=hps.get("baseline-s3-uri"),
+        help="Optional S3 prefix to also upload the baseline to"
+    )
     parser.add_argument("--train", type=str, default=os.environ.get("SM_CHANNEL_TRAIN"))
     parser.add_argument("--validation", type=str, default=os.environ.get("SM_CHANNEL_VALIDATION"))
 
@@ -219,6 +228,9 @@ def parse_args(cmd_args=None):
     if args.model_type not in MODEL_TYPES:
         parser.error(f"--model-type must be one of {MODEL_TYPES}")
 
+    if args.save_format not in SAVE_FORMATS:
+        parser.error(f"--save-format must be one of {SAVE_FORMATS}")
+
     # Accept numeric (index) target column specification:
     try:
         args.target = int(args.target)
@@ -240,9 +252,12 @@ def parse_args(cmd_args=None):
                 f"Mismatch: Got {n_cat_idxs} --cat-idxs but {n_cat_emb_dims} --cat-emb-dims"
             )
 
-    if args.num_gpus and not torch.cuda.is_available():
-        parser.error(
-            f"Got --num-gpus {args.num_gpus} but torch says cuda is not available: Cannot use GPUs"
-        )
+    if args.num_gpus:
+        # torch is slow to import and not otherwise needed for config parsing, so only import it here:
+        import torch
+        if not torch.cuda.is_available():
+            parser.error(
+                f"Got --num-gpus {args.num_gpus} but torch says cuda is not available: Cannot use GPUs"
+            )
 
     return args
@@ -9,32 +9,29 @@ import pandas as pd
 
 logger = logging.getLogger("data")
 
-def get_dataset(channel, args):
-    """Load a CSV dataset from file/folder `channel` to an X, y numpy pair"""
+def resolve_data_path(channel):
+    """Find the data file of a channel file/folder"""
     if os.path.isdir(channel):
         contents = os.listdir(channel)
         if len(contents) == 1:
-            data_path = os.path.join(channel, contents[0])
-        else:
-            csv_contents = list(filter(lambda s: s.endswith(".csv"), map(lambda s: s.lower(), contents)))
-            if len(csv_contents) == 1:
-                data_path = os.path.join(channel, csv_contents[0])
-            else:
-                raise ValueError(
-                    "Channel folder {} must contain exactly one file or exactly one .csv. Got {}".format(
-                        channel,
-                        contents
-                    )
-                )
+            return os.path.join(channel, contents[0])
+        csv_contents = list(filter(lambda s: s.endswith(".csv"), map(lambda s: s.lower(), contents)))
+        if len(csv_contents) == 1:
+            return os.path.join(channel, csv_contents[0])
+        raise ValueError(
+            "Channel folder {} must contain exactly one file or exactly one .csv. Got {}".format(
+                channel,
+                contents
+            )
+        )
     elif os.path.isfile(channel):
-        data_path = channel
+        return channel
     else:
         raise ValueError(f"Channel {channel} is neither file nor directory")
 
-    logger.info(f"Reading file {data_path}")
-    df = pd.read_csv(data_path)
-    logger.info(f"Got shape {df.shape}")
 
+def split_target(df, args):
+    """Split a DataFrame to X, y numpy arrays by args.target (column name or index)"""
     if isinstance(args.target, int):
         # args.target is a column index
         y = df.iloc[:, args.target]
@@ -49,3 +46,21 @@ def get_dataset(channel, args):
         raise ValueError(
             f"args.target is neither str (column name) nor int (column index): Got {args.target}"
         )
+
+
+def get_dataset(channel, args):
+    """Load a CSV dataset from file/folder `channel` to an X, y numpy pair"""
+    data_path = resolve_data_path(channel)
+    logger.info(f"Reading file {data_path}")
+    df = pd.read_csv(data_path)
+    logger.info(f"Got shape {df.shape}")
+    return split_target(df, args)
+
+
+def iter_dataset_chunks(channel, args, chunk_rows: int=100000):
+    """Like get_dataset, but yield (X, y, feature_names) for chunks of up to chunk_rows rows at a time"""
+    data_path = resolve_data_path(channel)
+    logger.info(f"Reading file {data_path} in chunks of {chunk_rows} rows")
+    for df in pd.read_csv(data_path, chunksize=chunk_rows):
+        X, y = split_target(df, args)
+        yield X, y, list(df.columns)
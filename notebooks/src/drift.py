@@ -0,0 +1,329 @@
+"""Score drift of captured endpoint traffic against a training baseline, incrementally and in bounded memory
+
+Summarizes each hour partition of an endpoint's Data Capture (see capture.py) to mergeable per-feature
+statistics (see sketches.py) of the request records and the model's outputs, caching each partition's
+summary under --cache-dir with a fingerprint of its files. Re-runs only read partitions that are new or have
+changed since (e.g. the current hour), then merge all the summaries and compare the inputs to the baseline:
+
+- PSI (population stability index) over the baseline's decile bins
+- KS: Maximum difference between the baseline and current (sketched) CDFs
+- MeanShift: Difference of means, in baseline standard deviations
+- Change in the rate of missing (non-numeric) values
+
+The baseline may be a SageMaker Model Monitor statistics.json (with KLL sketches, as suggested by Model
+Monitor or by train.py), or a saved FeatureStats. Capture is headerless, so features are matched by position.
+E.g:
+
+    python drift.py --capture-uri s3://{bucket}/capture --endpoint-name forestcover \\
+        --baseline s3://{bucket}/.../statistics.json --hours 24 --cache-dir .drift-cache --output drift.json
+
+Set --local-root to read s3:// URIs from a local folder instead of S3 (see capture.LocalStore), and
+--compacted to read the hourly Parquet files written by compact.py rather than the raw capture JSONL.
+"""
+
+# Python Built-Ins:
+import argparse
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+
+# External Dependencies:
+import numpy as np
+
+# Local Dependencies:
+import capture
+from sketches import FeatureStats
+
+
+logger = logging.getLogger("drift")
+
+DEFAULT_PSI_THRESHOLD = 0.2
+DEFAULT_KS_THRESHOLD = 0.1
+QUANTILE_BINS = 10
+# Floor on bin proportions, so PSI stays finite when a bin is empty:
+PSI_EPSILON = 1e-4
+
+
+def partition_stats(store, partition: capture.Partition, feature_names=None, batch_requests: int=10000,
+        source=capture):
+    """Summarize one capture partition's request (Inputs) and response (Outputs) records
+
+    source is the module to read the partition with: capture (JSONL files) or compact (Parquet).
+
+    Returns
+    -------
+    summary : dict
+        JSON-able, with Inputs and Outputs as FeatureStats dicts (None if there were no records)
+    """
+    inputs, outputs = None, None
+    n_requests, n_skipped = 0, 0
+    n_columns = len(feature_names) if feature_names else None
+    for batch in source.iter_batches(store, partition.objects, batch_requests, n_columns=n_columns):
+        n_requests += batch.n_requests
+        n_skipped += batch.n_skipped
+        if not len(batch.inputs):
+            continue
+        if inputs is None:
+            inputs = FeatureStats(feature_names or capture.column_names(batch.inputs.shape[1]))
+        inputs.update(batch.inputs)
+        if batch.outputs.shape[1]:
+            if outputs is None:
+                outputs = FeatureStats(capture.column_names(batch.outputs.shape[1]))
+            if batch.outputs.shape[1] == len(outputs.names):
+                outputs.update(batch.outputs)
+    if n_skipped:
+        logger.warning(f"Skipped {n_skipped} of {n_requests} captured requests in {partition.uri}")
+    return {
+        "Partition": partition.uri,
+        "Variant": partition.variant,
+        "Hour": partition.hour.isoformat(),
+        "Requests": n_requests,
+        "Skipped": n_skipped,
+        "Inputs": inputs.to_dict() if inputs else None,
+        "Outputs": outputs.to_dict() if outputs else None,
+    }
+
+
+class PartitionCache:
+    """Per-partition summaries on local disk, valid until the partition's files or feature names change"""
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(partition: capture.Partition, feature_names=None) -> str:
+        names = "\t".join(feature_names or [])
+        return capture.fingerprint(partition.objects) + hashlib.sha256(names.encode("utf-8")).hexdigest()[:8]
+
+    def _path(self, partition: capture.Partition) -> str:
+        return os.path.join(
+            self.cache_dir, hashlib.sha256(partition.uri.encode("utf-8")).hexdigest()[:32] + ".json"
+        )
+
+    def get(self, partition: capture.Partition, feature_names=None):
+        try:
+            with open(self._path(partition), "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached["Summary"] if cached.get("Key") == self.key(partition, feature_names) else None
+
+    def put(self, partition: capture.Partition, summary: dict, feature_names=None):
+        # Write then rename, so an interrupted run can't leave a truncated entry:
+        path = self._path(partition)
+        with open(path + ".tmp", "w") as f:
+            json.dump({ "Key": self.key(partition, feature_names), "Summary": summary }, f)
+        os.replace(path + ".tmp", path)
+
+
+def load_baseline(uri_or_path: str, store=None) -> FeatureStats:
+    """Load baseline FeatureStats from a Model Monitor statistics.json or a FeatureStats.to_dict() JSON"""
+    if uri_or_path.startswith("s3://"):
+        content = (store or capture.S3Store()).read(uri_or_path)
+    else:
+        with open(uri_or_path, "rb") as f:
+            content = f.read()
+    baseline = json.loads(content)
+    if "names" in baseline:
+        return FeatureStats.from_dict(baseline)
+    return FeatureStats.from_model_monitor(baseline)
+
+
+def _optional_float(value):
+    return None if value is None or not math.isfinite(value) else float(value)
+
+
+def feature_drift(baseline, current, bins: int=QUANTILE_BINS) -> dict:
+    """Drift scores of one feature's current NumericStats against its baseline NumericStats"""
+    def missing_rate(stats):
+        total = stats.present + stats.missing
+        return stats.missing / total if total else None
+
+    scores = {
+        "PSI": None,
+        "KS": None,
+        "MeanShift": None,
+        "BaselineMean": _optional_float(baseline.mean) if baseline.present else None,
+        "Mean": _optional_float(current.mean) if current.present else None,
+        "BaselineMissingRate": missing_rate(baseline),
+        "MissingRate": missing_rate(current),
+    }
+    if not (baseline.present and current.present and baseline.kll.count and current.kll.count):
+        return scores
+
+    # PSI over the baseline's quantile bins (fewer, for features with few distinct values):
+    edges = np.unique(baseline.kll.quantiles(np.linspace(0, 1, bins + 1)[1:-1]))
+    base_p = np.diff(np.concatenate([[0.], baseline.kll.cdf(edges), [1.]]))
+    cur_p = np.diff(np.concatenate([[0.], current.kll.cdf(edges), [1.]]))
+    base_p, cur_p = np.maximum(base_p, PSI_EPSILON), np.maximum(cur_p, PSI_EPSILON)
+    scores["PSI"] = float(np.sum((cur_p - base_p) * np.log(cur_p / base_p)))
+
+    # KS statistic evaluated at both distributions' percentiles:
+    grid = np.linspace(0, 1, 101)
+    points = np.unique(np.concatenate([baseline.kll.quantiles(grid), current.kll.quantiles(grid)]))
+    scores["KS"] = float(np.max(np.abs(baseline.kll.cdf(points) - current.kll.cdf(points))))
+
+    if baseline.std > 0:
+        scores["MeanShift"] = float((current.mean - baseline.mean) / baseline.std)
+    else:
+        scores["MeanShift"] = 0. if current.mean == baseline.mean else None
+    return scores
+
+
+def drift_report(baseline: FeatureStats, current: FeatureStats, psi_threshold=DEFAULT_PSI_THRESHOLD,
+        ks_threshold=DEFAULT_KS_THRESHOLD) -> dict:
+    """Per-feature drift scores, flagging features with PSI or KS over threshold"""
+    if len(current.names) != len(baseline.names):
+        raise ValueError(
+            f"Captured data has {len(current.names)} features, but the baseline has {len(baseline.names)}"
+        )
+    features = []
+    for name, base, cur in zip(baseline.names, baseline.features, current.features):
+        scores = feature_drift(base, cur)
+        scores["Drift"] = bool(
+            (scores["PSI"] is not None and scores["PSI"] > psi_threshold)
+            or (scores["KS"] is not None and scores["KS"] > ks_threshold)
+        )
+        features.append(dict(Name=name, **scores))
+    return {
+        "Thresholds": { "PSI": psi_threshold, "KS": ks_threshold },
+        "DriftedFeatures": [f["Name"] for f in features if f["Drift"]],
+        "Features": features,
+    }
+
+
+def output_summary(outputs: FeatureStats) -> list:
+    """Mean and quartiles of each model output column"""
+    summary = []
+    for name, stats in zip(outputs.names, outputs.features):
+        quartiles = stats.kll.quantiles([0.25, 0.5, 0.75])
+        summary.append({
+            "Name": name,
+            "Mean": _optional_float(stats.mean) if stats.present else None,
+            "Std": _optional_float(stats.std),
+            "Quartiles": [_optional_float(q) for q in quartiles],
+        })
+    return summary
+
+
+def analyze(store, capture_uri: str, endpoint_name: str, baseline: FeatureStats=None, variant: str=None,
+        start=None, end=None, cache_dir: str=None, batch_requests: int=10000, compacted: bool=False,
+        psi_threshold=DEFAULT_PSI_THRESHOLD, ks_threshold=DEFAULT_KS_THRESHOLD) -> dict:
+    """Summarize an endpoint's captured traffic in [start, end) and score its drift against baseline
+
+    Only one partition's summary (plus the running merged statistics) is held in memory at a time. Set
+    compacted to read the hourly Parquet files compact.py made under capture_uri, instead of raw capture.
+    """
+    if compacted:
+        # (pyarrow is only needed for compacted data)
+        import compact as source
+    else:
+        source = capture
+    feature_names = baseline.names if baseline else None
+    cache = PartitionCache(cache_dir) if cache_dir else None
+    partitions = source.list_partitions(store, capture_uri, endpoint_name, variant, start, end)
+    inputs, outputs = None, None
+    n_cached, n_requests, n_skipped = 0, 0, 0
+    t_start = datetime.now()
+    for partition in partitions:
+        summary = cache.get(partition, feature_names) if cache else None
+        if summary is None:
+            summary = partition_stats(store, partition, feature_names, batch_requests, source)
+            if cache:
+                cache.put(partition, summary, feature_names)
+        else:
+            n_cached += 1
+        n_requests += summary["Requests"]
+        n_skipped += summary["Skipped"]
+        if summary["Inputs"]:
+            partition_inputs = FeatureStats.from_dict(summary["Inputs"])
+            inputs = partition_inputs if inputs is None else inputs.merge(partition_inputs)
+        if summary["Outputs"]:
+            partition_outputs = FeatureStats.from_dict(summary["Outputs"])
+            if outputs is None:
+                outputs = partition_outputs
+            elif partition_outputs.names == outputs.names:
+                outputs.merge(partition_outputs)
+    logger.info(
+        "Summarized {} partitions ({} from cache) in {:.1f}s".format(
+            len(partitions), n_cached, (datetime.now() - t_start).total_seconds()
+        )
+    )
+
+    report = {
+        "EndpointName": endpoint_name,
+        "Variant": variant,
+        "Start": start.isoformat() if start else None,
+        "End": end.isoformat() if end else None,
+        "Partitions": len(partitions),
+        "CachedPartitions": n_cached,
+        "Requests": n_requests,
+        "SkippedRequests": n_skipped,
+        "Records": inputs.rows if inputs else 0,
+        "Outputs": output_summary(outputs) if outputs else [],
+    }
+    if baseline and inputs:
+        report.update(drift_report(baseline, inputs, psi_threshold, ks_threshold))
+    return report
+
+
+def parse_args(cmd_args=None):
+    parser = argparse.ArgumentParser(description="Score drift of captured endpoint traffic vs a baseline")
+    parser.add_argument("--capture-uri", type=str, required=True,
+        help="Data capture DestinationS3Uri (or compact.py's --compacted-uri, with --compacted)"
+    )
+    parser.add_argument("--compacted", action="store_true", help="Read compacted Parquet files")
+    parser.add_argument("--endpoint-name", type=str, required=True)
+    parser.add_argument("--variant", type=str, default=None, help="Only this variant (default all)")
+    parser.add_argument("--baseline", type=str, default=None, help="statistics.json (s3:// URI or path)")
+    parser.add_argument("--hours", type=float, default=24, help="Analyze the last N hours")
+    parser.add_argument("--cache-dir", type=str, default=None, help="Folder to cache partition summaries")
+    parser.add_argument("--local-root", type=str, default=None, help="Local stand-in folder for S3")
+    parser.add_argument("--batch-requests", type=int, default=10000)
+    parser.add_argument("--psi-threshold", type=float, default=DEFAULT_PSI_THRESHOLD)
+    parser.add_argument("--ks-threshold", type=float, default=DEFAULT_KS_THRESHOLD)
+    parser.add_argument("--output", "-o", type=str, default=None, help="Output file (default stdout)")
+    parser.add_argument("--log-level", default=logging.INFO)
+    args = parser.parse_args(args=cmd_args)
+
+    try:
+        args.log_level = int(args.log_level)
+    except ValueError:
+        pass
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(
+        stream=sys.stdout,
+        level=args.log_level,
+        format="%(asctime)s [%(name)s] %(levelname)s %(message)s",
+    )
+    store = capture.open_store(args.local_root)
+    end = datetime.now(timezone.utc)
+    report = analyze(
+        store,
+        args.capture_uri,
+        args.endpoint_name,
+        baseline=load_baseline(args.baseline, store) if args.baseline else None,
+        variant=args.variant,
+        start=end - timedelta(hours=args.hours),
+        end=end,
+        cache_dir=args.cache_dir,
+        batch_requests=args.batch_requests,
+        psi_threshold=args.psi_threshold,
+        ks_threshold=args.ks_threshold,
+        compacted=args.compacted,
+    )
+    report_str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_str)
+        logger.info(f"Report written to {args.output}")
+    else:
+        print(report_str)
@@ -1,32 +1,69 @@
 """SageMaker inference wrapper for PyTorch TabNet"""
 
 # Python Built-Ins:
+import io
 import json
 import logging
 import os
 import pickle
 
 # External Dependencies:
-from pytorch_tabnet.tab_model import TabNetClassifier, TabNetRegressor
+import numpy as np
 import torch
 
+# Local Dependencies:
+import artifact
+
 logger = logging.getLogger()
 
+CSV_CONTENT_TYPE = "text/csv"
+JSON_CONTENT_TYPE = "application/json"
+NPY_CONTENT_TYPE = "application/x-npy"
+
 
 def model_fn(model_dir):
     logger.info("Loading model metadata")
     with open(os.path.join(model_dir, "metadata.json"), "r") as f:
         config = json.loads(f.read())
 
-    model_path = os.path.join(model_dir, "tabnet.zip")
-    logger.info(f"Loading model from {model_path}")
-    model = TabNetClassifier() if config.get("modelType") == "classification" else TabNetRegressor()
-    model.load_model(model_path)
+    if artifact.has_flat_artifact(model_dir):
+        # Fast path: Load the uncompressed weights without unzipping or unpickling
+        logger.info(f"Loading flat model artifact from {model_dir}")
+        model = artifact.load_flat(model_dir)
+    else:
+        # Backward compatibility for models saved only as pytorch-tabnet's zip:
+        model_path = os.path.join(model_dir, "tabnet.zip")
+        logger.info(f"Loading model from {model_path}")
+        # pytorch-tabnet (and its sklearn/scipy dependencies) is slow to import, so defer it to model load:
+        from pytorch_tabnet.tab_model import TabNetClassifier, TabNetRegressor
+        model = TabNetClassifier() if config.get("modelType") == "classification" else TabNetRegressor()
+        model.load_model(model_path)
     logger.info("Model loaded")
 
     return model
 
 
+def input_fn(request_body, content_type=NPY_CONTENT_TYPE):
+    """Deserialize a request to a float tensor (same behaviour as the SageMaker PyTorch container default)
+
+    Defining this explicitly (rather than relying on the container) lets us exercise the exact same request
+    path offline, e.g. in benchmark.py and serve.py.
+    """
+    content_type = (content_type or NPY_CONTENT_TYPE).split(";")[0].strip().lower()
+    if isinstance(request_body, str):
+        request_body = request_body.encode("utf-8")
+    if content_type == CSV_CONTENT_TYPE:
+        array = np.genfromtxt(io.BytesIO(request_body), delimiter=",", dtype=np.float32, ndmin=1)
+        # genfromtxt collapses single-line CSV to 1D, which predict_fn treats as a single record anyway
+        return torch.from_numpy(np.ascontiguousarray(array, dtype=np.float32))
+    elif content_type == JSON_CONTENT_TYPE:
+        return torch.FloatTensor(json.loads(request_body))
+    elif content_type == NPY_CONTENT_TYPE:
+        return torch.from_numpy(np.load(io.BytesIO(request_body), allow_pickle=False))
+    else:
+        raise ValueError(f"Unsupported content type '{content_type}'")
+
+
 def predict_fn(input_data, model):
     # Note, the error when a user passes a CSV containing header strings is not super obvious (gets
     # deserialized to a string-like dtype instead of numeric), but trying to check with
@@ -60,3 +97,23 @@ def predict_fn(input_data, model):
     # ...But this would be rendered as Score0\nScore1\nScore2 by the default CSV serializer, rather than
     # Score0,Score1,Score2 - and the default Model Monitor processor is fussy about CSV formatting:
     return result
+
+
+def output_fn(prediction, accept=JSON_CONTENT_TYPE):
+    """Serialize predict_fn output (same behaviour as the SageMaker PyTorch container default)"""
+    accept = (accept or JSON_CONTENT_TYPE).split(";")[0].strip().lower()
+    if isinstance(prediction, torch.Tensor):
+        prediction = prediction.detach().cpu().numpy()
+    prediction = np.asarray(prediction)
+    if accept == CSV_CONTENT_TYPE:
+        buffer = io.StringIO()
+        np.savetxt(buffer, np.atleast_2d(prediction), delimiter=",", fmt="%s")
+        return buffer.getvalue()
+    elif accept == JSON_CONTENT_TYPE:
+        return json.dumps(prediction.tolist())
+    elif accept == NPY_CONTENT_TYPE:
+        buffer = io.BytesIO()
+        np.save(buffer, prediction)
+        return buffer.getvalue()
+    else:
+        raise ValueError(f"Unsupported accept type '{accept}'")
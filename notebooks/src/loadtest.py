@@ -0,0 +1,485 @@
+"""Asynchronous load generator for SageMaker endpoints and the local model server (serve.py)
+
+Replays records from the test split (headerless CSV, as prepared in notebook 1) or from captured endpoint
+traffic (SageMaker Data Capture JSONL files) against an /invocations URL, at a fixed request rate or a
+stepped ramp of increasing rates. Arrivals are open-loop (scheduled independently of responses), so a slow
+server shows up as rising latency rather than as a quietly reduced request rate.
+
+For each rate step we report latency percentiles, achieved throughput and error rates - and overall, the
+saturation point: The highest offered rate at which the latency/error objectives were still met. E.g:
+
+    # Against the local server:
+    python loadtest.py --url http://localhost:8080/invocations --data ../data/test-noheader.csv \\
+        --rate-start 10 --rate-step 10 --rate-max 200 --step-secs 20 --slo-p99-ms 100 \\
+        --instance-type local --output loadtest.json
+
+    # Against a deployed endpoint (requests are SigV4 signed, botocore required):
+    python loadtest.py --endpoint-name forestcover --region us-east-1 --data ../data/test-noheader.csv ...
+
+Only the Python standard library is needed unless signing requests to a real endpoint.
+"""
+
+# Python Built-Ins:
+import argparse
+import asyncio
+import base64
+from collections import Counter
+import csv
+import glob
+import json
+import logging
+import os
+import random
+import ssl
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+logger = logging.getLogger("loadtest")
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_samples, p: float) -> float:
+    """Linearly-interpolated percentile of an already-sorted non-empty list"""
+    if len(sorted_samples) == 1:
+        return float(sorted_samples[0])
+    rank = (len(sorted_samples) - 1) * p / 100.
+    lo = int(rank)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return float(sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (rank - lo))
+
+
+def load_csv_records(path: str, drop_last_columns: int=1, limit: int=None):
+    """Load records from headerless CSV file(s), dropping trailing target column(s), as CSV lines"""
+    paths = sorted(glob.glob(os.path.join(path, "*"))) if os.path.isdir(path) else [path]
+    records = []
+    for p in paths:
+        with open(p, "r", newline="") as f:
+            for row in csv.reader(f):
+                if not row:
+                    continue
+                records.append(",".join(row[:-drop_last_columns] if drop_last_columns else row))
+                if limit and len(records) >= limit:
+                    return records
+    return records
+
+
+def load_capture_records(path: str, limit: int=None):
+    """Load request payloads (CSV lines) from SageMaker Data Capture JSONL file(s) under path
+
+    Each captured request may contain multiple CSV records, which are split out into individual records so
+    they can be re-batched at whatever request size the test calls for. Non-CSV captures are skipped.
+    """
+    if os.path.isdir(path):
+        paths = sorted(glob.glob(os.path.join(path, "**", "*.jsonl"), recursive=True))
+    else:
+        paths = [path]
+    records = []
+    n_skipped = 0
+    for p in paths:
+        with open(p, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                endpoint_input = json.loads(line)["captureData"]["endpointInput"]
+                content_type = endpoint_input.get("observedContentType", "").split(";")[0].strip()
+                data = endpoint_input["data"]
+                if endpoint_input.get("encoding") == "BASE64":
+                    data = base64.b64decode(data).decode("utf-8")
+                if content_type != "text/csv":
+                    n_skipped += 1
+                    continue
+                records.extend(l for l in data.splitlines() if l.strip())
+                if limit and len(records) >= limit:
+                    return records[:limit]
+    if n_skipped:
+        logger.warning(f"Skipped {n_skipped} captured requests with non-CSV content type")
+    return records
+
+
+class SigV4Signer:
+    """Signs requests to the SageMaker runtime API with the default AWS credential chain (needs botocore)"""
+    def __init__(self, region: str):
+        import botocore.session
+        from botocore.auth import SigV4Auth
+        from botocore.awsrequest import AWSRequest
+
+        self._AWSRequest = AWSRequest
+        self._auth = SigV4Auth(botocore.session.Session().get_credentials(), "sagemaker", region)
+
+    def sign(self, url: str, body: bytes, headers: dict) -> dict:
+        request = self._AWSRequest(method="POST", url=url, data=body, headers=headers)
+        self._auth.add_auth(request)
+        return dict(request.headers.items())
+
+
+class ConnectionPool:
+    """Minimal keep-alive HTTP/1.1 client connection pool on asyncio streams"""
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.secure = parts.scheme == "https"
+        self.port = parts.port or (443 if self.secure else 80)
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.host_header = parts.netloc
+        self.timeout = timeout
+        self._idle = []
+        self._ssl = ssl.create_default_context() if self.secure else None
+
+    async def _connect(self):
+        return await asyncio.open_connection(self.host, self.port, ssl=self._ssl)
+
+    async def post(self, body: bytes, headers: dict):
+        """POST body to the pool's URL, returning (status, response body)"""
+        reused = bool(self._idle)
+        reader, writer = self._idle.pop() if reused else await self._connect()
+        try:
+            status, keep_alive, response = await asyncio.wait_for(
+                self._exchange(reader, writer, body, headers),
+                self.timeout,
+            )
+        except ConnectionResetError:
+            writer.close()
+            if not reused:
+                raise
+            # The server closed an idle keep-alive connection: Retry once on a fresh connection
+            reader, writer = await self._connect()
+            try:
+                status, keep_alive, response = await asyncio.wait_for(
+                    self._exchange(reader, writer, body, headers),
+                    self.timeout,
+                )
+            except BaseException:
+                writer.close()
+                raise
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        return status, response
+
+    async def _exchange(self, reader, writer, body: bytes, headers: dict):
+        head = [f"POST {self.path} HTTP/1.1", f"Host: {self.host_header}", f"Content-Length: {len(body)}"]
+        head.extend(f"{k}: {v}" for k, v in headers.items() if k.lower() not in ("host", "content-length"))
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Server closed connection without response")
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in response_headers:
+            response = await reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            response = b"".join(chunks)
+        else:
+            response = await reader.read()
+            return int(status), False, response
+
+        connection = response_headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+        return int(status), keep_alive, response
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle = []
+
+
+class StepStats:
+    """Accumulated results for one offered-rate step"""
+    def __init__(self, offered_rps: float):
+        self.offered_rps = offered_rps
+        self.latencies_ms = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.n_sent = 0
+        self.n_shed = 0
+        self.t_start = None
+        self.t_end = None
+
+    def summary(self, batch_size: int) -> dict:
+        elapsed = max((self.t_end or time.perf_counter()) - self.t_start, 1e-9)
+        n_ok = self.statuses.get(200, 0)
+        n_failed = self.n_sent - n_ok + self.n_shed
+        result = {
+            "offered_rps": self.offered_rps,
+            "sent": self.n_sent,
+            "shed_at_client": self.n_shed,
+            "succeeded": n_ok,
+            "achieved_rps": n_ok / elapsed,
+            "achieved_records_per_sec": n_ok * batch_size / elapsed,
+            "error_rate": n_failed / max(self.n_sent + self.n_shed, 1),
+            "status_counts": { str(k): v for k, v in self.statuses.items() },
+            "error_counts": dict(self.errors),
+            "duration_secs": elapsed,
+        }
+        if self.latencies_ms:
+            samples = sorted(self.latencies_ms)
+            result.update({ f"p{p}_ms": percentile(samples, p) for p in PERCENTILES })
+            result["mean_ms"] = sum(samples) / len(samples)
+            result["max_ms"] = samples[-1]
+        return result
+
+
+async def send_one(pool: ConnectionPool, body: bytes, headers: dict, signer, url: str, stats: StepStats):
+    if signer is not None:
+        headers = signer.sign(url, body, headers)
+    t0 = time.perf_counter()
+    try:
+        status, _ = await pool.post(body, headers)
+        stats.statuses[status] += 1
+        if status == 200:
+            stats.latencies_ms.append((time.perf_counter() - t0) * 1000)
+    except asyncio.TimeoutError:
+        stats.errors["Timeout"] += 1
+    except (OSError, ValueError, asyncio.IncompleteReadError) as err:
+        stats.errors[type(err).__name__] += 1
+
+
+async def run_step(
+    pool: ConnectionPool,
+    payloads,
+    rate: float,
+    duration: float,
+    max_in_flight: int,
+    headers: dict,
+    signer,
+    url: str,
+    poisson: bool,
+    rng: random.Random,
+    payload_offset: int,
+):
+    """Offer `rate` requests/sec for `duration` seconds, then wait for stragglers"""
+    stats = StepStats(rate)
+    in_flight = set()
+    loop = asyncio.get_running_loop()
+    stats.t_start = time.perf_counter()
+    t_next = loop.time()
+    t_stop = t_next + duration
+    i = payload_offset
+    while t_next < t_stop:
+        delay = t_next - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            # Client-side saturation: Record the request as shed rather than silently slowing the schedule
+            stats.n_shed += 1
+        else:
+            task = asyncio.ensure_future(
+                send_one(pool, payloads[i % len(payloads)], headers, signer, url, stats)
+            )
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            stats.n_sent += 1
+            i += 1
+        t_next += rng.expovariate(rate) if poisson else 1. / rate
+    if in_flight:
+        await asyncio.wait(in_flight)
+    stats.t_end = time.perf_counter()
+    return stats, i
+
+
+def find_saturation(steps, slo_p99_ms: float=None, max_error_rate: float=0.01, min_achieved_ratio=0.9):
+    """Identify the highest offered rate meeting the objectives, and the first step that broke them"""
+    last_ok = None
+    for step in steps:
+        reasons = []
+        if step["error_rate"] > max_error_rate:
+            reasons.append(f"error_rate {step['error_rate']:.2%} > {max_error_rate:.2%}")
+        if slo_p99_ms is not None and step.get("p99_ms", float("inf")) > slo_p99_ms:
+            reasons.append(f"p99 {step.get('p99_ms', float('nan')):.1f}ms > {slo_p99_ms}ms")
+        if step["achieved_rps"] < min_achieved_ratio * step["offered_rps"]:
+            reasons.append(f"achieved {step['achieved_rps']:.1f}rps < {min_achieved_ratio:.0%} of offered")
+        if reasons:
+            return {
+                "saturated": True,
+                "saturation_offered_rps": step["offered_rps"],
+                "reasons": reasons,
+                "max_sustainable_rps": last_ok["achieved_rps"] if last_ok else 0.,
+                "p99_ms_at_max_sustainable": last_ok.get("p99_ms") if last_ok else None,
+            }
+        last_ok = step
+    return {
+        "saturated": False,
+        "saturation_offered_rps": None,
+        "reasons": [],
+        "max_sustainable_rps": last_ok["achieved_rps"] if last_ok else 0.,
+        "p99_ms_at_max_sustainable": last_ok.get("p99_ms") if last_ok else None,
+    }
+
+
+def rate_schedule(args):
+    """List of offered request rates to step through"""
+    if args.rate is not None:
+        return [args.rate]
+    rates = []
+    rate = args.rate_start
+    while rate <= args.rate_max + 1e-9:
+        rates.append(rate)
+        rate = rate * args.rate_multiplier if args.rate_multiplier else rate + args.rate_step
+    return rates
+
+
+async def run_load_test(args) -> dict:
+    if args.capture:
+        records = load_capture_records(args.capture, limit=args.max_records)
+    else:
+        records = load_csv_records(
+            args.data,
+            drop_last_columns=args.drop_last_columns,
+            limit=args.max_records,
+        )
+    if not records:
+        raise ValueError("No records loaded to replay")
+    payloads = [
+        "\n".join(records[i:i + args.batch_size]).encode("utf-8")
+        for i in range(0, len(records) - args.batch_size + 1, args.batch_size)
+    ] or ["\n".join(records).encode("utf-8")]
+    logger.info(f"Loaded {len(records)} records as {len(payloads)} payloads of {args.batch_size} records")
+
+    signer = SigV4Signer(args.region) if args.sigv4 else None
+    headers = { "Content-Type": "text/csv", "Accept": args.accept }
+    pool = ConnectionPool(args.url, timeout=args.timeout)
+    rng = random.Random(args.seed)
+
+    steps = []
+    offset = 0
+    try:
+        for rate in rate_schedule(args):
+            logger.info(f"Offering {rate:g} requests/sec for {args.step_secs:g}s")
+            stats, offset = await run_step(
+                pool, payloads, rate, args.step_secs, args.max_in_flight, headers, signer, args.url,
+                args.poisson, rng, offset,
+            )
+            summary = stats.summary(args.batch_size)
+            logger.info(
+                "Achieved %.1f rps, p99=%s ms, error_rate=%.2f%%",
+                summary["achieved_rps"],
+                f"{summary['p99_ms']:.1f}" if "p99_ms" in summary else "n/a",
+                summary["error_rate"] * 100,
+            )
+            steps.append(summary)
+            if args.stop_on_saturation and find_saturation(
+                steps, args.slo_p99_ms, args.max_error_rate
+            )["saturated"]:
+                logger.info("Saturation reached: Stopping ramp")
+                break
+    finally:
+        pool.close()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "url": args.url,
+            "instance_type": args.instance_type,
+            "instance_count": args.instance_count,
+            "batch_size": args.batch_size,
+            "source": args.capture or args.data,
+            "arrivals": "poisson" if args.poisson else "uniform",
+            "slo_p99_ms": args.slo_p99_ms,
+            "max_error_rate": args.max_error_rate,
+        },
+        "steps": steps,
+        "saturation": find_saturation(steps, args.slo_p99_ms, args.max_error_rate),
+    }
+
+
+def parse_args(cmd_args=None):
+    parser = argparse.ArgumentParser(description="Asynchronous load generator for /invocations endpoints")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument(
+        "--url", type=str, help="Full /invocations URL e.g. http://localhost:8080/invocations"
+    )
+    target.add_argument("--endpoint-name", type=str, help="SageMaker endpoint name (requires --region)")
+    parser.add_argument("--region", type=str, default=os.environ.get("AWS_DEFAULT_REGION"))
+
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data", type=str, help="Headerless CSV file/folder (e.g. the test split)")
+    source.add_argument("--capture", type=str, help="Data Capture .jsonl file or folder to replay")
+    parser.add_argument(
+        "--drop-last-columns", type=int, default=1,
+        help="Trailing columns (i.e. target) to drop from --data records"
+    )
+    parser.add_argument("--max-records", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1, help="Records per request")
+    parser.add_argument("--accept", type=str, default="text/csv")
+
+    parser.add_argument("--rate", type=float, default=None, help="Fixed offered rate (requests/sec)")
+    parser.add_argument("--rate-start", type=float, default=10.)
+    parser.add_argument("--rate-step", type=float, default=10.)
+    parser.add_argument(
+        "--rate-multiplier", type=float, default=None,
+        help="Multiply (rather than add --rate-step to) the rate at each step"
+    )
+    parser.add_argument("--rate-max", type=float, default=100.)
+    parser.add_argument("--step-secs", type=float, default=30.)
+    parser.add_argument("--poisson", action="store_true", help="Exponential (rather than uniform) arrivals")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=60.)
+    parser.add_argument("--seed", type=int, default=1337)
+
+    parser.add_argument("--slo-p99-ms", type=float, default=None, help="p99 latency objective")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--stop-on-saturation", action="store_true")
+
+    parser.add_argument("--instance-type", type=str, default=None, help="Label for the report")
+    parser.add_argument("--instance-count", type=int, default=1, help="Label for the report")
+    parser.add_argument("--output", "-o", type=str, default=None, help="Output file (default stdout)")
+    parser.add_argument("--log-level", default=logging.INFO)
+    args = parser.parse_args(args=cmd_args)
+
+    try:
+        args.log_level = int(args.log_level)
+    except ValueError:
+        pass
+    args.sigv4 = False
+    if args.endpoint_name:
+        if not args.region:
+            parser.error("--region (or AWS_DEFAULT_REGION) is required with --endpoint-name")
+        args.url = "https://runtime.sagemaker.{}.amazonaws.com/endpoints/{}/invocations".format(
+            args.region,
+            args.endpoint_name,
+        )
+        args.sigv4 = True
+    if args.rate is None and args.rate_multiplier is not None and args.rate_multiplier <= 1:
+        parser.error("--rate-multiplier must be greater than 1")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(
+        stream=sys.stdout,
+        level=args.log_level,
+        format="%(asctime)s [%(name)s] %(levelname)s %(message)s",
+    )
+    report = asyncio.run(run_load_test(args))
+    report_str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_str)
+        logger.info(f"Report written to {args.output}")
+    else:
+        print(report_str)
@@ -0,0 +1,308 @@
+"""Shadow replay: Score captured production traffic with a candidate model and compare to the live outputs
+
+Reads the request records captured from an endpoint in a time window (raw Data Capture JSONL via capture.py,
+or the hourly Parquet files of compact.py with --compacted), scores them with a candidate model through the
+handlers in inference.py, and compares with the outputs the live model returned at the time:
+
+- Agreement: Fraction of records where the candidate predicts the same label (argmax) as production
+- Flips: Matrix of record counts by production label (rows) and candidate label (columns)
+- Score deltas: Per-output mean (candidate - production), and the distribution of each record's largest
+  absolute output difference
+
+As in batch_transform.py, the model is loaded once and then a pool of CPU worker processes is forked to
+share it, with large chunks of records in flight while the main process reads and decodes the next ones.
+The report includes the rows/sec (and rows/hour) achieved. E.g:
+
+    python replay.py --model-dir ./model --capture-uri s3://{bucket}/capture --endpoint-name forestcover \\
+        --hours 24 --output replay.json
+
+Set --local-root to read s3:// URIs (captures, and a --model-data model.tar.gz) from a local folder instead.
+"""
+
+# Python Built-Ins:
+import argparse
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tarfile
+import tempfile
+import time
+
+# External Dependencies:
+import numpy as np
+import torch
+
+# Local Dependencies:
+import capture
+import config
+import inference
+from sketches import KllSketch
+
+
+logger = logging.getLogger("replay")
+
+MAX_EXAMPLES = 20
+DELTA_QUANTILES = (0.5, 0.9, 0.99)
+
+# Worker process state, inherited from the parent through fork():
+_state = {}
+
+
+def _init_worker(threads_per_worker: int):
+    torch.set_num_threads(threads_per_worker)
+
+
+def score_chunk(X: np.ndarray) -> np.ndarray:
+    """Candidate model outputs (2D) for a 2D array of records"""
+    X_tensor = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32))
+    prediction = inference.predict_fn(X_tensor, _state["model"])
+    if isinstance(prediction, torch.Tensor):
+        prediction = prediction.detach().cpu().numpy()
+    return np.asarray(prediction, dtype=np.float64).reshape(len(X), -1)
+
+
+class ReplayComparison:
+    """Running comparison of candidate vs production outputs, in bounded memory"""
+    def __init__(self):
+        self.rows = 0
+        self.uncompared = 0
+        self.n_outputs = None
+        self.agreed = 0
+        self.flips = None
+        self.delta_sum = None
+        self.max_abs_delta = KllSketch()
+        self.examples = []
+
+    def update(self, candidate: np.ndarray, production: np.ndarray, event_ids: np.ndarray):
+        self.rows += len(candidate)
+        # Records captured without (decodable) outputs, or that the candidate can't score (e.g. with missing
+        # features) can't be compared:
+        if production.shape[1]:
+            comparable = np.isfinite(production).all(axis=1) & np.isfinite(candidate).all(axis=1)
+        else:
+            comparable = np.zeros(len(candidate), dtype=bool)
+        self.uncompared += int((~comparable).sum())
+        if not comparable.any():
+            return
+        candidate, production = candidate[comparable], production[comparable]
+        event_ids = event_ids[comparable]
+        if self.n_outputs is None:
+            self.n_outputs = candidate.shape[1]
+            self.flips = np.zeros((self.n_outputs, self.n_outputs), dtype=np.int64)
+            self.delta_sum = np.zeros(self.n_outputs)
+        if candidate.shape[1] != self.n_outputs or production.shape[1] != self.n_outputs:
+            raise ValueError(
+                f"Candidate gave {candidate.shape[1]} outputs and production {production.shape[1]}, "
+                f"expected {self.n_outputs}"
+            )
+        delta = candidate - production
+        self.delta_sum += delta.sum(axis=0)
+        self.max_abs_delta.update(np.abs(delta).max(axis=1))
+        if self.n_outputs > 1:
+            # (Labels only make sense for multi-output i.e. classification models)
+            production_labels = production.argmax(axis=1)
+            candidate_labels = candidate.argmax(axis=1)
+            np.add.at(self.flips, (production_labels, candidate_labels), 1)
+            disagree = production_labels != candidate_labels
+            self.agreed += int((~disagree).sum())
+            for ix in np.flatnonzero(disagree)[:MAX_EXAMPLES - len(self.examples)]:
+                self.examples.append({
+                    "EventId": event_ids[ix],
+                    "ProductionLabel": int(production_labels[ix]),
+                    "CandidateLabel": int(candidate_labels[ix]),
+                })
+
+    def report(self) -> dict:
+        compared = self.rows - self.uncompared
+        is_classifier = bool(self.n_outputs and self.n_outputs > 1)
+        return {
+            "Rows": self.rows,
+            "ComparedRows": compared,
+            "UncomparedRows": self.uncompared,
+            "Agreement": self.agreed / compared if compared and is_classifier else None,
+            "Flips": self.flips.tolist() if compared and is_classifier else None,
+            "MeanDelta": (self.delta_sum / compared).tolist() if compared else None,
+            "MaxAbsDeltaQuantiles": {
+                f"p{int(q * 100)}": float(v)
+                for q, v in zip(DELTA_QUANTILES, self.max_abs_delta.quantiles(DELTA_QUANTILES))
+            } if compared else None,
+            "DisagreementExamples": self.examples,
+        }
+
+
+def resolve_model_dir(store, model_data: str, work_dir: str) -> str:
+    """Extract a model.tar.gz (s3:// URI, read through store) to a folder under work_dir"""
+    model_dir = os.path.join(work_dir, "model")
+    os.makedirs(model_dir, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(store.read(model_data)), mode="r:gz") as tar:
+        tar.extractall(model_dir)
+    return model_dir
+
+
+def iter_chunks(batches, chunk_rows: int):
+    """Re-slice CaptureBatches to (inputs, outputs, event_ids) chunks of up to chunk_rows records"""
+    for batch in batches:
+        for start in range(0, len(batch.inputs), chunk_rows):
+            end = start + chunk_rows
+            yield batch.inputs[start:end], batch.outputs[start:end], batch.event_ids[start:end]
+
+
+def replay(store, source, partitions, args) -> dict:
+    """Score the partitions' records with the candidate model (already in _state) and compare"""
+    comparison = ReplayComparison()
+    n_requests, n_skipped = 0, 0
+
+    def batches():
+        nonlocal n_requests, n_skipped
+        for partition in partitions:
+            for batch in source.iter_batches(store, partition.objects, args.batch_requests):
+                n_requests += batch.n_requests
+                n_skipped += batch.n_skipped
+                if len(batch.inputs):
+                    yield batch
+
+    pool = None
+    if args.workers > 1:
+        # Fork after loading the model (and before running any torch ops) so weights are shared copy-on-write
+        pool = multiprocessing.get_context("fork").Pool(
+            args.workers,
+            initializer=_init_worker,
+            initargs=(args.threads_per_worker,),
+        )
+    else:
+        _init_worker(args.threads_per_worker)
+    t_start = time.perf_counter()
+    try:
+        if pool is None:
+            for X, production, event_ids in iter_chunks(batches(), args.chunk_rows):
+                comparison.update(score_chunk(X), production, event_ids)
+        else:
+            # Bound memory to max_in_flight chunks, keeping production outputs in this process:
+            max_in_flight = args.workers * args.prefetch
+            pending = deque()
+            for X, production, event_ids in iter_chunks(batches(), args.chunk_rows):
+                pending.append((pool.apply_async(score_chunk, (X,)), production, event_ids))
+                if len(pending) >= max_in_flight:
+                    result, production, event_ids = pending.popleft()
+                    comparison.update(result.get(), production, event_ids)
+            while pending:
+                result, production, event_ids = pending.popleft()
+                comparison.update(result.get(), production, event_ids)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - t_start
+
+    report = comparison.report()
+    rows_per_sec = report["Rows"] / max(elapsed, 1e-9)
+    report.update({
+        "Partitions": len(partitions),
+        "Requests": n_requests,
+        "SkippedRequests": n_skipped,
+        "Seconds": elapsed,
+        "RowsPerSec": rows_per_sec,
+        "RowsPerHour": rows_per_sec * 3600,
+        "Workers": args.workers,
+        "ThreadsPerWorker": args.threads_per_worker,
+        "ChunkRows": args.chunk_rows,
+    })
+    logger.info(
+        f"Replayed {report['Rows']} rows in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec): "
+        f"Agreement {report['Agreement']}"
+    )
+    return report
+
+
+def run(args) -> dict:
+    store = capture.open_store(args.local_root)
+    if args.compacted:
+        # (pyarrow is only needed for compacted data)
+        import compact as source
+    else:
+        source = capture
+    partitions = source.list_partitions(
+        store, args.capture_uri, args.endpoint_name, args.variant, args.start, args.end
+    )
+    logger.info(f"Replaying {len(partitions)} partitions from {args.start} to {args.end}")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        t_load = time.perf_counter()
+        model_dir = resolve_model_dir(store, args.model_data, work_dir) if args.model_data else args.model_dir
+        _state["model"] = inference.model_fn(model_dir)
+        load_secs = time.perf_counter() - t_load
+        report = replay(store, source, partitions, args)
+
+    report.update({
+        "EndpointName": args.endpoint_name,
+        "Variant": args.variant,
+        "Start": args.start.isoformat() if args.start else None,
+        "End": args.end.isoformat() if args.end else None,
+        "Model": args.model_data or args.model_dir,
+        "ModelLoadSecs": load_secs,
+    })
+    return report
+
+
+def parse_datetime(raw: str) -> datetime:
+    value = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def parse_args(cmd_args=None):
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    parser = argparse.ArgumentParser(description="Replay captured endpoint traffic against a candidate model")
+    model = parser.add_mutually_exclusive_group(required=True)
+    model.add_argument("--model-dir", type=str, help="Candidate model folder (extracted model.tar.gz)")
+    model.add_argument("--model-data", type=str, help="Candidate model.tar.gz s3:// URI")
+    parser.add_argument("--capture-uri", type=str, required=True,
+        help="Data capture DestinationS3Uri (or compact.py's --compacted-uri, with --compacted)"
+    )
+    parser.add_argument("--compacted", action="store_true", help="Read compacted Parquet files")
+    parser.add_argument("--endpoint-name", type=str, required=True)
+    parser.add_argument("--variant", type=str, default=None, help="Only this variant (default all)")
+    parser.add_argument("--hours", type=float, default=None, help="Replay the last N hours")
+    parser.add_argument("--start", type=parse_datetime, default=None, help="Window start (ISO 8601, UTC)")
+    parser.add_argument("--end", type=parse_datetime, default=None, help="Window end (ISO 8601, UTC)")
+    parser.add_argument("--local-root", type=str, default=None, help="Local stand-in folder for S3")
+    parser.add_argument("--workers", type=int, default=cpu_count, help="Worker processes (1 = in-process)")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--chunk-rows", type=int, default=8192, help="Records per scoring chunk")
+    parser.add_argument("--prefetch", type=int, default=2, help="Chunks in flight per worker")
+    parser.add_argument("--batch-requests", type=int, default=10000, help="Captured requests per read batch")
+    parser.add_argument("--output", "-o", type=str, default=None, help="Output file (default stdout)")
+    parser.add_argument("--log-level", default=logging.INFO)
+    args = parser.parse_args(args=cmd_args)
+
+    try:
+        args.log_level = int(args.log_level)
+    except ValueError:
+        pass
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.hours is not None:
+        if args.start:
+            parser.error("--hours and --start are mutually exclusive")
+        args.end = args.end or datetime.now(timezone.utc)
+        args.start = args.end - timedelta(hours=args.hours)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for l in (logger, capture.logger):
+        config.configure_logger(l, args)
+    report = run(args)
+    report_str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_str)
+        logger.info(f"Report written to {args.output}")
+    else:
+        print(report_str)
+    sys.exit(0)
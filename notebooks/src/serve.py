@@ -0,0 +1,237 @@
+"""Local pre-forked model server for the PyTorch TabNet inference handlers
+
+Hosts inference.py (model_fn/input_fn/predict_fn/output_fn) behind the SageMaker hosting HTTP contract
+(GET /ping, POST /invocations) without having to build the SageMaker PyTorch container. E.g:
+
+    python serve.py --model-dir ./model --workers 4 --threads-per-worker 1 --pin-cpus
+
+The model is loaded once in the parent process, which then forks the worker processes: So the (read-only)
+model weights are shared copy-on-write between workers rather than duplicated per worker. (This sharing comes
+from fork() alone, whichever artifact format the model was loaded from.) Each worker sets
+its own torch thread count, and can optionally be pinned to its own subset of CPUs - making this a useful
+stand-in for load tests and for comparing worker/thread layouts on a given instance size.
+
+Like a synchronous gunicorn worker, each worker handles one request at a time and closes the connection
+after responding.
+"""
+
+# Python Built-Ins:
+import argparse
+import gc
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+# External Dependencies:
+import torch
+
+# Local Dependencies:
+import config
+import inference
+
+
+logger = logging.getLogger("serve")
+
+
+class InvocationsHandler(BaseHTTPRequestHandler):
+    """HTTP handler implementing the SageMaker /ping and /invocations contract for `server.model`"""
+    server_version = "TabNetLocalServer/1.0"
+
+    def _respond(self, status: int, body, content_type: str="text/plain"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/ping":
+            self._respond(200, "")
+        elif self.path == "/execution-parameters":
+            # Queried by SageMaker Batch Transform to pick a default strategy for the container:
+            self._respond(
+                200,
+                json.dumps({
+                    "MaxConcurrentTransforms": self.server.n_workers,
+                    "BatchStrategy": "MULTI_RECORD",
+                    "MaxPayloadInMB": 6,
+                }),
+                inference.JSON_CONTENT_TYPE,
+            )
+        else:
+            self._respond(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        if self.path != "/invocations":
+            self._respond(404, f"Unknown path {self.path}")
+            return
+        content_type = self.headers.get("Content-Type", inference.NPY_CONTENT_TYPE)
+        accept = self.headers.get("Accept", inference.JSON_CONTENT_TYPE)
+        if accept == "*/*":
+            accept = inference.JSON_CONTENT_TYPE
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            input_data = inference.input_fn(body, content_type)
+        except ValueError as err:
+            self._respond(415, str(err))
+            return
+        try:
+            prediction = inference.predict_fn(input_data, self.server.model)
+            result = inference.output_fn(prediction, accept)
+        except ValueError as err:
+            self._respond(400, str(err))
+            return
+        except Exception as err:
+            logger.exception("Error processing invocation")
+            self._respond(500, f"{type(err).__name__}: {err}")
+            return
+        self._respond(200, result, accept)
+
+    def log_message(self, format, *args):
+        logger.debug("[worker %s] %s - %s", os.getpid(), self.address_string(), format % args)
+
+
+class PreforkedHTTPServer(HTTPServer):
+    """HTTPServer that serves on an already-bound listening socket shared with sibling processes"""
+    def __init__(self, listen_socket: socket.socket, model, n_workers: int):
+        super().__init__(listen_socket.getsockname()[:2], InvocationsHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listen_socket
+        self.model = model
+        self.n_workers = n_workers
+
+
+def worker_cpus(worker_ix: int, threads_per_worker: int):
+    """CPU set for a pinned worker: Consecutive blocks of the available CPUs, wrapping around if needed"""
+    available = sorted(os.sched_getaffinity(0))
+    return {
+        available[(worker_ix * threads_per_worker + i) % len(available)] for i in range(threads_per_worker)
+    }
+
+
+def run_worker(listen_socket: socket.socket, model, worker_ix: int, args):
+    """Worker process body: Configure threading/affinity then serve forever"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    torch.set_num_threads(args.threads_per_worker)
+    if args.pin_cpus and hasattr(os, "sched_setaffinity"):
+        cpus = worker_cpus(worker_ix, args.threads_per_worker)
+        os.sched_setaffinity(0, cpus)
+        logger.info(f"Worker {worker_ix} (pid {os.getpid()}) pinned to CPUs {sorted(cpus)}")
+    else:
+        logger.info(f"Worker {worker_ix} (pid {os.getpid()}) started")
+    PreforkedHTTPServer(listen_socket, model, args.workers).serve_forever()
+
+
+def spawn_worker(listen_socket: socket.socket, model, worker_ix: int, args) -> int:
+    """Fork a worker process, returning its PID (in the parent)"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(listen_socket, model, worker_ix, args)
+        except Exception:
+            logger.exception(f"Worker {worker_ix} crashed")
+        finally:
+            os._exit(1)
+    return pid
+
+
+def serve(args):
+    """Load the model once, then fork and supervise args.workers server processes"""
+    logger.info(f"Loading model from {args.model_dir}")
+    t0 = time.perf_counter()
+    model = inference.model_fn(args.model_dir)
+    logger.info(f"Model loaded in {time.perf_counter() - t0:.3f}s")
+    # Don't run any torch ops in the parent: An OpenMP thread pool initialized before fork() is not safe to
+    # use in the children. Freezing the GC moves everything loaded so far to a permanent generation, so
+    # garbage collections in the workers don't write to (and therefore un-share) those pages:
+    gc.collect()
+    gc.freeze()
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((args.host, args.port))
+    listen_socket.listen(args.backlog)
+    logger.info(
+        f"Listening on {args.host}:{args.port} with {args.workers} workers x {args.threads_per_worker} "
+        "torch threads"
+    )
+
+    workers = {}  # pid -> worker index
+    for ix in range(args.workers):
+        workers[spawn_worker(listen_socket, model, ix, args)] = ix
+
+    shutting_down = False
+
+    def handle_shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        ix = workers.pop(pid, None)
+        if ix is not None and not shutting_down:
+            logger.warning(f"Worker {ix} (pid {pid}) exited with status {status}: Restarting")
+            workers[spawn_worker(listen_socket, model, ix, args)] = ix
+    listen_socket.close()
+    logger.info("Server stopped")
+
+
+def parse_args(cmd_args=None):
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    parser = argparse.ArgumentParser(description="Local pre-forked SageMaker-compatible model server")
+    parser.add_argument("--model-dir", type=str, default=os.environ.get("SM_MODEL_DIR", "/opt/ml/model"))
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SAGEMAKER_BIND_TO_PORT", 8080)))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.environ.get("SAGEMAKER_MODEL_SERVER_WORKERS", cpu_count)),
+        help="Number of worker processes to fork"
+    )
+    parser.add_argument(
+        "--threads-per-worker", type=int, default=None,
+        help="torch intra-op threads per worker (default: available CPUs / workers, at least 1)"
+    )
+    parser.add_argument(
+        "--pin-cpus", type=config.boolean_hyperparam, nargs="?", const=True, default=False,
+        help="Pin each worker to its own block of --threads-per-worker CPUs (Linux only)"
+    )
+    parser.add_argument("--backlog", type=int, default=128, help="Listen socket connection backlog")
+    parser.add_argument("--log-level", default=logging.INFO)
+    args = parser.parse_args(args=cmd_args)
+
+    try:
+        args.log_level = int(args.log_level)
+    except ValueError:
+        pass
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.threads_per_worker is None:
+        args.threads_per_worker = max(1, cpu_count // args.workers)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config.configure_logger(logger, args)
+    serve(args)
+    sys.exit(0)
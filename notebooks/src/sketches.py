@@ -0,0 +1,290 @@
+"""Mergeable, bounded-memory per-feature statistics: Counts, moments, min/max and KLL quantile sketches
+
+Statistics are updated a whole batch (numpy array) at a time, and the statistics of two datasets can be
+merged. So partitions of a dataset can be summarized independently (and cached), then combined.
+
+The quantile sketch is KLL (Karnin, Lang & Liberty, 2016): The same algorithm SageMaker Model Monitor uses
+for the `distribution.kll` of numerical features in its statistics.json. Statistics can be converted to and
+from that format, so sketches of live data can be compared with Model Monitor baselines and vice versa.
+Memory per feature is O(k) whatever the number of values summarized.
+"""
+
+# Python Built-Ins:
+import math
+
+# External Dependencies:
+import numpy as np
+
+
+# Model Monitor's KLL parameters:
+DEFAULT_K = 2048
+DEFAULT_C = 0.64
+# Number of equal-width buckets Model Monitor reports for each numerical feature's distribution:
+MODEL_MONITOR_BUCKETS = 10
+
+
+class KllSketch:
+    """KLL quantile sketch: Levels of sorted samples, with items at level h standing for 2**h values"""
+    def __init__(self, k: int=DEFAULT_K, c: float=DEFAULT_C, seed: int=None):
+        self.k = int(k)
+        self.c = float(c)
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * self.c ** depth))
+
+    @property
+    def count(self) -> int:
+        """Number of values summarized (exact: Compaction preserves total weight)"""
+        return sum(len(items) << h for h, items in enumerate(self.levels))
+
+    def update(self, values):
+        """Add a batch of (finite) values"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other: "KllSketch"):
+        """Add another sketch's values to this one"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self._compress()
+        return self
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self.capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # Promote every other item of an even-length run (randomly the odd or even ones) with
+                # double weight, and keep any odd one out at this level:
+                n_pairs = len(items) // 2
+                offset = int(self._rng.integers(2))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[offset:2 * n_pairs:2]])
+                self.levels[h] = items[2 * n_pairs:]
+            h += 1
+
+    def _sorted_weighted(self):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(items), 1 << h, dtype=np.int64) for h, items in enumerate(self.levels)
+        ])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs):
+        """Approximate values at quantiles qs (in [0, 1]), or NaNs if empty"""
+        qs = np.atleast_1d(np.asarray(qs, dtype=np.float64))
+        if not self.count:
+            return np.full(len(qs), np.nan)
+        values, cum_weights = self._sorted_weighted()
+        ixs = np.searchsorted(cum_weights, qs * cum_weights[-1], side="left")
+        return values[np.clip(ixs, 0, len(values) - 1)]
+
+    def cdf(self, points):
+        """Approximate fraction of values <= each of points"""
+        points = np.atleast_1d(np.asarray(points, dtype=np.float64))
+        if not self.count:
+            return np.full(len(points), np.nan)
+        values, cum_weights = self._sorted_weighted()
+        ixs = np.searchsorted(values, points, side="right")
+        return np.where(ixs > 0, cum_weights[np.maximum(ixs - 1, 0)], 0) / cum_weights[-1]
+
+    def to_dict(self) -> dict:
+        """Model Monitor's `distribution.kll.sketch` format"""
+        return {
+            "parameters": { "c": self.c, "k": float(self.k) },
+            "data": [items.tolist() for items in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "KllSketch":
+        sketch = cls(k=int(d["parameters"]["k"]), c=d["parameters"]["c"])
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in d["data"]] or [np.empty(0)]
+        return sketch
+
+
+class NumericStats:
+    """Streaming statistics of one numeric feature, with NaN/infinite values counted as missing"""
+    def __init__(self, k: int=DEFAULT_K, c: float=DEFAULT_C):
+        self.present = 0
+        self.missing = 0
+        self.sum = 0.
+        self.mean = 0.
+        self.m2 = 0.  # Sum of squared deviations from the mean
+        self.min = math.inf
+        self.max = -math.inf
+        self.integral = True
+        self.kll = KllSketch(k=k, c=c)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.present) if self.present else math.nan
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        finite = values[np.isfinite(values)]
+        self.missing += len(values) - len(finite)
+        if not len(finite):
+            return self
+        batch = NumericStats(k=self.kll.k, c=self.kll.c)
+        batch.present = len(finite)
+        batch.sum = float(finite.sum())
+        batch.mean = batch.sum / batch.present
+        batch.m2 = float(np.square(finite - batch.mean).sum())
+        batch.min = float(finite.min())
+        batch.max = float(finite.max())
+        batch.integral = bool(np.all(finite == np.floor(finite)))
+        batch.kll.update(finite)
+        return self.merge(batch)
+
+    def merge(self, other: "NumericStats"):
+        """Combine with another feature's statistics (parallel variance algorithm of Chan et al.)"""
+        self.missing += other.missing
+        if not other.present:
+            return self
+        total = self.present + other.present
+        delta = other.mean - self.mean
+        self.mean += delta * other.present / total
+        self.m2 += other.m2 + delta * delta * self.present * other.present / total
+        self.present = total
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.integral = self.integral and other.integral
+        self.kll.merge(other.kll)
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "present": self.present,
+            "missing": self.missing,
+            "sum": self.sum,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min if self.present else None,
+            "max": self.max if self.present else None,
+            "integral": self.integral,
+            "kll": self.kll.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "NumericStats":
+        stats = cls()
+        stats.present = d["present"]
+        stats.missing = d["missing"]
+        stats.sum = d["sum"]
+        stats.mean = d["mean"]
+        stats.m2 = d["m2"]
+        stats.min = math.inf if d["min"] is None else d["min"]
+        stats.max = -math.inf if d["max"] is None else d["max"]
+        stats.integral = d["integral"]
+        stats.kll = KllSketch.from_dict(d["kll"])
+        return stats
+
+    def to_model_monitor(self, name: str) -> dict:
+        """This feature's entry in a Model Monitor statistics.json `features` list"""
+        feature = {
+            "name": name,
+            "inferred_type": "Integral" if self.integral else "Fractional",
+            "numerical_statistics": {
+                "common": { "num_present": self.present, "num_missing": self.missing },
+                "mean": self.mean if self.present else 0.,
+                "sum": self.sum,
+                "std_dev": self.std if self.present else 0.,
+                "min": self.min if self.present else 0.,
+                "max": self.max if self.present else 0.,
+                "distribution": { "kll": { "buckets": [], "sketch": self.kll.to_dict() } },
+            },
+        }
+        if self.present:
+            edges = np.linspace(self.min, self.max, MODEL_MONITOR_BUCKETS + 1)
+            cum_counts = self.kll.cdf(edges[1:]) * self.present
+            counts = np.diff(np.concatenate([[0.], cum_counts]))
+            feature["numerical_statistics"]["distribution"]["kll"]["buckets"] = [
+                { "lower_bound": float(lo), "upper_bound": float(hi), "count": float(count) }
+                for lo, hi, count in zip(edges[:-1], edges[1:], counts)
+            ]
+        return feature
+
+    @classmethod
+    def from_model_monitor(cls, feature: dict) -> "NumericStats":
+        """Statistics from a Model Monitor statistics.json numerical feature entry"""
+        numerical = feature["numerical_statistics"]
+        stats = cls()
+        stats.present = int(numerical["common"]["num_present"])
+        stats.missing = int(numerical["common"]["num_missing"])
+        stats.sum = float(numerical["sum"])
+        stats.mean = float(numerical["mean"])
+        stats.m2 = float(numerical["std_dev"]) ** 2 * stats.present
+        stats.min = float(numerical["min"])
+        stats.max = float(numerical["max"])
+        stats.integral = feature.get("inferred_type") == "Integral"
+        sketch = numerical.get("distribution", {}).get("kll", {}).get("sketch")
+        if sketch:
+            stats.kll = KllSketch.from_dict(sketch)
+        return stats
+
+
+class FeatureStats:
+    """NumericStats for each column of a 2D dataset, by name"""
+    def __init__(self, names, k: int=DEFAULT_K, c: float=DEFAULT_C):
+        self.names = list(names)
+        self.features = [NumericStats(k=k, c=c) for _ in self.names]
+
+    @property
+    def rows(self) -> int:
+        return max((f.present + f.missing for f in self.features), default=0)
+
+    def update(self, matrix):
+        """Add a batch of rows (2D array-like with one column per feature)"""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if matrix.ndim != 2 or matrix.shape[1] != len(self.names):
+            raise ValueError(f"Expected a 2D array with {len(self.names)} columns: Got shape {matrix.shape}")
+        for ix, feature in enumerate(self.features):
+            feature.update(matrix[:, ix])
+        return self
+
+    def merge(self, other: "FeatureStats"):
+        if other.names != self.names:
+            raise ValueError(f"Can't merge statistics of different features: {self.names} vs {other.names}")
+        for feature, other_feature in zip(self.features, other.features):
+            feature.merge(other_feature)
+        return self
+
+    def __getitem__(self, name) -> NumericStats:
+        return self.features[self.names.index(name)]
+
+    def to_dict(self) -> dict:
+        return { "names": self.names, "features": [f.to_dict() for f in self.features] }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "FeatureStats":
+        stats = cls(d["names"])
+        stats.features = [NumericStats.from_dict(f) for f in d["features"]]
+        return stats
+
+    def to_model_monitor(self) -> dict:
+        """Model Monitor statistics.json content"""
+        return {
+            "version": 0.0,
+            "dataset": { "item_count": self.rows },
+            "features": [f.to_model_monitor(name) for name, f in zip(self.names, self.features)],
+        }
+
+    @classmethod
+    def from_model_monitor(cls, statistics: dict) -> "FeatureStats":
+        """Statistics of the numerical features in a Model Monitor statistics.json (others are skipped)"""
+        numerical = [f for f in statistics["features"] if "numerical_statistics" in f]
+        stats = cls([f["name"] for f in numerical])
+        stats.features = [NumericStats.from_model_monitor(f) for f in numerical]
+        return stats
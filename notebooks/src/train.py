@@ -10,9 +10,10 @@ import random
 # External Dependencies:
 import numpy as np
 import torch
-from pytorch_tabnet.tab_model import TabNetClassifier, TabNetRegressor
 
 # Local Dependencies:
+import artifact
+import baseline
 import config
 import data
 
@@ -31,6 +32,9 @@ def set_seed(seed, use_gpus=True):
 
 
 def get_model(args):
+    # (Deferred import keeps `import train` cheap, e.g. for tools that only need set_seed or train())
+    from pytorch_tabnet.tab_model import TabNetClassifier, TabNetRegressor
+
     model_params = {
         "n_d": args.n_d,
         "n_a": args.n_a,
@@ -107,14 +111,23 @@ def train(args):
             "modelType": args.model_type,
         }))
 
-    model.save_model(os.path.join(args.model_dir, "tabnet"))
+    if args.save_format in ("flat", "both"):
+        artifact.save_flat(model, args.model_dir, args.model_type)
+    if args.save_format in ("zip", "both"):
+        model.save_model(os.path.join(args.model_dir, "tabnet"))
+
+    if args.baseline:
+        # (From the training features already in memory, so this costs one vectorized pass)
+        logger.info("Computing data quality baseline")
+        stats = baseline.compute_statistics(baseline.array_chunks(X_train))
+        baseline.save_baseline(stats, os.path.join(args.model_dir, "baseline"), args.baseline_s3_uri)
     return model
 
 
 if __name__ == "__main__":
     args = config.parse_args()
 
-    for l in (logger, data.logger):
+    for l in (logger, artifact.logger, baseline.logger, data.logger):
         config.configure_logger(l, args)
 
     logger.info("Loaded arguments: %s", args)
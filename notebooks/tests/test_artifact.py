@@ -0,0 +1,48 @@
+"""Round-trip tests for the flat model artifact format (artifact.py)
+
+Run from notebooks with `python -m pytest tests` (skipped unless pytorch-tabnet is installed, as in training).
+"""
+
+# Python Built-Ins:
+import os
+import sys
+
+# External Dependencies:
+import pytest
+
+np = pytest.importorskip("numpy")
+tab_model = pytest.importorskip("pytorch_tabnet.tab_model")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# Local Dependencies:
+import artifact
+
+
+def fit_tiny(ModelClass, y):
+    rng = np.random.RandomState(0)
+    X = rng.rand(len(y), 6).astype(np.float32)
+    model = ModelClass(n_d=4, n_a=4, n_steps=2, seed=0, verbose=0, device_name="cpu")
+    model.fit(X, y, max_epochs=2, batch_size=64, virtual_batch_size=32)
+    return model, X
+
+
+def test_classifier_round_trip(tmp_path):
+    # Labels that aren't 0..N-1, so predict() depends on preds_mapper to map class indexes back to them:
+    y = np.random.RandomState(1).choice([3, 5, 7], size=256)
+    model, X = fit_tiny(tab_model.TabNetClassifier, y)
+    artifact.save_flat(model, str(tmp_path), "classification")
+    loaded = artifact.load_flat(str(tmp_path))
+
+    np.testing.assert_allclose(loaded.predict_proba(X), model.predict_proba(X), rtol=1e-6)
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+    assert set(loaded.predict(X)) <= { 3, 5, 7 }
+
+
+def test_regressor_round_trip(tmp_path):
+    y = np.random.RandomState(1).rand(256, 1).astype(np.float32)
+    model, X = fit_tiny(tab_model.TabNetRegressor, y)
+    artifact.save_flat(model, str(tmp_path), "regression")
+    loaded = artifact.load_flat(str(tmp_path))
+
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), rtol=1e-6)
@@ -0,0 +1,27 @@
+"""Forbidden eager import checks for the training/serving entry points (benchmark_startup.py)
+
+Run from notebooks with `python -m pytest tests`. Targets whose own dependencies aren't installed are skipped.
+Only the forbidden-module rules are checked here: Import time budgets depend on the machine.
+"""
+
+# Python Built-Ins:
+import os
+import sys
+
+# External Dependencies:
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# Local Dependencies:
+import benchmark_startup
+
+
+@pytest.mark.parametrize("target", sorted(benchmark_startup.DEFAULT_TARGETS))
+def test_no_forbidden_imports(target):
+    spec = dict(benchmark_startup.DEFAULT_TARGETS[target], budget_ms=None)
+    result = benchmark_startup.measure_target(target, spec, repeats=1)
+    failed = [v for v in result["violations"] if v.startswith("Import failed:")]
+    if failed and "ModuleNotFoundError" in failed[0]:
+        pytest.skip(f"Dependencies of {target} not installed: {failed[0]}")
+    assert result["violations"] == []
@@ -1,7 +1,24 @@
-"""Small utilities to make life easier: root package"""
+"""Small utilities to make life easier: root package
+
+Submodules are imported lazily on first attribute access (e.g. `util.project`), because several of them
+pull in heavy dependencies (boto3, sagemaker, smexperiments) that most callers don't need.
+"""
+
+# Python Built-Ins:
+import importlib
 
-from . import boto
-from . import progress
-from . import project
-from . import smexps
 from .uid import append_timestamp
+
+_LAZY_SUBMODULES = ("boto", "progress", "project", "smexps")
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module  # Cache so __getattr__ is only hit once per submodule
+        return module
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_SUBMODULES))
@@ -1,5 +1,6 @@
 # Python Built-Ins:
 from datetime import datetime
+from functools import lru_cache
 import re
 import signal
 import time
@@ -7,11 +8,14 @@ from typing import Any, Callable, Optional, Union
 import warnings
 
 # External Dependencies:
-import boto3
 from dateutil.relativedelta import relativedelta  # For nice display purposes
 
 
-sfn = boto3.client("stepfunctions")
+@lru_cache(maxsize=None)
+def sfn_client():
+    """Step Functions client, created on first use (importing boto3 is slow)"""
+    import boto3
+    return boto3.client("stepfunctions")
 
 
 def camel_case_to_upper_snake(s: str) -> str:
@@ -134,7 +138,7 @@ def sfn_polling_spinner(execution_arn: str, poll_history_len: int=10, **kwargs):
     time.sleep(.2)  # Sleep a little to give a just-created sfn time to assume a state intially
 
     def fn_poll_result():
-        events = sfn.get_execution_history(
+        events = sfn_client().get_execution_history(
             executionArn=execution_arn,
             maxResults=poll_history_len,
             reverseOrder=True,
@@ -182,7 +186,7 @@ def sfn_polling_spinner(execution_arn: str, poll_history_len: int=10, **kwargs):
         fn_stringify_result = lambda res: res["status"] + (f" - {res['state']}" if res["state"] else ""),
         **kwargs
     )
-    return sfn.describe_execution(executionArn=execution_arn)
+    return sfn_client().describe_execution(executionArn=execution_arn)
 
 
 def notebook_safe_tqdm_loop(tqdm_iterator, fn):
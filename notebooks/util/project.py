@@ -12,24 +12,31 @@ separate sessions (interact with multiple projects).
 # Python Built-Ins:
 from collections import namedtuple
 from datetime import datetime, date
+from functools import lru_cache
 import json
 import logging
 import os
 from types import SimpleNamespace
 from typing import Union
 
-# External Dependencies:
-import boto3
-import sagemaker
-
 # Local Dependencies:
 from . import uid
 from . import progress
 
 logger = logging.getLogger("project")
 
-sfn = boto3.client("stepfunctions")
-ssm = boto3.client("ssm")
+
+@lru_cache(maxsize=None)
+def boto_client(service_name: str):
+    """Cached boto3 client for service_name, created on first use (importing boto3 is slow)"""
+    import boto3
+    return boto3.client(service_name)
+
+
+def get_execution_role():
+    """sagemaker.get_execution_role(), deferring the (slow) sagemaker SDK import until it's needed"""
+    import sagemaker
+    return sagemaker.get_execution_role()
 
 
 defaults = SimpleNamespace()
@@ -87,7 +94,7 @@ class ProjectSession:
             for s in sandbox_param_ids:
                 param_ssm_names[f"/MLEnv/Projects/{project_id}/{role_name}/{s}"] = { "cat": "sandbox", "id": s }
 
-        response = ssm.get_parameters(Names=[s for s in param_ssm_names])
+        response = boto_client("ssm").get_parameters(Names=[s for s in param_ssm_names])
         n_invalid = len(response.get("InvalidParameters", []))
         if n_invalid == len(param_ssm_names):
             raise ValueError(f"Found no valid SSM parameters for /MLEnv/Projects/{project_id}: Invalid project ID")
@@ -144,7 +151,7 @@ class ProjectSession:
         the response. Otherwise, display a spinner and waits for the submission workflow to complete.
         """
         # TODO: Check recorded against a Trial
-        submission = sfn.start_execution(
+        submission = boto_client("stepfunctions").start_execution(
             stateMachineArn=self.pipeline_state_machine,
             name=uid.append_timestamp("execution"),  # Auto-derive so we can make use of re-use checking
             input=json.dumps(data, default=stringify_datetime),
@@ -182,7 +189,7 @@ def init(project_id: str, role: Union[str, None]=None) -> ProjectSession:
     # Check that we can create the session straight away, for nice error behaviour:
     if role is None:
         try:
-            role = sagemaker.get_execution_role()
+            role = get_execution_role()
         except:
             logger.warning("User role not supplied and couldn't determine from environment")
     session = ProjectSession(project_id, role=role)
@@ -203,7 +210,7 @@ def session_or_default(sess: Union[ProjectSession, None]=None, role: Union[str,
     elif defaults.project_id:
         if role is None:
             try:
-                role = sagemaker.get_execution_role()
+                role = get_execution_role()
             except:
                 logger.warning("User role not supplied and couldn't determine from environment")
         defaults.session = ProjectSession(defaults.project_id, role=role)
@@ -0,0 +1,1322 @@
+"""In-memory stand-ins for the AWS APIs the pipeline's Lambdas use, to run them in-process with localrun.py
+
+Each stand-in implements just the operations (and response fields) that the functions in ../functions call,
+and counts every call by the state machine state it was made from. Other operations raise
+NotImplementedError, so a function's new AWS dependency shows up as a clear local failure:
+
+- s3: Objects are files at {root}/{bucket}/{key} (as in notebooks/src/capture.py's LocalStore), so data can
+  be staged by copying it into a folder. Also a minimal boto3-style resource, for Bucket(name).copy() etc.
+- sagemaker: Models, endpoint configs, endpoints, trials and jobs, in memory. After each change an endpoint
+  reports Creating/Updating for endpoint_polls DescribeEndpoint calls before going InService, and a job
+  reports InProgress for job_polls describes before Completed. (Jobs don't run: Stub their states instead
+  to fake what they would output)
+- application-autoscaling, cloudwatch, sns, ses: Recorded in memory. GetMetricData aggregates whatever
+  PutMetricData has stored, so metrics are empty unless seeded
+- stepfunctions: SendTaskSuccess/SendTaskFailure, which complete .waitForTaskToken states
+- lambda: Invoke runs the handlers defined in the SAM template in-process, importing each on first use (its
+  "cold start") from its CodeUri folder, with the template's layers on sys.path
+
+Initial state (e.g. a live endpoint to deploy over, or the trial register-model looks up) is seeded with
+API calls by service, made in order before the run and without waiting for anything to settle. E.g:
+
+    {
+        "sagemaker": {
+            "create_trial": [{ "TrialName": "trial-1", "ExperimentName": "experiment-1" }]
+        },
+        "cloudwatch": {
+            "put_metric_data": [{
+                "Namespace": "AWS/SageMaker",
+                "MetricData": [{ "MetricName": "Invocations", "Value": 1200, "Dimensions": [...] }]
+            }]
+        }
+    }
+"""
+
+# Python Built-Ins:
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import copy
+from datetime import datetime, timedelta, timezone
+import functools
+import hashlib
+import importlib.util
+import io
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from types import SimpleNamespace
+import uuid
+
+# External Dependencies:
+from botocore.exceptions import ClientError
+
+
+ACCOUNT_ID = "000000000000"
+REGION = "local"
+UNATTRIBUTED = "(unattributed)"
+
+
+class NoSuchKey(ClientError):
+    pass
+
+
+class ResourceNotFound(ClientError):
+    pass
+
+
+def client_error(code, message, operation_name, status=400, error_class=ClientError):
+    """A botocore-style ClientError (so functions' `except ClientError` handling works as against AWS)"""
+    return error_class(
+        { "Error": { "Code": code, "Message": message }, "ResponseMetadata": { "HTTPStatusCode": status } },
+        operation_name,
+    )
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _kebab(name):
+    return re.sub(r"(?<!^)(?=[A-Z])", "-", name).lower()
+
+
+class CallRecorder:
+    """Counts of API calls by operation, per state (of the calling thread) they were made from
+
+    Threads a function starts itself don't know their state, so their calls go to the only active state if
+    there's just one (as there is except in a Map or Parallel), or else to UNATTRIBUTED.
+    """
+    def __init__(self):
+        self.calls = defaultdict(Counter)
+        self._local = threading.local()
+        self._active = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def attribute_to(self, state_name):
+        previous = getattr(self._local, "state", None)
+        self._local.state = state_name
+        with self._lock:
+            self._active[state_name] += 1
+        try:
+            yield
+        finally:
+            self._local.state = previous
+            with self._lock:
+                self._active[state_name] -= 1
+                if not self._active[state_name]:
+                    del self._active[state_name]
+
+    def record(self, operation):
+        with self._lock:
+            state_name = getattr(self._local, "state", None)
+            if state_name is None:
+                state_name = next(iter(self._active)) if len(self._active) == 1 else UNATTRIBUTED
+            self.calls[state_name][operation] += 1
+
+
+def operation(method):
+    """Mark a stand-in method as an API operation: Counted, and serialized against the stand-in's state"""
+    name = "".join(word.capitalize() for word in method.__name__.split("_"))
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.recorder.record(f"{self.service_name}:{name}")
+        if not self.serialize:
+            return method(self, *args, **kwargs)
+        with self._lock:
+            return copy.deepcopy(method(self, *args, **kwargs))
+    wrapper.operation_name = name
+    return wrapper
+
+
+class Paginator:
+    def __init__(self, method, input_token, output_token):
+        self.method = method
+        self.input_token = input_token
+        self.output_token = output_token
+
+    def paginate(self, **kwargs):
+        kwargs.pop("PaginationConfig", None)
+        while True:
+            page = self.method(**kwargs)
+            yield page
+            token = page.get(self.output_token)
+            if not token:
+                return
+            kwargs[self.input_token] = token
+
+
+class StandIn:
+    """Base for service stand-ins: Unimplemented operations raise NotImplementedError when called"""
+    service_name = None
+    # Operations hold a lock and return deep copies, unless the stand-in handles that itself:
+    serialize = True
+    # (input token, output token) for each paginated operation that isn't (NextToken, NextToken):
+    pagination = {}
+    exceptions = SimpleNamespace(ClientError=ClientError)
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def unsupported(*args, **kwargs):
+            raise NotImplementedError(f"{self.service_name}.{name} is not implemented by the local stand-in")
+        return unsupported
+
+    def get_paginator(self, operation_name):
+        return Paginator(
+            getattr(self, operation_name),
+            *self.pagination.get(operation_name, ("NextToken", "NextToken")),
+        )
+
+
+class StreamingBody:
+    """The parts of botocore's StreamingBody the functions use, over in-memory bytes"""
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._stream.read(amt)
+
+    def iter_chunks(self, chunk_size=1024):
+        return iter(lambda: self._stream.read(chunk_size), b"")
+
+    def iter_lines(self, chunk_size=1024, keepends=False):
+        return iter(self._stream.read().splitlines(keepends))
+
+    def close(self):
+        self._stream.close()
+
+
+def byte_range(spec, size):
+    """[start, end) offsets of an HTTP Range header value like 'bytes=0-99', 'bytes=100-' or 'bytes=-10'"""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", spec)
+    if not match or not any(match.groups()):
+        raise ValueError(f"Unsupported Range '{spec}'")
+    first, last = match.groups()
+    if not first:
+        return max(size - int(last), 0), size
+    return min(int(first), size), min(int(last) + 1, size) if last else size
+
+
+class LocalS3(StandIn):
+    """S3 objects as files under root, with user metadata and multipart uploads held in memory"""
+    service_name = "s3"
+    pagination = { "list_objects_v2": ("ContinuationToken", "NextContinuationToken") }
+    exceptions = SimpleNamespace(ClientError=ClientError, NoSuchKey=NoSuchKey)
+    # (Bodies can be big, and file operations don't share state with each other)
+    serialize = False
+
+    def __init__(self, recorder, root):
+        super().__init__(recorder)
+        self.root = root
+        self.metadata = {}
+        self.uploads = {}
+        self._etags = {}
+
+    def path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def _stat(self, bucket, key, operation_name):
+        path = self.path(bucket, key)
+        if not os.path.isfile(path):
+            if operation_name == "HeadObject":
+                # (HEAD responses have no body, so botocore only knows the status code)
+                raise client_error("404", "Not Found", operation_name, 404)
+            raise client_error(
+                "NoSuchKey", "The specified key does not exist.", operation_name, 404, NoSuchKey
+            )
+        return path, os.stat(path)
+
+    def _etag(self, path, stat):
+        cache_key = (path, stat.st_mtime_ns, stat.st_size)
+        if cache_key not in self._etags:
+            digest = hashlib.md5()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            self._etags[cache_key] = f'"{digest.hexdigest()}"'
+        return self._etags[cache_key]
+
+    def _head(self, bucket, key, operation_name):
+        path, stat = self._stat(bucket, key, operation_name)
+        return path, {
+            "ContentLength": stat.st_size,
+            "ETag": self._etag(path, stat),
+            "LastModified": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            "Metadata": dict(self.metadata.get((bucket, key), {})),
+        }
+
+    def _write(self, bucket, key, data, metadata=None):
+        path = self.path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.metadata[(bucket, key)] = dict(metadata or {})
+        return self._etag(path, os.stat(path))
+
+    def _copy_source(self, CopySource, CopySourceIfMatch, operation_name):
+        if isinstance(CopySource, str):
+            bucket, _, key = CopySource.lstrip("/").partition("/")
+            CopySource = { "Bucket": bucket, "Key": key }
+        path, head = self._head(CopySource["Bucket"], CopySource["Key"], operation_name)
+        if CopySourceIfMatch is not None and CopySourceIfMatch != head["ETag"]:
+            raise client_error(
+                "PreconditionFailed", "At least one of the pre-conditions you specified did not hold",
+                operation_name, 412,
+            )
+        with open(path, "rb") as f:
+            return f.read(), head
+
+    @operation
+    def head_object(self, Bucket, Key, **kwargs):
+        return self._head(Bucket, Key, "HeadObject")[1]
+
+    @operation
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        path, head = self._head(Bucket, Key, "GetObject")
+        with open(path, "rb") as f:
+            if Range is None:
+                data = f.read()
+            else:
+                start, end = byte_range(Range, head["ContentLength"])
+                f.seek(start)
+                data = f.read(end - start)
+                head["ContentRange"] = f"bytes {start}-{end - 1}/{head['ContentLength']}"
+        head.update({ "Body": StreamingBody(data), "ContentLength": len(data) })
+        return head
+
+    @operation
+    def put_object(self, Bucket, Key, Body=b"", Metadata=None, **kwargs):
+        if hasattr(Body, "read"):
+            Body = Body.read()
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        return { "ETag": self._write(Bucket, Key, Body, Metadata) }
+
+    @operation
+    def copy_object(self, Bucket, Key, CopySource, CopySourceIfMatch=None, Metadata=None,
+            MetadataDirective="COPY", **kwargs):
+        data, head = self._copy_source(CopySource, CopySourceIfMatch, "CopyObject")
+        metadata = Metadata if MetadataDirective == "REPLACE" else head["Metadata"]
+        etag = self._write(Bucket, Key, data, metadata)
+        return { "CopyObjectResult": { "ETag": etag, "LastModified": now() } }
+
+    @operation
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        deleted = []
+        for obj in Delete["Objects"]:
+            path = self.path(Bucket, obj["Key"])
+            if os.path.isfile(path):
+                os.remove(path)
+            self.metadata.pop((Bucket, obj["Key"]), None)
+            deleted.append({ "Key": obj["Key"] })
+        return { "Deleted": deleted }
+
+    @operation
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None, StartAfter=None,
+            **kwargs):
+        bucket_dir = os.path.join(self.root, Bucket)
+        if not os.path.isdir(bucket_dir):
+            raise client_error("NoSuchBucket", "The specified bucket does not exist", "ListObjectsV2", 404)
+        # (Only walk the deepest folder the prefix is sure to be under)
+        search_dir = os.path.join(bucket_dir, *Prefix.rpartition("/")[0].split("/"))
+        keys = []
+        for dirpath, _, filenames in os.walk(search_dir):
+            rel_dir = os.path.relpath(dirpath, bucket_dir).replace(os.sep, "/")
+            for filename in filenames:
+                key = filename if rel_dir == "." else f"{rel_dir}/{filename}"
+                if key.startswith(Prefix):
+                    keys.append(key)
+        after = ContinuationToken or StartAfter
+        keys = [k for k in sorted(keys) if after is None or k > after]
+        page, truncated = keys[:MaxKeys], len(keys) > MaxKeys
+        contents = []
+        for key in page:
+            path, stat = self._stat(Bucket, key, "ListObjectsV2")
+            contents.append({
+                "Key": key,
+                "Size": stat.st_size,
+                "ETag": self._etag(path, stat),
+                "LastModified": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+                "StorageClass": "STANDARD",
+            })
+        response = { "Name": Bucket, "Prefix": Prefix, "KeyCount": len(contents), "IsTruncated": truncated }
+        if contents:
+            response["Contents"] = contents
+        if truncated:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    @operation
+    def create_multipart_upload(self, Bucket, Key, Metadata=None, **kwargs):
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[upload_id] = { "Parts": {}, "Metadata": Metadata }
+        return { "Bucket": Bucket, "Key": Key, "UploadId": upload_id }
+
+    def _upload(self, upload_id, operation_name):
+        with self._lock:
+            if upload_id not in self.uploads:
+                raise client_error("NoSuchUpload", "The specified upload does not exist", operation_name, 404)
+            return self.uploads[upload_id]
+
+    @operation
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        data = Body.read() if hasattr(Body, "read") else Body
+        self._upload(UploadId, "UploadPart")["Parts"][PartNumber] = data
+        return { "ETag": f'"{hashlib.md5(data).hexdigest()}"' }
+
+    @operation
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange=None,
+            CopySourceIfMatch=None, **kwargs):
+        data, _ = self._copy_source(CopySource, CopySourceIfMatch, "UploadPartCopy")
+        if CopySourceRange is not None:
+            start, end = byte_range(CopySourceRange, len(data))
+            data = data[start:end]
+        self._upload(UploadId, "UploadPartCopy")["Parts"][PartNumber] = data
+        return { "CopyPartResult": { "ETag": f'"{hashlib.md5(data).hexdigest()}"', "LastModified": now() } }
+
+    @operation
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        upload = self._upload(UploadId, "CompleteMultipartUpload")
+        data = b"".join(upload["Parts"][part["PartNumber"]] for part in MultipartUpload["Parts"])
+        etag = self._write(Bucket, Key, data, upload["Metadata"])
+        with self._lock:
+            del self.uploads[UploadId]
+        return { "Bucket": Bucket, "Key": Key, "ETag": etag }
+
+    @operation
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        with self._lock:
+            self.uploads.pop(UploadId, None)
+        return {}
+
+
+class LocalS3Resource:
+    """Just enough of boto3's S3 resource: Bucket(name) with copy(), upload_fileobj() and meta.client"""
+    def __init__(self, s3client):
+        self.meta = SimpleNamespace(client=s3client)
+
+    def Bucket(self, name):
+        return LocalBucket(self.meta.client, name)
+
+
+class LocalBucket:
+    def __init__(self, s3client, name):
+        self.name = name
+        self.meta = SimpleNamespace(client=s3client)
+
+    def copy(self, CopySource, Key, ExtraArgs=None, Callback=None, SourceClient=None, Config=None):
+        self.meta.client.copy_object(Bucket=self.name, Key=Key, CopySource=CopySource, **(ExtraArgs or {}))
+
+    def upload_fileobj(self, Fileobj, Key, ExtraArgs=None, Callback=None, Config=None):
+        self.meta.client.put_object(Bucket=self.name, Key=Key, Body=Fileobj.read(), **(ExtraArgs or {}))
+
+    def download_fileobj(self, Key, Fileobj, ExtraArgs=None, Callback=None, Config=None):
+        Fileobj.write(self.meta.client.get_object(Bucket=self.name, Key=Key)["Body"].read())
+
+
+class LocalSageMaker(StandIn):
+    """SageMaker resources in memory, with endpoints and jobs that finish after a set number of describes"""
+    service_name = "sagemaker"
+    BUSY_ENDPOINT_STATES = ("Creating", "Updating")
+
+    def __init__(self, recorder, endpoint_polls=0, job_polls=0):
+        super().__init__(recorder)
+        self.endpoint_polls = endpoint_polls
+        self.job_polls = job_polls
+        self.models = {}
+        self.endpoint_configs = {}
+        self.endpoints = {}
+        self.trials = {}
+        self.jobs = {}
+        # Tags by resource ARN (as dicts), for everything created here:
+        self.tags = {}
+
+    def arn(self, kind, name):
+        return f"arn:aws:sagemaker:{REGION}:{ACCOUNT_ID}:{kind}/{name.lower()}"
+
+    def _get(self, collection, name, kind, description, operation_name):
+        if name not in collection:
+            raise client_error(
+                "ValidationException",
+                f'Could not find {description} "{self.arn(kind, name)}".',
+                operation_name,
+            )
+        return collection[name]
+
+    def _create(self, collection, name, kind, description, operation_name, record):
+        if name in collection:
+            raise client_error(
+                "ValidationException",
+                f'Cannot create already existing {description} "{self.arn(kind, name)}".',
+                operation_name,
+            )
+        arn = self.arn(kind, name)
+        self.tags[arn] = { t["Key"]: t["Value"] for t in record.pop("Tags", None) or [] }
+        collection[name] = dict(record, CreationTime=now())
+        return arn
+
+    @staticmethod
+    def _listed(records, fields, CreationTimeBefore=None, CreationTimeAfter=None, NameContains=None,
+            name_field=None):
+        result = []
+        for record in sorted(records, key=lambda r: r["CreationTime"]):
+            if CreationTimeBefore is not None and record["CreationTime"] >= _utc(CreationTimeBefore):
+                continue
+            if CreationTimeAfter is not None and record["CreationTime"] <= _utc(CreationTimeAfter):
+                continue
+            if NameContains is not None and NameContains not in record[name_field]:
+                continue
+            result.append({ f: record[f] for f in fields if f in record })
+        return result
+
+    @operation
+    def add_tags(self, ResourceArn, Tags):
+        if ResourceArn not in self.tags:
+            raise client_error("ValidationException", f"Could not find resource {ResourceArn}.", "AddTags")
+        self.tags[ResourceArn].update({ t["Key"]: t["Value"] for t in Tags })
+        return { "Tags": Tags }
+
+    @operation
+    def list_tags(self, ResourceArn, **kwargs):
+        if ResourceArn not in self.tags:
+            raise client_error("ValidationException", f"Could not find resource {ResourceArn}.", "ListTags")
+        return { "Tags": [{ "Key": k, "Value": v } for k, v in self.tags[ResourceArn].items()] }
+
+    @operation
+    def create_model(self, ModelName, **kwargs):
+        record = dict(kwargs, ModelName=ModelName, ModelArn=self.arn("model", ModelName))
+        return { "ModelArn": self._create(self.models, ModelName, "model", "model", "CreateModel", record) }
+
+    @operation
+    def describe_model(self, ModelName):
+        return self._get(self.models, ModelName, "model", "model", "DescribeModel")
+
+    @operation
+    def list_models(self, NameContains=None, CreationTimeBefore=None, CreationTimeAfter=None, **kwargs):
+        return { "Models": self._listed(
+            self.models.values(), ("ModelName", "ModelArn", "CreationTime"),
+            CreationTimeBefore, CreationTimeAfter, NameContains, "ModelName",
+        ) }
+
+    @operation
+    def delete_model(self, ModelName):
+        self._get(self.models, ModelName, "model", "model", "DeleteModel")
+        del self.models[ModelName]
+        self.tags.pop(self.arn("model", ModelName), None)
+        return {}
+
+    @operation
+    def create_endpoint_config(self, EndpointConfigName, ProductionVariants, **kwargs):
+        record = dict(
+            kwargs,
+            EndpointConfigName=EndpointConfigName,
+            EndpointConfigArn=self.arn("endpoint-config", EndpointConfigName),
+            ProductionVariants=ProductionVariants,
+        )
+        arn = self._create(
+            self.endpoint_configs, EndpointConfigName, "endpoint-config", "endpoint configuration",
+            "CreateEndpointConfig", record,
+        )
+        return { "EndpointConfigArn": arn }
+
+    @operation
+    def describe_endpoint_config(self, EndpointConfigName):
+        return self._get(
+            self.endpoint_configs, EndpointConfigName, "endpoint-config", "endpoint configuration",
+            "DescribeEndpointConfig",
+        )
+
+    @operation
+    def list_endpoint_configs(self, NameContains=None, CreationTimeBefore=None, CreationTimeAfter=None,
+            **kwargs):
+        return { "EndpointConfigs": self._listed(
+            self.endpoint_configs.values(), ("EndpointConfigName", "EndpointConfigArn", "CreationTime"),
+            CreationTimeBefore, CreationTimeAfter, NameContains, "EndpointConfigName",
+        ) }
+
+    @operation
+    def delete_endpoint_config(self, EndpointConfigName):
+        self._get(
+            self.endpoint_configs, EndpointConfigName, "endpoint-config", "endpoint configuration",
+            "DeleteEndpointConfig",
+        )
+        del self.endpoint_configs[EndpointConfigName]
+        self.tags.pop(self.arn("endpoint-config", EndpointConfigName), None)
+        return {}
+
+    def _config_variants(self, config_name, operation_name):
+        config = self._get(
+            self.endpoint_configs, config_name, "endpoint-config", "endpoint configuration", operation_name
+        )
+        variants = []
+        for variant in config["ProductionVariants"]:
+            summary = {
+                "VariantName": variant["VariantName"],
+                "DeployedImages": [],
+                "CurrentWeight": variant.get("InitialVariantWeight", 1.0),
+                "DesiredWeight": variant.get("InitialVariantWeight", 1.0),
+            }
+            if "ServerlessConfig" in variant:
+                summary["CurrentServerlessConfig"] = variant["ServerlessConfig"]
+            else:
+                summary["CurrentInstanceCount"] = variant.get("InitialInstanceCount", 1)
+                summary["DesiredInstanceCount"] = variant.get("InitialInstanceCount", 1)
+            variants.append(summary)
+        capture = config.get("DataCaptureConfig")
+        if capture:
+            capture = {
+                "EnableCapture": capture.get("EnableCapture", True),
+                "CaptureStatus": "Started",
+                "CurrentSamplingPercentage": capture.get("InitialSamplingPercentage", 100),
+                "DestinationS3Uri": capture.get("DestinationS3Uri"),
+            }
+        return variants, capture
+
+    def _change_endpoint(self, endpoint, status, pending):
+        endpoint.update({ "EndpointStatus": status, "LastModifiedTime": now() })
+        endpoint["_Pending"] = pending
+        endpoint["_PollsLeft"] = self.endpoint_polls
+        if "EndpointConfigName" in pending and status == "Updating":
+            endpoint["PendingDeploymentSummary"] = { "EndpointConfigName": pending["EndpointConfigName"] }
+
+    def _settle_endpoint(self, endpoint):
+        pending = endpoint.pop("_Pending", {})
+        endpoint.pop("_PollsLeft", None)
+        endpoint.pop("PendingDeploymentSummary", None)
+        if "EndpointConfigName" in pending:
+            endpoint["EndpointConfigName"] = pending["EndpointConfigName"]
+            endpoint["ProductionVariants"], capture = self._config_variants(
+                pending["EndpointConfigName"], "DescribeEndpoint"
+            )
+            if capture:
+                endpoint["DataCaptureConfig"] = capture
+            else:
+                endpoint.pop("DataCaptureConfig", None)
+        for change in pending.get("DesiredWeightsAndCapacities", []):
+            for variant in endpoint["ProductionVariants"]:
+                if variant["VariantName"] == change["VariantName"]:
+                    if "DesiredWeight" in change:
+                        variant["CurrentWeight"] = variant["DesiredWeight"] = change["DesiredWeight"]
+                    if "DesiredInstanceCount" in change:
+                        variant["CurrentInstanceCount"] = change["DesiredInstanceCount"]
+                        variant["DesiredInstanceCount"] = change["DesiredInstanceCount"]
+        endpoint.update({ "EndpointStatus": "InService", "LastModifiedTime": now() })
+
+    @operation
+    def create_endpoint(self, EndpointName, EndpointConfigName, **kwargs):
+        self._config_variants(EndpointConfigName, "CreateEndpoint")
+        record = { "EndpointName": EndpointName, "EndpointArn": self.arn("endpoint", EndpointName) }
+        arn = self._create(self.endpoints, EndpointName, "endpoint", "endpoint", "CreateEndpoint", record)
+        self._change_endpoint(
+            self.endpoints[EndpointName], "Creating", { "EndpointConfigName": EndpointConfigName }
+        )
+        self.endpoints[EndpointName]["EndpointConfigName"] = EndpointConfigName
+        self.endpoints[EndpointName]["ProductionVariants"] = []
+        return { "EndpointArn": arn }
+
+    def _endpoint_for_update(self, EndpointName, operation_name):
+        endpoint = self._get(self.endpoints, EndpointName, "endpoint", "endpoint", operation_name)
+        if endpoint["EndpointStatus"] != "InService":
+            raise client_error(
+                "ValidationException",
+                f'Cannot update in-progress endpoint "{endpoint["EndpointArn"]}".',
+                operation_name,
+            )
+        return endpoint
+
+    @operation
+    def update_endpoint(self, EndpointName, EndpointConfigName, **kwargs):
+        endpoint = self._endpoint_for_update(EndpointName, "UpdateEndpoint")
+        self._config_variants(EndpointConfigName, "UpdateEndpoint")
+        self._change_endpoint(endpoint, "Updating", { "EndpointConfigName": EndpointConfigName })
+        return { "EndpointArn": endpoint["EndpointArn"] }
+
+    @operation
+    def update_endpoint_weights_and_capacities(self, EndpointName, DesiredWeightsAndCapacities):
+        endpoint = self._endpoint_for_update(EndpointName, "UpdateEndpointWeightsAndCapacities")
+        names = set(v["VariantName"] for v in endpoint["ProductionVariants"])
+        for change in DesiredWeightsAndCapacities:
+            if change["VariantName"] not in names:
+                raise client_error(
+                    "ValidationException",
+                    f"The variant name(s) [{change['VariantName']}] is/are not present.",
+                    "UpdateEndpointWeightsAndCapacities",
+                )
+        self._change_endpoint(
+            endpoint, "Updating", { "DesiredWeightsAndCapacities": DesiredWeightsAndCapacities }
+        )
+        return { "EndpointArn": endpoint["EndpointArn"] }
+
+    @operation
+    def describe_endpoint(self, EndpointName):
+        endpoint = self._get(self.endpoints, EndpointName, "endpoint", "endpoint", "DescribeEndpoint")
+        if endpoint["EndpointStatus"] in self.BUSY_ENDPOINT_STATES:
+            if endpoint["_PollsLeft"] > 0:
+                endpoint["_PollsLeft"] -= 1
+            else:
+                self._settle_endpoint(endpoint)
+        return { k: v for k, v in endpoint.items() if not k.startswith("_") }
+
+    @operation
+    def list_endpoints(self, StatusEquals=None, NameContains=None, CreationTimeBefore=None,
+            CreationTimeAfter=None, **kwargs):
+        endpoints = self._listed(
+            self.endpoints.values(),
+            ("EndpointName", "EndpointArn", "EndpointStatus", "CreationTime", "LastModifiedTime"),
+            CreationTimeBefore, CreationTimeAfter, NameContains, "EndpointName",
+        )
+        if StatusEquals is not None:
+            endpoints = [e for e in endpoints if e["EndpointStatus"] == StatusEquals]
+        return { "Endpoints": endpoints }
+
+    @operation
+    def delete_endpoint(self, EndpointName):
+        self._get(self.endpoints, EndpointName, "endpoint", "endpoint", "DeleteEndpoint")
+        del self.endpoints[EndpointName]
+        self.tags.pop(self.arn("endpoint", EndpointName), None)
+        return {}
+
+    @operation
+    def create_trial(self, TrialName, ExperimentName, **kwargs):
+        record = dict(
+            kwargs,
+            TrialName=TrialName,
+            ExperimentName=ExperimentName,
+            TrialArn=self.arn("experiment-trial", TrialName),
+        )
+        arn = self._create(self.trials, TrialName, "experiment-trial", "trial", "CreateTrial", record)
+        return { "TrialArn": arn }
+
+    @operation
+    def describe_trial(self, TrialName):
+        if TrialName not in self.trials:
+            raise client_error(
+                "ResourceNotFound", f"Trial '{self.arn('experiment-trial', TrialName)}' does not exist.",
+                "DescribeTrial", error_class=ResourceNotFound,
+            )
+        return self.trials[TrialName]
+
+    def _create_job(self, kind, kwargs):
+        name = kwargs[f"{kind}Name"]
+        kind_arn = _kebab(kind)
+        if (kind, name) in self.jobs:
+            raise client_error(
+                "ValidationException", "Job name must be unique within an AWS account and region",
+                f"Create{kind}",
+            )
+        arn = self.arn(kind_arn, name)
+        self.jobs[(kind, name)] = dict(
+            kwargs, **{ f"{kind}Arn": arn, f"{kind}Status": "InProgress", "CreationTime": now() },
+            _PollsLeft=self.job_polls,
+        )
+        return { f"{kind}Arn": arn }
+
+    def _describe_job(self, kind, name):
+        if (kind, name) not in self.jobs:
+            raise client_error(
+                "ValidationException", f"Could not find requested job with name {name}", f"Describe{kind}"
+            )
+        job = self.jobs[(kind, name)]
+        if job[f"{kind}Status"] == "InProgress":
+            if job["_PollsLeft"] > 0:
+                job["_PollsLeft"] -= 1
+            else:
+                job.update({ f"{kind}Status": "Completed", f"{kind}EndTime": now() })
+        return { k: v for k, v in job.items() if not k.startswith("_") }
+
+    @operation
+    def create_processing_job(self, **kwargs):
+        return self._create_job("ProcessingJob", kwargs)
+
+    @operation
+    def describe_processing_job(self, ProcessingJobName):
+        return self._describe_job("ProcessingJob", ProcessingJobName)
+
+    @operation
+    def create_transform_job(self, **kwargs):
+        return self._create_job("TransformJob", kwargs)
+
+    @operation
+    def describe_transform_job(self, TransformJobName):
+        return self._describe_job("TransformJob", TransformJobName)
+
+    @operation
+    def create_training_job(self, **kwargs):
+        return self._create_job("TrainingJob", kwargs)
+
+    @operation
+    def describe_training_job(self, TrainingJobName):
+        return self._describe_job("TrainingJob", TrainingJobName)
+
+    def settle(self):
+        """Finish every in-progress endpoint change and job straight away (e.g. after seeding)"""
+        with self._lock:
+            for endpoint in self.endpoints.values():
+                if endpoint["EndpointStatus"] in self.BUSY_ENDPOINT_STATES:
+                    self._settle_endpoint(endpoint)
+            for (kind, _), job in self.jobs.items():
+                if job[f"{kind}Status"] == "InProgress":
+                    job.update({ f"{kind}Status": "Completed", f"{kind}EndTime": now() })
+
+
+class LocalAutoScaling(StandIn):
+    service_name = "application-autoscaling"
+
+    def __init__(self, recorder):
+        super().__init__(recorder)
+        self.targets = {}
+        self.policies = {}
+
+    def _target(self, ServiceNamespace, ResourceId, ScalableDimension, operation_name):
+        key = (ServiceNamespace, ResourceId, ScalableDimension)
+        if key not in self.targets:
+            raise client_error(
+                "ObjectNotFoundException",
+                f"No scalable target registered for service namespace: {ServiceNamespace}, "
+                f"resource ID: {ResourceId}, scalable dimension: {ScalableDimension}",
+                operation_name,
+            )
+        return key
+
+    @operation
+    def register_scalable_target(self, ServiceNamespace, ResourceId, ScalableDimension, **kwargs):
+        key = (ServiceNamespace, ResourceId, ScalableDimension)
+        target = self.targets.get(key) or {
+            "ServiceNamespace": ServiceNamespace,
+            "ResourceId": ResourceId,
+            "ScalableDimension": ScalableDimension,
+            "CreationTime": now(),
+        }
+        target.update({ k: kwargs[k] for k in ("MinCapacity", "MaxCapacity", "RoleARN") if k in kwargs })
+        self.targets[key] = target
+        return {}
+
+    @operation
+    def deregister_scalable_target(self, ServiceNamespace, ResourceId, ScalableDimension):
+        key = self._target(ServiceNamespace, ResourceId, ScalableDimension, "DeregisterScalableTarget")
+        del self.targets[key]
+        # (Deregistering a target deletes its policies)
+        self.policies = { k: v for k, v in self.policies.items() if k[:3] != key }
+        return {}
+
+    @operation
+    def describe_scalable_targets(self, ServiceNamespace, ResourceIds=None, ScalableDimension=None, **kwargs):
+        return { "ScalableTargets": [
+            target for (namespace, rid, dimension), target in self.targets.items()
+            if namespace == ServiceNamespace
+            and (not ResourceIds or rid in ResourceIds)
+            and (ScalableDimension is None or dimension == ScalableDimension)
+        ] }
+
+    @operation
+    def put_scaling_policy(self, PolicyName, ServiceNamespace, ResourceId, ScalableDimension, **kwargs):
+        key = self._target(ServiceNamespace, ResourceId, ScalableDimension, "PutScalingPolicy")
+        arn = "arn:aws:autoscaling:{}:{}:scalingPolicy:{}:resource/{}/{}:policyName/{}".format(
+            REGION, ACCOUNT_ID, uuid.uuid4(), ServiceNamespace, ResourceId, PolicyName
+        )
+        self.policies[key + (PolicyName,)] = dict(
+            kwargs,
+            PolicyARN=arn,
+            PolicyName=PolicyName,
+            ServiceNamespace=ServiceNamespace,
+            ResourceId=ResourceId,
+            ScalableDimension=ScalableDimension,
+            PolicyType=kwargs.get("PolicyType", "StepScaling"),
+            Alarms=[],
+            CreationTime=now(),
+        )
+        return { "PolicyARN": arn, "Alarms": [] }
+
+    @operation
+    def describe_scaling_policies(self, ServiceNamespace, ResourceId=None, ScalableDimension=None,
+            PolicyNames=None, **kwargs):
+        return { "ScalingPolicies": [
+            policy for (namespace, rid, dimension, name), policy in self.policies.items()
+            if namespace == ServiceNamespace
+            and (ResourceId is None or rid == ResourceId)
+            and (ScalableDimension is None or dimension == ScalableDimension)
+            and (not PolicyNames or name in PolicyNames)
+        ] }
+
+
+def aggregate(values, stat):
+    """A CloudWatch statistic (Sum, Average, Minimum, Maximum, SampleCount or pNN) of a list of values"""
+    if stat == "Sum":
+        return sum(values)
+    elif stat == "Average":
+        return sum(values) / len(values)
+    elif stat == "Minimum":
+        return min(values)
+    elif stat == "Maximum":
+        return max(values)
+    elif stat == "SampleCount":
+        return float(len(values))
+    elif re.fullmatch(r"p\d+(\.\d+)?", stat):
+        ordered = sorted(values)
+        return ordered[max(0, math.ceil(float(stat[1:]) / 100 * len(ordered)) - 1)]
+    raise NotImplementedError(f"Statistic {stat} is not implemented by the local stand-in")
+
+
+class LocalCloudWatch(StandIn):
+    """CloudWatch metrics and alarms in memory: Datapoints put without a Timestamp are in every window"""
+    service_name = "cloudwatch"
+
+    def __init__(self, recorder):
+        super().__init__(recorder)
+        self.datapoints = defaultdict(list)
+        self.alarms = {}
+
+    @staticmethod
+    def _metric_key(namespace, metric_name, dimensions):
+        return (namespace, metric_name, frozenset((d["Name"], d["Value"]) for d in dimensions or []))
+
+    @operation
+    def put_metric_data(self, Namespace, MetricData):
+        for datum in MetricData:
+            key = self._metric_key(Namespace, datum["MetricName"], datum.get("Dimensions"))
+            timestamp = _utc(datum["Timestamp"]) if datum.get("Timestamp") else None
+            for value in datum.get("Values") or [datum["Value"]]:
+                self.datapoints[key].append((timestamp, value))
+        return {}
+
+    @operation
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy="TimestampDescending", **kwargs):
+        start, end = _utc(StartTime), _utc(EndTime)
+        results = []
+        for query in MetricDataQueries:
+            if "MetricStat" not in query:
+                raise NotImplementedError("Metric math is not implemented by the local stand-in")
+            stat = query["MetricStat"]
+            metric = stat["Metric"]
+            period = timedelta(seconds=stat["Period"])
+            buckets = defaultdict(list)
+            key = self._metric_key(metric["Namespace"], metric["MetricName"], metric.get("Dimensions"))
+            for timestamp, value in self.datapoints.get(key, []):
+                if timestamp is None:
+                    buckets[start].append(value)
+                elif start <= timestamp < end:
+                    buckets[start + period * ((timestamp - start) // period)].append(value)
+            timestamps = sorted(buckets, reverse=ScanBy == "TimestampDescending")
+            results.append({
+                "Id": query["Id"],
+                "Label": query.get("Label", metric["MetricName"]),
+                "Timestamps": timestamps,
+                "Values": [aggregate(buckets[t], stat["Stat"]) for t in timestamps],
+                "StatusCode": "Complete",
+            })
+        return { "MetricDataResults": results, "Messages": [] }
+
+    @operation
+    def put_metric_alarm(self, AlarmName, **kwargs):
+        self.alarms[AlarmName] = dict(kwargs, AlarmName=AlarmName)
+        return {}
+
+    @operation
+    def delete_alarms(self, AlarmNames):
+        for name in AlarmNames:
+            self.alarms.pop(name, None)
+        return {}
+
+
+class LocalSNS(StandIn):
+    service_name = "sns"
+
+    def __init__(self, recorder):
+        super().__init__(recorder)
+        self.sent = []
+
+    @operation
+    def publish(self, Message, **kwargs):
+        message_id = str(uuid.uuid4())
+        self.sent.append(dict(kwargs, Message=Message, MessageId=message_id))
+        return { "MessageId": message_id }
+
+
+class LocalSES(StandIn):
+    service_name = "ses"
+
+    def __init__(self, recorder):
+        super().__init__(recorder)
+        self.sent = []
+
+    @operation
+    def send_email(self, Source, Destination, Message, **kwargs):
+        message_id = str(uuid.uuid4())
+        self.sent.append(dict(kwargs, Source=Source, Destination=Destination, Message=Message))
+        return { "MessageId": message_id }
+
+
+class LocalStepFunctions(StandIn):
+    """Task token callbacks, for localrun.py to complete .waitForTaskToken states with"""
+    service_name = "stepfunctions"
+
+    def __init__(self, recorder):
+        super().__init__(recorder)
+        self.outcomes = {}
+
+    @operation
+    def send_task_success(self, taskToken, output):
+        self.outcomes[taskToken] = { "Output": json.loads(output) }
+        return {}
+
+    @operation
+    def send_task_failure(self, taskToken, error="", cause=""):
+        self.outcomes[taskToken] = { "Error": error, "Cause": cause }
+        return {}
+
+    @operation
+    def send_task_heartbeat(self, taskToken):
+        return {}
+
+    def pop_outcome(self, task_token):
+        """The callback sent for task_token ({"Output"} or {"Error", "Cause"}), or None if there wasn't one"""
+        with self._lock:
+            return self.outcomes.pop(task_token, None)
+
+
+def _scalar(value):
+    """A YAML scalar (or short-form intrinsic function, as its long-form dict) from a template line"""
+    if value.startswith("!"):
+        tag, _, arg = value[1:].partition(" ")
+        return { "Ref" if tag == "Ref" else f"Fn::{tag}": _scalar(arg.strip()) }
+    if len(value) > 1 and value[0] in "'\"" and value[-1] == value[0]:
+        return value[1:-1]
+    for parse in (int, float):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _parse_block(lines):
+    """Parse the (block-style) YAML mappings and lists of one template resource, skipping block scalars"""
+    root = {}
+    stack = [(-1, None, None)]
+    skip_indent = None
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        indent = len(line) - len(line.lstrip(" "))
+        if skip_indent is not None:
+            if indent > skip_indent:
+                continue
+            skip_indent = None
+        while stack[-1][0] >= indent:
+            stack.pop()
+        _, parent, parent_key = stack[-1]
+        is_item = stripped.startswith("- ")
+        if parent is None:
+            container = root
+        else:
+            if parent[parent_key] is None:
+                parent[parent_key] = [] if is_item else {}
+            container = parent[parent_key]
+        if is_item:
+            if isinstance(container, list):
+                container.append(_scalar(stripped[2:].strip()))
+            continue
+        key, _, value = stripped.partition(":")
+        value = value.strip()
+        if value and value[0] not in "'\"":
+            value = re.sub(r"\s+#.*$", "", value)
+        if not isinstance(container, dict):
+            continue
+        if value in ("|", "|-", ">", ">-"):
+            container[key] = ""
+            skip_indent = indent
+        elif value:
+            container[key] = _scalar(value)
+        else:
+            container[key] = None
+            stack.append((indent, container, key))
+    return root
+
+
+class SamTemplate:
+    """The parameters and resources of a SAM template, with references resolved to local stand-in values
+
+    This is a minimal reader for templates laid out like ../deployment/project.sam.yml (2-space indented
+    block YAML), not a general YAML parser. References resolve to, in order of preference: overrides (e.g.
+    {"ArtifactsBucket": "my-bucket"}), functions' local names and ARNs, parameter defaults, or else a
+    placeholder like "local-artifacts-bucket".
+    """
+    def __init__(self, path, overrides=None):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.overrides = overrides or {}
+        self.parameters = {}
+        self.resources = {}
+        with open(path, "r") as f:
+            lines = f.read().splitlines()
+        section, name, block = None, None, []
+        for line in lines + ["EOF:"]:
+            if line.lstrip().startswith("#"):
+                continue
+            if re.match(r"^\S", line) or re.match(r"^  [\w-]+:\s*$", line):
+                if name is not None:
+                    getattr(self, section)[name] = _parse_block(block)
+                name, block = None, []
+                if re.match(r"^\S", line):
+                    section = { "Parameters:": "parameters", "Resources:": "resources" }.get(line.strip())
+                elif section is not None:
+                    name = line.strip()[:-1]
+            elif name is not None:
+                block.append(line)
+
+    def of_type(self, resource_type):
+        return { k: v for k, v in self.resources.items() if v.get("Type") == resource_type }
+
+    def function_arn(self, name):
+        return f"arn:aws:lambda:{REGION}:{ACCOUNT_ID}:function:{name}"
+
+    def resolve(self, value):
+        """A template value (maybe a Ref, GetAtt or Sub) as a string"""
+        if isinstance(value, dict):
+            if "Ref" in value:
+                return self.resolve_name(value["Ref"])
+            elif "Fn::GetAtt" in value:
+                return self.resolve_name(value["Fn::GetAtt"])
+            elif "Fn::Sub" in value:
+                return re.sub(r"\$\{([\w:.-]+)\}", lambda m: self.resolve_name(m.group(1)), value["Fn::Sub"])
+            raise ValueError(f"Unsupported template value {value}")
+        return str(value)
+
+    def resolve_name(self, name):
+        """Resolve a Ref ("Name") or GetAtt ("Name.Attribute")"""
+        if name in self.overrides:
+            return self.overrides[name]
+        if name == "AWS::Region":
+            return REGION
+        if name == "AWS::AccountId":
+            return ACCOUNT_ID
+        resource, _, attribute = name.partition(".")
+        if self.resources.get(resource, {}).get("Type") == "AWS::Serverless::Function":
+            # (Functions are named by logical ID locally)
+            return self.function_arn(resource) if attribute == "Arn" else resource
+        if not attribute and "Default" in self.parameters.get(resource, {}):
+            return str(self.parameters[resource]["Default"])
+        if attribute == "Arn":
+            return f"arn:aws:local:{REGION}:{ACCOUNT_ID}:{_kebab(resource)}"
+        return f"local-{_kebab(resource)}" + (f"-{_kebab(attribute)}" if attribute else "")
+
+    def functions(self):
+        """Local definitions of the template's functions, by name (logical ID)"""
+        result = {}
+        for name, resource in self.of_type("AWS::Serverless::Function").items():
+            properties = resource.get("Properties") or {}
+            layer_dirs = []
+            for layer in properties.get("Layers") or []:
+                layer_name = layer.get("Ref") if isinstance(layer, dict) else layer
+                content_uri = (self.resources.get(layer_name, {}).get("Properties") or {}).get("ContentUri")
+                if isinstance(content_uri, str):
+                    layer_dir = os.path.normpath(os.path.join(self.base_dir, content_uri))
+                    # (Python layers are extracted to /opt, and /opt/python is on the Lambda's path)
+                    python_dir = os.path.join(layer_dir, "python")
+                    layer_dirs.append(python_dir if os.path.isdir(python_dir) else layer_dir)
+            variables = ((properties.get("Environment") or {}).get("Variables")) or {}
+            result[name] = {
+                "Dir": os.path.normpath(os.path.join(self.base_dir, properties["CodeUri"])),
+                "Handler": properties["Handler"],
+                "MemorySize": int(properties.get("MemorySize", 128)),
+                "Timeout": float(properties.get("Timeout", 3)),
+                "Environment": { k: self.resolve(v) for k, v in variables.items() },
+                "Layers": layer_dirs,
+            }
+        return result
+
+    def definition_substitutions(self, definition_path=None):
+        """DefinitionSubstitutions of the state machine with definition_path (or else the first one)"""
+        machines = list(self.of_type("AWS::Serverless::StateMachine").values())
+        if not machines:
+            return {}
+        machine = machines[0]
+        if definition_path is not None:
+            for candidate in machines:
+                uri = (candidate.get("Properties") or {}).get("DefinitionUri")
+                if isinstance(uri, str) and os.path.basename(uri) == os.path.basename(definition_path):
+                    machine = candidate
+        substitutions = (machine.get("Properties") or {}).get("DefinitionSubstitutions") or {}
+        return { k: self.resolve(v) for k, v in substitutions.items() }
+
+
+class LambdaContext:
+    """The parts of the Lambda context object that the handlers use"""
+    def __init__(self, function_name, function_arn, memory_mb, timeout_secs):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.invoked_function_arn = function_arn
+        self.memory_limit_in_mb = memory_mb
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = f"/aws/lambda/{function_name}"
+        self.log_stream_name = f"local/[$LATEST]{self.aws_request_id}"
+        self._deadline = time.monotonic() + timeout_secs
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class LocalLambda(StandIn):
+    """Invokes a SAM template's functions in-process, timing each one's import (cold start) and invocations
+
+    Environment variables are process-wide, so all the functions' template Environment Variables are set (if
+    not already) up front.
+    """
+    service_name = "lambda"
+    serialize = False
+
+    def __init__(self, recorder, template):
+        super().__init__(recorder)
+        self.template = template
+        self.functions = template.functions()
+        self.handlers = {}
+        self.stats = {}
+        self._import_lock = threading.Lock()
+        os.environ.setdefault("AWS_REGION", REGION)
+        os.environ.setdefault("AWS_DEFAULT_REGION", REGION)
+        for function in self.functions.values():
+            for key, value in function["Environment"].items():
+                os.environ.setdefault(key, value)
+            for layer_dir in function["Layers"]:
+                if layer_dir not in sys.path:
+                    sys.path.append(layer_dir)
+
+    def _record(self, name, **increments):
+        with self._lock:
+            stats = self.stats.setdefault(
+                name, { "Invocations": 0, "Errors": 0, "InitSeconds": None, "Seconds": 0., "MaxSeconds": 0. }
+            )
+            for key, value in increments.items():
+                if key == "MaxSeconds":
+                    stats[key] = max(stats[key], value)
+                else:
+                    stats[key] = value if stats[key] is None else stats[key] + value
+
+    def handler(self, name):
+        """The function's handler, importing its module first if needed"""
+        with self._import_lock:
+            if name not in self.handlers:
+                function = self.functions[name]
+                module_name, _, handler_name = function["Handler"].rpartition(".")
+                path = os.path.join(function["Dir"], *module_name.split(".")) + ".py"
+                # (Every function's module is "main", so load each under its own name. Functions may read
+                # files relative to their folder at import, so switch to it like the Lambda runtime does)
+                spec = importlib.util.spec_from_file_location(f"lambda_{_kebab(name).replace('-', '_')}",
+                    path)
+                module = importlib.util.module_from_spec(spec)
+                cwd = os.getcwd()
+                sys.path.insert(0, function["Dir"])
+                t_start = time.perf_counter()
+                try:
+                    os.chdir(function["Dir"])
+                    spec.loader.exec_module(module)
+                finally:
+                    os.chdir(cwd)
+                    sys.path.remove(function["Dir"])
+                self._record(name, InitSeconds=time.perf_counter() - t_start)
+                self.handlers[name] = getattr(module, handler_name)
+            return self.handlers[name]
+
+    @operation
+    def invoke(self, FunctionName, Payload=b"", InvocationType="RequestResponse", **kwargs):
+        name = FunctionName.split(":")[6] if FunctionName.startswith("arn:") else FunctionName
+        if name not in self.functions:
+            raise client_error(
+                "ResourceNotFoundException", f"Function not found: {self.template.function_arn(name)}",
+                "Invoke", 404,
+            )
+        function = self.functions[name]
+        event = json.loads(Payload or b"null")
+        t_start = time.perf_counter()
+        function_error = None
+        try:
+            context = LambdaContext(
+                name, self.template.function_arn(name), function["MemorySize"], function["Timeout"]
+            )
+            result = json.dumps(self.handler(name)(event, context)).encode("utf-8")
+        except Exception as err:
+            traceback.print_exc()
+            function_error = "Unhandled"
+            result = json.dumps({
+                "errorMessage": str(err),
+                "errorType": type(err).__name__,
+                "stackTrace": traceback.format_tb(err.__traceback__),
+            }).encode("utf-8")
+        elapsed = time.perf_counter() - t_start
+        if function_error is None and elapsed > function["Timeout"]:
+            # (The real function would have been stopped, so fail it to show the Timeout needs raising)
+            function_error = "Unhandled"
+            result = json.dumps({
+                "errorMessage": f"Task timed out after {elapsed:.2f} seconds (limit {function['Timeout']}s)",
+                "errorType": "Sandbox.Timedout",
+            }).encode("utf-8")
+        self._record(name, Invocations=1, Errors=int(function_error is not None), Seconds=elapsed,
+            MaxSeconds=elapsed)
+        response = {
+            "StatusCode": 202 if InvocationType == "Event" else 200,
+            "ExecutedVersion": "$LATEST",
+            "Payload": StreamingBody(result),
+        }
+        if function_error:
+            response["FunctionError"] = function_error
+        return response
+
+
+class LocalAWS:
+    """One set of stand-ins sharing a CallRecorder, to install in place of the util layer's boto3 clients"""
+    def __init__(self, template, root, seed=None, endpoint_polls=0, job_polls=0):
+        self.recorder = CallRecorder()
+        s3 = LocalS3(self.recorder, root)
+        self.clients = { c.service_name: c for c in (
+            s3,
+            LocalSageMaker(self.recorder, endpoint_polls=endpoint_polls, job_polls=job_polls),
+            LocalAutoScaling(self.recorder),
+            LocalCloudWatch(self.recorder),
+            LocalSNS(self.recorder),
+            LocalSES(self.recorder),
+            LocalStepFunctions(self.recorder),
+            LocalLambda(self.recorder, template),
+        ) }
+        self.resources = { "s3": LocalS3Resource(s3) }
+        if seed:
+            self.seed(seed)
+
+    def client(self, service_name):
+        if service_name not in self.clients:
+            raise NotImplementedError(f"There's no local stand-in for {service_name}")
+        return self.clients[service_name]
+
+    def seed(self, seed):
+        """Make the API calls in seed ({service: {operation: [kwargs, ...]}}) and settle the results"""
+        for service_name, calls in seed.items():
+            for operation_name, requests in calls.items():
+                for request in requests:
+                    getattr(self.client(service_name), operation_name)(**request)
+        self.clients["sagemaker"].settle()
+        self.recorder.calls.clear()
+
+    def install(self):
+        """Have util.clients (from the template's layer) return these stand-ins instead of boto3's"""
+        from util import clients
+        for service_name, stand_in in self.clients.items():
+            clients.use_stand_in(service_name, stand_in)
+        for service_name, stand_in in self.resources.items():
+            clients.use_stand_in(service_name, stand_in, kind="resource")
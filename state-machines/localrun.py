@@ -0,0 +1,685 @@
+"""Run a state machine definition locally, with stubbed or in-process Task results, and time each state
+
+Checks the pipeline's ASL logic without deploying anything: Choice routing, Map fan-out, Retry and Catch, and
+the Parameters/ResultPath plumbing between states. Task states call a task handler instead of AWS. With just
+--stubs, the CLI uses canned results from a stubs JSON file keyed by state name, where each entry is one of:
+
+- Any JSON value: Returned as the result of every call
+- `{"Results": [...]}`: Returned in turn, one per call (the last one repeating)
+- `{"Error": "...", "Cause": "..."}`: Raised as a task failure
+
+E.g. to run the pipeline with 3 test shards:
+
+    python localrun.py SubmitForestCoverModel.asl.json --stubs local-stubs.json \\
+        --input '{"EndpointName": "demo", "TestScoring": {"ShardCount": 3}}'
+
+With --template, Tasks instead run the real Lambda handlers in-process, against local stand-ins for the AWS
+APIs they call (see localaws.py) with S3 in the --local-root folder. Lambda ARN and lambda:invoke Resources
+invoke the template's functions, `.sync` SageMaker job integrations create the job then describe it until
+it's finished, and other `arn:aws:states:::{service}:{action}` integrations call the stand-in API. Stubs
+still take precedence for the states they name, e.g. to fake the outputs of jobs. A `.waitForTaskToken`
+state's task gets the token in $$.Task.Token, and then completes with whatever the task sent with
+SendTaskSuccess/Failure, or else the state's entry (in stub format) in --callbacks:
+
+    python localrun.py SubmitForestCoverModel.asl.json --template ../deployment/project.sam.yml \\
+        --local-root ./local-aws --seed @seed.json --stubs local-stubs.json \\
+        --callbacks '{"Deployment Approval": {"Status": "Approved"}}' --input @input.json --report report.json
+
+${...} DefinitionSubstitutions are replaced from --sub NAME=VALUE arguments, then (with --template) the
+template's own, resolved to local values. --sub values also override the template's parameters/resources.
+
+Wait states and Retry intervals don't actually wait unless --time-scale is set (e.g. 0.01 to sleep for 1%
+of the time), but the time they would take is reported with each state's entries, task attempts, wall time,
+and AWS calls made: To profile where an end-to-end run spends its time, and how many API calls it makes.
+"""
+
+# Python Built-Ins:
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import copy
+from datetime import datetime, timezone
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+
+class StatesError(Exception):
+    """A Step Functions error (e.g. task failure or States.Runtime), with error name and cause"""
+    def __init__(self, error, cause=""):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+def substitute(definition_text, substitutions):
+    """Apply SAM-style ${Name} DefinitionSubstitutions to a definition string"""
+    return re.sub(
+        r"\$\{(\w+)\}",
+        lambda m: substitutions.get(m.group(1), m.group(0)),
+        definition_text,
+    )
+
+
+_PATH_TOKEN = re.compile(r"\.([^.\[]+)|\[(\d+)\]|\['([^']+)'\]")
+
+
+def parse_path(path):
+    """Split a JSONPath like $.a.b[0] into (root, [tokens]), where root is '$' or '$$'"""
+    root = "$$" if path.startswith("$$") else "$"
+    rest = path[len(root):]
+    tokens = []
+    pos = 0
+    while pos < len(rest):
+        match = _PATH_TOKEN.match(rest, pos)
+        if not match:
+            raise StatesError("States.Runtime", f"Unsupported JSONPath '{path}'")
+        name, index, quoted = match.groups()
+        tokens.append(int(index) if index is not None else (name if name is not None else quoted))
+        pos = match.end()
+    return root, tokens
+
+
+def get_path(data, path, context=None):
+    """Evaluate a (simple) JSONPath against data, or the context object for '$$' paths"""
+    root, tokens = parse_path(path)
+    value = context if root == "$$" else data
+    for token in tokens:
+        try:
+            value = value[token]
+        except (KeyError, IndexError, TypeError):
+            raise StatesError("States.Runtime", f"Path '{path}' not found in input")
+    return value
+
+
+def has_path(data, path):
+    try:
+        get_path(data, path)
+        return True
+    except StatesError:
+        return False
+
+
+def set_path(data, path, value):
+    """Return a copy of data with value placed at a ResultPath (None path discards the value)"""
+    if path is None:
+        return data
+    root, tokens = parse_path(path)
+    if not tokens:
+        return value
+    result = copy.deepcopy(data) if isinstance(data, dict) else {}
+    target = result
+    for token in tokens[:-1]:
+        if not isinstance(target.get(token), dict):
+            target[token] = {}
+        target = target[token]
+    target[tokens[-1]] = value
+    return result
+
+
+def _split_args(raw):
+    """Split intrinsic function arguments on top-level commas"""
+    args, depth, quoted, current = [], 0, False, ""
+    for i, ch in enumerate(raw):
+        if ch == "'" and (i == 0 or raw[i - 1] != "\\"):
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and not quoted and depth == 0:
+            args.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        args.append(current.strip())
+    return args
+
+
+def evaluate_expression(expr, data, context):
+    """Evaluate a '.$' value: A JSONPath or an intrinsic function call"""
+    match = re.fullmatch(r"(States\.\w+)\((.*)\)", expr.strip(), re.DOTALL)
+    if not match:
+        return get_path(data, expr, context)
+    name, raw_args = match.groups()
+    args = []
+    for arg in _split_args(raw_args):
+        if arg.startswith("'"):
+            args.append(arg[1:-1].replace("\\'", "'"))
+        elif arg.startswith("$") or arg.startswith("States."):
+            args.append(evaluate_expression(arg, data, context))
+        else:
+            args.append(json.loads(arg))
+    if name == "States.Format":
+        template, values = args[0], iter(args[1:])
+        return re.sub(r"\{\}", lambda _: str(next(values)), template)
+    elif name == "States.StringToJson":
+        return json.loads(args[0])
+    elif name == "States.JsonToString":
+        return json.dumps(args[0], separators=(",", ":"))
+    elif name == "States.Array":
+        return args
+    raise StatesError("States.Runtime", f"Unsupported intrinsic function {name}")
+
+
+def apply_parameters(template, data, context):
+    """Build a Parameters/ResultSelector object, evaluating keys ending '.$'"""
+    if isinstance(template, dict):
+        result = {}
+        for key, value in template.items():
+            if key.endswith(".$"):
+                result[key[:-2]] = evaluate_expression(value, data, context)
+            else:
+                result[key] = apply_parameters(value, data, context)
+        return result
+    elif isinstance(template, list):
+        return [apply_parameters(v, data, context) for v in template]
+    return template
+
+
+_COMPARISONS = {
+    "StringEquals": lambda a, b: isinstance(a, str) and a == b,
+    "StringLessThan": lambda a, b: isinstance(a, str) and a < b,
+    "StringGreaterThan": lambda a, b: isinstance(a, str) and a > b,
+    "StringLessThanEquals": lambda a, b: isinstance(a, str) and a <= b,
+    "StringGreaterThanEquals": lambda a, b: isinstance(a, str) and a >= b,
+    "NumericEquals": lambda a, b: isinstance(a, (int, float)) and a == b,
+    "NumericLessThan": lambda a, b: isinstance(a, (int, float)) and a < b,
+    "NumericGreaterThan": lambda a, b: isinstance(a, (int, float)) and a > b,
+    "NumericLessThanEquals": lambda a, b: isinstance(a, (int, float)) and a <= b,
+    "NumericGreaterThanEquals": lambda a, b: isinstance(a, (int, float)) and a >= b,
+    "BooleanEquals": lambda a, b: isinstance(a, bool) and a == b,
+}
+
+
+def evaluate_rule(rule, data):
+    """Evaluate a Choice rule (with And/Or/Not, comparisons, *Path comparisons and type tests)"""
+    if "And" in rule:
+        return all(evaluate_rule(r, data) for r in rule["And"])
+    if "Or" in rule:
+        return any(evaluate_rule(r, data) for r in rule["Or"])
+    if "Not" in rule:
+        return not evaluate_rule(rule["Not"], data)
+
+    variable = rule["Variable"]
+    if "IsPresent" in rule:
+        return has_path(data, variable) == rule["IsPresent"]
+    value = get_path(data, variable)
+    if "IsNull" in rule:
+        return (value is None) == rule["IsNull"]
+    if "IsString" in rule:
+        return isinstance(value, str) == rule["IsString"]
+    if "IsBoolean" in rule:
+        return isinstance(value, bool) == rule["IsBoolean"]
+    if "IsNumeric" in rule:
+        return (isinstance(value, (int, float)) and not isinstance(value, bool)) == rule["IsNumeric"]
+    for name, compare in _COMPARISONS.items():
+        if name in rule:
+            return compare(value, rule[name])
+        if f"{name}Path" in rule:
+            return compare(value, get_path(data, rule[f"{name}Path"]))
+    raise StatesError("States.Runtime", f"Unsupported Choice rule {rule}")
+
+
+def error_matches(error_equals, error):
+    """Whether a Retry or Catch ErrorEquals list matches an error name"""
+    if error in error_equals:
+        return True
+    # (Wildcards don't match runtime errors, and States.TaskFailed doesn't match timeouts)
+    if error == "States.Runtime":
+        return False
+    return "States.ALL" in error_equals or ("States.TaskFailed" in error_equals and error != "States.Timeout")
+
+
+def parse_timestamp(value):
+    value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class StubTasks:
+    """Task handler returning canned results per state name (see module docstring for the format)"""
+    def __init__(self, stubs):
+        self.stubs = stubs
+        self.calls = {}
+
+    def __call__(self, state_name, resource, parameters, context):
+        if state_name not in self.stubs:
+            raise StatesError("States.TaskFailed", f"No stub provided for Task state '{state_name}'")
+        n_calls = self.calls.get(state_name, 0)
+        self.calls[state_name] = n_calls + 1
+        stub = self.stubs[state_name]
+        if isinstance(stub, dict) and "Results" in stub:
+            stub = stub["Results"][min(n_calls, len(stub["Results"]) - 1)]
+        if isinstance(stub, dict) and "Error" in stub:
+            raise StatesError(stub["Error"], stub.get("Cause", ""))
+        return copy.deepcopy(stub)
+
+
+class LocalTasks:
+    """Task handler running each Task's service integration against local AWS stand-ins (localaws.LocalAWS)
+
+    States named in stubs return their canned results instead (as StubTasks), and .waitForTaskToken tasks
+    complete with the callback the task sent for its token, or else their entry in callbacks (in the same
+    format). AWS calls are counted by the state they're made from, in aws.recorder.
+    """
+    # Step Functions' prefixes for errors from each service integration:
+    ERROR_PREFIXES = { "lambda": "Lambda", "sagemaker": "SageMaker", "sns": "SNS", "ses": "SES", "s3": "S3" }
+
+    def __init__(self, aws, stubs=None, callbacks=None):
+        self.aws = aws
+        self.stubs = StubTasks(stubs or {})
+        self.callbacks = StubTasks(callbacks or {})
+
+    def __call__(self, state_name, resource, parameters, context):
+        if state_name in self.stubs.stubs:
+            return self.stubs(state_name, resource, parameters, context)
+        with self.aws.recorder.attribute_to(state_name):
+            if resource.startswith("arn:aws:lambda:"):
+                return self.invoke(resource, parameters)
+            match = re.fullmatch(
+                r"arn:aws:states:::([\w-]+):(\w+)(\.sync(?::2)?|\.waitForTaskToken)?", resource
+            )
+            if not match:
+                raise StatesError("States.Runtime", f"Unsupported Task Resource '{resource}'")
+            service, action, pattern = match.groups()
+            if service == "lambda" and action == "invoke":
+                result = {
+                    "ExecutedVersion": "$LATEST",
+                    "Payload": self.invoke(parameters["FunctionName"], parameters.get("Payload")),
+                    "StatusCode": 200,
+                }
+            else:
+                result = self.call(service, action, parameters)
+            if pattern == ".waitForTaskToken":
+                return self.await_callback(state_name, context["Task"]["Token"])
+            elif pattern is not None:
+                return self.complete(service, action, parameters)
+            return result
+
+    def call(self, service, action, parameters):
+        """Call the stand-in API for a service integration, returning its (JSON-safe) response"""
+        method = re.sub(r"(?<!^)(?=[A-Z])", "_", action).lower()
+        try:
+            response = getattr(self.aws.client(service), method)(**parameters)
+        except NotImplementedError as err:
+            raise StatesError("States.Runtime", str(err))
+        except Exception as err:
+            error = getattr(err, "response", {}).get("Error", {})
+            if not error:
+                raise
+            prefix = self.ERROR_PREFIXES.get(service, service)
+            raise StatesError(f"{prefix}.{error.get('Code')}", error.get("Message", ""))
+        return json.loads(json.dumps(response, default=lambda o: o.isoformat()))
+
+    def invoke(self, function_name, payload):
+        """Invoke a Lambda function, returning its result or raising its error as Step Functions would"""
+        try:
+            response = self.aws.client("lambda").invoke(
+                FunctionName=function_name, Payload=json.dumps(payload).encode("utf-8")
+            )
+        except Exception as err:
+            error = getattr(err, "response", {}).get("Error", {})
+            if not error:
+                raise
+            raise StatesError(f"Lambda.{error.get('Code')}", error.get("Message", ""))
+        result = response["Payload"].read()
+        if response.get("FunctionError"):
+            raise StatesError(json.loads(result).get("errorType", "Lambda.Unknown"), result.decode("utf-8"))
+        return json.loads(result) if result else None
+
+    def complete(self, service, action, parameters):
+        """Poll a .sync integration's describe call until it's finished (only SageMaker jobs are supported)"""
+        kind = action[len("create"):]
+        if service != "sagemaker" or not action.startswith("create") or not kind.endswith("Job"):
+            raise StatesError("States.Runtime", f"Unsupported .sync integration {service}:{action}")
+        while True:
+            description = self.call(service, f"describe{kind}", { f"{kind}Name": parameters[f"{kind}Name"] })
+            status = description[f"{kind}Status"]
+            if status not in ("InProgress", "Stopping"):
+                break
+        if status != "Completed":
+            raise StatesError("States.TaskFailed", json.dumps(description))
+        return description
+
+    def await_callback(self, state_name, task_token):
+        outcome = self.aws.client("stepfunctions").pop_outcome(task_token)
+        if outcome is None:
+            if state_name not in self.callbacks.stubs:
+                # (The real state would wait until its TimeoutSeconds, or forever)
+                raise StatesError(
+                    "States.Timeout",
+                    f"Nothing sent a callback for the task token of '{state_name}', and it has no "
+                    "--callbacks entry",
+                )
+            return self.callbacks(state_name, None, None, None)
+        if "Error" in outcome:
+            raise StatesError(outcome["Error"], outcome["Cause"])
+        return outcome["Output"]
+
+
+class LocalStateMachine:
+    """Local interpreter for a subset of Amazon States Language, calling task_handler for Task states
+
+    task_handler(state_name, resource, parameters, context) should return the task's result, or raise
+    StatesError to fail it. Wait states and Retry intervals sleep for time_scale times their real duration
+    (so by default not at all), and the time is added to their state's WaitSeconds in stats.
+    """
+    def __init__(self, definition, task_handler, name="LocalStateMachine", time_scale=0., sleep=time.sleep):
+        self.definition = definition
+        self.task_handler = task_handler
+        self.name = name
+        self.time_scale = time_scale
+        self.sleep = sleep
+        self.trace = []
+        # Totals by state name (over all its entries, including in Map iterations):
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, state_name, state_type, **increments):
+        with self._lock:
+            stats = self.stats.setdefault(state_name, {
+                "Type": state_type,
+                "Entries": 0,
+                "Attempts": 0,
+                "Errors": 0,
+                "Seconds": 0.,
+                "WaitSeconds": 0.,
+            })
+            for key, value in increments.items():
+                stats[key] += value
+
+    def wait(self, state_name, state_type, seconds):
+        """Account for (and maybe sleep a scaled fraction of) seconds of waiting in a state"""
+        self.record(state_name, state_type, WaitSeconds=seconds)
+        if self.time_scale and seconds > 0:
+            self.sleep(seconds * self.time_scale)
+
+    def run(self, execution_input):
+        """Run an execution to completion, returning {"Status", "Output" | "Error" & "Cause", "Seconds"}"""
+        execution_name = str(uuid.uuid4())
+        context = {
+            "Execution": {
+                "Id": f"arn:aws:states:local:000000000000:execution:{self.name}:{execution_name}",
+                "Input": execution_input,
+                "Name": execution_name,
+                "StartTime": datetime.utcnow().isoformat() + "Z",
+            },
+            "StateMachine": {
+                "Id": f"arn:aws:states:local:000000000000:stateMachine:{self.name}",
+                "Name": self.name,
+            },
+        }
+        t_start = time.perf_counter()
+        try:
+            output = self.run_states(self.definition, execution_input, context, path=())
+            result = { "Status": "SUCCEEDED", "Output": output }
+        except StatesError as e:
+            result = { "Status": "FAILED", "Error": e.error, "Cause": e.cause }
+        result["Seconds"] = time.perf_counter() - t_start
+        return result
+
+    def run_states(self, machine, data, context, path):
+        state_name = machine["StartAt"]
+        while True:
+            state = machine["States"][state_name]
+            step = { "State": "/".join(path + (state_name,)), "Type": state["Type"] }
+            self.trace.append(step)
+            state_context = dict(context, State={
+                "Name": state_name,
+                "EnteredTime": datetime.utcnow().isoformat() + "Z",
+            })
+            t_start = time.perf_counter()
+            try:
+                data, next_state = self.run_state(state_name, state, data, state_context, path)
+            finally:
+                step["Seconds"] = time.perf_counter() - t_start
+                self.record(state_name, state["Type"], Entries=1, Seconds=step["Seconds"])
+            if next_state is None:
+                return data
+            state_name = next_state
+
+    def run_state(self, state_name, state, data, context, path):
+        """Run one state, returning (output, next state name or None if ended)"""
+        state_type = state["Type"]
+        if state_type == "Fail":
+            raise StatesError(state.get("Error", "States.Fail"), state.get("Cause", ""))
+        if state_type == "Succeed":
+            return data, None
+        if state_type == "Choice":
+            for rule in state["Choices"]:
+                if evaluate_rule(rule, data):
+                    return data, rule["Next"]
+            if "Default" not in state:
+                raise StatesError("States.NoChoiceMatched", f"No Choice matched in state '{state_name}'")
+            return data, state["Default"]
+
+        if "InputPath" in state and state["InputPath"] is None:
+            effective_input = {}
+        else:
+            effective_input = get_path(data, state.get("InputPath", "$"))
+        if "Parameters" in state and state_type not in ("Map", "Task"):
+            effective_input = apply_parameters(state["Parameters"], effective_input, context)
+
+        if state_type == "Pass":
+            result = state.get("Result", effective_input)
+        elif state_type == "Wait":
+            self.wait(state_name, state_type, self.wait_seconds(state, effective_input))
+            result = effective_input
+        elif state_type in ("Task", "Map", "Parallel"):
+            try:
+                result = self.run_with_retry(state_name, state, lambda: self.run_work(
+                    state_name, state, effective_input, context, path
+                ))
+            except StatesError as e:
+                catcher = next(
+                    (c for c in state.get("Catch", []) if error_matches(c["ErrorEquals"], e.error)), None
+                )
+                if catcher is None:
+                    raise
+                error_output = { "Error": e.error, "Cause": e.cause }
+                return set_path(data, catcher.get("ResultPath", "$"), error_output), catcher["Next"]
+        else:
+            raise StatesError("States.Runtime", f"Unsupported state type {state_type}")
+
+        if "ResultSelector" in state:
+            result = apply_parameters(state["ResultSelector"], result, context)
+        output = set_path(data, state.get("ResultPath", "$"), result)
+        if "OutputPath" in state:
+            output = {} if state["OutputPath"] is None else get_path(output, state["OutputPath"])
+        return output, (None if state.get("End") else state["Next"])
+
+    def run_work(self, state_name, state, effective_input, context, path):
+        """One attempt at a Task, Map or Parallel state's work, returning its result"""
+        state_type = state["Type"]
+        if state_type == "Task":
+            if state["Resource"].endswith(".waitForTaskToken"):
+                # (Each attempt gets a new token)
+                context = dict(context, Task={ "Token": uuid.uuid4().hex })
+            parameters = (
+                apply_parameters(state["Parameters"], effective_input, context) if "Parameters" in state
+                else effective_input
+            )
+            return self.task_handler(state_name, state["Resource"], parameters, context)
+        elif state_type == "Map":
+            return self.run_map(state_name, state, effective_input, context, path)
+        return [
+            self.run_states(branch, effective_input, context, path + (state_name, str(ix)))
+            for ix, branch in enumerate(state["Branches"])
+        ]
+
+    def run_with_retry(self, state_name, state, attempt):
+        """Call attempt() until it succeeds, or fails with an error the state's Retry doesn't (or no longer)
+        cover"""
+        retriers = state.get("Retry", [])
+        retries = [0] * len(retriers)
+        while True:
+            self.record(state_name, state["Type"], Attempts=1)
+            try:
+                return attempt()
+            except StatesError as e:
+                self.record(state_name, state["Type"], Errors=1)
+                # (Only the first retrier matching the error applies, even once its attempts run out)
+                ix = next(
+                    (i for i, r in enumerate(retriers) if error_matches(r["ErrorEquals"], e.error)), None
+                )
+                if ix is None or retries[ix] >= retriers[ix].get("MaxAttempts", 3):
+                    raise
+                retrier = retriers[ix]
+                delay = retrier.get("IntervalSeconds", 1) * retrier.get("BackoffRate", 2.0) ** retries[ix]
+                delay = min(delay, retrier.get("MaxDelaySeconds", delay))
+                if retrier.get("JitterStrategy") == "FULL":
+                    delay = random.uniform(0, delay)
+                retries[ix] += 1
+                self.wait(state_name, state["Type"], delay)
+
+    def wait_seconds(self, state, data):
+        """How long a Wait state would wait, given its input"""
+        if "Seconds" in state:
+            return state["Seconds"]
+        elif "SecondsPath" in state:
+            return get_path(data, state["SecondsPath"])
+        elif "Timestamp" in state or "TimestampPath" in state:
+            timestamp = state["Timestamp"] if "Timestamp" in state else get_path(data, state["TimestampPath"])
+            return max(0., (parse_timestamp(timestamp) - datetime.now(timezone.utc)).total_seconds())
+        return 0.
+
+    def run_map(self, state_name, state, data, context, path):
+        items = get_path(data, state.get("ItemsPath", "$"))
+        if not isinstance(items, list):
+            raise StatesError("States.Runtime", f"Map state '{state_name}' ItemsPath is not an array")
+        max_concurrency = state.get("MaxConcurrency", 0)
+        if "MaxConcurrencyPath" in state:
+            max_concurrency = int(get_path(data, state["MaxConcurrencyPath"]))
+        iterator = state.get("ItemProcessor", state.get("Iterator"))
+
+        def run_item(ix):
+            item_context = dict(context, Map={ "Item": { "Index": ix, "Value": items[ix] } })
+            item_input = (
+                apply_parameters(state["Parameters"], data, item_context) if "Parameters" in state
+                else items[ix]
+            )
+            return self.run_states(iterator, item_input, item_context, path + (state_name, str(ix)))
+
+        # (0 means unlimited concurrency in Step Functions)
+        with ThreadPoolExecutor(max_workers=max_concurrency or max(len(items), 1)) as executor:
+            return list(executor.map(run_item, range(len(items))))
+
+    def report(self, calls=None):
+        """Per-state stats (in order of first entry), with the AWS calls made from each if calls is given"""
+        states = {}
+        for name, stats in self.stats.items():
+            states[name] = dict(stats)
+            if calls is not None:
+                states[name]["Calls"] = dict(calls.get(name, {}))
+        return states
+
+
+def format_report(states):
+    lines = ["{:<32} {:<8} {:>7} {:>8} {:>10} {:>10}  {}".format(
+        "State", "Type", "Entries", "Attempts", "Seconds", "Waited", "AWS calls"
+    )]
+    for name, stats in states.items():
+        calls = ", ".join(f"{op} x{n}" for op, n in sorted(stats.get("Calls", {}).items()))
+        lines.append("{:<32} {:<8} {:>7} {:>8} {:>10.3f} {:>10.1f}  {}".format(
+            name[:32], stats["Type"], stats["Entries"], stats["Attempts"] or "-", stats["Seconds"],
+            stats["WaitSeconds"], calls,
+        ))
+    return "\n".join(lines)
+
+
+def load_json_arg(raw):
+    """Parse a JSON string argument, or the JSON file it names with @path"""
+    if raw.startswith("@"):
+        with open(raw[1:], "r") as f:
+            return json.load(f)
+    return json.loads(raw)
+
+
+def parse_args(cmd_args=None):
+    parser = argparse.ArgumentParser(
+        description="Run a state machine definition locally with stubbed or in-process tasks"
+    )
+    parser.add_argument("definition", type=str, help="Path to the .asl.json definition")
+    parser.add_argument("--input", type=str, default="{}", help="Execution input: JSON string or @file.json")
+    parser.add_argument("--stubs", type=str, default=None, help="JSON file of Task results by state name")
+    parser.add_argument(
+        "--sub", type=str, action="append", default=[],
+        help="DefinitionSubstitutions as NAME=VALUE (repeatable)"
+    )
+    parser.add_argument("--template", type=str, default=None,
+        help="SAM template: Run its Lambda functions in-process for Tasks without stubs"
+    )
+    parser.add_argument("--local-root", type=str, default="local-aws", help="Local stand-in folder for S3")
+    parser.add_argument("--seed", type=str, default=None,
+        help="API calls to set up the AWS stand-ins with (see localaws.py): JSON string or @file.json"
+    )
+    parser.add_argument("--callbacks", type=str, default=None,
+        help=".waitForTaskToken results by state name, in stub format: JSON string or @file.json"
+    )
+    parser.add_argument("--endpoint-polls", type=int, default=0,
+        help="DescribeEndpoint calls that see an endpoint still Creating/Updating after each change"
+        " (functions that poll endpoints really sleep between these)"
+    )
+    parser.add_argument("--job-polls", type=int, default=0, help="Describe calls that see a job InProgress")
+    parser.add_argument("--time-scale", type=float, default=0.,
+        help="Fraction of Wait and Retry time to actually sleep for (default 0)"
+    )
+    parser.add_argument("--report", type=str, default=None, help="Write the per-state report as JSON here")
+    args = parser.parse_args(args=cmd_args)
+    if not (args.stubs or args.template):
+        parser.error("Provide --stubs and/or a --template to run Lambda functions from")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    substitutions = dict(s.partition("=")[::2] for s in args.sub)
+    stubs = {}
+    if args.stubs:
+        with open(args.stubs, "r") as f:
+            stubs = json.load(f)
+    execution_input = load_json_arg(args.input)
+
+    aws = None
+    if args.template:
+        # (Only needed, with its botocore dependency, to run functions in-process)
+        import localaws
+        template = localaws.SamTemplate(args.template, overrides=substitutions)
+        substitutions = dict(template.definition_substitutions(args.definition), **substitutions)
+        os.makedirs(args.local_root, exist_ok=True)
+        aws = localaws.LocalAWS(
+            template,
+            args.local_root,
+            seed=load_json_arg(args.seed) if args.seed else None,
+            endpoint_polls=args.endpoint_polls,
+            job_polls=args.job_polls,
+        )
+        aws.install()
+        task_handler = LocalTasks(
+            aws, stubs, load_json_arg(args.callbacks) if args.callbacks else None
+        )
+    else:
+        task_handler = StubTasks(stubs)
+
+    with open(args.definition, "r") as f:
+        definition = json.loads(substitute(f.read(), substitutions))
+    machine = LocalStateMachine(definition, task_handler, time_scale=args.time_scale)
+    result = machine.run(execution_input)
+    for step in machine.trace:
+        print(f"{step['Type']:>8} {step['Seconds']:9.3f}s  {step['State']}")
+    states = machine.report(aws.recorder.calls if aws else None)
+    print(format_report(states))
+    print(json.dumps(result, indent=2))
+    if args.report:
+        report = { "Execution": result, "States": states }
+        if aws:
+            report["Functions"] = aws.client("lambda").stats
+            report["UnattributedCalls"] = dict(aws.recorder.calls.get(localaws.UNATTRIBUTED, {}))
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if result["Status"] == "SUCCEEDED" else 1)